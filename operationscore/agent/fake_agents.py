@@ -3,11 +3,15 @@
 Fake Multi-Agent Simulator for OperationScore
 
 Spawns multiple concurrent fake device agents that generate random metrics
-and submit operational health reports to the scoring API.
+and submit operational health reports to the scoring API. The agents are
+registered first (POST /api/register), since the server rejects reports
+from unregistered hostnames.
 
 Usage:
     python agent/fake_agents.py --agents 20 --interval 10
     python agent/fake_agents.py --agents 10 --server http://localhost:8000
+
+For load tests with latency statistics see agent/fleet_bench.py.
 """
 
 import asyncio
@@ -61,6 +65,67 @@ def generate_metrics(hostname: str) -> Dict[str, Any]:
     }
 
 
+async def register_agent(
+    session: aiohttp.ClientSession,
+    server_url: str,
+    hostname: str,
+    username: str,
+    password: str,
+) -> bool:
+    """
+    Register one fake device via POST /api/register.
+
+    Args:
+        session: Shared aiohttp ClientSession
+        server_url: Base URL of the scoring API
+        hostname: The fake device hostname
+        username: Registration account (CLIENT role)
+        password: Registration password
+
+    Returns:
+        True if the server accepted the registration
+    """
+    payload = {
+        "hostname": hostname,
+        "ip": "127.0.0.1",
+        "username": username,
+        "password": password,
+    }
+    try:
+        async with session.post(
+            f"{server_url}/api/register",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            return response.status == 200
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        return False
+
+
+async def register_agents(
+    session: aiohttp.ClientSession,
+    server_url: str,
+    hostnames: List[str],
+    username: str,
+    password: str,
+    concurrency: int = 20,
+) -> List[str]:
+    """
+    Register many fake devices with at most *concurrency* requests in flight.
+
+    Returns:
+        Hostnames whose registration failed (empty on success)
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def register(hostname: str) -> bool:
+        async with semaphore:
+            return await register_agent(session, server_url, hostname, username, password)
+
+    results = await asyncio.gather(*(register(h) for h in hostnames))
+    return [h for h, ok in zip(hostnames, results) if not ok]
+
+
 async def fake_agent(
     agent_id: int,
     server_url: str,
@@ -144,7 +209,9 @@ async def fake_agent(
 async def run_simulator(
     num_agents: int,
     server_url: str,
-    max_interval: int
+    max_interval: int,
+    username: str = "ops-client",
+    password: str = "client123!"
 ) -> None:
     """
     Launch and manage multiple fake agents.
@@ -156,6 +223,8 @@ async def run_simulator(
         num_agents: Number of fake agents to spawn
         server_url: Base URL of the scoring API
         max_interval: Maximum sleep interval between reports
+        username: Registration account for the fake devices
+        password: Registration password
     """
     logger = logging.getLogger("FakeAgentSimulator")
     logger.info(
@@ -176,6 +245,15 @@ async def run_simulator(
     
     # Create shared aiohttp session
     async with aiohttp.ClientSession() as session:
+        # Reports from unregistered hostnames are rejected with 403
+        hostnames = [f"fake-device-{i + 1}" for i in range(num_agents)]
+        failed = await register_agents(session, server_url, hostnames, username, password)
+        if failed:
+            logger.error(f"Registration failed for {len(failed)} agents (first: {failed[0]})")
+            if len(failed) == num_agents:
+                return
+        logger.info(f"Registered {num_agents - len(failed)} fake agents")
+
         # Create concurrent tasks for all agents
         tasks: List[asyncio.Task] = [
             asyncio.create_task(
@@ -203,6 +281,7 @@ def main():
         --agents N: Number of fake agents to spawn (default: 10)
         --interval S: Maximum seconds between reports (default: 5)
         --server URL: Scoring API server URL (default: http://localhost:8000)
+        --username / --password: Registration account (default: ops-client)
     """
     parser = argparse.ArgumentParser(
         description="Fake multi-agent simulator for OperationScore",
@@ -230,6 +309,20 @@ def main():
         help="Scoring API server URL (default: http://localhost:8000)"
     )
     
+    parser.add_argument(
+        "--username",
+        type=str,
+        default="ops-client",
+        help="Registration username (default: ops-client)"
+    )
+
+    parser.add_argument(
+        "--password",
+        type=str,
+        default="client123!",
+        help="Registration password (default: client123!)"
+    )
+    
     args = parser.parse_args()
     
     # Validate arguments
@@ -243,7 +336,9 @@ def main():
     
     # Run the simulator
     try:
-        asyncio.run(run_simulator(args.agents, args.server, args.interval))
+        asyncio.run(run_simulator(
+            args.agents, args.server, args.interval, args.username, args.password
+        ))
     except KeyboardInterrupt:
         print("\nSimulator interrupted by user")
         sys.exit(0)
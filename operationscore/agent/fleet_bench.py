@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Fleet load-test harness for OperationScore.
+
+Starts a server on a throwaway database (or targets --server), registers
+N fake devices (agent/fake_agents.py), then drives three workloads at
+fixed rates for --duration seconds:
+
+  report   POST /report with fake_agents metrics; a --repeat share of the
+           reports resends the device's previous metrics unchanged
+  poll     GET /tasks/{hostname}
+  run      POST /runs/start
+
+Requests are issued open-loop: each one starts at its scheduled slot
+whether or not earlier ones have finished, and latency is measured from
+that slot. A stalled server therefore shows up as latency, not as a lower
+request rate. Requests that would exceed --max-in-flight are counted as
+dropped instead of being sent late.
+
+The result is a JSON report (latency percentiles, histogram buckets,
+status codes and error rate per workload, plus the server's own per-stage
+report timings from GET /metrics) and optionally the same as markdown.
+Two JSON reports can be compared to see what a server change did.
+
+Usage:
+    python agent/fleet_bench.py --agents 200 --duration 60 --report-rate 100 \\
+        --json bench.json --markdown bench.md
+    python agent/fleet_bench.py --server http://localhost:8000 --agents 50
+    python agent/fleet_bench.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+# ---------------------------------------------------------------------------
+# Path injection — ensure fake_agents.py is importable regardless of CWD.
+# ---------------------------------------------------------------------------
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, _SCRIPT_DIR)
+
+import aiohttp  # noqa: E402
+
+from fake_agents import generate_metrics, register_agents  # noqa: E402
+
+REPO_ROOT = Path(_SCRIPT_DIR).parent
+
+# Histogram bucket upper bounds in milliseconds (last bucket: above 5 s)
+BUCKETS_MS: tuple = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Status codes counted as success per workload
+EXPECTED_STATUS: Dict[str, tuple] = {
+    "report": (200,),
+    "poll": (200, 204),
+    "run": (201,),
+}
+
+# Metrics shown by render_markdown() / compare_reports(): key → (title, lower is better)
+_SUMMARY_FIELDS: Dict[str, tuple] = {
+    "achieved_rps": ("req/s", False),
+    "p50_ms": ("p50 ms", True),
+    "p90_ms": ("p90 ms", True),
+    "p99_ms": ("p99 ms", True),
+    "max_ms": ("max ms", True),
+    "error_rate": ("errors", True),
+}
+
+
+# ---------------------------------------------------------------------------
+# Latency statistics
+# ---------------------------------------------------------------------------
+
+class LatencyStats:
+    """Latency samples and outcomes of one workload."""
+
+    def __init__(self, name: str, expected: tuple = (200,)) -> None:
+        self.name = name
+        self.expected = expected
+        self.samples: List[float] = []       # seconds, successful and failed alike
+        self.statuses: Dict[str, int] = {}   # "200", "503", "ClientConnectorError", ...
+        self.errors = 0
+        self.dropped = 0
+
+    def record(self, seconds: float, status: Union[int, str]) -> None:
+        self.samples.append(seconds)
+        key = str(status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status not in self.expected:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile in milliseconds (0.0 without samples)."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+        return ordered[rank - 1] * 1000.0
+
+    def histogram(self) -> List[List[Any]]:
+        """[[upper bound ms or "+Inf", count], ...] (non-cumulative)."""
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for seconds in self.samples:
+            ms = seconds * 1000.0
+            index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+            counts[index] += 1
+        return [[bound, count] for bound, count in zip(list(BUCKETS_MS) + ["+Inf"], counts)]
+
+    def summary(self, duration: float) -> dict:
+        requests = len(self.samples)
+        return {
+            "requests": requests,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "error_rate": round(self.errors / requests, 4) if requests else 0.0,
+            "achieved_rps": round(requests / duration, 2) if duration > 0 else 0.0,
+            "mean_ms": round(sum(self.samples) / requests * 1000.0, 3) if requests else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(max(self.samples) * 1000.0, 3) if requests else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+            "histogram_ms": self.histogram(),
+        }
+
+
+async def drive(
+    rate: float,
+    duration: float,
+    request: Callable[[], Awaitable[Union[int, str]]],
+    stats: LatencyStats,
+    max_in_flight: int = 256,
+) -> None:
+    """
+    Call *request* *rate* times per second for *duration* seconds (open loop).
+
+    *request* returns the HTTP status; latency is recorded from the
+    scheduled start, so time spent queued behind a slow server counts.
+    """
+    if rate <= 0 or duration <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / rate
+    started = loop.time()
+    in_flight: set = set()
+
+    async def timed(scheduled: float) -> None:
+        try:
+            status: Union[int, str] = await request()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as exc:
+            status = type(exc).__name__
+        stats.record(loop.time() - scheduled, status)
+
+    for slot in range(int(rate * duration)):
+        scheduled = started + slot * interval
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            stats.dropped += 1
+            continue
+        task = asyncio.create_task(timed(scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+# ---------------------------------------------------------------------------
+# Workloads
+# ---------------------------------------------------------------------------
+
+class Fleet:
+    """Fake devices and the requests they send."""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        server_url: str,
+        hostnames: List[str],
+        repeat: float,
+        timeout: float,
+    ) -> None:
+        self.session = session
+        self.server_url = server_url
+        self.hostnames = hostnames
+        self.repeat = repeat
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._last_metrics: Dict[str, Dict[str, Any]] = {}
+        self._next_report = 0
+        self._next_poll = 0
+
+    async def report(self) -> int:
+        hostname = self.hostnames[self._next_report % len(self.hostnames)]
+        self._next_report += 1
+        previous = self._last_metrics.get(hostname)
+        if previous is not None and random.random() < self.repeat:
+            metrics = dict(previous, timestamp=datetime.now().isoformat() + "Z")
+        else:
+            metrics = generate_metrics(hostname)
+        self._last_metrics[hostname] = metrics
+        async with self.session.post(
+            f"{self.server_url}/report", json=metrics, timeout=self.timeout
+        ) as response:
+            await response.read()
+            return response.status
+
+    async def poll(self) -> int:
+        hostname = self.hostnames[self._next_poll % len(self.hostnames)]
+        self._next_poll += 1
+        async with self.session.get(
+            f"{self.server_url}/tasks/{hostname}", timeout=self.timeout
+        ) as response:
+            await response.read()
+            return response.status
+
+    async def start_run(self) -> int:
+        async with self.session.post(
+            f"{self.server_url}/runs/start", timeout=self.timeout
+        ) as response:
+            await response.read()
+            return response.status
+
+
+def parse_stage_timings(text: str) -> Dict[str, dict]:
+    """Per-stage {count, mean_ms} from the report stage histogram in GET /metrics."""
+    prefix = "operationscore_report_stage_duration_seconds_"
+    sums: Dict[str, float] = {}
+    counts: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line.startswith(prefix) or 'stage="' not in line:
+            continue
+        name, _, value = line.rpartition(" ")
+        stage = name.split('stage="', 1)[1].split('"', 1)[0]
+        if name.startswith(prefix + "sum"):
+            sums[stage] = float(value)
+        elif name.startswith(prefix + "count"):
+            counts[stage] = float(value)
+    return {
+        stage: {
+            "count": int(count),
+            "mean_ms": round(sums.get(stage, 0.0) / count * 1000.0, 3) if count else 0.0,
+        }
+        for stage, count in sorted(counts.items())
+    }
+
+
+async def _server_stage_timings(session: aiohttp.ClientSession, server_url: str) -> Dict[str, dict]:
+    try:
+        async with session.get(f"{server_url}/metrics") as response:
+            if response.status != 200:
+                return {}
+            return parse_stage_timings(await response.text())
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        return {}
+
+
+async def run_benchmark(args: argparse.Namespace, server_url: str) -> dict:
+    """Register the fleet, run all workloads concurrently and build the report."""
+    hostnames = [f"bench-device-{i + 1}" for i in range(args.agents)]
+    connector = aiohttp.TCPConnector(limit=args.max_in_flight * 3)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        register_started = time.perf_counter()
+        failed = await register_agents(
+            session, server_url, hostnames, args.username, args.password, concurrency=args.register_concurrency
+        )
+        register_seconds = time.perf_counter() - register_started
+        if failed:
+            raise RuntimeError(f"registration failed for {len(failed)} devices (first: {failed[0]})")
+
+        fleet = Fleet(session, server_url, hostnames, args.repeat, args.timeout)
+        stats = {name: LatencyStats(name, expected) for name, expected in EXPECTED_STATUS.items()}
+        run_rate = 1.0 / args.run_interval if args.run_interval > 0 else 0.0
+        started = time.perf_counter()
+        await asyncio.gather(
+            drive(args.report_rate, args.duration, fleet.report, stats["report"], args.max_in_flight),
+            drive(args.poll_rate, args.duration, fleet.poll, stats["poll"], args.max_in_flight),
+            drive(run_rate, args.duration, fleet.start_run, stats["run"], args.max_in_flight),
+        )
+        elapsed = time.perf_counter() - started
+        server_stages = await _server_stage_timings(session, server_url)
+
+    return {
+        "label": args.label,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "config": {
+            "server": server_url if args.server else "spawned",
+            "db_profile": None if args.server else args.db_profile,
+            "agents": args.agents,
+            "duration_seconds": args.duration,
+            "report_rate": args.report_rate,
+            "poll_rate": args.poll_rate,
+            "run_interval_seconds": args.run_interval,
+            "repeat": args.repeat,
+            "max_in_flight": args.max_in_flight,
+            "seed": args.seed,
+        },
+        "registration": {
+            "devices": args.agents,
+            "seconds": round(register_seconds, 3),
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "workloads": {name: s.summary(elapsed) for name, s in stats.items() if s.samples or s.dropped},
+        "server_stages": server_stages,
+    }
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=REPO_ROOT, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "git": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Local server
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(port: int, workdir: Path, db_profile: str) -> subprocess.Popen:
+    """Start uvicorn on 127.0.0.1:*port* with its database and snapshot files in *workdir*."""
+    env = dict(
+        os.environ,
+        DB_PATH=str(workdir / "bench.db"),
+        SNAPSHOT_DIR=str(workdir / "snapshot"),
+        DB_PROFILE=db_profile,
+    )
+    # The child gets its own descriptor of the log; ours is closed once it has started
+    with open(workdir / "server.log", "wb") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+
+
+async def wait_until_ready(server_url: str, process: Optional[subprocess.Popen], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                async with session.get(f"{server_url}/health", timeout=aiohttp.ClientTimeout(total=2)) as r:
+                    if r.status == 200:
+                        return
+            except (asyncio.TimeoutError, aiohttp.ClientError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {server_url} not ready after {timeout:.0f}s")
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def _format(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4f}".rstrip("0").rstrip(".") if value < 1 else f"{value:.1f}"
+    return str(value)
+
+
+def render_markdown(report: dict) -> str:
+    cfg = report["config"]
+    lines = [
+        f"# Fleet benchmark: {report.get('label') or 'unlabelled'}",
+        "",
+        f"- git `{report['environment'].get('git')}`, Python {report['environment'].get('python')}, "
+        f"{report['environment'].get('cpus')} CPUs",
+        f"- {cfg['agents']} devices, {cfg['duration_seconds']}s, report {cfg['report_rate']}/s, "
+        f"poll {cfg['poll_rate']}/s, run every {cfg['run_interval_seconds']}s, repeat {cfg['repeat']}",
+        f"- registration: {report['registration']['seconds']}s",
+        "",
+        "| workload | requests | dropped | " + " | ".join(t for t, _ in _SUMMARY_FIELDS.values()) + " |",
+        "|---|---|---|" + "---|" * len(_SUMMARY_FIELDS),
+    ]
+    for name, summary in report["workloads"].items():
+        cells = [_format(summary[key]) for key in _SUMMARY_FIELDS]
+        lines.append(f"| {name} | {summary['requests']} | {summary['dropped']} | " + " | ".join(cells) + " |")
+    if report.get("server_stages"):
+        lines += ["", "| server stage | count | mean ms |", "|---|---|---|"]
+        for stage, timing in report["server_stages"].items():
+            lines.append(f"| {stage} | {timing['count']} | {_format(timing['mean_ms'])} |")
+    return "\n".join(lines) + "\n"
+
+
+def compare_reports(base: dict, new: dict) -> str:
+    """Markdown table of *new* against *base* (change in percent, worse ones flagged)."""
+    lines = [
+        f"# {base.get('label') or 'base'} → {new.get('label') or 'new'}",
+        "",
+        "| workload | metric | base | new | change |",
+        "|---|---|---|---|---|",
+    ]
+    for name in sorted(set(base["workloads"]) | set(new["workloads"])):
+        old_summary = base["workloads"].get(name)
+        new_summary = new["workloads"].get(name)
+        if old_summary is None or new_summary is None:
+            lines.append(f"| {name} | — | {'—' if old_summary is None else 'present'} | "
+                         f"{'—' if new_summary is None else 'present'} | |")
+            continue
+        for key, (title, lower_is_better) in _SUMMARY_FIELDS.items():
+            before, after = old_summary[key], new_summary[key]
+            if before:
+                change = (after - before) / before * 100.0
+                worse = change > 0 if lower_is_better else change < 0
+                delta = f"{change:+.1f}%" + (" ⚠" if worse and abs(change) >= 10.0 else "")
+            else:
+                delta = "—" if not after else "new"
+            lines.append(f"| {name} | {title} | {_format(before)} | {_format(after)} | {delta} |")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Load-test an OperationScore server with a fake fleet",
+        epilog="Example: python agent/fleet_bench.py --agents 200 --duration 60 --json bench.json",
+    )
+    parser.add_argument("--agents", type=int, default=100, help="Fake devices to register (default: 100)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run the workloads (default: 30)")
+    parser.add_argument("--report-rate", type=float, default=50.0, help="POST /report per second (default: 50)")
+    parser.add_argument("--poll-rate", type=float, default=50.0, help="GET /tasks/{hostname} per second (default: 50)")
+    parser.add_argument("--run-interval", type=float, default=10.0,
+                        help="Seconds between POST /runs/start, 0 = none (default: 10)")
+    parser.add_argument("--repeat", type=float, default=0.0,
+                        help="Share of reports that resend the previous metrics unchanged, 0..1 (default: 0)")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="Per-workload cap on open requests; extra slots are dropped (default: 256)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds (default: 30)")
+    parser.add_argument("--register-concurrency", type=int, default=20,
+                        help="Parallel registrations (default: 20)")
+    parser.add_argument("--server", type=str, default=None,
+                        help="Existing server URL; default spawns one on a temporary database")
+    parser.add_argument("--db-profile", type=str, default="balanced", help="DB_PROFILE of the spawned server")
+    parser.add_argument("--username", type=str, default="ops-client", help="Registration username")
+    parser.add_argument("--password", type=str, default="client123!", help="Registration password")
+    parser.add_argument("--label", type=str, default="", help="Name stored in the report (e.g. a branch)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for generated metrics (default: 1)")
+    parser.add_argument("--json", type=str, default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--markdown", type=str, default=None, help="Also write a markdown summary here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="Compare two JSON reports and print a markdown table")
+    args = parser.parse_args(argv)
+    if not args.compare:
+        if args.agents < 1:
+            parser.error("--agents must be at least 1")
+        if args.duration <= 0:
+            parser.error("--duration must be positive")
+        if not 0.0 <= args.repeat <= 1.0:
+            parser.error("--repeat must be between 0 and 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    if args.compare:
+        base, new = (json.loads(Path(path).read_text(encoding="utf-8")) for path in args.compare)
+        print(compare_reports(base, new), end="")
+        return 0
+
+    random.seed(args.seed)
+    process = None
+    with tempfile.TemporaryDirectory(prefix="opsbench-") as tmp:
+        if args.server:
+            server_url = args.server.rstrip("/")
+        else:
+            port = _free_port()
+            server_url = f"http://127.0.0.1:{port}"
+            process = spawn_server(port, Path(tmp), args.db_profile)
+        try:
+            asyncio.run(wait_until_ready(server_url, process))
+            report = asyncio.run(run_benchmark(args, server_url))
+        except RuntimeError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            if process is not None:
+                log = Path(tmp) / "server.log"
+                print(log.read_text(errors="replace")[-4000:], file=sys.stderr)
+            return 1
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+    text = json.dumps(report, indent=2)
+    if args.json:
+        Path(args.json).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.markdown:
+        Path(args.markdown).write_text(render_markdown(report), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -182,6 +182,17 @@ def _build_arg_parser() -> argparse.ArgumentParser:
         metavar="SECONDS",
         help="Seconds between task polls in polling mode (default: 10)",
     )
+    p.add_argument(
+        "--long-poll-wait",
+        type=int,
+        default=30,
+        metavar="SECONDS",
+        help=(
+            "Ask the server to hold each task poll open up to this many seconds "
+            "until a task arrives (0 disables; default: 30). Servers without "
+            "long-poll support are polled every --poll-interval as before."
+        ),
+    )
     return p
 
 
@@ -517,16 +528,32 @@ def run_once(args, collector: MetricsCollector, report_url: str) -> int:
 # ---------------------------------------------------------------------------
 # Polling loop
 # ---------------------------------------------------------------------------
+def _ack_task(task_url: str, task_id: str, timeout: int) -> None:
+    """Acknowledge a leased task so the server does not deliver it again."""
+    import requests
+
+    try:
+        requests.post(f"{task_url}/{task_id}/ack", timeout=timeout)
+    except Exception as exc:
+        print(f"[ops_collect] task ack error: {exc}", file=sys.stderr)
+
+
 def _run_polling(args, collector: MetricsCollector, center: str, report_url: str) -> None:
     """
     Poll /tasks/<hostname> in a loop.
     On "run_scan" command: call run_once().
     Ctrl+C: exit 0 cleanly.
+
+    Each poll asks for ?wait=<long_poll_wait>. A server that answers with
+    "X-Long-Poll: 1" has already held the request open, so the next poll is
+    sent immediately; otherwise the loop sleeps poll_interval as before.
     """
     import requests
 
     hostname = collector.hostname
     task_url = center.rstrip("/") + "/tasks/" + hostname
+    wait = max(0, int(getattr(args, "long_poll_wait", 0) or 0))
+    params = {"wait": wait} if wait else None
 
     print(f"[ops_collect] polling {task_url} every {args.poll_interval}s — Ctrl+C to stop",
           file=sys.stderr)
@@ -534,15 +561,20 @@ def _run_polling(args, collector: MetricsCollector, center: str, report_url: str
     while True:
         try:
             try:
-                resp = requests.get(task_url, timeout=args.timeout)
+                resp = requests.get(task_url, params=params, timeout=args.timeout + wait)
             except Exception as exc:
                 print(f"[ops_collect] task poll error: {exc}", file=sys.stderr)
                 time.sleep(args.poll_interval)
                 continue
 
+            long_polled = bool(wait) and resp.headers.get("X-Long-Poll") == "1"
+            # Servers with leased tasks redeliver anything not acknowledged
+            leased = isinstance(resp.headers.get("X-Task-Lease-Seconds"), str)
+
             if resp.status_code == 204:
-                # No pending tasks
-                time.sleep(args.poll_interval)
+                # No pending tasks (a long-poll server already waited for one)
+                if not long_polled:
+                    time.sleep(args.poll_interval)
                 continue
 
             if resp.status_code == 200:
@@ -558,7 +590,11 @@ def _run_polling(args, collector: MetricsCollector, center: str, report_url: str
                 else:
                     print(f"[ops_collect] WARNING: unknown task command {command!r}, skipping",
                           file=sys.stderr)
-                time.sleep(args.poll_interval)
+                    # run_scan is acknowledged by its /report; skipped tasks need an explicit ack
+                    if leased and task.get("task_id"):
+                        _ack_task(task_url, task["task_id"], args.timeout)
+                if not long_polled:
+                    time.sleep(args.poll_interval)
                 continue
 
             # Unexpected status
@@ -611,6 +647,9 @@ def main() -> None:
     env_poll = os.environ.get("OPS_POLL_INTERVAL_SECONDS")
     if env_poll and env_poll.isdigit():
         args.poll_interval = int(env_poll)
+    env_wait = os.environ.get("OPS_LONG_POLL_WAIT_SECONDS")
+    if env_wait and env_wait.isdigit():
+        args.long_poll_wait = int(env_wait)
 
     # ------------------------------------------------------------------
     # 1. Collect metrics (hostname needed for registration and polling)
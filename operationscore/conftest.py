@@ -3,10 +3,29 @@ Root-level conftest.py.
 
 Ensures the repository root (/home/umut/hackmetu/operationscore) is on
 sys.path so that 'server.*' imports resolve correctly when pytest is
-invoked from any directory.
+invoked from any directory, and keeps every test's snapshot files
+(latest_snapshot.json, score_distribution.json) under its tmp_path instead
+of server/snapshot/.
 """
 import sys
 import os
 
+import pytest
+
 # Insert repo root at the front of sys.path
 sys.path.insert(0, os.path.dirname(__file__))
+
+
+@pytest.fixture(autouse=True)
+def _snapshot_dir(tmp_path, monkeypatch):
+    from server import config, score_distribution, snapshot_store
+
+    snapshot_dir = tmp_path / "snapshot"
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", str(snapshot_dir))
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DIR", snapshot_dir)
+    monkeypatch.setattr(snapshot_store, "LATEST_PATH", snapshot_dir / "latest_snapshot.json")
+    monkeypatch.setattr(snapshot_store, "TMP_PATH", snapshot_dir / "latest_snapshot.json.tmp")
+    monkeypatch.setattr(score_distribution, "PERSIST_PATH", snapshot_dir / "score_distribution.json")
+    yield
+    # A write still queued must land here, not in server/snapshot/ once the paths are restored
+    snapshot_store.flush()
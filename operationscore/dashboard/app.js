@@ -121,7 +121,9 @@ var state = {
     currentTab: 'cihazlar',
     devices: [],
     deviceCount: 0,
+    devicesGeneration: null,   /* /api/devices generation; later polls ask ?since= */
     fleetHistory: null,
+    fleetDistribution: null,   /* /api/fleet/distribution (latest-score percentiles + histogram) */
     latestTimestamp: null,
     /* Scan session */
     scanRunId: null,
@@ -145,16 +147,44 @@ var _chartInstances = {};
    API Client — New Endpoints
    ---------------------------------------------------------- */
 
+function _deviceSortKey(d) {
+    return [d.device_type === 'SERVER' ? 0 : 1, d.latest_score === null || d.latest_score === undefined ? Infinity : d.latest_score];
+}
+
+/* Apply a ?since= delta: drop removed hostnames, replace or add changed devices, keep the server's order */
+function _mergeDeviceChanges(devices, changed, removed) {
+    if (changed.length === 0 && removed.length === 0) return devices;
+    var drop = {};
+    var i;
+    for (i = 0; i < removed.length; i++) drop[removed[i]] = true;
+    for (i = 0; i < changed.length; i++) drop[changed[i].hostname] = true;
+    var merged = devices.filter(function (d) { return !drop[d.hostname]; }).concat(changed);
+    merged.sort(function (a, b) {
+        var ka = _deviceSortKey(a), kb = _deviceSortKey(b);
+        return ka[0] - kb[0] || (ka[1] === kb[1] ? 0 : (ka[1] < kb[1] ? -1 : 1));
+    });
+    return merged;
+}
+
 function fetchDevices() {
     var url = (window.API_BASE || 'http://127.0.0.1:8000') + '/api/devices';
+    // After the first full load only devices changed since the last generation are fetched
+    if (state.devicesGeneration !== null) url += '?since=' + state.devicesGeneration;
     return safeFetch(url)
         .then(function (res) {
             if (!res.ok) throw new Error("HTTP " + res.status);
             return res.json();
         })
         .then(function (data) {
-            state.devices = (data && Array.isArray(data.devices)) ? data.devices : [];
-            state.deviceCount = data.device_count || state.devices.length;
+            var incoming = (data && Array.isArray(data.devices)) ? data.devices : [];
+            if (data && data.full === false) {
+                state.devices = _mergeDeviceChanges(state.devices, incoming, data.removed || []);
+                state.deviceCount = state.devices.length;
+            } else {
+                state.devices = incoming;
+                state.deviceCount = (data && data.device_count) || state.devices.length;
+            }
+            if (data && typeof data.generation === 'number') state.devicesGeneration = data.generation;
             return state.devices;
         })
         .catch(function () {
@@ -189,6 +219,22 @@ function fetchFleetHistory(limit) {
         });
 }
 
+function fetchFleetDistribution() {
+    var url = (window.API_BASE || 'http://127.0.0.1:8000') + '/api/fleet/distribution?bucket_width=10';
+    return safeFetch(url)
+        .then(function (res) {
+            if (!res.ok) throw new Error("HTTP " + res.status);
+            return res.json();
+        })
+        .then(function (data) {
+            state.fleetDistribution = data || null;
+            return state.fleetDistribution;
+        })
+        .catch(function () {
+            return state.fleetDistribution;
+        });
+}
+
 function fetchDeviceHistory(hostname) {
     var url = (window.API_BASE || 'http://127.0.0.1:8000') + '/api/devices/' + encodeURIComponent(hostname) + '/history?limit=100';
     return safeFetch(url)
@@ -575,8 +621,10 @@ function renderCurrentTab() {
 function _startDevicesPolling() {
     if (_devicesPollTimer) return;
     _devicesPollTimer = setInterval(function () {
-        fetchDevices().then(function () {
-            if (state.currentTab === 'cihazlar') renderDevicesPage();
+        var before = state.devices;
+        fetchDevices().then(function (devices) {
+            // An empty delta keeps the same array: nothing to re-render
+            if (devices !== before && state.currentTab === 'cihazlar') renderDevicesPage();
         });
     }, 5000);
 }
@@ -585,7 +633,7 @@ function _startFleetPolling() {
     if (_fleetPollTimer) return;
     _fleetPollTimer = setInterval(function () {
         if (state.currentTab === 'analiz') {
-            fetchFleetHistory(200).then(function () {
+            Promise.all([fetchFleetHistory(200), fetchFleetDistribution()]).then(function () {
                 renderAnalyticsCharts();
             });
         }
@@ -808,7 +856,8 @@ function renderAnalyticsPage() {
     // Show loading, then fetch
     showLoading();
 
-    fetchFleetHistory(200).then(function (points) {
+    Promise.all([fetchFleetHistory(200), fetchFleetDistribution()]).then(function (results) {
+        var points = results[0];
         if (!points || points.length === 0) {
             showEmpty('Henüz fleet geçmiş verisi yok. Tarama yapıldıkça burada grafikler oluşacak.');
             return;
@@ -829,6 +878,13 @@ function renderAnalyticsPage() {
         html += '  <div class="chart-container"><canvas id="chartServerClient"></canvas></div>';
         html += '</div>';
 
+        // Chart: latest score distribution
+        html += '<div class="chart-card card">';
+        html += '  <h3 class="chart-card__title">Skor Dağılımı (son skorlar)</h3>';
+        html += '  <p class="text-muted text-sm" id="distributionPercentiles"></p>';
+        html += '  <div class="chart-container"><canvas id="chartDistribution"></canvas></div>';
+        html += '</div>';
+
         // Chart 3: Critical count (only if data has it)
         var hasCritical = false;
         for (var i = 0; i < points.length; i++) {
@@ -920,6 +976,35 @@ function renderAnalyticsCharts() {
         });
     }
 
+    // Chart: score distribution (stacked server / client histogram)
+    var dist = state.fleetDistribution;
+    var ctxDist = document.getElementById('chartDistribution');
+    if (ctxDist && dist) {
+        var pctEl = document.getElementById('distributionPercentiles');
+        if (pctEl) {
+            var fmt = function (v) { return v === null || v === undefined ? '—' : v.toFixed(1); };
+            pctEl.textContent = 'p5 ' + fmt(dist.fleet.p5) + ' · p50 ' + fmt(dist.fleet.p50) +
+                ' · p95 ' + fmt(dist.fleet.p95) + ' (' + dist.device_count + ' cihaz)';
+        }
+        var counts = function (d) { return d.histogram.map(function (b) { return b.count; }); };
+        _chartInstances.distribution = new Chart(ctxDist, {
+            type: 'bar',
+            data: {
+                labels: dist.fleet.histogram.map(function (b) { return b.lower + '–' + b.upper; }),
+                datasets: [
+                    { label: 'Sunucu', data: counts(dist.server), backgroundColor: 'rgba(16,185,129,0.6)', borderRadius: 3 },
+                    { label: 'Client', data: counts(dist.client), backgroundColor: 'rgba(245,158,11,0.6)', borderRadius: 3 }
+                ]
+            },
+            options: (function () {
+                var opts = _chartOptions(0, undefined);
+                opts.scales.x.stacked = true;
+                opts.scales.y.stacked = true;
+                return opts;
+            })()
+        });
+    }
+
     // Chart 3: Critical count
     var ctx3 = document.getElementById('chartCritical');
     if (ctx3) {
@@ -3,9 +3,14 @@ server/api_schemas.py — Pydantic v2 request/response schemas.
 
 Covers:
   POST /api/register
-  GET  /api/devices
+  GET  /api/devices (?since=<generation> for changes only)
   GET  /api/devices/{hostname}/history
+  GET  /api/devices/{hostname}/trend
   GET  /api/fleet/history
+  GET  /api/fleet/distribution
+  GET  /api/fleet/metrics/trend
+  GET  /api/fleet/metrics/current
+  POST /reports/batch
 """
 
 import ipaddress
@@ -14,6 +19,8 @@ from typing import Optional
 
 from pydantic import BaseModel, Field, field_validator
 
+from server.models import DeviceMetrics
+
 
 # ---------------------------------------------------------------------------
 # A) Register
@@ -67,11 +74,20 @@ class DeviceListItem(BaseModel):
     improvement_total: Optional[float] = None
     top_reasons_json: Optional[str] = None   # JSON array string of top issue reasons
     actions_json: Optional[str] = None       # JSON array string of recommended actions
+    # Trend statistics (device_trends); null before the first report
+    score_ewma: Optional[float] = None
+    score_slope_per_day: Optional[float] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    risk_level_since: Optional[str] = None   # ISO, when risk_level last changed
 
 
 class DevicesListResponse(BaseModel):
     device_count: int
     devices: list[DeviceListItem]
+    generation: int = 0      # pass back as ?since= to get only later changes
+    full: bool = True        # False: devices/removed are changes since ?since=
+    removed: list[str] = Field(default_factory=list)   # hostnames deactivated since ?since=
 
 
 # ---------------------------------------------------------------------------
@@ -87,6 +103,33 @@ class DeviceHistoryPoint(BaseModel):
 class DeviceHistoryResponse(BaseModel):
     hostname: str
     points: list[DeviceHistoryPoint]
+    # Range pages: pass as ?cursor= for the next page; None on the last page
+    next_cursor: Optional[str] = None
+    # ?points= requests: points in the range before downsampling
+    raw_count: Optional[int] = None
+    downsampled: bool = False
+
+
+# ---------------------------------------------------------------------------
+# Device trend (device_trends)
+# ---------------------------------------------------------------------------
+
+
+class DeviceTrendResponse(BaseModel):
+    hostname: str
+    report_count: int = 0
+    first_score: Optional[float] = None
+    latest_score: Optional[float] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    improvement_total: Optional[float] = None
+    ewma_score: Optional[float] = None
+    ewma_span: Optional[int] = None          # reports; alpha = 2 / (span + 1)
+    slope_per_day: Optional[float] = None    # score points per day over the window
+    window_size: Optional[int] = None        # reports in the slope window
+    risk_level: Optional[str] = None
+    risk_level_since: Optional[str] = None   # ISO
+    seconds_since_risk_change: Optional[int] = None
 
 
 # ---------------------------------------------------------------------------
@@ -103,4 +146,97 @@ class FleetHistoryPoint(BaseModel):
 
 
 class FleetHistoryResponse(BaseModel):
+    resolution: str = "1m"   # "1m" | "15m" | "1h"
     points: list[FleetHistoryPoint]
+
+
+# ---------------------------------------------------------------------------
+# Fleet score distribution (server/score_distribution.py)
+# ---------------------------------------------------------------------------
+
+
+class ScoreHistogramBucket(BaseModel):
+    lower: int
+    upper: int       # exclusive, except 100 in the last bucket
+    count: int
+
+
+class ScoreDistribution(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    p5: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    histogram: list[ScoreHistogramBucket]
+
+
+class FleetDistributionResponse(BaseModel):
+    device_count: int
+    bin_width: float     # percentile resolution in score points
+    fleet: ScoreDistribution
+    server: ScoreDistribution
+    client: ScoreDistribution
+
+
+# ---------------------------------------------------------------------------
+# K/L) Fleet metric aggregates (device_report_metrics)
+# ---------------------------------------------------------------------------
+
+
+class FleetMetricsPoint(BaseModel):
+    timestamp: str   # ISO bucket start
+    reports: int
+    devices: int
+    firewall_disabled: int        # devices, not reports
+    ssh_root_login_allowed: int
+    password_policy_failed: int
+    avg_update_count: Optional[float] = None
+    avg_disk_usage: Optional[float] = None
+    max_disk_usage: Optional[float] = None
+    avg_ram_usage: Optional[float] = None
+    avg_cpu_usage: Optional[float] = None
+
+
+class FleetMetricsTrendResponse(BaseModel):
+    resolution: str = "1h"   # "1m" | "15m" | "1h"
+    points: list[FleetMetricsPoint]
+
+
+class FleetMetricsSummary(BaseModel):
+    devices: int
+    servers: int
+    clients: int
+    firewall_disabled: int
+    ssh_root_login_allowed: int
+    password_policy_failed: int
+    with_unnecessary_services: int
+    pending_updates: int
+    max_sudo_users: Optional[int] = None
+    avg_disk_usage: Optional[float] = None
+    max_disk_usage: Optional[float] = None
+    avg_ram_usage: Optional[float] = None
+    avg_cpu_usage: Optional[float] = None
+
+
+# ---------------------------------------------------------------------------
+# I/J) Report batch
+# ---------------------------------------------------------------------------
+
+
+class ReportBatchRequest(BaseModel):
+    reports: list[DeviceMetrics] = Field(..., min_length=1)
+
+
+class ReportBatchItem(BaseModel):
+    hostname: str
+    ok: bool
+    score: Optional[float] = None
+    risk_level: Optional[str] = None
+    issues: list[dict] = Field(default_factory=list)
+    error: Optional[str] = None
+
+
+class ReportBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: list[ReportBatchItem]   # same order as the request
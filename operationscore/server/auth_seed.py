@@ -8,6 +8,7 @@ Credentials are read from environment variables with safe defaults.
 
 import os
 import bcrypt
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from server.db_models import AuthAccount
@@ -66,7 +67,12 @@ def seed_auth_accounts(db: Session) -> None:
         inserted += 1
 
     # Single commit covering all inserts (or none if both already existed)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker seeded the same accounts at the same time
+        db.rollback()
+        inserted = 0
 
     if inserted:
         import logging
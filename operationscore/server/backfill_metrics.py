@@ -0,0 +1,39 @@
+"""
+server/backfill_metrics.py — Fill device_report_metrics for existing reports.
+
+Reports stored before the device_report_metrics table existed only carry
+metrics_json. The server backfills them on startup; run this to do it
+offline (e.g. before starting a server on a large database):
+
+    python -m server.backfill_metrics [--chunk-size N]
+
+It creates the table if needed and is safe to run repeatedly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Optional
+
+from server import config
+from server import repository
+from server.db import init_db
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backfill typed report metrics from metrics_json.")
+    parser.add_argument("--chunk-size", type=int, default=config.RESCORE_CHUNK_SIZE,
+                        help=f"Reports per transaction (default {config.RESCORE_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    init_db()
+    started = time.monotonic()
+    created = repository.backfill_report_metrics(chunk_size=max(1, args.chunk_size))
+    print(f"device_report_metrics: {created} rows created "
+          f"({repository.count_reports()} reports) in {time.monotonic() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,231 @@
+"""
+server/cluster.py — Cross-worker pub/sub so N uvicorn workers act as one server.
+
+Each worker listens on a Unix stream socket CLUSTER_DIR/<node id>.sock and
+keeps one outbound connection to every other socket in that directory.
+publish() writes one JSON line per peer; a newly started worker says
+"hello" so existing workers connect back to it. Sockets of dead workers are
+removed when a connection to them is refused.
+
+SQLite stays the source of truth. The bus carries the in-memory side effects
+a write has in the worker that handled it, and every other worker replays
+them through the handler registered for the message kind:
+
+  registry  active-device set add / remove / invalidate (device_registry)
+  bump      response cache generation (response_cache)
+  ws        WebSocket events, re-published to local clients (ws_broadcaster)
+  tasks     task queue enqueue / take / requeue / finish (task_queue; the
+            agent_tasks row decides which worker wins a task)
+  ...       report, run_started, device_removed, snapshot_reset, rescored
+            (main.py)
+
+Anything published while a handler runs is not forwarded again, so replays
+never echo. With CLUSTER_DIR unset the bus is never started and publish()
+is a no-op.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Longest accepted message line (a report with its metrics and issues is a few KB)
+MAX_MESSAGE_BYTES = 1 << 20
+
+# A peer whose unsent backlog exceeds this is disconnected (it stopped reading)
+MAX_PEER_BACKLOG_BYTES = 8 << 20
+
+Handler = Callable[[Any], None]
+
+
+class ClusterBus:
+    """Full mesh of Unix socket connections between the workers of one server."""
+
+    def __init__(self) -> None:
+        self.node_id = f"{os.getpid()}-{secrets.token_hex(3)}"
+        self.path: Optional[Path] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        # peer node id → outbound stream
+        self._writers: dict[str, asyncio.StreamWriter] = {}
+        self._handlers: dict[str, Handler] = {}
+        self._replay = threading.local()
+        self._stats = {
+            "messages_sent": 0,
+            "messages_received": 0,
+            "messages_dropped": 0,
+            "handler_errors": 0,
+            "peers_pruned": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self._server is not None
+
+    def on(self, kind: str, handler: Handler) -> None:
+        """Replay messages of *kind* from other workers with *handler*(payload)."""
+        self._handlers[kind] = handler
+
+    def replaying(self) -> bool:
+        """True while a peer's message is being applied in this thread."""
+        return getattr(self._replay, "active", False)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    async def start(self, directory: str) -> None:
+        """Listen in *directory* and connect to every worker already there."""
+        self._loop = asyncio.get_running_loop()
+        base = Path(directory)
+        base.mkdir(parents=True, exist_ok=True)
+        self.path = base / f"{self.node_id}.sock"
+        self._server = await asyncio.start_unix_server(
+            self._serve_peer, path=str(self.path), limit=MAX_MESSAGE_BYTES
+        )
+        for path in sorted(base.glob("*.sock")):
+            if path != self.path:
+                await self._connect(path)
+        logger.info("cluster node %s joined %s with %d peers", self.node_id, base, len(self._writers))
+
+    async def stop(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+        self._loop = None
+
+    async def _connect(self, path: Path) -> None:
+        node = path.stem
+        if node in self._writers:
+            return
+        try:
+            _, writer = await asyncio.open_unix_connection(str(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a worker that exited without cleaning up
+            path.unlink(missing_ok=True)
+            self._stats["peers_pruned"] += 1
+            return
+        self._writers[node] = writer
+        writer.write(self._frame("hello", {"path": str(self.path)}))
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    logger.warning("cluster message over %d bytes dropped", MAX_MESSAGE_BYTES)
+                    self._stats["messages_dropped"] += 1
+                    continue
+                if not line:
+                    return
+                message = json.loads(line)
+                if message.get("k") == "hello":
+                    await self._connect(Path(message["p"]["path"]))
+                else:
+                    self._dispatch(message)
+        except (ConnectionError, json.JSONDecodeError):
+            logger.exception("cluster peer stream failed")
+        finally:
+            writer.close()
+
+    # ------------------------------------------------------------------
+    # Messages
+    # ------------------------------------------------------------------
+    def _frame(self, kind: str, payload: Any) -> bytes:
+        message = {"k": kind, "o": self.node_id, "p": payload}
+        return (json.dumps(message, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def publish(self, kind: str, payload: Any = None) -> None:
+        """Send to every peer. Thread-safe; a no-op when stopped or replaying."""
+        loop = self._loop
+        if loop is None or self.replaying():
+            return
+        frame = self._frame(kind, payload)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._send(frame)
+        else:
+            loop.call_soon_threadsafe(self._send, frame)
+
+    def _send(self, frame: bytes) -> None:
+        for node, writer in list(self._writers.items()):
+            if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_PEER_BACKLOG_BYTES:
+                logger.warning("cluster peer %s dropped (closed or not reading)", node)
+                writer.close()
+                del self._writers[node]
+                self._stats["messages_dropped"] += 1
+                continue
+            writer.write(frame)
+            self._stats["messages_sent"] += 1
+
+    def _dispatch(self, message: dict) -> None:
+        self._stats["messages_received"] += 1
+        handler = self._handlers.get(message.get("k"))
+        if handler is None:
+            return
+        self._replay.active = True
+        try:
+            handler(message.get("p"))
+        except Exception:
+            self._stats["handler_errors"] += 1
+            logger.exception("cluster handler failed kind=%s", message.get("k"))
+        finally:
+            self._replay.active = False
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "node_id": self.node_id, "peers": len(self._writers), **self._stats}
+
+
+# Process-wide bus; main.py starts it when CLUSTER_DIR is set
+cluster = ClusterBus()
+
+
+def attach() -> None:
+    """
+    Forward the shared subsystems' changes over the bus and replay the
+    peers' ones. main.py registers the handlers for its own state.
+    """
+    from server import response_cache
+    from server.device_registry import active_devices
+    from server.task_queue import task_queue
+    from server.ws_broadcaster import ws_broadcaster
+
+    active_devices.subscribe(lambda event, hostname: cluster.publish("registry", [event, hostname]))
+
+    def _replay_registry(payload: list) -> None:
+        event, hostname = payload
+        if event == "add":
+            active_devices.add(hostname)
+        elif event == "remove":
+            active_devices.discard(hostname)
+        else:
+            active_devices.invalidate(hostname)
+
+    cluster.on("registry", _replay_registry)
+
+    response_cache.subscribe(lambda generation: cluster.publish("bump"))
+    cluster.on("bump", lambda payload: response_cache.bump())
+
+    ws_broadcaster.subscribe(lambda event: cluster.publish("ws", event))
+    cluster.on("ws", ws_broadcaster.publish)
+
+    task_queue.shared = True
+    task_queue.subscribe(lambda event, payload: cluster.publish("tasks", [event, payload]))
+    cluster.on("tasks", lambda payload: task_queue.apply_remote(*payload))
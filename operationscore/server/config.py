@@ -2,7 +2,7 @@
 server/config.py — Centralized demo-safe configuration defaults.
 
 Reads from environment variables. Never crashes on missing or malformed values.
-Exposes four module-level constants and the get_allow_origins() helper
+Exposes module-level constants and the get_allow_origins() helper
 (called by main.py's CORSMiddleware setup).
 """
 
@@ -58,3 +58,147 @@ DEFAULT_DEVICE_HISTORY_LIMIT: int = min(_raw_device, MAX_HISTORY_LIMIT)
 
 _raw_fleet = _env_int("DEFAULT_FLEET_HISTORY_LIMIT", 200)
 DEFAULT_FLEET_HISTORY_LIMIT: int = min(_raw_fleet, MAX_HISTORY_LIMIT)
+
+# Upper bound for ?points= on /api/devices/{hostname}/history (downsampled ranges)
+MAX_HISTORY_POINTS: int = _env_int("MAX_HISTORY_POINTS", 1000)
+
+# ---------------------------------------------------------------------------
+# Fleet history rollups (fleet_rollup, GET /api/fleet/history)
+# ---------------------------------------------------------------------------
+
+# Upper bound for ?limit= on /api/fleet/history (default: a week of 1m buckets)
+MAX_FLEET_HISTORY_POINTS: int = _env_int("MAX_FLEET_HISTORY_POINTS", 10080)
+# How long 1m / 15m buckets are kept (1h buckets are kept indefinitely)
+FLEET_ROLLUP_1M_RETENTION_DAYS: int = _env_int("FLEET_ROLLUP_1M_RETENTION_DAYS", 7)
+FLEET_ROLLUP_15M_RETENTION_DAYS: int = _env_int("FLEET_ROLLUP_15M_RETENTION_DAYS", 90)
+FLEET_ROLLUP_PRUNE_SECONDS: int = _env_int("FLEET_ROLLUP_PRUNE_SECONDS", 3600)
+
+# ---------------------------------------------------------------------------
+# Per-device trend statistics (device_trends)
+# ---------------------------------------------------------------------------
+
+# EWMA span in reports: alpha = 2 / (span + 1)
+TREND_EWMA_SPAN: int = _env_int("TREND_EWMA_SPAN", 10)
+# Reports in the sliding window of the score slope regression
+TREND_WINDOW: int = _env_int("TREND_WINDOW", 20)
+
+# ---------------------------------------------------------------------------
+# Snapshot files (server/snapshot_store.py, server/score_distribution.py)
+# ---------------------------------------------------------------------------
+
+# latest_snapshot.json / score_distribution.json; empty = server/snapshot
+SNAPSHOT_DIR: str = _env("SNAPSHOT_DIR", "")
+
+# ---------------------------------------------------------------------------
+# Fleet score distribution (server/score_distribution.py)
+# ---------------------------------------------------------------------------
+
+# How often a changed distribution is written for warm restarts
+SCORE_DISTRIBUTION_PERSIST_SECONDS: int = _env_int("SCORE_DISTRIBUTION_PERSIST_SECONDS", 30)
+
+# ---------------------------------------------------------------------------
+# Report export (GET /api/export/reports)
+# ---------------------------------------------------------------------------
+
+# Rows fetched per round trip and written per response chunk
+EXPORT_BATCH_SIZE: int = _env_int("EXPORT_BATCH_SIZE", 1000)
+
+# ---------------------------------------------------------------------------
+# Registration credential verification (server/credentials.py)
+# ---------------------------------------------------------------------------
+
+REGISTER_VERIFY_WORKERS: int = _env_int("REGISTER_VERIFY_WORKERS", os.cpu_count() or 2)
+
+REGISTER_CACHE_TTL_SECONDS: int = _env_int("REGISTER_CACHE_TTL_SECONDS", 60)
+
+REGISTER_MAX_CONCURRENCY_PER_IP: int = _env_int("REGISTER_MAX_CONCURRENCY_PER_IP", 4)
+
+# ---------------------------------------------------------------------------
+# Active-device registry cache (server/device_registry.py)
+# ---------------------------------------------------------------------------
+
+DEVICE_REGISTRY_REFRESH_SECONDS: int = _env_int("DEVICE_REGISTRY_REFRESH_SECONDS", 300)
+# How long a hostname the devices table does not know is answered from cache
+DEVICE_REGISTRY_MISS_TTL_SECONDS: int = _env_int("DEVICE_REGISTRY_MISS_TTL_SECONDS", 5)
+
+# ---------------------------------------------------------------------------
+# Agent task long-poll (GET /tasks/{hostname}?wait=N)
+# ---------------------------------------------------------------------------
+
+TASK_LONG_POLL_MAX_SECONDS: int = _env_int("TASK_LONG_POLL_MAX_SECONDS", 60)
+
+# ---------------------------------------------------------------------------
+# Durable task queue leases (server/task_queue.py)
+# ---------------------------------------------------------------------------
+
+TASK_LEASE_SECONDS: int = _env_int("TASK_LEASE_SECONDS", 600)
+TASK_MAX_ATTEMPTS: int = _env_int("TASK_MAX_ATTEMPTS", 3)
+TASK_RETENTION_HOURS: int = _env_int("TASK_RETENTION_HOURS", 24)
+
+# ---------------------------------------------------------------------------
+# Run / scan session eviction (server/run_sessions.py)
+# ---------------------------------------------------------------------------
+
+RUN_SESSION_TTL_SECONDS: int = _env_int("RUN_SESSION_TTL_SECONDS", 3600)
+RUN_SESSION_MAX_AGE_SECONDS: int = _env_int("RUN_SESSION_MAX_AGE_SECONDS", 86400)
+# How often expired sessions are archived when no broadcast / run start does it
+RUN_SESSION_EVICT_SECONDS: int = _env_int("RUN_SESSION_EVICT_SECONDS", 60)
+
+# ---------------------------------------------------------------------------
+# WebSocket fan-out (server/ws_broadcaster.py)
+# ---------------------------------------------------------------------------
+
+WS_CLIENT_QUEUE_SIZE: int = _env_int("WS_CLIENT_QUEUE_SIZE", 256)
+WS_BATCH_MAX_EVENTS: int = _env_int("WS_BATCH_MAX_EVENTS", 50)
+WS_SEND_TIMEOUT_SECONDS: int = _env_int("WS_SEND_TIMEOUT_SECONDS", 5)
+
+# ---------------------------------------------------------------------------
+# Multi-worker mode (server/cluster.py); empty = single process, no bus.
+# Every worker of one server must use the same directory.
+# ---------------------------------------------------------------------------
+
+CLUSTER_DIR: str = _env("CLUSTER_DIR", "")
+
+# ---------------------------------------------------------------------------
+# Read-endpoint response cache (server/response_cache.py)
+# ---------------------------------------------------------------------------
+
+RESPONSE_GZIP_MIN_BYTES: int = _env_int("RESPONSE_GZIP_MIN_BYTES", 1024)
+
+# ---------------------------------------------------------------------------
+# Batch report ingestion (POST /reports/batch)
+# ---------------------------------------------------------------------------
+
+REPORT_BATCH_MAX_ITEMS: int = _env_int("REPORT_BATCH_MAX_ITEMS", 500)
+
+# ---------------------------------------------------------------------------
+# Rule spec (server/scoring/spec.py); empty path = bundled rule_spec.json
+# ---------------------------------------------------------------------------
+
+RULE_SPEC_PATH: str = _env("RULE_SPEC_PATH", "")
+RULE_SPEC_RELOAD_SECONDS: int = _env_int("RULE_SPEC_RELOAD_SECONDS", 5)
+
+# ---------------------------------------------------------------------------
+# Historical rescoring (server/rescore.py)
+# ---------------------------------------------------------------------------
+
+RESCORE_CHUNK_SIZE: int = _env_int("RESCORE_CHUNK_SIZE", 500)
+RESCORE_WORKERS: int = _env_int("RESCORE_WORKERS", os.cpu_count() or 2)
+
+# ---------------------------------------------------------------------------
+# SQLite storage profile and query timing (server/db_profile.py)
+# ---------------------------------------------------------------------------
+
+# Database file; empty = server/data/operationscore.db (load tests use a throwaway file)
+DB_PATH: str = _env("DB_PATH", "")
+DB_PROFILE: str = _env("DB_PROFILE", "balanced")
+DB_SLOW_QUERY_MS: int = _env_int("DB_SLOW_QUERY_MS", 100)
+DB_QUERY_STATS_MAX_STATEMENTS: int = _env_int("DB_QUERY_STATS_MAX_STATEMENTS", 500)
+
+# ---------------------------------------------------------------------------
+# Unchanged-report fast path (memoized scoring + heartbeat rows)
+# ---------------------------------------------------------------------------
+
+SCORE_CACHE_SIZE: int = _env_int("SCORE_CACHE_SIZE", 4096)
+# "0" / "false" / "off" stores every report in full
+REPORT_HEARTBEATS: bool = _env("REPORT_HEARTBEATS", "1").lower() not in ("0", "false", "no", "off")
@@ -0,0 +1,167 @@
+"""
+server/credentials.py — Off-loop registration credential verification.
+
+bcrypt.checkpw costs hundreds of milliseconds of CPU, so /api/register must
+never run it on the event loop: a reimaged lab re-registering at once would
+stall every /report in the meantime.
+
+  - The account lookup runs in the thread pool, bcrypt in a process pool
+    (REGISTER_VERIFY_WORKERS processes), so enrollment scales with cores.
+  - Successful verifications are cached for REGISTER_CACHE_TTL_SECONDS,
+    keyed by an HMAC of (username, password) under a per-process random key;
+    plaintext passwords are never stored. Failures are not cached.
+  - Each source IP may have at most REGISTER_MAX_CONCURRENCY_PER_IP
+    verifications in flight; further requests from that IP wait their turn.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import bcrypt
+from starlette.concurrency import run_in_threadpool
+
+from server import config
+from server import repository
+
+logger = logging.getLogger(__name__)
+
+# Entries beyond this trigger a sweep of expired cache keys
+_CACHE_SWEEP_THRESHOLD = 10_000
+
+_hmac_key: bytes = secrets.token_bytes(32)
+
+# HMAC digest → (role, expires_at on the monotonic clock)
+_verified_cache: dict[bytes, tuple[str, float]] = {}
+
+# source IP → (semaphore, number of holders + waiters)
+_ip_slots: dict[str, list] = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _checkpw(password: str, password_hash: str) -> bool:
+    """bcrypt check executed inside a pool worker (module-level so it pickles)."""
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+def _cache_key(username: str, password: str) -> bytes:
+    msg = username.encode("utf-8") + b"\x00" + password.encode("utf-8")
+    return hmac.new(_hmac_key, msg, hashlib.sha256).digest()
+
+
+def _cache_get(key: bytes) -> Optional[str]:
+    hit = _verified_cache.get(key)
+    if hit is None:
+        return None
+    role, expires_at = hit
+    if expires_at <= time.monotonic():
+        _verified_cache.pop(key, None)
+        return None
+    return role
+
+
+def _cache_put(key: bytes, role: str) -> None:
+    now = time.monotonic()
+    if len(_verified_cache) >= _CACHE_SWEEP_THRESHOLD:
+        for k in [k for k, (_, exp) in _verified_cache.items() if exp <= now]:
+            del _verified_cache[k]
+    _verified_cache[key] = (role, now + config.REGISTER_CACHE_TTL_SECONDS)
+
+
+def clear_cache() -> None:
+    """Drop every cached verification (e.g. after an account password change)."""
+    _verified_cache.clear()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=config.REGISTER_VERIFY_WORKERS)
+    return _pool
+
+
+def shutdown() -> None:
+    """Stop the bcrypt worker processes (called from the app shutdown hook)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+@asynccontextmanager
+async def _ip_slot(source_ip: Optional[str]) -> AsyncIterator[None]:
+    """Bound concurrent verifications per source IP; idle IPs are forgotten."""
+    ip = source_ip or "unknown"
+    slot = _ip_slots.get(ip)
+    if slot is None:
+        slot = _ip_slots[ip] = [asyncio.Semaphore(config.REGISTER_MAX_CONCURRENCY_PER_IP), 0]
+    slot[1] += 1
+    try:
+        async with slot[0]:
+            yield
+    finally:
+        slot[1] -= 1
+        if slot[1] == 0:
+            _ip_slots.pop(ip, None)
+
+
+async def _run_checkpw(password: str, password_hash: str) -> bool:
+    global _pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), _checkpw, password, password_hash)
+    except BrokenProcessPool:
+        # A worker died (OOM-killed, ...): start a fresh pool next time and
+        # answer this request from the thread pool instead of failing it.
+        logger.warning("bcrypt process pool broken; recreating")
+        _pool = None
+        return await run_in_threadpool(_checkpw, password, password_hash)
+
+
+async def _verify_uncached(username: str, password: str) -> tuple[bool, Optional[str]]:
+    account = await run_in_threadpool(repository.get_register_account, username)
+    if account is None:
+        return False, None
+    password_hash, role = account
+    ok = await _run_checkpw(password, password_hash)
+    return (True, role) if ok else (False, None)
+
+
+async def verify_credentials(
+    username: str,
+    password: str,
+    source_ip: Optional[str] = None,
+) -> tuple[bool, Optional[str]]:
+    """
+    Async equivalent of repository.verify_register_credentials.
+    Returns (True, role) on success, (False, None) otherwise.
+    """
+    key = _cache_key(username, password)
+    role = _cache_get(key)
+    if role is not None:
+        return True, role
+
+    async with _ip_slot(source_ip):
+        # Another request from the same lab may have verified while we waited
+        role = _cache_get(key)
+        if role is not None:
+            return True, role
+        try:
+            ok, role = await _verify_uncached(username, password)
+        except Exception:
+            logger.exception("credential verification failed username=%s", username)
+            return False, None
+
+    if ok:
+        _cache_put(key, role)
+    return ok, role
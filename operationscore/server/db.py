@@ -1,23 +1,28 @@
 """
 server/db.py — SQLAlchemy 2.0 engine, session factory, and declarative Base.
 
-Creates the SQLite engine pointing at server/data/operationscore.db.
-Ensures server/data/ exists at import time (idempotent).
+Creates the SQLite engine pointing at server/data/operationscore.db (or
+DB_PATH) with the DB_PROFILE PRAGMAs and per-statement timing
+(server/db_profile.py). Ensures the data directory exists at import time
+(idempotent).
 """
 
 from pathlib import Path
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from server import config
+from server.db_profile import apply_profile, query_stats
+
 # ---------------------------------------------------------------------------
 # Paths
 # ---------------------------------------------------------------------------
 BASE_DIR = Path(__file__).resolve().parent.parent   # repo root
 DATA_DIR = BASE_DIR / "server" / "data"
-DB_PATH  = DATA_DIR / "operationscore.db"
+DB_PATH  = Path(config.DB_PATH) if config.DB_PATH else DATA_DIR / "operationscore.db"
 
 # Ensure the directory exists before the engine is created
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 # ---------------------------------------------------------------------------
 # Engine
@@ -28,6 +33,8 @@ engine = create_engine(
     future=True,
     echo=False,
 )
+DB_PROFILE = apply_profile(engine, config.DB_PROFILE)
+query_stats.install(engine)
 
 # ---------------------------------------------------------------------------
 # Session factory
@@ -51,7 +58,13 @@ Base = declarative_base()
 def init_db() -> None:
     """
     Register all ORM models then create every table that does not yet exist.
-    Safe to call on every startup (create_all is idempotent).
+    Safe to call on every startup (create_all is idempotent), also from
+    several workers starting at once on a fresh database.
     """
     from server import db_models  # noqa: F401 — registers models with Base
-    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        # Write lock for the existence checks and CREATEs: concurrent workers
+        # wait (busy timeout) instead of racing each other to the same table
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        Base.metadata.create_all(bind=conn)
+        conn.commit()
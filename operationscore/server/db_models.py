@@ -5,6 +5,14 @@ Tables:
   auth_accounts   — bcrypt-hashed credentials for server/client roles
   devices         — registered devices
   device_reports  — per-device health-score history
+  device_report_metrics — typed K1–K10 inputs of each report (for SQL aggregates)
+  device_heartbeats — per-device repeats of the latest report (unchanged metrics)
+  report_heartbeats — heartbeats per report and fleet_rollup bucket (rescore deltas)
+  device_changes  — latest change generation per device (delta sync)
+  device_trends   — streaming score statistics per device (EWMA, slope, min/max)
+  fleet_rollup    — fleet score aggregates per time bucket (1m / 15m / 1h)
+  agent_tasks     — durable agent task queue (queued / leased / done / failed)
+  run_session_archive — finished / expired run and scan sessions evicted from memory
 """
 
 from __future__ import annotations
@@ -12,7 +20,7 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, Integer, String, Text
+from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from server.db import Base
@@ -59,6 +67,12 @@ class Device(Base):
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
+    trend: Mapped[Optional["DeviceTrend"]] = relationship(
+        "DeviceTrend",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 Index("ix_devices_device_type", Device.device_type)
@@ -83,6 +97,12 @@ class DeviceReport(Base):
     actions_json:     Mapped[str]      = mapped_column(Text,       nullable=False)
 
     device: Mapped["Device"] = relationship("Device", back_populates="reports")
+    typed_metrics: Mapped[Optional["DeviceReportMetrics"]] = relationship(
+        "DeviceReportMetrics",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 Index(
@@ -90,3 +110,209 @@ Index(
     DeviceReport.device_id,
     DeviceReport.collected_at,
 )
+
+
+# ---------------------------------------------------------------------------
+# device_report_metrics
+# ---------------------------------------------------------------------------
+class DeviceReportMetrics(Base):
+    """
+    The K1–K10 inputs of one DeviceReport as typed columns, so fleet analytics
+    run as SQL aggregates instead of parsing metrics_json row by row.
+
+    Written in the same transaction as its report and pruned with it.
+    device_id and collected_ts (UTC epoch seconds) are copied from the report
+    so the aggregate queries never join device_reports.
+    """
+    __tablename__ = "device_report_metrics"
+
+    report_id:                  Mapped[int]   = mapped_column(
+        Integer, ForeignKey("device_reports.id", ondelete="CASCADE"), primary_key=True
+    )
+    device_id:                  Mapped[int]   = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False
+    )
+    collected_ts:               Mapped[int]   = mapped_column(Integer, nullable=False)
+    update_count:               Mapped[int]   = mapped_column(Integer, nullable=False)   # K1
+    firewall_enabled:           Mapped[bool]  = mapped_column(Boolean, nullable=False)   # K2
+    ssh_root_login_allowed:     Mapped[bool]  = mapped_column(Boolean, nullable=False)   # K3
+    sudo_users_count:           Mapped[int]   = mapped_column(Integer, nullable=False)   # K4
+    unnecessary_services_count: Mapped[int]   = mapped_column(Integer, nullable=False)   # K5
+    disk_usage_percent:         Mapped[float] = mapped_column(Float,   nullable=False)   # K6
+    password_policy_ok:         Mapped[bool]  = mapped_column(Boolean, nullable=False)   # K7
+    last_seen_minutes:          Mapped[int]   = mapped_column(Integer, nullable=False)   # K8
+    ram_usage_percent:          Mapped[float] = mapped_column(Float,   nullable=False)   # K9
+    cpu_usage_percent:          Mapped[float] = mapped_column(Float,   nullable=False)   # K10
+
+
+# Range scans for the bucketed trend query
+Index("ix_device_report_metrics_collected_ts", DeviceReportMetrics.collected_ts)
+# Latest report per device: MAX(report_id) GROUP BY device_id reads only this index
+Index("ix_device_report_metrics_device_id", DeviceReportMetrics.device_id)
+
+
+# ---------------------------------------------------------------------------
+# device_heartbeats
+# ---------------------------------------------------------------------------
+class DeviceHeartbeat(Base):
+    """
+    One row per device: how often, and until when, the device repeated the
+    report report_id with unchanged metrics and score. Such reports update
+    this row (and fleet_rollup) instead of inserting a DeviceReport.
+    """
+    __tablename__ = "device_heartbeats"
+
+    device_id:         Mapped[int]      = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    report_id:         Mapped[int]      = mapped_column(
+        Integer, ForeignKey("device_reports.id", ondelete="CASCADE"), nullable=False
+    )
+    last_collected_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    heartbeat_count:   Mapped[int]      = mapped_column(Integer, default=0, nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# report_heartbeats
+# ---------------------------------------------------------------------------
+class ReportHeartbeat(Base):
+    """
+    How many heartbeats repeated report report_id inside one fleet_rollup
+    bucket, so a rescore can move those buckets by (new - old) * count.
+
+    bucket_start is the 1m bucket; once 1m buckets expire the rows are merged
+    into their 15m (later 1h) bucket start. Pruned with the report.
+    """
+    __tablename__ = "report_heartbeats"
+
+    report_id:       Mapped[int]      = mapped_column(
+        Integer, ForeignKey("device_reports.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket_start:    Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    heartbeat_count: Mapped[int]      = mapped_column(Integer, default=0, nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# device_changes
+# ---------------------------------------------------------------------------
+class DeviceChange(Base):
+    """
+    One row per device: the generation of its last change. Every write that
+    changes a device's /api/devices entry (registration, report, heartbeat,
+    rescore, deactivation) sets generation = MAX(generation) + 1 in the same
+    transaction, so GET /api/devices?since=N is one indexed range scan.
+    """
+    __tablename__ = "device_changes"
+
+    device_id:  Mapped[int]  = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    generation: Mapped[int]  = mapped_column(Integer, unique=True, index=True, nullable=False)
+    removed:    Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# device_trends
+# ---------------------------------------------------------------------------
+class DeviceTrend(Base):
+    """
+    One row per device: score statistics updated in O(1) with every stored
+    DeviceReport (same transaction), so the device list and
+    /api/devices/{hostname}/trend never load the report history.
+
+    window_json holds the last TREND_WINDOW (collected_ts, score) points;
+    slope_per_day is the least-squares slope over them (None below two
+    distinct timestamps).
+    """
+    __tablename__ = "device_trends"
+
+    device_id:        Mapped[int]             = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    report_count:     Mapped[int]             = mapped_column(Integer,    nullable=False)
+    first_score:      Mapped[float]           = mapped_column(Float,      nullable=False)
+    latest_score:     Mapped[float]           = mapped_column(Float,      nullable=False)
+    min_score:        Mapped[float]           = mapped_column(Float,      nullable=False)
+    max_score:        Mapped[float]           = mapped_column(Float,      nullable=False)
+    ewma_score:       Mapped[float]           = mapped_column(Float,      nullable=False)
+    window_json:      Mapped[str]             = mapped_column(Text,       nullable=False)   # [[epoch s, score], ...] oldest first
+    slope_per_day:    Mapped[Optional[float]] = mapped_column(Float,      nullable=True)
+    risk_level:       Mapped[str]             = mapped_column(String(16), nullable=False)
+    risk_level_since: Mapped[datetime]        = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# fleet_rollup
+# ---------------------------------------------------------------------------
+class FleetRollup(Base):
+    """
+    Running sum/count per device type for one time bucket.
+
+    Updated in the same transaction as every DeviceReport insert so fleet
+    history never has to scan device_reports.
+    """
+    __tablename__ = "fleet_rollup"
+    __table_args__ = (
+        UniqueConstraint("resolution", "bucket_start", name="uq_fleet_rollup_resolution_bucket"),
+    )
+
+    id:             Mapped[int]      = mapped_column(Integer, primary_key=True, autoincrement=True)
+    resolution:     Mapped[int]      = mapped_column(Integer, nullable=False)      # bucket width in seconds
+    bucket_start:   Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    server_sum:     Mapped[float]    = mapped_column(Float,   default=0.0, nullable=False)
+    server_count:   Mapped[int]      = mapped_column(Integer, default=0,   nullable=False)
+    client_sum:     Mapped[float]    = mapped_column(Float,   default=0.0, nullable=False)
+    client_count:   Mapped[int]      = mapped_column(Integer, default=0,   nullable=False)
+    critical_count: Mapped[int]      = mapped_column(Integer, default=0,   nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# agent_tasks
+# ---------------------------------------------------------------------------
+class AgentTask(Base):
+    """
+    One task queued for an agent. The in-memory queue (server/task_queue.py)
+    serves dequeues; this table lets queued and leased tasks survive a restart.
+
+    No FK to devices: POST /tasks/{hostname} may target any hostname.
+    """
+    __tablename__ = "agent_tasks"
+
+    id:               Mapped[int]                = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id:          Mapped[str]                = mapped_column(String(36),  unique=True, nullable=False)
+    hostname:         Mapped[str]                = mapped_column(String(255), nullable=False)
+    command:          Mapped[str]                = mapped_column(String(64),  nullable=False)
+    run_id:           Mapped[Optional[str]]      = mapped_column(String(36),  nullable=True)
+    created_at:       Mapped[datetime]           = mapped_column(DateTime(timezone=True), nullable=False)
+    status:           Mapped[str]                = mapped_column(String(16),  default="queued", nullable=False)  # "queued"|"leased"|"done"|"failed"
+    attempts:         Mapped[int]                = mapped_column(Integer,     default=0, nullable=False)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at:      Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+Index("ix_agent_tasks_status_id", AgentTask.status, AgentTask.id)
+
+
+# ---------------------------------------------------------------------------
+# run_session_archive
+# ---------------------------------------------------------------------------
+class RunSessionArchive(Base):
+    """
+    A run or scan session evicted from memory (server/run_sessions.py).
+    devices_json maps hostname → null (pending) or {timestamp, score, issues}.
+    """
+    __tablename__ = "run_session_archive"
+    __table_args__ = (
+        UniqueConstraint("kind", "run_id", name="uq_run_session_archive_kind_run"),
+    )
+
+    id:                Mapped[int]                = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id:            Mapped[str]                = mapped_column(String(36), nullable=False)
+    kind:              Mapped[str]                = mapped_column(String(8),  nullable=False)   # "scan"|"run"
+    started_at:        Mapped[datetime]           = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at:       Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    total_devices:     Mapped[int]                = mapped_column(Integer, nullable=False)
+    completed_devices: Mapped[int]                = mapped_column(Integer, nullable=False)
+    score_sum:         Mapped[float]              = mapped_column(Float,   nullable=False)
+    reported_count:    Mapped[int]                = mapped_column(Integer, nullable=False)
+    devices_json:      Mapped[str]                = mapped_column(Text,    nullable=False)
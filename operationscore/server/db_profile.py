@@ -0,0 +1,215 @@
+"""
+server/db_profile.py — SQLite storage profile and query instrumentation.
+
+apply_profile() registers a "connect" listener that sets the PRAGMAs of one
+storage profile (DB_PROFILE) on every new DBAPI connection:
+
+  safe      rollback journal, synchronous=FULL, small page cache, no mmap
+            (the SQLite defaults; every commit is fsynced)
+  balanced  WAL, synchronous=NORMAL, 64 MiB cache, 256 MiB mmap (default;
+            readers never block the writer, a commit needs no fsync)
+  fast      WAL, synchronous=OFF, 256 MiB cache, 1 GiB mmap (bulk loads and
+            benchmarks; the last commits can be lost on power failure)
+
+All profiles set busy_timeout so concurrent writers wait instead of failing
+with "database is locked".
+
+QueryStats hooks before/after_cursor_execute on an engine and aggregates
+time per statement (literal IN-lists collapsed so they share one entry).
+Statements slower than DB_SLOW_QUERY_MS are logged and kept in a short
+ring buffer. GET /debug/db serves the profile, the effective PRAGMAs and the
+top statements by total time.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from server import config
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA name → value, applied in this order (journal_mode first)
+PROFILES: dict[str, dict[str, Any]] = {
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2_000,          # KiB when negative
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5_000,         # ms
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65_536,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5_000,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262_144,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10_000,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+
+def resolve_profile(name: str) -> str:
+    """*name* if it is a known profile, else DEFAULT_PROFILE (with a warning)."""
+    name = (name or "").strip().lower()
+    if name in PROFILES:
+        return name
+    if name:
+        logger.warning("unknown DB_PROFILE %r, using %r", name, DEFAULT_PROFILE)
+    return DEFAULT_PROFILE
+
+
+def apply_profile(engine: Engine, name: str) -> str:
+    """Set the PRAGMAs of profile *name* on every new connection of *engine*."""
+    name = resolve_profile(name)
+    pragmas = PROFILES[name]
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection: Any, _record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
+    return name
+
+
+def effective_pragmas(engine: Engine) -> dict[str, Any]:
+    """Current values of the profile PRAGMAs as SQLite reports them."""
+    with engine.connect() as conn:
+        return {
+            pragma: conn.execute(text(f"PRAGMA {pragma}")).scalar()
+            for pragma in PROFILES[DEFAULT_PROFILE]
+        }
+
+
+# "IN (?, ?, ?)" of any length → one entry
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    return _IN_LIST.sub("(?, ...)", _SPACES.sub(" ", statement).strip())
+
+
+class _StatementStats:
+    __slots__ = ("calls", "total", "max")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class QueryStats:
+    """Per-statement timing for the engines passed to install()."""
+
+    def __init__(self, max_statements: int = 500, slow_log_size: int = 50) -> None:
+        self.max_statements = max_statements
+        self.slow_ms = config.DB_SLOW_QUERY_MS
+        self._lock = threading.Lock()
+        self._statements: dict[str, _StatementStats] = {}
+        self._slow: deque = deque(maxlen=slow_log_size)
+        self._untracked = 0
+
+    def install(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    @staticmethod
+    def _before(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:
+        if context is not None:
+            context._ops_query_started = time.perf_counter()
+
+    def _after(self, _conn, _cursor, statement, _parameters, context, executemany) -> None:
+        started = getattr(context, "_ops_query_started", None)
+        if started is None:
+            return
+        self.record(statement, time.perf_counter() - started, executemany)
+
+    def record(self, statement: str, seconds: float, executemany: bool = False) -> None:
+        key = normalize_statement(statement)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= self.max_statements:
+                    self._untracked += 1
+                else:
+                    stats = self._statements[key] = _StatementStats()
+            if stats is not None:
+                stats.calls += 1
+                stats.total += seconds
+                stats.max = max(stats.max, seconds)
+            slow = seconds * 1000.0 >= self.slow_ms
+            if slow:
+                self._slow.append({
+                    "at": time.time(),
+                    "ms": round(seconds * 1000.0, 3),
+                    "executemany": executemany,
+                    "statement": key[:500],
+                })
+        if slow:
+            logger.warning("slow query %.1f ms: %s", seconds * 1000.0, key[:500])
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+            self._untracked = 0
+
+    def top(self, limit: int = 20) -> list[dict]:
+        """Statements ordered by total time, most expensive first."""
+        if limit <= 0:
+            return []
+        with self._lock:
+            items = sorted(self._statements.items(), key=lambda kv: kv[1].total, reverse=True)[:limit]
+            return [
+                {
+                    "statement": statement,
+                    "calls": stats.calls,
+                    "total_ms": round(stats.total * 1000.0, 3),
+                    "avg_ms": round(stats.total * 1000.0 / stats.calls, 3),
+                    "max_ms": round(stats.max * 1000.0, 3),
+                }
+                for statement, stats in items
+            ]
+
+    def stats(self, limit: int = 20) -> dict:
+        with self._lock:
+            calls = sum(s.calls for s in self._statements.values())
+            total = sum(s.total for s in self._statements.values())
+            summary = {
+                "statements": len(self._statements),
+                "untracked_calls": self._untracked,
+                "calls": calls,
+                "total_ms": round(total * 1000.0, 3),
+                "slow_query_ms": self.slow_ms,
+                "slow_queries": list(self._slow),
+            }
+        summary["top"] = self.top(limit)
+        return summary
+
+
+# Process-wide statistics for the server engine (installed by server/db.py)
+query_stats = QueryStats(max_statements=config.DB_QUERY_STATS_MAX_STATEMENTS)
@@ -0,0 +1,233 @@
+"""
+server/device_registry.py — In-process cache of active (registered) hostnames.
+
+POST /report must reject unregistered devices before scoring. Instead of a
+DB query per report, the hot path checks a set that is:
+
+  - warmed at startup from the devices table (warm_from_db),
+  - updated by repository.upsert_device / repository.deactivate_device,
+  - read-through on a miss, so a device registered by another worker (or
+    before warm-up) is found in the DB and cached; a hostname the DB does
+    not know is remembered for DEVICE_REGISTRY_MISS_TTL_SECONDS, so an
+    unregistered agent retrying /report costs one query per TTL,
+  - fully re-read every DEVICE_REGISTRY_REFRESH_SECONDS, which bounds how
+    long a deactivation made by another worker can go unnoticed.
+
+contains_async() is the event-loop variant used by main.py: the read-through
+runs in the thread pool and a due refresh runs as a background task while
+lookups keep using the current set. contains() / `in` do both inline.
+
+invalidate() drops one hostname (or everything) so the next lookup goes to
+the DB; subscribe() lets other subsystems (e.g. a cross-worker bus) observe
+every add/remove/invalidate.
+
+Every add/discard/invalidate bumps a generation. A DB read (refresh or
+read-through) remembers the generation it started at and, when it lands,
+yields to changes made meanwhile, so a device deactivated while a refresh
+was reading the table is not re-added by it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable, Iterable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from server import config
+
+logger = logging.getLogger(__name__)
+
+# Listener signature: (event, hostname) where event is "add" | "remove" | "invalidate"
+# and hostname is None for a full invalidation.
+RegistryListener = Callable[[str, Optional[str]], None]
+
+# Bound on remembered misses (random hostnames must not grow memory)
+_MISSES_MAX = 10_000
+
+
+class DeviceRegistry:
+    """Set of active hostnames with DB read-through on misses."""
+
+    def __init__(self, refresh_seconds: int, miss_ttl_seconds: int = 5) -> None:
+        self._active: set[str] = set()
+        # hostname → monotonic time until which it is known not to be active
+        self._misses: dict[str, float] = {}
+        self._warm = False
+        self._loaded_at = 0.0
+        self._refresh_seconds = refresh_seconds
+        self._miss_ttl_seconds = miss_ttl_seconds
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._listeners: list[RegistryListener] = []
+        self._generation = 0
+        # hostname → (generation, active) of its last add / discard, or
+        # active=None for invalidate; pruned once a full reload covers it
+        self._changes: dict[str, tuple[int, Optional[bool]]] = {}
+        self._cleared_at = 0
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def warm(self, hostnames: Iterable[str], generation: Optional[int] = None) -> None:
+        """
+        Replace the cached set with *hostnames*. With *generation* (taken
+        before they were read), adds / discards made since then win over them.
+        """
+        active = set(hostnames)
+        if generation is not None:
+            if self._cleared_at > generation:
+                return
+            self._changes = self._changed_since(generation)
+            for hostname, (_, state) in self._changes.items():
+                if state:
+                    active.add(hostname)
+                else:
+                    active.discard(hostname)
+        else:
+            self._changes.clear()
+        self._active = active
+        self._misses.clear()
+        self._warm = True
+        self._loaded_at = time.monotonic()
+
+    def warm_from_db(self) -> int:
+        """Load every active hostname from the devices table. Returns the count."""
+        from server import repository  # lazy: repository imports this module
+        generation = self._generation
+        self.warm(repository.list_active_hostnames(), generation)
+        return len(self._active)
+
+    def _changed_since(self, generation: int) -> dict[str, tuple[int, Optional[bool]]]:
+        return {h: change for h, change in self._changes.items() if change[0] > generation}
+
+    def _record(self, hostname: Optional[str], state: Optional[bool]) -> None:
+        self._generation += 1
+        if hostname is None:
+            self._changes.clear()
+            self._cleared_at = self._generation
+        else:
+            self._changes[hostname] = (self._generation, state)
+
+    def _refresh_due(self) -> bool:
+        return self._warm and time.monotonic() - self._loaded_at > self._refresh_seconds
+
+    def _refresh(self) -> None:
+        try:
+            self.warm_from_db()
+        except Exception:
+            logger.exception("device registry refresh failed; keeping cached set")
+            self._loaded_at = time.monotonic()
+
+    async def _refresh_off_loop(self) -> None:
+        from server import repository
+        generation = self._generation
+        try:
+            hostnames = await run_in_threadpool(repository.list_active_hostnames)
+        except Exception:
+            logger.exception("device registry refresh failed; keeping cached set")
+            self._loaded_at = time.monotonic()
+            return
+        self.warm(hostnames, generation)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def _cached(self, hostname: str) -> Optional[bool]:
+        """True / False if the cache knows *hostname*, None if the DB must be asked."""
+        if hostname in self._active:
+            return True
+        until = self._misses.get(hostname)
+        if until is not None:
+            if until > time.monotonic():
+                return False
+            del self._misses[hostname]
+        return None
+
+    def _remember(self, hostname: str, registered: bool, generation: int) -> bool:
+        """Cache a DB answer read since *generation*, unless a change overtook it."""
+        change = self._changes.get(hostname)
+        if (change is not None and change[0] > generation) or self._cleared_at > generation:
+            return registered if change is None or change[1] is None else change[1]
+        if registered:
+            self._active.add(hostname)
+        else:
+            if len(self._misses) >= _MISSES_MAX:
+                self._misses.clear()
+            self._misses[hostname] = time.monotonic() + self._miss_ttl_seconds
+        return registered
+
+    def contains(self, hostname: str) -> bool:
+        """True if *hostname* is an active device. Set lookup on the hot path."""
+        if self._refresh_due():
+            self._refresh()
+        cached = self._cached(hostname)
+        if cached is not None:
+            return cached
+        from server import repository
+        generation = self._generation
+        return self._remember(hostname, repository.is_registered(hostname), generation)
+
+    async def contains_async(self, hostname: str) -> bool:
+        """contains() for the event loop: no DB work runs on the loop."""
+        if self._refresh_due() and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_off_loop())
+        cached = self._cached(hostname)
+        if cached is not None:
+            return cached
+        from server import repository
+        generation = self._generation
+        return self._remember(hostname, await run_in_threadpool(repository.is_registered, hostname), generation)
+
+    def __contains__(self, hostname: str) -> bool:
+        return self.contains(hostname)
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    # ------------------------------------------------------------------
+    # Coherence hooks
+    # ------------------------------------------------------------------
+    def add(self, hostname: str) -> None:
+        self._active.add(hostname)
+        self._misses.pop(hostname, None)
+        self._record(hostname, True)
+        self._notify("add", hostname)
+
+    def discard(self, hostname: str) -> None:
+        self._active.discard(hostname)
+        self._record(hostname, False)
+        self._notify("remove", hostname)
+
+    def invalidate(self, hostname: Optional[str] = None) -> None:
+        """
+        Forget *hostname* (or every hostname when None) so the next lookup
+        re-reads the DB. Use when the devices table was changed elsewhere.
+        """
+        if hostname is None:
+            self._active.clear()
+            self._misses.clear()
+            self._warm = False
+        else:
+            self._active.discard(hostname)
+            self._misses.pop(hostname, None)
+        self._record(hostname, None)
+        self._notify("invalidate", hostname)
+
+    def subscribe(self, listener: RegistryListener) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, hostname: Optional[str]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(event, hostname)
+            except Exception:
+                logger.exception("device registry listener failed event=%s", event)
+
+
+# Process-wide registry used by main.py and repository.py
+active_devices = DeviceRegistry(
+    refresh_seconds=config.DEVICE_REGISTRY_REFRESH_SECONDS,
+    miss_ttl_seconds=config.DEVICE_REGISTRY_MISS_TTL_SECONDS,
+)
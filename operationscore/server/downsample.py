@@ -0,0 +1,77 @@
+"""
+server/downsample.py — Reduce a time series to a bounded number of points.
+
+Used by GET /api/devices/{hostname}/history?points=N so a chart of a long
+range costs N points instead of every stored report:
+
+  lttb    Largest-Triangle-Three-Buckets: keeps the first and last point and,
+          per bucket, the point forming the largest triangle with the point
+          kept before it and the average of the next bucket. Preserves the
+          visual shape (spikes, drops) of a line chart.
+  minmax  Equal-time buckets; keeps each bucket's lowest and highest point
+          (in time order). Never hides an extreme value.
+
+Both take parallel x (e.g. epoch seconds, ascending) and y sequences and
+return the indices of the points to keep, ascending.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket (the last point for the final bucket)
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        count = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / count
+        avg_y = sum(ys[avg_start:avg_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+def minmax_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
+    n = len(xs)
+    if threshold >= n or threshold < 2:
+        return list(range(n))
+
+    buckets = threshold // 2
+    start, span = xs[0], (xs[-1] - xs[0]) or 1.0
+    lowest: dict[int, int] = {}
+    highest: dict[int, int] = {}
+    for i in range(n):
+        b = min(int((xs[i] - start) / span * buckets), buckets - 1)
+        if b not in lowest or ys[i] < ys[lowest[b]]:
+            lowest[b] = i
+        if b not in highest or ys[i] > ys[highest[b]]:
+            highest[b] = i
+    return sorted(set(lowest.values()) | set(highest.values()))
+
+
+def downsample_indices(method: str, xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
+    """Indices kept by *method* ("lttb" or "minmax"). Raises ValueError for others."""
+    if method == "lttb":
+        return lttb_indices(xs, ys, threshold)
+    if method == "minmax":
+        return minmax_indices(xs, ys, threshold)
+    raise ValueError(f"Unknown downsampling method '{method}'.")
@@ -2,6 +2,8 @@
 HTTP exception helpers.
 """
 
+from typing import Optional
+
 from fastapi import HTTPException
 
 
@@ -9,8 +11,8 @@ def http_400(detail: str) -> HTTPException:
     return HTTPException(status_code=400, detail=detail)
 
 
-def http_401(detail: str = "Invalid credentials") -> HTTPException:
-    return HTTPException(status_code=401, detail=detail)
+def http_401(detail: str = "Invalid credentials", headers: Optional[dict] = None) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers=headers)
 
 
 def http_403(detail: str = "Device not registered") -> HTTPException:
@@ -21,5 +23,9 @@ def http_404(detail: str = "Not found") -> HTTPException:
     return HTTPException(status_code=404, detail=detail)
 
 
+def http_409(detail: str = "Conflict") -> HTTPException:
+    return HTTPException(status_code=409, detail=detail)
+
+
 def http_500(detail: str = "Internal error") -> HTTPException:
     return HTTPException(status_code=500, detail=detail)
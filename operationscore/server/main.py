@@ -1,56 +1,161 @@
-from fastapi import APIRouter, FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List, Optional
 from datetime import datetime, timezone
+import asyncio
 from asyncio import Lock
 from uuid import uuid4
 import json
 import logging
+import time
+import zlib
 from .models import DeviceMetrics, ScoreReport, ScoreIssue
-from .scoring.engine import calculate_score
-from .state import device_metrics_cache, device_reports_cache, registered_devices, ws_clients
-from .snapshot_store import build_snapshot, atomic_write_snapshot, risk_level as snapshot_risk_level
+from .scoring.engine import calculate_score_cached, metrics_content_hash, score_cache_stats
+from .scoring.spec import RuleSpecError, rule_spec
+from .state import device_metrics_cache, device_reports_cache, registered_devices
+from . import snapshot_store
+from .snapshot_store import build_snapshot, empty_snapshot, set_snapshot, risk_level as snapshot_risk_level
+from .task_queue import task_queue
+from .run_sessions import run_sessions, scan_sessions
+from .ws_broadcaster import ws_broadcaster
+from .cluster import attach as attach_cluster, cluster
+from .score_distribution import score_distribution
+from . import db as server_db, rescore, response_cache
+from .db_profile import effective_pragmas, query_stats
+from . import telemetry
+from .telemetry import report_stage_seconds, reports_total
 from . import config
-from .http_errors import http_400, http_401, http_403, http_404, http_500
+from .http_errors import http_400, http_401, http_403, http_404, http_409, http_500
 
 try:
     from .repository import (
-        verify_register_credentials,
         upsert_device,
-        is_registered,
+        deactivate_device,
         save_report,
+        save_reports,
+        save_heartbeat,
         get_devices_list,
+        get_device_changes,
+        get_device_types,
+        current_device_generation,
+        device_generations,
         get_device_history,
+        get_device_history_page,
+        get_device_history_downsampled,
+        get_device_trend,
         get_fleet_history,
+        rebuild_fleet_rollups,
+        prune_fleet_rollups,
+        rebuild_device_trends,
+        backfill_report_metrics,
+        get_metric_trend,
+        get_metric_summary,
+        iter_report_export,
+        RISK_LEVELS,
     )
+    from . import credentials
+    from .credentials import verify_credentials
+    from .device_registry import active_devices
+    is_active_device = active_devices.contains_async
+    from .warm_start import apply_latest_reports, read_latest_reports, warm_caches
+    # Re-read the device type after a registration handled elsewhere (another worker)
+    active_devices.subscribe(lambda event, hostname: score_distribution.forget_type(hostname))
     REPO_AVAILABLE = True
 except ModuleNotFoundError:
     REPO_AVAILABLE = False
     print("WARN: server.repository missing; API endpoints will be disabled until repository is added")
 
-    def verify_register_credentials(username: str, password: str):
+    credentials = None
+    active_devices = set()
+
+    async def is_active_device(hostname: str) -> bool:
+        return False
+
+    async def verify_credentials(username: str, password: str, source_ip=None):
         return (False, None)
 
     def upsert_device(*args, **kwargs):
         raise http_500("Repository layer not available")  # noqa: already a raise
 
-    def is_registered(hostname: str) -> bool:
+    def deactivate_device(hostname: str) -> bool:
         return False
 
     def save_report(*args, **kwargs):
         return None
 
+    def save_reports(*args, **kwargs):
+        return []
+
+    def save_heartbeat(*args, **kwargs):
+        return False
+
     def get_devices_list():
         return []
 
+    def get_device_types(hostnames=None) -> dict:
+        return {}
+
+    def get_device_changes(since: int) -> dict:
+        return {"generation": 0, "full": True, "devices": [], "removed": []}
+
+    def current_device_generation() -> int:
+        return 0
+
+    def device_generations(hostnames: list) -> dict:
+        return {}
+
     def get_device_history(hostname: str, limit: int):
         return []
 
-    def get_fleet_history(limit: int):
+    def get_device_history_page(hostname: str, limit: int, start=None, end=None, cursor=None):
+        return [], None
+
+    def get_device_history_downsampled(hostname: str, points: int, start=None, end=None, method: str = "lttb"):
+        return [], 0
+
+    def get_device_trend(hostname: str) -> dict:
+        raise KeyError(hostname)
+
+    def get_fleet_history(limit: int, start=None, end=None, resolution: str = "1m"):
         return []
 
+    def rebuild_fleet_rollups(only_if_empty: bool = True) -> int:
+        return 0
+
+    def prune_fleet_rollups(now=None) -> int:
+        return 0
+
+    def rebuild_device_trends(only_if_empty: bool = True) -> int:
+        return 0
+
+    def backfill_report_metrics(chunk_size: int = 500) -> int:
+        return 0
+
+    def get_metric_trend(limit: int, start=None, end=None, resolution: str = "1h"):
+        return []
+
+    def get_metric_summary() -> dict:
+        return {}
+
+    RISK_LEVELS = ("EXCELLENT", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+    def iter_report_export(start=None, end=None, hostnames=None, risk_levels=None, batch_size=None):
+        return iter(())
+
+    def warm_caches() -> dict:
+        return {"devices": 0, "skipped": 0, "query_seconds": 0.0, "decode_seconds": 0.0}
+
+    def read_latest_reports():
+        return [], {}
+
+    def apply_latest_reports(entries, overwrite: bool = False) -> int:
+        return 0
+
 
 from .api_schemas import (
     RegisterRequest,
@@ -59,8 +164,16 @@ from .api_schemas import (
     DevicesListResponse,
     DeviceHistoryPoint,
     DeviceHistoryResponse,
+    DeviceTrendResponse,
+    FleetDistributionResponse,
     FleetHistoryPoint,
     FleetHistoryResponse,
+    FleetMetricsPoint,
+    FleetMetricsSummary,
+    FleetMetricsTrendResponse,
+    ReportBatchItem,
+    ReportBatchRequest,
+    ReportBatchResponse,
 )
 
 # Configure logging
@@ -79,6 +192,7 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+app.add_middleware(telemetry.RequestMetricsMiddleware)
 
 
 @app.exception_handler(RequestValidationError)
@@ -95,6 +209,30 @@ app.include_router(snapshot_router, prefix="/snapshot", tags=["Snapshot"])
 
 api_router = APIRouter(prefix="/api", tags=["API"])
 
+_basic_auth = HTTPBasic(auto_error=False)
+
+
+async def require_operator(
+    request: Request,
+    credentials: Optional[HTTPBasicCredentials] = Depends(_basic_auth),
+) -> str:
+    """
+    Guard for admin routes: HTTP Basic credentials of the SERVER account,
+    checked by verify_credentials() as /api/register does. Returns the username.
+    """
+    if credentials is None:
+        raise http_401("Credentials required", headers={"WWW-Authenticate": "Basic"})
+    source_ip = request.client.host if request.client else None
+    ok, role = await verify_credentials(credentials.username, credentials.password, source_ip)
+    if not ok:
+        logger.warning(
+            "ADMIN auth fail username=%s from_ip=%s path=%s", credentials.username, source_ip, request.url.path,
+        )
+        raise http_401(headers={"WWW-Authenticate": "Basic"})
+    if role != "SERVER":
+        raise http_403("Server account required")
+    return credentials.username
+
 
 @api_router.post("/register", response_model=RegisterResponse)
 async def api_register(req: RegisterRequest, request: Request):
@@ -104,48 +242,350 @@ async def api_register(req: RegisterRequest, request: Request):
     if not username:
         raise http_400("username must not be empty")
     source_ip = request.client.host if request.client else None
-    ok, role = verify_register_credentials(username, req.password)
+    ok, role = await verify_credentials(username, req.password, source_ip)
     if not ok:
         logger.warning("REGISTER fail username=%s from_ip=%s", username, source_ip)
         raise http_401()
     upsert_device(hostname=req.hostname, registered_ip=req.ip, device_type=role, source_ip=source_ip)
+    score_distribution.set_device_type(req.hostname, role)
+    response_cache.bump()
+    _publish_device_change(req.hostname, removed=False)
     logger.info("REGISTER ok hostname=%s type=%s ip=%s from_ip=%s", req.hostname, role, req.ip, source_ip)
     return RegisterResponse(ok=True, device_type=role, message="Registered successfully")
 
 
+def _build_api_devices_list() -> DevicesListResponse:
+    # Read before the list so a change made meanwhile is sent again, not lost
+    generation = current_device_generation()
+    items = get_devices_list()
+    return DevicesListResponse(
+        device_count=len(items), devices=[DeviceListItem(**item) for item in items], generation=generation,
+    )
+
+
 @api_router.get("/devices", response_model=DevicesListResponse)
-async def api_devices_list():
+async def api_devices_list(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Only devices changed after this generation"),
+):
+    """
+    All active devices, or with ?since=N only those changed after generation
+    N plus the hostnames removed since (full=false). Use the returned
+    generation as the next ?since=.
+    """
     if not REPO_AVAILABLE:
         raise http_500("Repository layer not available")
-    items = get_devices_list()
-    return DevicesListResponse(device_count=len(items), devices=[DeviceListItem(**item) for item in items])
+    if since is None:
+        return response_cache.cached_json(request, "api_devices", _build_api_devices_list)
+    changes = await run_in_threadpool(get_device_changes, since)
+    return DevicesListResponse(
+        device_count=len(changes["devices"]),
+        devices=[DeviceListItem(**item) for item in changes["devices"]],
+        generation=changes["generation"],
+        full=changes["full"],
+        removed=changes["removed"],
+    )
 
 
 @api_router.get("/devices/{hostname}/history", response_model=DeviceHistoryResponse)
-async def api_device_history(hostname: str, limit: int = config.DEFAULT_DEVICE_HISTORY_LIMIT):
+async def api_device_history(
+    hostname: str,
+    limit: int = config.DEFAULT_DEVICE_HISTORY_LIMIT,
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    points: Optional[int] = None,
+    method: str = "lttb",
+):
+    """
+    Without from/to/cursor/points: the latest *limit* points.
+    With from/to or cursor: keyset pages of *limit* points, oldest first;
+    follow next_cursor until it is null.
+    With points: the whole [from, to] range downsampled to at most *points*
+    points (method "lttb" or "minmax").
+    """
     if not REPO_AVAILABLE:
         raise http_500("Repository layer not available")
     if limit < 1 or limit > config.MAX_HISTORY_LIMIT:
         raise http_400("Invalid limit")
+    start = _parse_query_ts(from_, "from")
+    end = _parse_query_ts(to, "to")
+    if start is not None and end is not None and start > end:
+        raise http_400("Invalid time range")
+
+    if points is not None:
+        if cursor is not None:
+            raise http_400("cursor cannot be combined with points")
+        if points < 3 or points > config.MAX_HISTORY_POINTS:
+            raise http_400("Invalid points")
+        try:
+            result, raw_count = await run_in_threadpool(
+                get_device_history_downsampled, hostname, points, start, end, method
+            )
+        except KeyError:
+            raise http_404(f"Device '{hostname}' not found")
+        except ValueError:
+            raise http_400("Invalid method")
+        return DeviceHistoryResponse(
+            hostname=hostname,
+            points=[DeviceHistoryPoint(**p) for p in result],
+            raw_count=raw_count,
+            downsampled=len(result) < raw_count,
+        )
+
+    next_cursor = None
     try:
-        points = get_device_history(hostname, limit)
+        if start is None and end is None and cursor is None:
+            result = get_device_history(hostname, limit)
+        else:
+            result, next_cursor = await run_in_threadpool(
+                get_device_history_page, hostname, limit, start, end, cursor
+            )
     except KeyError:
         raise http_404(f"Device '{hostname}' not found")
+    except ValueError:
+        raise http_400("Invalid cursor")
     except Exception:
         logger.exception("get_device_history failed hostname=%s", hostname)
         raise http_500()
     # 200 with empty points when device exists but has no reports yet
-    return DeviceHistoryResponse(hostname=hostname, points=[DeviceHistoryPoint(**p) for p in points])
+    return DeviceHistoryResponse(
+        hostname=hostname,
+        points=[DeviceHistoryPoint(**p) for p in result],
+        next_cursor=next_cursor,
+    )
+
+
+@api_router.get("/devices/{hostname}/trend", response_model=DeviceTrendResponse)
+async def api_device_trend(hostname: str):
+    """EWMA, window slope, min/max and time since the last risk-level change (O(1) read)."""
+    if not REPO_AVAILABLE:
+        raise http_500("Repository layer not available")
+    try:
+        return DeviceTrendResponse(**await run_in_threadpool(get_device_trend, hostname))
+    except KeyError:
+        raise http_404(f"Device '{hostname}' not found")
+
+
+@api_router.delete("/devices/{hostname}")
+async def api_deactivate_device(hostname: str, operator: str = Depends(require_operator)):
+    """
+    Deactivate a device: later /report calls from it are rejected with 403.
+    Needs the SERVER account's HTTP Basic credentials.
+    """
+    if not REPO_AVAILABLE:
+        raise http_500("Repository layer not available")
+    if not await run_in_threadpool(deactivate_device, hostname):
+        raise http_404(f"Device '{hostname}' not found")
+    device_metrics_cache.pop(hostname, None)
+    device_reports_cache.pop(hostname, None)
+    registered_devices.pop(hostname, None)
+    score_distribution.remove(hostname)
+    cluster.publish("device_removed", {"hostname": hostname})
+    response_cache.bump()
+    _publish_device_change(hostname, removed=True)
+    logger.info("DEVICE deactivated hostname=%s by=%s", hostname, operator)
+    return {"ok": True, "hostname": hostname}
+
+
+# Keeps background job tasks referenced until they finish
+_background_tasks: set = set()
+
+
+async def _run_rescore(job: "rescore.RescoreJob") -> None:
+    await run_in_threadpool(job.run)
+    if job.changed:
+        await _reload_rescored_reports()
+        cluster.publish("rescored")
+    # Stored scores changed under /api/devices and the history endpoints
+    response_cache.bump()
+
+
+async def _reload_rescored_reports(persist: bool = True) -> None:
+    """
+    Replace the cached latest reports by their rescored rows, so
+    /latest_reports, the snapshot and the score distribution agree with
+    /api/devices again. The rows are read off the loop, applied on it.
+    """
+    try:
+        entries, _ = await run_in_threadpool(read_latest_reports)
+    except Exception:
+        logger.exception("reloading rescored reports failed")
+        return
+    applied = apply_latest_reports(entries, overwrite=True)
+    try:
+        snapshot = build_snapshot(device_metrics_cache, device_reports_cache, registered_devices)
+        set_snapshot(snapshot, persist=persist)
+    except Exception:
+        logger.exception("Snapshot rebuild after rescore failed")
+    logger.info("rescored reports reloaded for %d devices", applied)
+
+
+@api_router.post("/admin/rescore", status_code=202)
+async def api_start_rescore(
+    chunk_size: Optional[int] = Query(None, ge=1, le=10_000),
+    workers: Optional[int] = Query(None, ge=0, le=64),
+    operator: str = Depends(require_operator),
+):
+    """Start recomputing stored report scores with the current rules (one job at a time)."""
+    if not REPO_AVAILABLE:
+        raise http_500("Repository layer not available")
+    if rescore.current_job is not None and rescore.current_job.running:
+        raise http_409("A rescore job is already running")
+    job = rescore.RescoreJob(chunk_size=chunk_size, workers=workers)
+    rescore.current_job = job
+    logger.info("RESCORE started by=%s chunk_size=%s workers=%s", operator, chunk_size, workers)
+    task = asyncio.create_task(_run_rescore(job))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return job.progress()
+
+
+@api_router.get("/admin/rescore", dependencies=[Depends(require_operator)])
+async def api_rescore_progress():
+    """Progress and throughput of the current or last rescore job."""
+    if rescore.current_job is None:
+        raise http_404("No rescore job has been started")
+    return rescore.current_job.progress()
+
+
+def _parse_query_ts(value: Optional[str], name: str) -> Optional[datetime]:
+    """Parse an ISO-8601 query parameter; naive values are taken as UTC."""
+    if value is None:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise http_400(f"Invalid {name}")
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
 
 @api_router.get("/fleet/history", response_model=FleetHistoryResponse)
-async def api_fleet_history(limit: int = config.DEFAULT_FLEET_HISTORY_LIMIT):
+async def api_fleet_history(
+    limit: int = config.DEFAULT_FLEET_HISTORY_LIMIT,
+    resolution: str = "1m",
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+):
+    if not REPO_AVAILABLE:
+        raise http_500("Repository layer not available")
+    if limit < 1 or limit > config.MAX_FLEET_HISTORY_POINTS:
+        raise http_400("Invalid limit")
+    start = _parse_query_ts(from_, "from")
+    end = _parse_query_ts(to, "to")
+    if start is not None and end is not None and start > end:
+        raise http_400("Invalid time range")
+    try:
+        points = await run_in_threadpool(get_fleet_history, limit, start, end, resolution)
+    except ValueError:
+        raise http_400("Invalid resolution")
+    return FleetHistoryResponse(resolution=resolution, points=[FleetHistoryPoint(**p) for p in points])
+
+
+@api_router.get("/fleet/distribution", response_model=FleetDistributionResponse)
+async def api_fleet_distribution(request: Request, bucket_width: int = 10):
+    """
+    p5 / p50 / p95, mean and a histogram (*bucket_width*-point buckets, a
+    divisor of 100) of the active devices' latest scores, fleet-wide and per
+    device type. Read from incrementally maintained histograms.
+    """
+    if bucket_width < 1 or 100 % bucket_width:
+        raise http_400("Invalid bucket_width")
+    return response_cache.cached_json(
+        request,
+        f"fleet_distribution:{bucket_width}",
+        lambda: FleetDistributionResponse(**score_distribution.summary(bucket_width)),
+    )
+
+
+@api_router.get("/fleet/metrics/trend", response_model=FleetMetricsTrendResponse)
+async def api_fleet_metrics_trend(
+    limit: int = config.DEFAULT_FLEET_HISTORY_LIMIT,
+    resolution: str = "1h",
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+):
+    """K1–K10 input aggregates per time bucket (SQL over device_report_metrics)."""
     if not REPO_AVAILABLE:
         raise http_500("Repository layer not available")
     if limit < 1 or limit > config.MAX_HISTORY_LIMIT:
         raise http_400("Invalid limit")
-    points = get_fleet_history(limit)
-    return FleetHistoryResponse(points=[FleetHistoryPoint(**p) for p in points])
+    start = _parse_query_ts(from_, "from")
+    end = _parse_query_ts(to, "to")
+    if start is not None and end is not None and start > end:
+        raise http_400("Invalid time range")
+    try:
+        points = await run_in_threadpool(get_metric_trend, limit, start, end, resolution)
+    except ValueError:
+        raise http_400("Invalid resolution")
+    return FleetMetricsTrendResponse(resolution=resolution, points=[FleetMetricsPoint(**p) for p in points])
+
+
+def _ndjson_chunks(batches) -> Any:
+    """One NDJSON chunk per batch; stored metrics / issues JSON is spliced in unparsed."""
+    for batch in batches:
+        lines = []
+        for row in batch:
+            metrics, issues = row.pop("metrics_json"), row.pop("issues_json")
+            head = json.dumps(row, separators=(",", ":"))
+            lines.append(f'{head[:-1]},"metrics":{metrics or "null"},"issues":{issues or "[]"}}}\n')
+        yield "".join(lines).encode("utf-8")
+
+
+def _gzip_chunks(chunks) -> Any:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@api_router.get("/export/reports")
+async def api_export_reports(
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    hostname: Optional[List[str]] = Query(None),
+    risk_level: Optional[List[str]] = Query(None),
+    gzip: bool = False,
+):
+    """
+    Stored reports as NDJSON (one JSON object per line, in insertion order),
+    optionally gzip-compressed. Filters: from / to on collected_at, and
+    repeatable hostname and risk_level. Streamed from a server-side cursor in
+    EXPORT_BATCH_SIZE batches, so memory does not grow with the row count.
+    """
+    if not REPO_AVAILABLE:
+        raise http_500("Repository layer not available")
+    start = _parse_query_ts(from_, "from")
+    end = _parse_query_ts(to, "to")
+    if start is not None and end is not None and start > end:
+        raise http_400("Invalid time range")
+    levels = [level.upper() for level in risk_level] if risk_level else None
+    if levels and any(level not in RISK_LEVELS for level in levels):
+        raise http_400("Invalid risk_level")
+
+    # A sync generator: Starlette iterates it in the threadpool
+    chunks = _ndjson_chunks(iter_report_export(start, end, hostname, levels))
+    if gzip:
+        return StreamingResponse(
+            _gzip_chunks(chunks),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="reports.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        chunks,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="reports.ndjson"'},
+    )
+
+
+@api_router.get("/fleet/metrics/current", response_model=FleetMetricsSummary)
+async def api_fleet_metrics_current():
+    """K1–K10 input aggregates over each active device's latest report."""
+    if not REPO_AVAILABLE:
+        raise http_500("Repository layer not available")
+    return FleetMetricsSummary(**await run_in_threadpool(get_metric_summary))
 
 
 app.include_router(api_router)
@@ -158,6 +598,11 @@ app.include_router(api_router)
 @app.on_event("startup")
 async def on_startup() -> None:
     """Initialise SQLite DB and seed auth_accounts on every startup (idempotent)."""
+    if config.CLUSTER_DIR and not cluster.enabled:
+        # Before the task queue loads: shared mode keeps other workers' leases
+        attach_cluster()
+        _register_cluster_handlers()
+        await cluster.start(config.CLUSTER_DIR)
     try:
         from .db import init_db, SessionLocal
         from .auth_seed import seed_auth_accounts
@@ -167,8 +612,104 @@ async def on_startup() -> None:
             seed_auth_accounts(db)
         finally:
             db.close()
+        backfilled = rebuild_fleet_rollups(only_if_empty=True)
+        if backfilled:
+            logger.info("on_startup fleet_rollup backfilled from %d reports", backfilled)
+        pruned = prune_fleet_rollups()
+        if pruned:
+            logger.info("on_startup fleet_rollup pruned %d expired buckets", pruned)
+        trended = rebuild_device_trends(only_if_empty=True)
+        if trended:
+            logger.info("on_startup device_trends backfilled from %d reports", trended)
+        typed = backfill_report_metrics()
+        if typed:
+            logger.info("on_startup device_report_metrics backfilled for %d reports", typed)
+        active = active_devices.warm_from_db()
+        logger.info("on_startup device registry warmed with %d active devices", active)
+        device_types = get_device_types()
+        score_distribution.warm_types(device_types)
+        restored = score_distribution.load(active=device_types)
+        if restored:
+            logger.info("on_startup score distribution restored for %d devices", restored)
+        warmed = warm_caches()
+        logger.info(
+            "on_startup caches warmed with %d devices (%d skipped) in %.2fs (query %.2fs, decode %.2fs)",
+            warmed["devices"], warmed["skipped"],
+            warmed["query_seconds"] + warmed["decode_seconds"],
+            warmed["query_seconds"], warmed["decode_seconds"],
+        )
+        pending = task_queue.load_from_db()
+        if pending:
+            logger.info("on_startup task queue restored %d pending tasks", pending)
     except Exception as _e:
         logger.warning("on_startup DB init skipped: %s", _e)
+    snapshot_store.load_snapshot()
+    if device_reports_cache:
+        # The warmed caches are newer than a snapshot file written before the restart
+        set_snapshot(build_snapshot(device_metrics_cache, device_reports_cache, registered_devices), persist=False)
+    # Nothing cached before this startup describes the freshly loaded state
+    response_cache.bump()
+    global _distribution_persister, _rollup_pruner, _session_evictor
+    _distribution_persister = asyncio.create_task(_persist_score_distribution())
+    _rollup_pruner = asyncio.create_task(_prune_fleet_rollups())
+    _session_evictor = asyncio.create_task(_evict_run_sessions())
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    """Stop the bcrypt verification worker processes and WebSocket senders; flush the snapshot file."""
+    if credentials is not None:
+        credentials.shutdown()
+    await ws_broadcaster.close_all()
+    await cluster.stop()
+    await run_in_threadpool(snapshot_store.flush)
+    if _distribution_persister is not None:
+        _distribution_persister.cancel()
+    if _rollup_pruner is not None:
+        _rollup_pruner.cancel()
+    if _session_evictor is not None:
+        _session_evictor.cancel()
+    if score_distribution.dirty():
+        await run_in_threadpool(score_distribution.save)
+
+
+_distribution_persister: Optional[asyncio.Task] = None
+
+
+async def _persist_score_distribution() -> None:
+    """Write the score distribution every SCORE_DISTRIBUTION_PERSIST_SECONDS while it changes."""
+    while True:
+        await asyncio.sleep(config.SCORE_DISTRIBUTION_PERSIST_SECONDS)
+        if score_distribution.dirty():
+            await run_in_threadpool(score_distribution.save)
+
+
+_rollup_pruner: Optional[asyncio.Task] = None
+
+
+async def _prune_fleet_rollups() -> None:
+    """Drop expired 1m / 15m fleet_rollup buckets every FLEET_ROLLUP_PRUNE_SECONDS."""
+    while True:
+        await asyncio.sleep(config.FLEET_ROLLUP_PRUNE_SECONDS)
+        try:
+            pruned = await run_in_threadpool(prune_fleet_rollups)
+        except Exception:
+            logger.exception("fleet_rollup pruning failed")
+            continue
+        if pruned:
+            logger.info("fleet_rollup pruned %d expired buckets", pruned)
+
+
+_session_evictor: Optional[asyncio.Task] = None
+
+
+async def _evict_run_sessions() -> None:
+    """Archive expired scan / run sessions every RUN_SESSION_EVICT_SECONDS."""
+    while True:
+        await asyncio.sleep(config.RUN_SESSION_EVICT_SECONDS)
+        # evict_expired() logs and keeps the sessions if archiving fails
+        await scan_sessions.evict_expired()
+        await run_sessions.evict_expired()
 
 
 # ============================================================================
@@ -212,6 +753,11 @@ class Task(BaseModel):
         }
 
 
+def _task_from_item(item: Dict[str, Any]) -> Task:
+    """Build the API Task model from a task_queue item."""
+    return Task(task_id=item["task_id"], command=item["command"], created_at=item["created_at"])
+
+
 class BroadcastRequest(BaseModel):
     """
     Request body for broadcasting a command to all known devices.
@@ -322,95 +868,41 @@ class RegisteredDevice(BaseModel):
 # ============================================================================
 # device_metrics_cache, device_reports_cache, registered_devices imported from .state
 
-# Store task queues for each device by hostname
-# Format: {hostname: [Task, Task, ...]}  (FIFO queue)
-task_queues: Dict[str, List[Task]] = {}
+# Agent task queues (per-host deques + agent_tasks table) live in .task_queue
 
 # Lock for thread-safe concurrent access to caches
 cache_lock = Lock()
 
-# Lock for thread-safe concurrent access to task queues
-task_queue_lock = Lock()
-
 # Lock for thread-safe concurrent access to device registry
 device_registry_lock = Lock()
 
-# Store active scan sessions by run_id
-# Format: {run_id: {"created_at": datetime, "devices": {hostname: "pending"|"completed"}}}
-scan_sessions: Dict[str, Dict] = {}
-
-# Lock for thread-safe concurrent access to scan sessions
-scan_session_lock = Lock()
+# Scan sessions (POST /tasks/broadcast) and run sessions (broadcast + POST /runs/start)
+# live in .run_sessions: SessionStore objects with per-run counters and a
+# hostname → pending-session index; expired sessions are archived to SQLite.
 
 # Current active run session ID (simplified tracking for POST /tasks/broadcast)
 # Format: run_id (UUID4) or None if no active run
 current_run_id: Optional[str] = None
 
-# Single global run session storage by run_id (source of truth)
-# Format: {run_id: {"run_id": str, "started_at": datetime, "reports": {hostname: ScoreReport}}}
-run_sessions: Dict[str, Dict[str, Any]] = {}
 
-# Lock for thread-safe concurrent access to run sessions
-run_lock = Lock()
+def _start_run(run_id: str, started_at: datetime, hostnames: List[str], scan: bool) -> None:
+    """Create the run (and with *scan*, the scan) session and make it current on every worker."""
+    global current_run_id
+    if scan:
+        scan_sessions.create(run_id, started_at, hostnames)
+    run_sessions.create(run_id, started_at, hostnames)
+    # Set current_run_id globally (will be used by POST /report)
+    current_run_id = run_id
+    cluster.publish("run_started", {
+        "run_id": run_id,
+        "started_at": started_at.isoformat(),
+        "hostnames": list(hostnames),
+        "scan": scan,
+    })
 
 
-# WebSocket connection manager for real-time broadcasts
-class ConnectionManager:
-    """
-    Manage active WebSocket client connections and broadcast JSON events.
-
-    This lightweight manager stores active WebSocket connections and provides
-    methods to register new connections, remove disconnected clients, and
-    broadcast arbitrary JSON-serializable messages to all connected clients.
-
-    Why broadcasting: when devices submit health reports to POST /report the
-    server emits real-time events so frontend dashboards and monitoring UIs
-    can react immediately (update progress bars, charts, or notifications)
-    without polling the REST API.
-
-    How frontends consume events: a frontend establishes a WebSocket
-    connection to the `/ws` endpoint and listens for JSON messages. Each
-    broadcast from `ws_manager.broadcast(...)` is delivered to all
-    connected clients.
-    """
-
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        try:
-            self.active_connections.remove(websocket)
-        except ValueError:
-            pass
-
-    async def broadcast(self, message: dict):
-        # broadcast JSON message to all active connections
-        for connection in list(self.active_connections):
-            try:
-                await connection.send_json(message)
-            except Exception:
-                # ignore send errors and continue
-                pass
-
-
-# Global WebSocket manager instance
-ws_manager = ConnectionManager()
-
-
-async def broadcast_event(payload: dict) -> None:
-    """
-    Broadcast JSON payload to all connected WebSocket clients.
-    On send failure, remove the client and continue.
-    """
-    for ws in list(ws_clients):
-        try:
-            await ws.send_json(payload)
-        except Exception:
-            ws_clients.discard(ws)
+# WebSocket fan-out (per-client bounded queues, coalescing, batching) lives in
+# .ws_broadcaster; POST /report only calls ws_broadcaster.publish().
 
 
 # ============================================================================
@@ -599,6 +1091,247 @@ def calculate_risk_level(score: float) -> str:
         return "LOW"
 
 
+# Pre-bound metric children for the report path
+_STAGE_SCORE = report_stage_seconds.labels("score")
+_STAGE_SAVE = report_stage_seconds.labels("save_report")
+_STAGE_BUILD_SNAPSHOT = report_stage_seconds.labels("build_snapshot")
+_STAGE_WRITE_SNAPSHOT = report_stage_seconds.labels("write_snapshot")
+_STAGE_BROADCAST = report_stage_seconds.labels("broadcast")
+_REPORTS_STORED = reports_total.labels("stored")
+_REPORTS_HEARTBEAT = reports_total.labels("heartbeat")
+_REPORTS_STORE_FAILED = reports_total.labels("store_failed")
+_REPORTS_REJECTED = reports_total.labels("rejected")
+
+
+def _score_metrics(metrics: DeviceMetrics, now_dt: datetime) -> tuple[DeviceMetrics, ScoreReport, str]:
+    """
+    Overwrite last_seen_minutes (K8) from the registry, then score (memoized).
+    Returns the metrics, the report and the metrics content hash.
+    """
+    prev_dt = registered_devices.get(metrics.hostname)
+    if prev_dt is not None and prev_dt.tzinfo is None:
+        prev_dt = prev_dt.replace(tzinfo=timezone.utc)
+    if prev_dt is None:
+        mins = 0
+    else:
+        mins = round((now_dt - prev_dt).total_seconds() / 60)
+    metrics = metrics.model_copy(update={"last_seen_minutes": max(0, mins)})
+    with _STAGE_SCORE.time():
+        content_hash = metrics_content_hash(metrics)
+        return metrics, calculate_score_cached(metrics, content_hash), content_hash
+
+
+def _is_repeat(hostname: str, content_hash: str, report: ScoreReport) -> bool:
+    """True if *report* repeats the device's cached latest report (same inputs and score)."""
+    if not config.REPORT_HEARTBEATS:
+        return False
+    previous = device_reports_cache.get(hostname)
+    if previous is None:
+        return False
+    if previous.get("content_hash") is None and hostname in device_metrics_cache:
+        # Warmed from the database at startup (server/warm_start.py): hashed on first use
+        previous["content_hash"] = metrics_content_hash(device_metrics_cache[hostname])
+    return (
+        previous.get("content_hash") == content_hash
+        and previous["report"].total_score == report.total_score
+    )
+
+
+async def _apply_report(
+    metrics: DeviceMetrics,
+    report: ScoreReport,
+    now_dt: datetime,
+    content_hash: Optional[str] = None,
+) -> None:
+    """Ack run_scan, overwrite the caches and attach the report to open sessions."""
+    # A report completes any run_scan task leased to this device
+    await task_queue.ack_command(metrics.hostname, "run_scan")
+
+    async with cache_lock:
+        _record_report(metrics, report, now_dt, content_hash)
+
+    # Other workers mirror the same cache and session update
+    if cluster.enabled:
+        cluster.publish("report", {
+            "metrics": metrics.model_dump(mode="json"),
+            "report": report.model_dump(mode="json"),
+            "scored_at": now_dt.isoformat(),
+            "content_hash": content_hash,
+        })
+
+
+def _record_report(
+    metrics: DeviceMetrics,
+    report: ScoreReport,
+    now_dt: datetime,
+    content_hash: Optional[str] = None,
+) -> None:
+    """Overwrite the caches and attach the report to open sessions (no awaits)."""
+    device_metrics_cache[metrics.hostname] = metrics
+    device_reports_cache[metrics.hostname] = {
+        "report": report,
+        "scored_at": now_dt,
+        "content_hash": content_hash,
+    }
+    registered_devices[metrics.hostname] = now_dt
+    score_distribution.update(metrics.hostname, report.total_score)
+
+    # Complete this device in every scan session still waiting for it, and
+    # attach the report to the current run session (indexed, no scan)
+    run_result = {
+        "timestamp": metrics.timestamp,
+        "score": report.total_score,
+        "issues": report.issues,
+    }
+    scan_sessions.record_pending(metrics.hostname, run_result)
+    if current_run_id and run_sessions.record(current_run_id, metrics.hostname, run_result):
+        logger.debug(f"Attached report for {metrics.hostname} to run {current_run_id}")
+
+
+def _publish_device_change(hostname: str, removed: bool) -> None:
+    """Push a device_changed event (registration / deactivation) with the device's generation."""
+    try:
+        generation = device_generations([hostname]).get(hostname)
+        ws_broadcaster.publish({
+            "type": "device_changed",
+            "hostname": hostname,
+            "removed": removed,
+            "generation": generation,
+        })
+    except Exception:
+        logger.exception("WebSocket broadcast failed")
+
+
+def _publish_reports(reports: Dict[str, ScoreReport], now_dt: datetime) -> None:
+    """
+    Rewrite the snapshot once, invalidate cached reads and push one event per
+    host in *reports* (callers leave out hosts whose report did not change).
+    Events carry the device's change generation (GET /api/devices?since=).
+    """
+    # Build snapshot and make it current; the file is written off-loop (log on failure, still return 200)
+    try:
+        with _STAGE_BUILD_SNAPSHOT.time():
+            snapshot = build_snapshot(
+                device_metrics_cache,
+                device_reports_cache,
+                registered_devices,
+                now_iso=now_dt.isoformat(),
+            )
+        with _STAGE_WRITE_SNAPSHOT.time():
+            set_snapshot(snapshot)
+    except Exception as e:
+        logger.exception("Snapshot write failed: %s", e)
+
+    # Cached GET responses (/latest_reports, /devices, /snapshot/latest, ...) are now stale
+    response_cache.bump()
+
+    # WebSocket broadcast: queued per client, never waits on a socket
+    broadcast_started = time.perf_counter()
+    try:
+        generations = device_generations(list(reports)) if reports else {}
+    except Exception:
+        logger.exception("device generation lookup failed")
+        generations = {}
+    for hostname, report in reports.items():
+        try:
+            ws_broadcaster.publish({
+                "type": "snapshot_updated",
+                "hostname": hostname,
+                "score": report.total_score,
+                "risk_level": snapshot_risk_level(report.total_score),
+                "generated_at": now_dt.isoformat(),
+                "generation": generations.get(hostname),
+            })
+        except Exception:
+            logger.exception("WebSocket broadcast failed")
+    _STAGE_BROADCAST.observe(time.perf_counter() - broadcast_started)
+
+
+# ============================================================================
+# Cross-worker replay (server/cluster.py, only with CLUSTER_DIR set)
+# ============================================================================
+# The worker that handled a write already persisted it, wrote the snapshot
+# file and published its WebSocket events (relayed by the bus); peers only
+# update their in-memory state. Publishing from a handler is a no-op.
+
+_peer_snapshot_pending = False
+
+
+def _rebuild_snapshot_after_peers() -> None:
+    global _peer_snapshot_pending
+    _peer_snapshot_pending = False
+    try:
+        snapshot = build_snapshot(device_metrics_cache, device_reports_cache, registered_devices)
+        set_snapshot(snapshot, persist=False)
+    except Exception:
+        logger.exception("Snapshot rebuild after peer reports failed")
+
+
+def _replay_report(payload: dict) -> None:
+    global _peer_snapshot_pending
+    metrics = DeviceMetrics.model_validate(payload["metrics"])
+    report = ScoreReport.model_validate(payload["report"])
+    _record_report(metrics, report, datetime.fromisoformat(payload["scored_at"]), payload["content_hash"])
+    if not _peer_snapshot_pending:
+        # One in-memory rebuild per burst of peer reports
+        _peer_snapshot_pending = True
+        asyncio.get_running_loop().call_soon(_rebuild_snapshot_after_peers)
+
+
+def _replay_run_started(payload: dict) -> None:
+    started_at = datetime.fromisoformat(payload["started_at"])
+    _start_run(payload["run_id"], started_at, payload["hostnames"], scan=payload["scan"])
+
+
+def _replay_device_removed(payload: dict) -> None:
+    hostname = payload["hostname"]
+    device_metrics_cache.pop(hostname, None)
+    device_reports_cache.pop(hostname, None)
+    registered_devices.pop(hostname, None)
+    score_distribution.remove(hostname)
+
+
+def _replay_snapshot_reset(payload: Any) -> None:
+    device_metrics_cache.clear()
+    device_reports_cache.clear()
+    registered_devices.clear()
+    score_distribution.clear()
+    set_snapshot(empty_snapshot(), persist=False)
+
+
+async def _reload_after_peer_rescore() -> None:
+    await _reload_rescored_reports(persist=False)
+    response_cache.bump()
+
+
+def _replay_rescored(payload: Any) -> None:
+    # The reload reads the DB off the loop; keep the task referenced until done
+    task = asyncio.get_running_loop().create_task(_reload_after_peer_rescore())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _register_cluster_handlers() -> None:
+    cluster.on("report", _replay_report)
+    cluster.on("run_started", _replay_run_started)
+    cluster.on("device_removed", _replay_device_removed)
+    cluster.on("snapshot_reset", _replay_snapshot_reset)
+    cluster.on("rescored", _replay_rescored)
+
+
+def _issues_as_dicts(report: Any) -> List[dict]:
+    issues_raw = getattr(report, "issues", None) or []
+    issues_list = []
+    for iss in issues_raw:
+        if hasattr(iss, "model_dump"):
+            issues_list.append(iss.model_dump())
+        elif hasattr(iss, "dict"):
+            issues_list.append(iss.dict())
+        elif isinstance(iss, dict):
+            issues_list.append(iss)
+    return issues_list
+
+
 @app.post(
     "/report",
     summary="Generate Operational Health Report",
@@ -612,27 +1345,18 @@ async def create_report(metrics: DeviceMetrics, request: Request):
     client_ip: str = (request.client.host if request.client else None) or "unknown"
 
     # G1: Always enforce registration — no REPO_AVAILABLE fallback here
-    if not is_registered(metrics.hostname):
+    if not await is_active_device(metrics.hostname):
         logger.info(
             "REPORT rejected not_registered hostname=%s from_ip=%s",
             metrics.hostname, client_ip,
         )
+        _REPORTS_REJECTED.inc()
         raise http_403("Device not registered")
 
     try:
         now_dt = datetime.now(timezone.utc)
-
-        # Server-side last_seen_minutes (K8) — overwrite agent value
-        prev_dt = registered_devices.get(metrics.hostname)
-        if prev_dt is not None and prev_dt.tzinfo is None:
-            prev_dt = prev_dt.replace(tzinfo=timezone.utc)
-        if prev_dt is None:
-            mins = 0
-        else:
-            mins = round((now_dt - prev_dt).total_seconds() / 60)
-        metrics = metrics.model_copy(update={"last_seen_minutes": max(0, mins)})
-
-        report = calculate_score(metrics)
+        metrics, report, content_hash = _score_metrics(metrics, now_dt)
+        repeat = _is_repeat(metrics.hostname, content_hash, report)
 
         # G2/G3: Persist exactly once, never crash on failure
         score_value = None
@@ -643,87 +1367,38 @@ async def create_report(metrics: DeviceMetrics, request: Request):
         elif isinstance(report, dict) and "score" in report:
             score_value = report["score"]
 
+        heartbeat = False
         try:
-            save_report(metrics.hostname, metrics, report, client_ip)
+            with _STAGE_SAVE.time():
+                # Unchanged reports only bump a heartbeat row when possible
+                heartbeat = repeat and await run_in_threadpool(
+                    save_heartbeat, metrics.hostname, metrics, report, client_ip
+                )
+                if not heartbeat:
+                    await run_in_threadpool(save_report, metrics.hostname, metrics, report, client_ip)
+            (_REPORTS_HEARTBEAT if heartbeat else _REPORTS_STORED).inc()
             logger.info(
-                "REPORT stored hostname=%s from_ip=%s score=%s",
-                metrics.hostname, client_ip, score_value,
+                "REPORT %s hostname=%s from_ip=%s score=%s",
+                "heartbeat" if heartbeat else "stored", metrics.hostname, client_ip, score_value,
             )
         except Exception as exc:
+            _REPORTS_STORE_FAILED.inc()
             logger.exception(
                 "REPORT store_failed hostname=%s from_ip=%s err=%s",
                 metrics.hostname, client_ip, str(exc),
             )
             # G3: do NOT re-raise — still return 200 with the computed score
 
-        # Cache overwrite
-        async with cache_lock:
-            device_metrics_cache[metrics.hostname] = metrics
-            device_reports_cache[metrics.hostname] = {"report": report, "scored_at": now_dt}
-
-        async with device_registry_lock:
-            registered_devices[metrics.hostname] = now_dt
-
-        # Update scan session status if device belongs to a pending scan
-        async with scan_session_lock:
-            for run_id, session_data in scan_sessions.items():
-                devices_map = session_data.get("devices", {})
-                if metrics.hostname in devices_map and devices_map[metrics.hostname] == "pending":
-                    devices_map[metrics.hostname] = "completed"
-
-        # Store report in current run session if active
-        async with run_lock:
-            if current_run_id and current_run_id in run_sessions:
-                run_sessions[current_run_id]["reports"][metrics.hostname] = report
-                if metrics.hostname in run_sessions[current_run_id]["devices"]:
-                    run_sessions[current_run_id]["devices"][metrics.hostname] = {
-                        "status": "completed",
-                        "report": report,
-                    }
-                    logger.debug(f"Attached report for {metrics.hostname} to run {current_run_id}")
-
-        # Build snapshot and atomic overwrite (log on failure, still return 200)
-        try:
-            snapshot = build_snapshot(
-                device_metrics_cache,
-                device_reports_cache,
-                registered_devices,
-                now_iso=now_dt.isoformat(),
-            )
-            atomic_write_snapshot(snapshot)
-        except Exception as e:
-            logger.exception("Snapshot write failed: %s", e)
-
-        # WebSocket broadcast (remove failed clients, continue)
-        risk = snapshot_risk_level(report.total_score)
-        try:
-            await broadcast_event({
-                "type": "snapshot_updated",
-                "hostname": metrics.hostname,
-                "score": report.total_score,
-                "risk_level": risk,
-                "generated_at": now_dt.isoformat(),
-            })
-        except Exception:
-            logger.exception("WebSocket broadcast failed")
-
-        issues_raw = getattr(report, "issues", None) or []
-        issues_list = []
-        for iss in issues_raw:
-            if hasattr(iss, "model_dump"):
-                issues_list.append(iss.model_dump())
-            elif hasattr(iss, "dict"):
-                issues_list.append(iss.dict())
-            elif isinstance(iss, dict):
-                issues_list.append(iss)
+        await _apply_report(metrics, report, now_dt, content_hash)
+        _publish_reports({} if heartbeat else {metrics.hostname: report}, now_dt)
 
         return {
             "ok": True,
             "hostname": metrics.hostname,
             "score": report.total_score,
             "total_score": report.total_score,
-            "risk_level": risk,
-            "issues": issues_list,
+            "risk_level": snapshot_risk_level(report.total_score),
+            "issues": _issues_as_dicts(report),
         }
 
     except ValueError as e:
@@ -732,6 +1407,115 @@ async def create_report(metrics: DeviceMetrics, request: Request):
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
 
+@app.post(
+    "/reports/batch",
+    response_model=ReportBatchResponse,
+    summary="Submit Many Health Reports",
+    tags=["Reporting"]
+)
+async def create_reports_batch(batch: ReportBatchRequest, request: Request):
+    """
+    Score and store up to REPORT_BATCH_MAX_ITEMS reports in one request
+    (relays, offline replays).
+
+    Each report goes through the same checks and scoring as POST /report.
+    Reports from unregistered or deactivated devices are rejected per item
+    and do not fail the batch. Accepted reports are written in one
+    transaction. The snapshot is rebuilt once, and WebSocket clients get one
+    snapshot_updated event per distinct hostname. Results are returned in
+    request order. A hostname repeated in the batch is processed in order,
+    so its last report becomes the cached one.
+    """
+    if len(batch.reports) > config.REPORT_BATCH_MAX_ITEMS:
+        raise http_400(f"At most {config.REPORT_BATCH_MAX_ITEMS} reports per batch")
+    client_ip: str = (request.client.host if request.client else None) or "unknown"
+
+    try:
+        now_dt = datetime.now(timezone.utc)
+        results: List[Optional[ReportBatchItem]] = []
+        scored: List[tuple[str, DeviceMetrics, ScoreReport]] = []
+        hashes: List[str] = []
+        repeats: List[bool] = []
+        # hostname → (content hash, score) of its previous report in this batch
+        batch_latest: Dict[str, tuple[str, float]] = {}
+        for metrics in batch.reports:
+            if not await is_active_device(metrics.hostname):
+                _REPORTS_REJECTED.inc()
+                results.append(ReportBatchItem(
+                    hostname=metrics.hostname, ok=False, error="Device not registered",
+                ))
+                continue
+            metrics, report, content_hash = _score_metrics(metrics, now_dt)
+            # Later reports of the same host in this batch see it as just seen
+            registered_devices[metrics.hostname] = now_dt
+            previous = batch_latest.get(metrics.hostname)
+            if previous is None:
+                repeat = _is_repeat(metrics.hostname, content_hash, report)
+            else:
+                repeat = config.REPORT_HEARTBEATS and previous == (content_hash, report.total_score)
+            batch_latest[metrics.hostname] = (content_hash, report.total_score)
+            scored.append((metrics.hostname, metrics, report))
+            hashes.append(content_hash)
+            repeats.append(repeat)
+            results.append(None)
+
+        try:
+            save_started = time.perf_counter()
+            missing = await run_in_threadpool(save_reports, scored, client_ip, repeats)
+            _STAGE_SAVE.observe(time.perf_counter() - save_started)
+            heartbeats = sum(repeats) if not missing else sum(
+                r for (hostname, _, _), r in zip(scored, repeats) if hostname not in missing
+            )
+            _REPORTS_HEARTBEAT.inc(heartbeats)
+            _REPORTS_STORED.inc(len(scored) - len(missing) - heartbeats)
+            _REPORTS_REJECTED.inc(len(missing))
+            if missing:
+                logger.warning(
+                    "REPORT batch store_skipped from_ip=%s hostnames=%s",
+                    client_ip, sorted(set(missing)),
+                )
+        except Exception as exc:
+            # G3: scores are still returned and cached when persistence fails
+            _REPORTS_STORE_FAILED.inc(len(scored))
+            logger.exception("REPORT batch store_failed from_ip=%s err=%s", client_ip, str(exc))
+
+        changed: Dict[str, ScoreReport] = {}
+        for (_, metrics, report), content_hash, repeat in zip(scored, hashes, repeats):
+            await _apply_report(metrics, report, now_dt, content_hash)
+            if repeat:
+                # A later repeat must not hide an earlier change of the same host
+                continue
+            changed[metrics.hostname] = report
+        if scored:
+            _publish_reports(changed, now_dt)
+
+        accepted = iter(scored)
+        for i, item in enumerate(results):
+            if item is None:
+                hostname, _, report = next(accepted)
+                results[i] = ReportBatchItem(
+                    hostname=hostname,
+                    ok=True,
+                    score=report.total_score,
+                    risk_level=snapshot_risk_level(report.total_score),
+                    issues=_issues_as_dicts(report),
+                )
+        logger.info(
+            "REPORT batch from_ip=%s accepted=%d rejected=%d",
+            client_ip, len(scored), len(results) - len(scored),
+        )
+        return ReportBatchResponse(
+            accepted=len(scored),
+            rejected=len(results) - len(scored),
+            results=results,
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metrics: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating reports: {str(e)}")
+
+
 @app.get(
     "/health",
     summary="Health Check",
@@ -751,6 +1535,127 @@ async def health_check():
     }
 
 
+@app.get(
+    "/debug/ws",
+    summary="WebSocket Fan-out Statistics",
+    tags=["System"]
+)
+async def ws_stats():
+    """Connected clients, queued/sent/coalesced/dropped events and send latency."""
+    return ws_broadcaster.stats()
+
+
+def _register_metric_callbacks() -> None:
+    """Gauges and counters read at scrape time from state owned by other modules."""
+    registry = telemetry.registry
+    registry.gauge_callback(
+        "operationscore_task_queue_tasks", "Agent tasks in the in-memory queue by state.",
+        lambda: {k: v for k, v in task_queue.stats().items() if k in ("queued", "leased")},
+        ("state",),
+    )
+    registry.gauge_callback(
+        "operationscore_task_queue_waiters", "Parked GET /tasks long-poll requests.",
+        lambda: task_queue.stats()["waiters"],
+    )
+    registry.gauge_callback(
+        "operationscore_ws_clients", "Connected WebSocket clients.",
+        lambda: ws_broadcaster.stats()["clients"],
+    )
+    registry.gauge_callback(
+        "operationscore_ws_queued_events", "Events waiting in WebSocket client queues.",
+        lambda: ws_broadcaster.stats()["queued_events"],
+    )
+    registry.counter_callback(
+        "operationscore_ws_events_total", "WebSocket events by result.",
+        lambda: {
+            result: ws_broadcaster.stats()[f"events_{result}"]
+            for result in ("sent", "coalesced", "dropped")
+        },
+        ("result",),
+    )
+    registry.counter_callback(
+        "operationscore_ws_frames_sent_total", "WebSocket frames sent.",
+        lambda: ws_broadcaster.stats()["frames_sent"],
+    )
+    registry.counter_callback(
+        "operationscore_ws_slow_disconnects_total", "WebSocket clients disconnected for being too slow.",
+        lambda: ws_broadcaster.stats()["slow_disconnects"],
+    )
+    registry.gauge_callback(
+        "operationscore_cache_entries", "Entries per in-memory cache.",
+        lambda: {
+            "device_metrics": len(device_metrics_cache),
+            "device_reports": len(device_reports_cache),
+            "registered_devices": len(registered_devices),
+            "response_cache": response_cache.size(),
+        },
+        ("cache",),
+    )
+    registry.gauge_callback(
+        "operationscore_active_devices", "Active devices accepted by /report.",
+        lambda: len(active_devices),
+    )
+    registry.gauge_callback(
+        "operationscore_sessions_in_memory", "Run and scan sessions held in memory.",
+        lambda: {"run": len(run_sessions), "scan": len(scan_sessions)},
+        ("kind",),
+    )
+    registry.counter_callback(
+        "operationscore_score_cache_lookups_total", "Memoized scoring lookups by result.",
+        lambda: {"hit": score_cache_stats()["hits"], "miss": score_cache_stats()["misses"]},
+        ("result",),
+    )
+    registry.counter_callback(
+        "operationscore_db_queries_total", "SQL statements executed on the server engine.",
+        lambda: query_stats.stats(limit=0)["calls"],
+    )
+    registry.gauge_callback(
+        "operationscore_cluster_peers", "Other workers connected over the cluster bus.",
+        lambda: cluster.stats()["peers"],
+    )
+    registry.counter_callback(
+        "operationscore_cluster_messages_total", "Cluster bus messages by direction.",
+        lambda: {
+            direction: cluster.stats()[f"messages_{direction}"]
+            for direction in ("sent", "received", "dropped")
+        },
+        ("direction",),
+    )
+    registry.counter_callback(
+        "operationscore_snapshot_file_writes_total", "Background snapshot file writes by result.",
+        lambda: {"ok": snapshot_store.writer_stats()["writes"], "failed": snapshot_store.writer_stats()["failures"]},
+        ("result",),
+    )
+
+
+_register_metric_callbacks()
+
+
+@app.get(
+    "/metrics",
+    summary="Prometheus Metrics",
+    tags=["System"]
+)
+async def metrics_endpoint():
+    """Counters, gauges and histograms in Prometheus text exposition format."""
+    return Response(content=telemetry.registry.render(), media_type=telemetry.CONTENT_TYPE)
+
+
+@app.get(
+    "/debug/db",
+    summary="Database Profile and Query Statistics",
+    tags=["System"]
+)
+async def db_stats(limit: int = Query(20, ge=1, le=200)):
+    """Storage profile, effective PRAGMAs, slow queries and the top statements by total time."""
+    pragmas = await run_in_threadpool(effective_pragmas, server_db.engine)
+    return {
+        "profile": server_db.DB_PROFILE,
+        "pragmas": pragmas,
+        **query_stats.stats(limit),
+    }
+
+
 @app.get(
     "/rules",
     summary="List Available Rules",
@@ -758,58 +1663,65 @@ async def health_check():
 )
 async def list_rules():
     """
-    Get information about all available health evaluation rules.
+    Get the compiled rule set currently used for scoring.
     
     Returns:
-        List of rule IDs and their evaluation purposes
+        Spec version/source/load time and, per rule, its ID, name,
+        description, metrics field and penalty tiers
     """
-    rules_info = [
-        {
-            "rule_id": "K1",
-            "name": "Pending Package Updates",
-            "description": "Checks for unpatched packages that threaten stability and security"
-        },
-        {
-            "rule_id": "K2",
-            "name": "Firewall Status",
-            "description": "Verifies that UFW firewall is enabled"
-        },
-        {
-            "rule_id": "K3",
-            "name": "SSH Root Login",
-            "description": "Ensures SSH root login is disabled to prevent direct attacks"
-        },
-        {
-            "rule_id": "K4",
-            "name": "Sudo User Privileges",
-            "description": "Checks that sudo access is limited to necessary users (≤3)"
-        },
-        {
-            "rule_id": "K5",
-            "name": "Unnecessary Services",
-            "description": "Identifies resource-wasting and unnecessary background services"
-        },
-        {
-            "rule_id": "K6",
-            "name": "Disk Usage",
-            "description": "Monitors disk capacity to ensure system stability"
-        },
-        {
-            "rule_id": "K7",
-            "name": "Password Policy",
-            "description": "Verifies that password policies meet compliance requirements"
-        },
-        {
-            "rule_id": "K8",
-            "name": "Zombie Device Detection",
-            "description": "Identifies devices that haven't reported recently"
-        }
+    return rule_spec.current().describe()
+
+
+@app.post(
+    "/rules/reload",
+    summary="Reload Rule Spec",
+    tags=["Scoring"]
+)
+async def reload_rules():
+    """
+    Recompile the rule spec from disk now instead of waiting for the
+    periodic change check. An invalid spec returns 400 and the previous
+    rules stay active.
+    """
+    try:
+        rule_set = rule_spec.reload()
+    except RuleSpecError as exc:
+        raise http_400(f"Invalid rule spec: {exc}")
+    return {"ok": True, "version": rule_set.version, "total_rules": len(rule_set)}
+
+
+def _build_latest_reports() -> LatestReportsResponse:
+    # Runs on the event loop without awaiting, so the caches cannot change mid-read
+    devices_list: List[DeviceScore] = []
+    for hostname, report_data in device_reports_cache.items():
+        metrics = device_metrics_cache.get(hostname)
+        report = report_data.get("report")
+
+        if metrics and report:
+            device_score = DeviceScore(
+                hostname=hostname,
+                timestamp=metrics.timestamp,
+                final_score=report.total_score,
+                risk_level=calculate_risk_level(report.total_score),
+                issues=report.issues
+            )
+            devices_list.append(device_score)
+
+    return LatestReportsResponse(
+        device_count=len(devices_list),
+        cache_timestamp=datetime.now(),
+        devices=devices_list
+    )
+
+
+def _build_devices() -> DevicesResponse:
+    devices_list = [
+        RegisteredDevice(hostname=hostname, last_seen=last_seen)
+        for hostname, last_seen in registered_devices.items()
     ]
-    
-    return {
-        "total_rules": len(rules_info),
-        "rules": rules_info
-    }
+    # Sort by hostname for consistent ordering
+    devices_list.sort(key=lambda d: d.hostname)
+    return DevicesResponse(device_count=len(devices_list), devices=devices_list)
 
 
 @app.get(
@@ -818,7 +1730,7 @@ async def list_rules():
     summary="Get Latest Reports for All Devices",
     tags=["Reporting"]
 )
-async def get_latest_reports():
+async def get_latest_reports(request: Request):
     """
     Retrieve the latest operational health scores for all devices in cache.
     
@@ -839,8 +1751,9 @@ async def get_latest_reports():
     Notes:
         - Returns only anlık (instant) data from in-memory cache
         - No historical data is stored
-        - Device data persists in cache until server restarts
+        - The cache is refilled from the latest stored reports at startup
         - Devices are cached when POST /report is called with their metrics
+        - The serialized response is cached until the next ingest (ETag / 304)
     
     Example Response:
         {
@@ -872,29 +1785,7 @@ async def get_latest_reports():
         }
     """
     try:
-        devices_list: List[DeviceScore] = []
-        
-        # Read cached reports safely
-        async with cache_lock:
-            for hostname, report_data in device_reports_cache.items():
-                metrics = device_metrics_cache.get(hostname)
-                report = report_data.get("report")
-                
-                if metrics and report:
-                    device_score = DeviceScore(
-                        hostname=hostname,
-                        timestamp=metrics.timestamp,
-                        final_score=report.total_score,
-                        risk_level=calculate_risk_level(report.total_score),
-                        issues=report.issues
-                    )
-                    devices_list.append(device_score)
-        
-        return LatestReportsResponse(
-            device_count=len(devices_list),
-            cache_timestamp=datetime.now(),
-            devices=devices_list
-        )
+        return response_cache.cached_json(request, "latest_reports", _build_latest_reports)
     
     except Exception as e:
         raise HTTPException(
@@ -909,7 +1800,7 @@ async def get_latest_reports():
     summary="Get Registered Devices",
     tags=["Device Management"]
 )
-async def get_devices():
+async def get_devices(request: Request):
     """
     Retrieve the list of all registered devices in the device registry.
     
@@ -930,8 +1821,8 @@ async def get_devices():
     
     Notes:
         - Returns only devices that have submitted at least one report
-        - This endpoint safely reads from the registry using async locks
-        - Device data persists in registry until server restarts
+        - The serialized response is cached until the next ingest (ETag / 304)
+        - The registry is refilled from the database at startup (last_seen kept)
         - Provides device discovery for fleet management queries
     
     Example Response:
@@ -950,24 +1841,7 @@ async def get_devices():
         }
     """
     try:
-        devices_list: List[RegisteredDevice] = []
-        
-        # Read device registry safely
-        async with device_registry_lock:
-            for hostname, last_seen in registered_devices.items():
-                device = RegisteredDevice(
-                    hostname=hostname,
-                    last_seen=last_seen
-                )
-                devices_list.append(device)
-        
-        # Sort by hostname for consistent ordering
-        devices_list.sort(key=lambda d: d.hostname)
-        
-        return DevicesResponse(
-            device_count=len(devices_list),
-            devices=devices_list
-        )
+        return response_cache.cached_json(request, "devices", _build_devices)
     
     except Exception as e:
         raise HTTPException(
@@ -1030,44 +1904,17 @@ async def broadcast_tasks(request_body: BroadcastRequest):
             else:
                 hostnames = list(registered_devices.keys())
 
-            devices_targeted = 0
-            
-            # Create scan session and queue tasks atomically
-            async with task_queue_lock, scan_session_lock, run_lock:
-                # Initialize scan session
-                scan_sessions[run_id] = {
-                    "created_at": timestamp,
-                    "devices": {hostname: "pending" for hostname in hostnames}
-                }
-                
-                # Initialize run session for tracking reports
-                # devices dict tracks each device with status (pending/completed) and its report
-                run_sessions[run_id] = {
-                    "run_id": run_id,
-                    "started_at": timestamp,
-                    "reports": {},  # Keep for backward compatibility
-                    "devices": {
-                        hostname: {"status": "pending", "report": None}
-                        for hostname in hostnames
-                    }
-                }
-                logger.info(f"Created run {run_id} with {len(hostnames)} target devices")
-                
-                # Set current_run_id globally (will be used by POST /report)
-                global current_run_id
-                current_run_id = run_id
-                
-                # Queue tasks for each registered device
-                for hostname in hostnames:
-                    if hostname not in task_queues:
-                        task_queues[hostname] = []
-                    task = Task(
-                        task_id=str(uuid4()),
-                        command=command,
-                        created_at=timestamp
-                    )
-                    task_queues[hostname].append(task)
-                    devices_targeted += 1
+            # Archive expired sessions, then create the scan and run sessions
+            await scan_sessions.evict_expired()
+            await run_sessions.evict_expired()
+            _start_run(run_id, timestamp, hostnames, scan=True)
+            logger.info(f"Created run {run_id} with {len(hostnames)} target devices")
+
+            # Queue tasks for each registered device (one DB transaction)
+            queued = await task_queue.enqueue_many(
+                hostnames, command, run_id=run_id, created_at=timestamp
+            )
+            devices_targeted = len(queued)
 
             return BroadcastResponse(
                 run_id=run_id,
@@ -1136,20 +1983,10 @@ async def create_task(hostname: str, request_body: dict):
                 detail="Missing or empty 'command' field in request body"
             )
         
-        # Create task with UUID and current timestamp
-        task = Task(
-            task_id=str(uuid4()),
-            command=command,
-            created_at=datetime.now()
-        )
-        
-        # Add task to device's queue (create queue if doesn't exist)
-        async with task_queue_lock:
-            if hostname not in task_queues:
-                task_queues[hostname] = []
-            task_queues[hostname].append(task)
+        # Persist and add to the device's queue (UUID + current timestamp)
+        item = await task_queue.enqueue(hostname, command)
         
-        return task
+        return _task_from_item(item)
     
     except HTTPException:
         raise
@@ -1165,16 +2002,28 @@ async def create_task(hostname: str, request_body: dict):
     summary="Dequeue a Task for a Device",
     tags=["Task Management"]
 )
-async def get_task(hostname: str, response: Response):
+async def get_task(
+    hostname: str,
+    response: Response,
+    wait: int = Query(0, ge=0, description="Long-poll: seconds to wait for a task (capped)"),
+):
     """
-    Retrieve and remove the oldest pending task for a device.
+    Retrieve and lease the oldest pending task for a device.
     
     Implements FIFO (First-In-First-Out) queue semantics. Returns the oldest
-    task in the queue for the device and removes it. Subsequent calls will
-    return the next task in line.
+    task in the queue for the device and leases it for TASK_LEASE_SECONDS
+    (advertised in the "X-Task-Lease-Seconds" header). A task that is not
+    acknowledged in time — POST /tasks/{hostname}/{task_id}/ack, or a /report
+    for run_scan — is delivered again, up to TASK_MAX_ATTEMPTS times.
+    
+    With ?wait=N (N capped at TASK_LONG_POLL_MAX_SECONDS) an empty queue does
+    not answer 204 immediately: the request parks until a task is queued for
+    the device or N seconds pass. Every response carries "X-Long-Poll: 1" so
+    agents know the server waited and can poll again without sleeping.
     
     Args:
         hostname: Target device hostname
+        wait: Long-poll timeout in seconds (0 = return immediately)
     
     Returns:
         Task containing:
@@ -1202,19 +2051,17 @@ async def get_task(hostname: str, response: Response):
     Example Response (when no tasks pending):
         HTTP/1.1 204 No Content
     """
+    response.headers["X-Long-Poll"] = "1"
+    response.headers["X-Task-Lease-Seconds"] = str(config.TASK_LEASE_SECONDS)
     try:
-        # Retrieve and remove oldest task (FIFO)
-        async with task_queue_lock:
-            # Check if queue exists and has tasks
-            if hostname not in task_queues or not task_queues[hostname]:
-                # No tasks - return 204 No Content
-                response.status_code = 204
-                return
-            
-            # Pop oldest task from queue (index 0 = FIFO)
-            task = task_queues[hostname].pop(0)
+        # Lease oldest task (FIFO), waiting up to the capped long-poll timeout
+        item = await task_queue.dequeue(hostname, wait=min(wait, config.TASK_LONG_POLL_MAX_SECONDS))
+        if item is None:
+            # No tasks - return 204 No Content
+            response.status_code = 204
+            return
         
-        return task
+        return _task_from_item(item)
     
     except Exception as e:
         raise HTTPException(
@@ -1223,6 +2070,24 @@ async def get_task(hostname: str, response: Response):
         )
 
 
+@app.post(
+    "/tasks/{hostname}/{task_id}/ack",
+    summary="Acknowledge a Leased Task",
+    tags=["Task Management"]
+)
+async def ack_task(hostname: str, task_id: str):
+    """
+    Mark a task delivered by GET /tasks/{hostname} as done so its lease is not
+    re-queued. run_scan tasks are acknowledged implicitly by the agent's /report.
+    
+    Raises:
+        HTTPException(404): If the task is not currently leased to this device
+    """
+    if not await task_queue.ack(hostname, task_id):
+        raise http_404(f"Task '{task_id}' is not leased to '{hostname}'")
+    return {"ok": True, "task_id": task_id}
+
+
 @app.get(
     "/scan_sessions/{run_id}",
     response_model=ScanSessionResponse,
@@ -1275,20 +2140,19 @@ async def get_scan_session(run_id: str):
         }
     """
     try:
-        # Retrieve scan session safely
-        async with scan_session_lock:
-            if run_id not in scan_sessions:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Scan session '{run_id}' not found"
-                )
-            
-            session_data = scan_sessions[run_id]
-            return ScanSessionResponse(
-                run_id=run_id,
-                created_at=session_data["created_at"],
-                devices=session_data["devices"]
+        # Retrieve scan session (memory, then archive)
+        session = await scan_sessions.get(run_id)
+        if session is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Scan session '{run_id}' not found"
             )
+        
+        return ScanSessionResponse(
+            run_id=run_id,
+            created_at=session.started_at,
+            devices=session.statuses()
+        )
     
     except HTTPException:
         raise
@@ -1622,36 +2486,15 @@ async def start_run():
         run_id = str(uuid4())
         started_at = datetime.now()
         
-        # Initialize run session in single global storage
-        async with run_lock:
-            run_sessions[run_id] = {
-                "run_id": run_id,
-                "started_at": started_at,
-                "reports": {},  # Keep for backward compatibility
-                "devices": {
-                    hostname: {"status": "pending", "report": None}
-                    for hostname in target_devices
-                }
-            }
-            logger.info(f"Started run {run_id} with {len(target_devices)} target devices")
-            
-            # Set current_run_id globally (will be used by POST /report)
-            global current_run_id
-            current_run_id = run_id
+        # Archive expired runs, then initialize this one
+        await run_sessions.evict_expired()
+        _start_run(run_id, started_at, target_devices, scan=False)
+        logger.info(f"Started run {run_id} with {len(target_devices)} target devices")
         
-        # Broadcast "run_scan" task to all target devices
-        devices_targeted = 0
-        async with task_queue_lock:
-            for hostname in target_devices:
-                if hostname not in task_queues:
-                    task_queues[hostname] = []
-                task = Task(
-                    task_id=str(uuid4()),
-                    command="run_scan",
-                    created_at=started_at
-                )
-                task_queues[hostname].append(task)
-                devices_targeted += 1
+        # Broadcast "run_scan" task to all target devices (one DB transaction)
+        await task_queue.enqueue_many(
+            target_devices, "run_scan", run_id=run_id, created_at=started_at
+        )
         
         return RunStartResponse(
             run_id=run_id,
@@ -1688,7 +2531,8 @@ async def list_runs() -> Dict[str, Any]:
     
     Notes:
         - Returns empty list if no runs have been executed
-        - Runs persist in memory until server restarts
+        - Runs are archived to SQLite RUN_SESSION_TTL_SECONDS after they finish
+          and are still listed here
     
     Example Response:
         {
@@ -1708,18 +2552,15 @@ async def list_runs() -> Dict[str, Any]:
         }
     """
     try:
-        runs_list: List[RunSummary] = []
-        
-        # Read all run sessions safely
-        async with run_lock:
-            for run_id, run_data in run_sessions.items():
-                device_count = len(run_data.get("reports", {}))
-                summary = RunSummary(
-                    run_id=run_id,
-                    started_at=run_data["started_at"],
-                    device_count=device_count
-                )
-                runs_list.append(summary)
+        # In-memory and archived runs; device_count is a maintained counter
+        runs_list: List[RunSummary] = [
+            RunSummary(
+                run_id=item["run_id"],
+                started_at=item["started_at"],
+                device_count=item["reported_count"]
+            )
+            for item in await run_sessions.summaries()
+        ]
         
         # Sort by started_at descending (newest first)
         runs_list.sort(key=lambda r: r.started_at, reverse=True)
@@ -1790,50 +2631,39 @@ async def get_run_detail(run_id: str):
         }
     """
     try:
-        # Retrieve run session safely
-        async with run_lock:
-            if run_id not in run_sessions:
-                logger.warning(f"Run ID not found: {run_id}")
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Run session '{run_id}' not found"
-                )
-            
-            run_data = run_sessions[run_id]
-            logger.debug(f"Retrieved run {run_id} with {len(run_data.get('devices', {}))} target devices")
-            
-            # Convert stored device status/reports to RunDeviceStatus objects
-            device_status_map: Dict[str, RunDeviceStatus] = {}
-            for hostname, device_info in run_data.get("devices", {}).items():
-                status = device_info.get("status", "pending")
-                raw_report = device_info.get("report")
-                
-                # Convert raw report to DeviceScore if completed
-                device_score = None
-                if status == "completed" and raw_report:
-                    # Get the metrics from cache for timestamp
-                    async with cache_lock:
-                        metrics = device_metrics_cache.get(hostname)
-                    
-                    if metrics:
-                        device_score = DeviceScore(
-                            hostname=hostname,
-                            timestamp=metrics.timestamp,
-                            final_score=raw_report.total_score,
-                            risk_level=calculate_risk_level(raw_report.total_score),
-                            issues=raw_report.issues
-                        )
-                
-                device_status_map[hostname] = RunDeviceStatus(
-                    status=status,
-                    report=device_score
+        # Retrieve run session (memory, then archive)
+        session = await run_sessions.get(run_id)
+        if session is None:
+            logger.warning(f"Run ID not found: {run_id}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"Run session '{run_id}' not found"
+            )
+        logger.debug(f"Retrieved run {run_id} with {session.total} target devices")
+        
+        # Convert stored device results to RunDeviceStatus objects
+        device_status_map: Dict[str, RunDeviceStatus] = {}
+        for hostname, result in session.devices.items():
+            device_score = None
+            if result is not None:
+                device_score = DeviceScore(
+                    hostname=hostname,
+                    timestamp=result["timestamp"],
+                    final_score=result["score"],
+                    risk_level=calculate_risk_level(result["score"]),
+                    issues=result["issues"]
                 )
             
-            return RunDetail(
-                run_id=run_id,
-                started_at=run_data["started_at"],
-                devices=device_status_map
+            device_status_map[hostname] = RunDeviceStatus(
+                status="pending" if result is None else "completed",
+                report=device_score
             )
+        
+        return RunDetail(
+            run_id=run_id,
+            started_at=session.started_at,
+            devices=device_status_map
+        )
     
     except HTTPException:
         raise
@@ -1903,55 +2733,29 @@ async def get_run_summary(run_id: str):
         }
     """
     try:
-        # Retrieve run session safely
-        async with run_lock:
-            if run_id not in run_sessions:
-                logger.warning(f"Run ID not found for summary: {run_id}")
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Run session '{run_id}' not found"
-                )
-            
-            run_data = run_sessions[run_id]
-            devices_dict = run_data.get("devices", {})
-            
-            # Calculate statistics
-            total_devices = len(devices_dict)
-            completed_devices = 0
-            pending_devices = 0
-            total_score = 0.0
-            
-            for hostname, device_info in devices_dict.items():
-                status = device_info.get("status", "pending")
-                
-                if status == "completed":
-                    completed_devices += 1
-                    raw_report = device_info.get("report")
-                    
-                    # Accumulate score from completed devices
-                    if raw_report and hasattr(raw_report, "total_score"):
-                        total_score += raw_report.total_score
-                else:
-                    pending_devices += 1
-            
-            # Calculate average score
-            average_score = None
-            if completed_devices > 0:
-                average_score = total_score / completed_devices
-            
-            logger.debug(
-                f"Run {run_id} summary: {total_devices} total, "
-                f"{completed_devices} completed, {pending_devices} pending, "
-                f"avg_score={average_score}"
-            )
-            
-            return RunSummaryDetail(
-                run_id=run_id,
-                total_devices=total_devices,
-                completed_devices=completed_devices,
-                pending_devices=pending_devices,
-                average_score=average_score
+        # Retrieve run session (memory, then archive)
+        session = await run_sessions.get(run_id)
+        if session is None:
+            logger.warning(f"Run ID not found for summary: {run_id}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"Run session '{run_id}' not found"
             )
+        
+        # Statistics come from counters maintained as reports arrive
+        logger.debug(
+            f"Run {run_id} summary: {session.total} total, "
+            f"{session.completed} completed, {session.pending} pending, "
+            f"avg_score={session.average_score}"
+        )
+        
+        return RunSummaryDetail(
+            run_id=run_id,
+            total_devices=session.total,
+            completed_devices=session.completed,
+            pending_devices=session.pending,
+            average_score=session.average_score
+        )
     
     except HTTPException:
         raise
@@ -2021,47 +2825,28 @@ async def get_run_progress(run_id: str):
         }
     """
     try:
-        # Retrieve run session safely
-        async with run_lock:
-            if run_id not in run_sessions:
-                logger.warning(f"Run ID not found for progress: {run_id}")
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Run session '{run_id}' not found"
-                )
-            
-            run_data = run_sessions[run_id]
-            devices_dict = run_data.get("devices", {})
-            
-            # Calculate progress metrics
-            total_devices = len(devices_dict)
-            completed = 0
-            pending = 0
-            
-            for hostname, device_info in devices_dict.items():
-                status = device_info.get("status", "pending")
-                if status == "completed":
-                    completed += 1
-                else:
-                    pending += 1
-            
-            # Calculate completion percentage
-            completion_percent = 0.0
-            if total_devices > 0:
-                completion_percent = (completed / total_devices) * 100.0
-            
-            logger.debug(
-                f"Run {run_id} progress: {completed}/{total_devices} devices "
-                f"({completion_percent:.1f}% complete)"
-            )
-            
-            return RunProgress(
-                run_id=run_id,
-                total_devices=total_devices,
-                completed=completed,
-                pending=pending,
-                completion_percent=completion_percent
+        # Retrieve run session (memory, then archive)
+        session = await run_sessions.get(run_id)
+        if session is None:
+            logger.warning(f"Run ID not found for progress: {run_id}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"Run session '{run_id}' not found"
             )
+        
+        # Progress comes from counters maintained as reports arrive
+        logger.debug(
+            f"Run {run_id} progress: {session.completed}/{session.total} devices "
+            f"({session.completion_percent:.1f}% complete)"
+        )
+        
+        return RunProgress(
+            run_id=run_id,
+            total_devices=session.total,
+            completed=session.completed,
+            pending=session.pending,
+            completion_percent=session.completion_percent
+        )
     
     except HTTPException:
         raise
@@ -2092,11 +2877,14 @@ async def api_register(payload: _RegisterPayload, request: Request):
     Authenticate with username/password and register the device.
     Returns device_type (SERVER or CLIENT) on success, 401 on failure.
     """
-    ok, role = verify_register_credentials(payload.username, payload.password)
+    source_ip = request.client.host if request.client else payload.ip
+    ok, role = await verify_credentials(payload.username, payload.password, source_ip)
     if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials or registration not permitted.")
-    source_ip = request.client.host if request.client else payload.ip
     upsert_device(payload.hostname, payload.ip, role, source_ip=source_ip)
+    score_distribution.set_device_type(payload.hostname, role)
+    response_cache.bump()
+    _publish_device_change(payload.hostname, removed=False)
     return {"ok": True, "device_type": role, "hostname": payload.hostname}
 
 
@@ -2137,18 +2925,17 @@ async def api_fleet_history(limit: int = 200):
 async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint for real-time snapshot updates.
-    On connect: add to ws_clients. On disconnect: remove from ws_clients.
+    Frames are single events or {"type": "batch", "events": [...]}; see
+    server/ws_broadcaster.py for coalescing and slow-client handling.
     """
-    await ws_manager.connect(websocket)
-    ws_clients.add(websocket)
+    await ws_broadcaster.connect(websocket)
     try:
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
         pass
     finally:
-        ws_manager.disconnect(websocket)
-        ws_clients.discard(websocket)
+        await ws_broadcaster.disconnect(websocket)
 
 
 if __name__ == "__main__":
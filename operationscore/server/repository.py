@@ -7,19 +7,39 @@ No db: Session parameter is passed by the caller.
 
 from __future__ import annotations
 
+import base64
+import binascii
 import json
 from collections import defaultdict
-from datetime import datetime, timezone
-from typing import Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Iterator, Optional
 
 import bcrypt
-from sqlalchemy import asc, desc
+from sqlalchemy import Integer, asc, case, cast, desc, func, insert, or_, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from server import config, downsample
 from server.db import SessionLocal
-from server.db_models import AuthAccount, Device, DeviceReport
+from server.db_models import (
+    AgentTask,
+    AuthAccount,
+    Device,
+    DeviceChange,
+    DeviceHeartbeat,
+    DeviceReport,
+    DeviceReportMetrics,
+    DeviceTrend,
+    FleetRollup,
+    ReportHeartbeat,
+    RunSessionArchive,
+)
+from server.device_registry import active_devices
 
 MAX_REPORTS_PER_DEVICE = 500
 
+# Fleet rollup resolutions: API name → bucket width in seconds
+FLEET_ROLLUP_RESOLUTIONS: dict[str, int] = {"1m": 60, "15m": 900, "1h": 3600}
+
 
 # ---------------------------------------------------------------------------
 # Internal helpers
@@ -48,6 +68,11 @@ def _parse_ts(value: Any) -> datetime:
     return _utcnow()
 
 
+def _as_utc(dt: datetime) -> datetime:
+    """SQLite returns naive datetimes; stored values are UTC."""
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
 def _derive_risk_level(score: float) -> str:
     if score < 40:
         return "CRITICAL"
@@ -85,6 +110,99 @@ def _get_issues(report: Any) -> list:
     return []
 
 
+def _is_critical(score: float, risk_level: str) -> bool:
+    return risk_level == "CRITICAL" or score < 40
+
+
+def _bucket_start(dt: datetime, seconds: int) -> datetime:
+    """Floor *dt* (converted to UTC) to the start of its *seconds*-wide bucket."""
+    dt = dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    epoch = int(dt.astimezone(timezone.utc).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc)
+
+
+def _update_fleet_rollups(
+    db: Any,
+    collected_at: datetime,
+    device_type: str,
+    score: float,
+    critical: int,
+    count: int = 1,
+) -> None:
+    """
+    Add one report to every fleet_rollup resolution (single upsert
+    statement). With count=0, *score* and *critical* are the changes of
+    reports already counted (rescoring); they only update existing buckets,
+    so a bucket pruned by retention is not recreated.
+    """
+    is_server = device_type == "SERVER"
+    if not count:
+        for seconds in FLEET_ROLLUP_RESOLUTIONS.values():
+            db.execute(
+                update(FleetRollup)
+                .where(
+                    FleetRollup.resolution == seconds,
+                    FleetRollup.bucket_start == _bucket_start(collected_at, seconds),
+                )
+                .values(
+                    server_sum=FleetRollup.server_sum + (score if is_server else 0.0),
+                    client_sum=FleetRollup.client_sum + (0.0 if is_server else score),
+                    critical_count=FleetRollup.critical_count + int(critical),
+                )
+            )
+        return
+    rows = [
+        {
+            "resolution":     seconds,
+            "bucket_start":   _bucket_start(collected_at, seconds),
+            "server_sum":     score if is_server else 0.0,
+            "server_count":   count if is_server else 0,
+            "client_sum":     0.0 if is_server else score,
+            "client_count":   0 if is_server else count,
+            "critical_count": int(critical),
+        }
+        for seconds in FLEET_ROLLUP_RESOLUTIONS.values()
+    ]
+    stmt = sqlite_insert(FleetRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FleetRollup.resolution, FleetRollup.bucket_start],
+        set_={
+            "server_sum":     FleetRollup.server_sum     + stmt.excluded.server_sum,
+            "server_count":   FleetRollup.server_count   + stmt.excluded.server_count,
+            "client_sum":     FleetRollup.client_sum     + stmt.excluded.client_sum,
+            "client_count":   FleetRollup.client_count   + stmt.excluded.client_count,
+            "critical_count": FleetRollup.critical_count + stmt.excluded.critical_count,
+        },
+    )
+    db.execute(stmt)
+
+
+def _metric_columns(data: Any, collected_at: datetime) -> Optional[dict]:
+    """
+    device_report_metrics columns for a metrics dict, or None when a K1–K10
+    input is missing or malformed (legacy rows keep only their metrics_json).
+    """
+    try:
+        services = data.get("unnecessary_services") or []
+        if not isinstance(services, list):
+            return None
+        return {
+            "collected_ts":               int(_parse_ts(collected_at).timestamp()),
+            "update_count":               int(data["update_count"]),
+            "firewall_enabled":           bool(data["firewall_enabled"]),
+            "ssh_root_login_allowed":     bool(data["ssh_root_login_allowed"]),
+            "sudo_users_count":           int(data["sudo_users_count"]),
+            "unnecessary_services_count": len(services),
+            "disk_usage_percent":         float(data["disk_usage_percent"]),
+            "password_policy_ok":         bool(data["password_policy_ok"]),
+            "last_seen_minutes":          int(data["last_seen_minutes"]),
+            "ram_usage_percent":          float(data.get("ram_usage_percent") or 0.0),
+            "cpu_usage_percent":          float(data.get("cpu_usage_percent") or 0.0),
+        }
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
 def _dump(obj: Any) -> Any:
     if obj is None:
         return None
@@ -103,10 +221,11 @@ def _dump(obj: Any) -> Any:
 # 1. verify_register_credentials
 # ---------------------------------------------------------------------------
 
-def verify_register_credentials(username: str, password: str) -> tuple[bool, Optional[str]]:
+def get_register_account(username: str) -> Optional[tuple[str, str]]:
     """
-    Check username/password against auth_accounts.
-    Returns (True, role) on success, (False, None) otherwise.
+    Return (password_hash, role) for an account allowed to register devices,
+    or None if the username is unknown or can_register is False.
+    No password check — callers run bcrypt themselves (see server/credentials.py).
     """
     db = SessionLocal()
     try:
@@ -116,17 +235,31 @@ def verify_register_credentials(username: str, password: str) -> tuple[bool, Opt
             .first()
         )
         if account is None or not account.can_register:
+            return None
+        return account.password_hash, account.role
+    finally:
+        db.close()
+
+
+def verify_register_credentials(username: str, password: str) -> tuple[bool, Optional[str]]:
+    """
+    Check username/password against auth_accounts.
+    Returns (True, role) on success, (False, None) otherwise.
+    Blocking (bcrypt) — async routes use server.credentials.verify_credentials.
+    """
+    try:
+        account = get_register_account(username)
+        if account is None:
             return False, None
+        password_hash, role = account
 
         match = bcrypt.checkpw(
             password.encode("utf-8"),
-            account.password_hash.encode("utf-8"),
+            password_hash.encode("utf-8"),
         )
-        return (True, account.role) if match else (False, None)
+        return (True, role) if match else (False, None)
     except Exception:
         return False, None
-    finally:
-        db.close()
 
 
 # ---------------------------------------------------------------------------
@@ -139,7 +272,7 @@ def upsert_device(
     device_type: str,
     source_ip: Optional[str] = None,
 ) -> None:
-    """Insert or update a Device row."""
+    """Insert or update (and reactivate) a Device row; updates the registry cache."""
     db = SessionLocal()
     try:
         now = _utcnow()
@@ -147,7 +280,7 @@ def upsert_device(
             db.query(Device).filter(Device.hostname == hostname).first()
         )
         if device is None:
-            db.add(Device(
+            device = Device(
                 hostname=hostname,
                 registered_ip=registered_ip,
                 last_seen_ip=source_ip or registered_ip,
@@ -155,16 +288,42 @@ def upsert_device(
                 registered_at=now,
                 last_seen_at=now,
                 is_active=True,
-            ))
+            )
+            db.add(device)
+            db.flush()
         else:
             device.registered_ip = registered_ip
             device.device_type = device_type
             device.last_seen_at = now
+            device.is_active = True
             if source_ip:
                 device.last_seen_ip = source_ip
+        _touch_devices(db, [device.id])
+        db.commit()
+    finally:
+        db.close()
+    active_devices.add(hostname)
+
+
+def deactivate_device(hostname: str) -> bool:
+    """
+    Soft-delete a device (is_active=False); its reports are kept.
+    Returns False if no such device exists. Updates the registry cache.
+    """
+    db = SessionLocal()
+    try:
+        device: Optional[Device] = (
+            db.query(Device).filter(Device.hostname == hostname).first()
+        )
+        if device is None:
+            return False
+        device.is_active = False
+        _touch_devices(db, [device.id], removed=True)
         db.commit()
     finally:
         db.close()
+    active_devices.discard(hostname)
+    return True
 
 
 # ---------------------------------------------------------------------------
@@ -184,10 +343,146 @@ def is_registered(hostname: str) -> bool:
         db.close()
 
 
+def get_device_types(hostnames: Optional[list[str]] = None) -> dict[str, str]:
+    """hostname → device_type of the active devices (only *hostnames* when given)."""
+    db = SessionLocal()
+    try:
+        query = db.query(Device.hostname, Device.device_type).filter(Device.is_active == True)  # noqa: E712
+        if hostnames is not None:
+            query = query.filter(Device.hostname.in_(hostnames))
+        return {hostname: device_type for hostname, device_type in query.all()}
+    finally:
+        db.close()
+
+
+def list_active_hostnames() -> list[str]:
+    """Hostnames of every active device (warms the registry cache at startup)."""
+    db = SessionLocal()
+    try:
+        return [
+            row[0] for row in
+            db.query(Device.hostname).filter(Device.is_active == True).all()  # noqa: E712
+        ]
+    finally:
+        db.close()
+
+
 # ---------------------------------------------------------------------------
 # 4. save_report
 # ---------------------------------------------------------------------------
 
+def serialize_report(metrics: Any, report: Any) -> dict:
+    """Score columns of a DeviceReport row (total_score … actions_json) for *report*."""
+    # Score / risk
+    total_score = _get_score(report)
+    risk_level = _get_risk_level(report)
+
+    # Issues
+    issues = _get_issues(report)
+    issues_sorted = sorted(
+        issues,
+        key=lambda i: -float(getattr(i, "penalty", 0) or i.get("penalty", 0) if isinstance(i, dict) else getattr(i, "penalty", 0)),
+    )
+
+    top_reasons, actions = [], []
+    for issue in issues_sorted[:3]:
+        rule_id = getattr(issue, "rule_id", None) or (issue.get("rule_id", "K?") if isinstance(issue, dict) else "K?")
+        message  = getattr(issue, "message",  None) or (issue.get("message",  "")  if isinstance(issue, dict) else "")
+        rec      = getattr(issue, "recommendation", None) or (issue.get("recommendation", "") if isinstance(issue, dict) else "")
+        top_reasons.append(f"{rule_id} {message}")
+        actions.append(rec[:120] + "..." if len(rec) > 120 else rec)
+
+    return {
+        "total_score":      total_score,
+        "risk_level":       risk_level,
+        "issues_json":      json.dumps([_dump(i) for i in issues], default=str, ensure_ascii=False),
+        "top_reasons_json": json.dumps(top_reasons,                ensure_ascii=False),
+        "actions_json":     json.dumps(actions,                    ensure_ascii=False),
+    }
+
+
+def _collected_at(metrics: Any, now: datetime) -> datetime:
+    ts_raw = getattr(metrics, "timestamp", None) or (
+        metrics.get("timestamp") if isinstance(metrics, dict) else None
+    )
+    return _parse_ts(ts_raw) if ts_raw is not None else now
+
+
+def _touch_devices(db: Any, device_ids: list[int], removed: bool = False) -> None:
+    """
+    Give each device a new change generation (MAX + 1, in the caller's
+    transaction). The write lock SQLite takes for the statement makes the
+    generations unique and increasing across connections and workers.
+    """
+    for device_id in device_ids:
+        next_generation = (
+            select(func.coalesce(func.max(DeviceChange.generation), 0) + 1).scalar_subquery()
+        )
+        stmt = sqlite_insert(DeviceChange).values(
+            device_id=device_id, generation=next_generation, removed=removed,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DeviceChange.device_id],
+            set_={"generation": next_generation, "removed": removed},
+        )
+        db.execute(stmt)
+
+
+def _add_report(db: Any, device: Device, metrics: Any, report: Any, source_ip: str, now: datetime) -> None:
+    """Stage one DeviceReport row, its fleet_rollup increments and last_seen_* updates."""
+    device.last_seen_at = now
+    device.last_seen_ip = source_ip
+    collected_at = _collected_at(metrics, now)
+
+    columns = serialize_report(metrics, report)
+    data = _dump(metrics)
+    typed = _metric_columns(data, collected_at)
+    db.add(DeviceReport(
+        device_id=device.id,
+        collected_at=collected_at,
+        metrics_json=json.dumps(data, default=str, ensure_ascii=False),
+        typed_metrics=DeviceReportMetrics(device_id=device.id, **typed) if typed else None,
+        **columns,
+    ))
+    _update_fleet_rollups(
+        db, collected_at, device.device_type, columns["total_score"],
+        _is_critical(columns["total_score"], columns["risk_level"]),
+    )
+    device.trend = _step_trend(
+        device.trend, device.id, collected_at, columns["total_score"], columns["risk_level"]
+    )
+
+
+def _enforce_report_retention(db: Any, device_id: int) -> None:
+    """Keep at most MAX_REPORTS_PER_DEVICE reports for one device (oldest deleted)."""
+    db.flush()
+    count: int = (
+        db.query(DeviceReport)
+        .filter(DeviceReport.device_id == device_id)
+        .count()
+    )
+    if count > MAX_REPORTS_PER_DEVICE:
+        excess = count - MAX_REPORTS_PER_DEVICE
+        oldest_ids = [
+            row[0] for row in (
+                db.query(DeviceReport.id)
+                .filter(DeviceReport.device_id == device_id)
+                .order_by(asc(DeviceReport.collected_at))
+                .limit(excess)
+                .all()
+            )
+        ]
+        db.query(DeviceReportMetrics).filter(
+            DeviceReportMetrics.report_id.in_(oldest_ids)
+        ).delete(synchronize_session=False)
+        db.query(ReportHeartbeat).filter(
+            ReportHeartbeat.report_id.in_(oldest_ids)
+        ).delete(synchronize_session=False)
+        db.query(DeviceReport).filter(
+            DeviceReport.id.in_(oldest_ids)
+        ).delete(synchronize_session=False)
+
+
 def save_report(
     hostname: str,
     metrics: Any,
@@ -206,74 +501,122 @@ def save_report(
         if device is None:
             raise ValueError(f"Device '{hostname}' not registered — cannot save report.")
 
-        now = _utcnow()
-        device.last_seen_at = now
-        device.last_seen_ip = source_ip
+        _add_report(db, device, metrics, report, source_ip, _utcnow())
+        _enforce_report_retention(db, device.id)
+        _touch_devices(db, [device.id])
+        db.commit()
+    finally:
+        db.close()
 
-        # Timestamp
-        ts_raw = getattr(metrics, "timestamp", None) or (
-            metrics.get("timestamp") if isinstance(metrics, dict) else None
-        )
-        collected_at = _parse_ts(ts_raw) if ts_raw is not None else now
 
-        # Score / risk
-        total_score = _get_score(report)
-        risk_level = _get_risk_level(report)
+def _add_heartbeat(db: Any, device: Device, metrics: Any, report: Any, source_ip: str, now: datetime) -> bool:
+    """
+    Stage a heartbeat for a report that repeats the device's latest stored
+    report: bump device_heartbeats, report_heartbeats, fleet_rollup and
+    last_seen_* only.
+    Returns False (nothing staged) if the latest report has a different score.
+    """
+    db.flush()
+    latest = (
+        db.query(DeviceReport.id, DeviceReport.total_score, DeviceReport.risk_level)
+        .filter(DeviceReport.device_id == device.id)
+        .order_by(desc(DeviceReport.id))
+        .first()
+    )
+    score = _get_score(report)
+    if latest is None or latest.total_score != score:
+        return False
 
-        # Issues
-        issues = _get_issues(report)
-        issues_sorted = sorted(
-            issues,
-            key=lambda i: -float(getattr(i, "penalty", 0) or i.get("penalty", 0) if isinstance(i, dict) else getattr(i, "penalty", 0)),
-        )
+    device.last_seen_at = now
+    device.last_seen_ip = source_ip
+    collected_at = _collected_at(metrics, now)
+    stmt = sqlite_insert(DeviceHeartbeat).values(
+        device_id=device.id, report_id=latest.id, last_collected_at=collected_at, heartbeat_count=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DeviceHeartbeat.device_id],
+        set_={
+            "report_id":         stmt.excluded.report_id,
+            "last_collected_at": stmt.excluded.last_collected_at,
+            "heartbeat_count":   case(
+                (DeviceHeartbeat.report_id == stmt.excluded.report_id, DeviceHeartbeat.heartbeat_count + 1),
+                else_=1,
+            ),
+        },
+    )
+    db.execute(stmt)
+    stmt = sqlite_insert(ReportHeartbeat).values(
+        report_id=latest.id,
+        bucket_start=_bucket_start(collected_at, FLEET_ROLLUP_RESOLUTIONS["1m"]),
+        heartbeat_count=1,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ReportHeartbeat.report_id, ReportHeartbeat.bucket_start],
+        set_={"heartbeat_count": ReportHeartbeat.heartbeat_count + 1},
+    ))
+    _update_fleet_rollups(db, collected_at, device.device_type, score, _is_critical(score, latest.risk_level))
+    return True
 
-        top_reasons, actions = [], []
-        for issue in issues_sorted[:3]:
-            rule_id = getattr(issue, "rule_id", None) or (issue.get("rule_id", "K?") if isinstance(issue, dict) else "K?")
-            message  = getattr(issue, "message",  None) or (issue.get("message",  "")  if isinstance(issue, dict) else "")
-            rec      = getattr(issue, "recommendation", None) or (issue.get("recommendation", "") if isinstance(issue, dict) else "")
-            top_reasons.append(f"{rule_id} {message}")
-            actions.append(rec[:120] + "..." if len(rec) > 120 else rec)
-
-        metrics_json    = json.dumps(_dump(metrics),              default=str, ensure_ascii=False)
-        issues_json     = json.dumps([_dump(i) for i in issues],  default=str, ensure_ascii=False)
-        top_reasons_json = json.dumps(top_reasons,                ensure_ascii=False)
-        actions_json    = json.dumps(actions,                     ensure_ascii=False)
-
-        db.add(DeviceReport(
-            device_id=device.id,
-            collected_at=collected_at,
-            total_score=total_score,
-            risk_level=risk_level,
-            metrics_json=metrics_json,
-            issues_json=issues_json,
-            top_reasons_json=top_reasons_json,
-            actions_json=actions_json,
-        ))
-
-        # Retention: keep at most MAX_REPORTS_PER_DEVICE per device
-        db.flush()
-        count: int = (
-            db.query(DeviceReport)
-            .filter(DeviceReport.device_id == device.id)
-            .count()
+
+def save_heartbeat(hostname: str, metrics: Any, report: Any, source_ip: str) -> bool:
+    """
+    Record *report* as a repeat of the device's latest stored report instead
+    of inserting a new DeviceReport. Returns False without writing anything
+    when there is no stored report with the same score (save in full then).
+    Raises ValueError if the device is not found.
+    """
+    db = SessionLocal()
+    try:
+        device: Optional[Device] = (
+            db.query(Device).filter(Device.hostname == hostname).first()
         )
-        if count > MAX_REPORTS_PER_DEVICE:
-            excess = count - MAX_REPORTS_PER_DEVICE
-            oldest_ids = [
-                row[0] for row in (
-                    db.query(DeviceReport.id)
-                    .filter(DeviceReport.device_id == device.id)
-                    .order_by(asc(DeviceReport.collected_at))
-                    .limit(excess)
-                    .all()
-                )
-            ]
-            db.query(DeviceReport).filter(
-                DeviceReport.id.in_(oldest_ids)
-            ).delete(synchronize_session=False)
+        if device is None:
+            raise ValueError(f"Device '{hostname}' not registered — cannot save report.")
+        if not _add_heartbeat(db, device, metrics, report, source_ip, _utcnow()):
+            return False
+        _touch_devices(db, [device.id])
+        db.commit()
+        return True
+    finally:
+        db.close()
+
 
+def save_reports(
+    items: list[tuple[str, Any, Any]],
+    source_ip: str,
+    heartbeats: Optional[list[bool]] = None,
+) -> list[str]:
+    """
+    Persist many (hostname, metrics, report) items in one transaction.
+    Items flagged in *heartbeats* are stored as heartbeats when they repeat
+    the device's latest report, otherwise in full.
+    Items whose device does not exist are skipped; their hostnames are returned.
+    """
+    if not items:
+        return []
+    db = SessionLocal()
+    try:
+        hostnames = {hostname for hostname, _, _ in items}
+        devices: dict[str, Device] = {
+            d.hostname: d
+            for d in db.query(Device).filter(Device.hostname.in_(hostnames)).all()
+        }
+        now = _utcnow()
+        missing: list[str] = []
+        for i, (hostname, metrics, report) in enumerate(items):
+            device = devices.get(hostname)
+            if device is None:
+                missing.append(hostname)
+                continue
+            if heartbeats and heartbeats[i] and _add_heartbeat(db, device, metrics, report, source_ip, now):
+                continue
+            _add_report(db, device, metrics, report, source_ip, now)
+        # Retention and change generation once per device rather than once per report
+        for device in devices.values():
+            _enforce_report_retention(db, device.id)
+        _touch_devices(db, [device.id for device in devices.values()])
         db.commit()
+        return missing
     finally:
         db.close()
 
@@ -282,59 +625,145 @@ def save_report(
 # 5. get_devices_list
 # ---------------------------------------------------------------------------
 
+def _device_summaries(db: Any, devices: list[Device]) -> list[dict]:
+    """
+    /api/devices entries for *devices*, sorted: SERVER first, then
+    latest_score ascending (None last). Reads each device's latest report
+    (one indexed lookup) and its device_trends row, never the history.
+    """
+    result = []
+    trends: dict[int, DeviceTrend] = {
+        t.device_id: t
+        for t in db.query(DeviceTrend).filter(DeviceTrend.device_id.in_([d.id for d in devices]))
+    }
+
+    for device in devices:
+        last_report = (
+            db.query(DeviceReport)
+            .filter(DeviceReport.device_id == device.id)
+            .order_by(desc(DeviceReport.collected_at), desc(DeviceReport.id))
+            .first()
+        )
+        trend = trends.get(device.id)
+        latest_score: Optional[float] = None
+        risk_level:   Optional[str]   = None
+        improvement_total: float      = 0.0
+
+        last_report_top_reasons_json: Optional[str] = None
+        last_report_actions_json: Optional[str]   = None
+
+        if last_report is not None:
+            if trend is not None:
+                first_score = trend.first_score
+            else:
+                first_score = (
+                    db.query(DeviceReport.total_score)
+                    .filter(DeviceReport.device_id == device.id)
+                    .order_by(asc(DeviceReport.collected_at))
+                    .limit(1)
+                    .scalar()
+                )
+            latest_score = last_report.total_score
+            risk_level   = last_report.risk_level
+            improvement_total = round(latest_score - first_score, 2)
+            last_report_top_reasons_json = last_report.top_reasons_json
+            last_report_actions_json     = last_report.actions_json
+
+        result.append({
+            "hostname":           device.hostname,
+            "device_type":        device.device_type,
+            "registered_ip":      device.registered_ip,
+            "last_seen_ip":       device.last_seen_ip,
+            "last_seen_at":       device.last_seen_at.isoformat() if device.last_seen_at else None,
+            "latest_score":       latest_score,
+            "risk_level":         risk_level,
+            "improvement_total":  improvement_total,
+            "top_reasons_json":   last_report_top_reasons_json,
+            "actions_json":       last_report_actions_json,
+            **_trend_list_fields(trend),
+        })
+
+    def _sort_key(d: dict):
+        is_client = 0 if d["device_type"] == "SERVER" else 1
+        score = d["latest_score"] if d["latest_score"] is not None else float("inf")
+        return (is_client, score)
+
+    result.sort(key=_sort_key)
+    return result
+
+
 def get_devices_list() -> list[dict]:
     """
-    Summary of all active devices with latest score + improvement_total.
+    Summary of all active devices with latest score, improvement_total and
+    the trend statistics (score_ewma, score_slope_per_day, min/max_score,
+    risk_level_since).
     Sorted: SERVER first, then latest_score ascending (None last).
     """
     db = SessionLocal()
     try:
         devices = db.query(Device).filter(Device.is_active == True).all()  # noqa: E712
-        result = []
+        return _device_summaries(db, devices)
+    finally:
+        db.close()
 
-        for device in devices:
-            reports = (
-                db.query(DeviceReport)
-                .filter(DeviceReport.device_id == device.id)
-                .order_by(asc(DeviceReport.collected_at))
-                .all()
-            )
-            latest_score: Optional[float] = None
-            risk_level:   Optional[str]   = None
-            improvement_total: float      = 0.0
 
-            last_report_top_reasons_json: Optional[str] = None
-            last_report_actions_json: Optional[str]   = None
+def current_device_generation() -> int:
+    """Generation of the latest device change (0 before any)."""
+    db = SessionLocal()
+    try:
+        return db.query(func.coalesce(func.max(DeviceChange.generation), 0)).scalar()
+    finally:
+        db.close()
+
 
-            if reports:
-                first_score  = reports[0].total_score
-                last_report  = reports[-1]
-                latest_score = last_report.total_score
-                risk_level   = last_report.risk_level
-                improvement_total = round(latest_score - first_score, 2)
-                last_report_top_reasons_json = last_report.top_reasons_json
-                last_report_actions_json     = last_report.actions_json
+def get_device_changes(since: int) -> dict:
+    """
+    Devices changed after generation *since*:
+    {"generation", "full", "devices", "removed"}.
 
-            result.append({
-                "hostname":           device.hostname,
-                "device_type":        device.device_type,
-                "registered_ip":      device.registered_ip,
-                "last_seen_ip":       device.last_seen_ip,
-                "last_seen_at":       device.last_seen_at.isoformat() if device.last_seen_at else None,
-                "latest_score":       latest_score,
-                "risk_level":         risk_level,
-                "improvement_total":  improvement_total,
-                "top_reasons_json":   last_report_top_reasons_json,
-                "actions_json":       last_report_actions_json,
-            })
+    devices holds the current entries of changed active devices (as in
+    get_devices_list) and removed the hostnames deactivated since then. A
+    *since* of 0, or one newer than the database (e.g. after a reset),
+    returns every active device with full=True instead.
+    """
+    generation = current_device_generation()
+    if since <= 0 or since > generation:
+        return {"generation": generation, "full": True, "devices": get_devices_list(), "removed": []}
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Device, DeviceChange.generation, DeviceChange.removed)
+            .join(DeviceChange, DeviceChange.device_id == Device.id)
+            .filter(DeviceChange.generation > since)
+            .all()
+        )
+        changed = [device for device, _, removed in rows if device.is_active and not removed]
+        removed = sorted(device.hostname for device, _, removed in rows if removed or not device.is_active)
+        # Changes committed after the first read are included; report them as seen
+        generation = max([generation] + [g for _, g, _ in rows])
+        return {
+            "generation": generation,
+            "full": False,
+            "devices": _device_summaries(db, changed),
+            "removed": removed,
+        }
+    finally:
+        db.close()
 
-        def _sort_key(d: dict):
-            is_client = 0 if d["device_type"] == "SERVER" else 1
-            score = d["latest_score"] if d["latest_score"] is not None else float("inf")
-            return (is_client, score)
 
-        result.sort(key=_sort_key)
-        return result
+def device_generations(hostnames: list[str]) -> dict[str, int]:
+    """Current change generation of each hostname that has one."""
+    if not hostnames:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Device.hostname, DeviceChange.generation)
+            .join(DeviceChange, DeviceChange.device_id == Device.id)
+            .filter(Device.hostname.in_(hostnames))
+            .all()
+        )
+        return {hostname: generation for hostname, generation in rows}
     finally:
         db.close()
 
@@ -363,59 +792,1153 @@ def get_device_history(hostname: str, limit: int) -> list[dict]:
             .limit(limit)
             .all()
         )
-        return [
+        points = [
             {"timestamp": r.collected_at.isoformat(), "score": r.total_score}
             for r in reversed(reports)
         ]
+        # Heartbeats since the latest report extend it to the last repeat
+        heartbeat = db.get(DeviceHeartbeat, device.id)
+        if (
+            heartbeat is not None and reports
+            and heartbeat.report_id == reports[0].id
+            and heartbeat.last_collected_at > reports[0].collected_at
+        ):
+            points.append({"timestamp": heartbeat.last_collected_at.isoformat(), "score": reports[0].total_score})
+            points = points[-limit:]
+        return points
+    finally:
+        db.close()
+
+
+def encode_history_cursor(collected_at: datetime, report_id: int) -> str:
+    """Opaque keyset cursor for the history row (collected_at, report_id)."""
+    raw = f"{collected_at.isoformat()}|{report_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of encode_history_cursor. Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts, report_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(report_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Invalid history cursor.") from exc
+
+
+def _history_device(db: Any, hostname: str) -> Device:
+    device = db.query(Device).filter(Device.hostname == hostname).first()
+    if device is None:
+        raise KeyError(f"Device '{hostname}' not found.")
+    return device
+
+
+def _history_range(
+    query: Any, start: Optional[datetime], end: Optional[datetime]
+) -> Any:
+    # Stored timestamps are naive UTC; compare in the same form
+    if start is not None:
+        query = query.filter(DeviceReport.collected_at >= _parse_ts(start).astimezone(timezone.utc).replace(tzinfo=None))
+    if end is not None:
+        query = query.filter(DeviceReport.collected_at <= _parse_ts(end).astimezone(timezone.utc).replace(tzinfo=None))
+    return query
+
+
+def _history_heartbeat_point(
+    db: Any, device_id: int, start: Optional[datetime], end: Optional[datetime]
+) -> Optional[dict]:
+    """The heartbeat repeat of the latest report as a point, if it falls in [start, end]."""
+    heartbeat = db.get(DeviceHeartbeat, device_id)
+    if heartbeat is None:
+        return None
+    latest = (
+        db.query(DeviceReport.id, DeviceReport.collected_at, DeviceReport.total_score)
+        .filter(DeviceReport.device_id == device_id)
+        .order_by(desc(DeviceReport.collected_at), desc(DeviceReport.id))
+        .first()
+    )
+    if latest is None or heartbeat.report_id != latest.id or heartbeat.last_collected_at <= latest.collected_at:
+        return None
+    ts = _parse_ts(heartbeat.last_collected_at)
+    if (start is not None and ts < _parse_ts(start)) or (end is not None and ts > _parse_ts(end)):
+        return None
+    return {"timestamp": heartbeat.last_collected_at.isoformat(), "score": latest.total_score}
+
+
+def get_device_history_page(
+    hostname: str,
+    limit: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    Up to *limit* history points for *hostname* inside [start, end], oldest
+    first, continuing after *cursor*. Returns (points, next_cursor); next_cursor
+    is None on the last page.
+
+    Pages are keyset reads over ix_device_reports_device_id_collected_at
+    ((collected_at, id) after the cursor), so page N costs the same as page 1.
+    Raises KeyError if device not found, ValueError for a malformed cursor.
+    """
+    after = decode_history_cursor(cursor) if cursor is not None else None
+    db = SessionLocal()
+    try:
+        device = _history_device(db, hostname)
+        query = db.query(DeviceReport.id, DeviceReport.collected_at, DeviceReport.total_score).filter(
+            DeviceReport.device_id == device.id
+        )
+        query = _history_range(query, start, end)
+        if after is not None:
+            after_ts, after_id = after
+            # The plain >= keeps the index range scan; the OR breaks timestamp ties
+            query = query.filter(
+                DeviceReport.collected_at >= after_ts,
+                or_(DeviceReport.collected_at > after_ts, DeviceReport.id > after_id),
+            )
+        rows = query.order_by(asc(DeviceReport.collected_at), asc(DeviceReport.id)).limit(limit + 1).all()
+
+        points = [{"timestamp": r.collected_at.isoformat(), "score": r.total_score} for r in rows[:limit]]
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            return points, encode_history_cursor(last.collected_at, last.id)
+
+        heartbeat_point = _history_heartbeat_point(db, device.id, start, end)
+        if heartbeat_point is not None:
+            if len(points) < limit:
+                points.append(heartbeat_point)
+            else:
+                # Full page: the heartbeat point is all the next page holds
+                last = rows[-1]
+                return points, encode_history_cursor(last.collected_at, last.id)
+        return points, None
     finally:
         db.close()
 
 
+def get_device_history_downsampled(
+    hostname: str,
+    points: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    method: str = "lttb",
+) -> tuple[list[dict], int]:
+    """
+    History of *hostname* inside [start, end] reduced to at most *points*
+    points with server/downsample.py (*method* "lttb" or "minmax"), oldest
+    first. Returns (points, raw_count) where raw_count is the number of points
+    in the range before downsampling.
+
+    Reads only (collected_at, total_score) over the device/time index; the
+    per-device row count is bounded by report retention.
+    Raises KeyError if device not found, ValueError for an unknown method.
+    """
+    if method not in downsample.METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'.")
+    db = SessionLocal()
+    try:
+        device = _history_device(db, hostname)
+        query = db.query(DeviceReport.collected_at, DeviceReport.total_score).filter(
+            DeviceReport.device_id == device.id
+        )
+        rows = _history_range(query, start, end).order_by(
+            asc(DeviceReport.collected_at), asc(DeviceReport.id)
+        ).all()
+        raw = [{"timestamp": r.collected_at.isoformat(), "score": r.total_score} for r in rows]
+        xs = [_parse_ts(r.collected_at).timestamp() for r in rows]
+        heartbeat_point = _history_heartbeat_point(db, device.id, start, end)
+        if heartbeat_point is not None:
+            raw.append(heartbeat_point)
+            xs.append(_parse_ts(heartbeat_point["timestamp"]).timestamp())
+    finally:
+        db.close()
+
+    ys = [p["score"] for p in raw]
+    return [raw[i] for i in downsample.downsample_indices(method, xs, ys, points)], len(raw)
+
+
 # ---------------------------------------------------------------------------
 # 7. get_fleet_history
 # ---------------------------------------------------------------------------
 
-def get_fleet_history(limit: int) -> list[dict]:
+def get_fleet_history(
+    limit: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "1m",
+) -> list[dict]:
     """
-    Fleet-wide history bucketed by minute for the last *limit* reports.
-    Returns ascending list with keys: timestamp, fleet_avg, server_avg, client_avg, critical_count.
+    Fleet-wide history read from fleet_rollup at *resolution* ("1m", "15m", "1h").
+    Returns the latest *limit* buckets inside [start, end], ascending, with keys:
+    timestamp, fleet_avg, server_avg, client_avg, critical_count.
+    Raises ValueError for an unknown resolution.
     """
+    seconds = FLEET_ROLLUP_RESOLUTIONS.get(resolution)
+    if seconds is None:
+        raise ValueError(f"Unknown resolution '{resolution}'.")
+
     db = SessionLocal()
     try:
+        query = db.query(FleetRollup).filter(FleetRollup.resolution == seconds)
+        if start is not None:
+            query = query.filter(FleetRollup.bucket_start >= _bucket_start(start, seconds))
+        if end is not None:
+            query = query.filter(FleetRollup.bucket_start <= _parse_ts(end).astimezone(timezone.utc))
+        rows = query.order_by(desc(FleetRollup.bucket_start)).limit(limit).all()
+
+        def _avg(total: float, count: int) -> Optional[float]:
+            return round(total / count, 2) if count else None
+
+        return [
+            {
+                "timestamp":      r.bucket_start.isoformat(),
+                "fleet_avg":      _avg(r.server_sum + r.client_sum, r.server_count + r.client_count),
+                "server_avg":     _avg(r.server_sum, r.server_count),
+                "client_avg":     _avg(r.client_sum, r.client_count),
+                "critical_count": r.critical_count,
+            }
+            for r in reversed(rows)
+        ]
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 8. rebuild_fleet_rollups
+# ---------------------------------------------------------------------------
+
+def rebuild_fleet_rollups(only_if_empty: bool = True) -> int:
+    """
+    Recompute fleet_rollup from device_reports (backfill for databases created
+    before the rollup table existed). Streams only the four columns it needs.
+    With *only_if_empty* (default) it is a no-op once any rollup row exists.
+    Returns the number of reports aggregated.
+    """
+    db = SessionLocal()
+    try:
+        if only_if_empty and db.query(FleetRollup.id).first() is not None:
+            return 0
+
+        buckets: dict = defaultdict(lambda: [0.0, 0, 0.0, 0, 0])
+        aggregated = 0
         rows = (
-            db.query(DeviceReport, Device.device_type)
+            db.query(
+                DeviceReport.collected_at,
+                DeviceReport.total_score,
+                DeviceReport.risk_level,
+                Device.device_type,
+            )
             .join(Device, DeviceReport.device_id == Device.id)
-            .order_by(desc(DeviceReport.collected_at))
+            .yield_per(1000)
+        )
+        for collected_at, score, risk_level, device_type in rows:
+            aggregated += 1
+            for seconds in FLEET_ROLLUP_RESOLUTIONS.values():
+                b = buckets[(seconds, _bucket_start(collected_at, seconds))]
+                if device_type == "SERVER":
+                    b[0] += score
+                    b[1] += 1
+                else:
+                    b[2] += score
+                    b[3] += 1
+                if _is_critical(score, risk_level):
+                    b[4] += 1
+
+        db.query(FleetRollup).delete(synchronize_session=False)
+        if buckets:
+            db.execute(
+                FleetRollup.__table__.insert(),
+                [
+                    {
+                        "resolution":     seconds,
+                        "bucket_start":   bucket_start,
+                        "server_sum":     b[0],
+                        "server_count":   b[1],
+                        "client_sum":     b[2],
+                        "client_count":   b[3],
+                        "critical_count": b[4],
+                    }
+                    for (seconds, bucket_start), b in buckets.items()
+                ],
+            )
+        db.commit()
+        return aggregated
+    finally:
+        db.close()
+
+
+def prune_fleet_rollups(now: Optional[datetime] = None) -> int:
+    """
+    Delete 1m buckets older than FLEET_ROLLUP_1M_RETENTION_DAYS and 15m
+    buckets older than FLEET_ROLLUP_15M_RETENTION_DAYS; 1h buckets are kept.
+    report_heartbeats rows past those ages are merged into their 15m / 1h
+    bucket start. Returns the number of fleet_rollup rows deleted.
+    """
+    now = (now or _utcnow()).astimezone(timezone.utc).replace(tzinfo=None)
+    retention = {
+        FLEET_ROLLUP_RESOLUTIONS["1m"]:  timedelta(days=config.FLEET_ROLLUP_1M_RETENTION_DAYS),
+        FLEET_ROLLUP_RESOLUTIONS["15m"]: timedelta(days=config.FLEET_ROLLUP_15M_RETENTION_DAYS),
+    }
+    db = SessionLocal()
+    try:
+        deleted = 0
+        for seconds, keep in retention.items():
+            deleted += (
+                db.query(FleetRollup)
+                .filter(FleetRollup.resolution == seconds, FleetRollup.bucket_start < now - keep)
+                .delete(synchronize_session=False)
+            )
+
+        # Merge expired heartbeat counts not yet aligned to the next bucket
+        # width still kept into that bucket's start
+        merged: dict[tuple[int, datetime], int] = defaultdict(int)
+        coarser = {
+            FLEET_ROLLUP_RESOLUTIONS["1m"]:  FLEET_ROLLUP_RESOLUTIONS["15m"],
+            FLEET_ROLLUP_RESOLUTIONS["15m"]: FLEET_ROLLUP_RESOLUTIONS["1h"],
+        }
+        for seconds, keep in retention.items():
+            stale = (
+                (ReportHeartbeat.bucket_start < now - keep)
+                & (cast(func.strftime("%s", ReportHeartbeat.bucket_start), Integer) % coarser[seconds] != 0)
+            )
+            for report_id, bucket_start, count in (
+                db.query(ReportHeartbeat.report_id, ReportHeartbeat.bucket_start, ReportHeartbeat.heartbeat_count)
+                .filter(stale)
+            ):
+                merged[(report_id, _bucket_start(bucket_start, coarser[seconds]))] += count
+            db.query(ReportHeartbeat).filter(stale).delete(synchronize_session=False)
+            for (report_id, start), count in merged.items():
+                stmt = sqlite_insert(ReportHeartbeat).values(
+                    report_id=report_id, bucket_start=start, heartbeat_count=count,
+                )
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=[ReportHeartbeat.report_id, ReportHeartbeat.bucket_start],
+                    set_={"heartbeat_count": ReportHeartbeat.heartbeat_count + stmt.excluded.heartbeat_count},
+                ))
+            merged.clear()
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 9. agent task queue (backing store for server/task_queue.py)
+# ---------------------------------------------------------------------------
+
+def insert_tasks(rows: list[dict]) -> None:
+    """
+    Insert queued tasks in ONE transaction (a single executemany), so a
+    broadcast to the whole fleet costs one commit.
+    Each row: task_id, hostname, command, created_at, run_id (optional).
+    """
+    if not rows:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(insert(AgentTask), [
+            {
+                "task_id":    r["task_id"],
+                "hostname":   r["hostname"],
+                "command":    r["command"],
+                "created_at": r["created_at"],
+                "run_id":     r.get("run_id"),
+                "status":     "queued",
+                "attempts":   0,
+            }
+            for r in rows
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def lease_task(task_id: str, lease_expires_at: datetime, attempts: int) -> bool:
+    """
+    Mark a queued task as handed to its agent until *lease_expires_at*.
+    False if the task is no longer queued (another worker leased or closed it).
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(AgentTask)
+            .where(AgentTask.task_id == task_id, AgentTask.status == "queued")
+            .values(status="leased", lease_expires_at=lease_expires_at, attempts=attempts)
+        )
+        db.commit()
+        return result.rowcount > 0
+    finally:
+        db.close()
+
+
+def requeue_tasks(task_ids: list[str]) -> list[str]:
+    """Return expired leases to the queue. Returns the ids that were still leased."""
+    if not task_ids:
+        return []
+    db = SessionLocal()
+    try:
+        requeued = db.execute(
+            update(AgentTask)
+            .where(AgentTask.task_id.in_(task_ids), AgentTask.status == "leased")
+            .values(status="queued", lease_expires_at=None)
+            .returning(AgentTask.task_id)
+        ).scalars().all()
+        db.commit()
+        return list(requeued)
+    finally:
+        db.close()
+
+
+def finish_tasks(task_ids: list[str], status: str = "done", hostname: Optional[str] = None) -> list[str]:
+    """
+    Close open tasks as "done" (acknowledged) or "failed" (attempts exhausted),
+    optionally only those of *hostname*. Returns the ids closed by this call.
+    """
+    if not task_ids:
+        return []
+    db = SessionLocal()
+    try:
+        stmt = update(AgentTask).where(
+            AgentTask.task_id.in_(task_ids), AgentTask.status.in_(("queued", "leased"))
+        )
+        if hostname is not None:
+            stmt = stmt.where(AgentTask.hostname == hostname)
+        finished = db.execute(
+            stmt.values(status=status, lease_expires_at=None, finished_at=_utcnow())
+            .returning(AgentTask.task_id)
+        ).scalars().all()
+        db.commit()
+        return list(finished)
+    finally:
+        db.close()
+
+
+def load_open_tasks(reset_leases: bool = True) -> list[dict]:
+    """
+    Queued and leased tasks in enqueue order (restart recovery).
+    With *reset_leases* leases do not survive a restart: leased rows are
+    returned to "queued". Workers sharing the table (server/cluster.py) pass
+    False so a restarting worker leaves the other workers' leases alone.
+    """
+    db = SessionLocal()
+    try:
+        if reset_leases:
+            db.execute(
+                update(AgentTask)
+                .where(AgentTask.status == "leased")
+                .values(status="queued", lease_expires_at=None)
+            )
+            db.commit()
+        rows = (
+            db.query(AgentTask)
+            .filter(AgentTask.status.in_(("queued", "leased")))
+            .order_by(asc(AgentTask.id))
+            .all()
+        )
+        return [
+            {
+                "task_id":    r.task_id,
+                "hostname":   r.hostname,
+                "command":    r.command,
+                "run_id":     r.run_id,
+                "created_at": r.created_at,
+                "attempts":   r.attempts,
+                "status":     r.status,
+                "lease_expires_at": r.lease_expires_at,
+            }
+            for r in rows
+        ]
+    finally:
+        db.close()
+
+
+def purge_finished_tasks(before: datetime) -> int:
+    """Delete done/failed tasks finished before *before*. Returns rows deleted."""
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(AgentTask)
+            .filter(AgentTask.status.in_(("done", "failed")), AgentTask.finished_at < before)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 10. run session archive (backing store for server/run_sessions.py)
+# ---------------------------------------------------------------------------
+
+def archive_run_sessions(rows: list[dict]) -> None:
+    """Insert evicted sessions in one transaction; an already archived run is kept as is."""
+    if not rows:
+        return
+    db = SessionLocal()
+    try:
+        stmt = sqlite_insert(RunSessionArchive).on_conflict_do_nothing(
+            index_elements=[RunSessionArchive.kind, RunSessionArchive.run_id]
+        )
+        db.execute(stmt, rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_archived_run(kind: str, run_id: str) -> Optional[dict]:
+    """Full archived session (including devices_json), or None."""
+    db = SessionLocal()
+    try:
+        row: Optional[RunSessionArchive] = (
+            db.query(RunSessionArchive)
+            .filter(RunSessionArchive.kind == kind, RunSessionArchive.run_id == run_id)
+            .first()
+        )
+        if row is None:
+            return None
+        return {
+            "run_id":            row.run_id,
+            "started_at":        row.started_at,
+            "finished_at":       row.finished_at,
+            "total_devices":     row.total_devices,
+            "completed_devices": row.completed_devices,
+            "score_sum":         row.score_sum,
+            "reported_count":    row.reported_count,
+            "devices_json":      row.devices_json,
+        }
+    finally:
+        db.close()
+
+
+def list_archived_runs(kind: str) -> list[dict]:
+    """run_id / started_at / reported_count of every archived session (no devices_json)."""
+    db = SessionLocal()
+    try:
+        return [
+            {"run_id": run_id, "started_at": started_at, "reported_count": reported_count}
+            for run_id, started_at, reported_count in (
+                db.query(
+                    RunSessionArchive.run_id,
+                    RunSessionArchive.started_at,
+                    RunSessionArchive.reported_count,
+                )
+                .filter(RunSessionArchive.kind == kind)
+                .all()
+            )
+        ]
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 11. historical rescoring (backing store for server/rescore.py)
+# ---------------------------------------------------------------------------
+
+def count_reports() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(DeviceReport.id).count()
+    finally:
+        db.close()
+
+
+def fetch_report_metrics(after_id: int, limit: int) -> list[tuple[int, str, float]]:
+    """(id, metrics_json, total_score) of the next *limit* reports with id > *after_id*."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(DeviceReport.id, DeviceReport.metrics_json, DeviceReport.total_score)
+            .filter(DeviceReport.id > after_id)
+            .order_by(asc(DeviceReport.id))
             .limit(limit)
             .all()
         )
+        return [tuple(row) for row in rows]
+    finally:
+        db.close()
 
-        buckets: dict = defaultdict(lambda: {"fleet": [], "server": [], "client": [], "critical": 0})
-        for report, device_type in rows:
-            dt = report.collected_at
-            key = dt.replace(second=0, microsecond=0)
-            score = report.total_score
-            buckets[key]["fleet"].append(score)
-            if device_type == "SERVER":
-                buckets[key]["server"].append(score)
-            else:
-                buckets[key]["client"].append(score)
-            if report.risk_level == "CRITICAL" or score < 40:
-                buckets[key]["critical"] += 1
 
-        def _avg(lst: list) -> Optional[float]:
-            return round(sum(lst) / len(lst), 2) if lst else None
+def update_report_scores(rows: list[dict]) -> set[int]:
+    """
+    Overwrite the score columns of many reports in one transaction.
+    Each row: id plus the keys returned by serialize_report().
 
+    fleet_rollup follows in the same transaction: each changed report's
+    score and critical deltas are added to its own bucket, and once per
+    heartbeat to the buckets in report_heartbeats, so buckets of pruned
+    reports stay correct. Returns the ids of the devices whose scores changed.
+    """
+    if not rows:
+        return set()
+    db = SessionLocal()
+    try:
+        before = {
+            row.id: row for row in
+            db.query(
+                DeviceReport.id,
+                DeviceReport.device_id,
+                DeviceReport.collected_at,
+                DeviceReport.total_score,
+                DeviceReport.risk_level,
+                Device.device_type,
+            )
+            .join(Device, DeviceReport.device_id == Device.id)
+            .filter(DeviceReport.id.in_([row["id"] for row in rows]))
+        }
+        db.execute(update(DeviceReport), rows)
+
+        # (1m bucket, device type) → [score delta, critical delta]; coarser
+        # buckets nest, so the 1m bucket start lands in the same 15m / 1h ones
+        deltas: dict[tuple[datetime, str], list] = {}
+        changed: set[int] = set()
+        # report id → (score delta, critical delta, device type), for its heartbeats
+        report_deltas: dict[int, tuple[float, int, str]] = {}
+        for row in rows:
+            old = before.get(row["id"])
+            if old is None:
+                continue
+            score = row.get("total_score", old.total_score)
+            risk_level = row.get("risk_level", old.risk_level)
+            critical = int(_is_critical(score, risk_level)) - int(_is_critical(old.total_score, old.risk_level))
+            if score == old.total_score and not critical:
+                continue
+            changed.add(old.device_id)
+            report_deltas[old.id] = (score - old.total_score, critical, old.device_type)
+            key = (_bucket_start(old.collected_at, FLEET_ROLLUP_RESOLUTIONS["1m"]), old.device_type)
+            delta = deltas.setdefault(key, [0.0, 0])
+            delta[0] += score - old.total_score
+            delta[1] += critical
+        if report_deltas:
+            heartbeats = (
+                db.query(ReportHeartbeat.report_id, ReportHeartbeat.bucket_start, ReportHeartbeat.heartbeat_count)
+                .filter(ReportHeartbeat.report_id.in_(list(report_deltas)))
+            )
+            for report_id, bucket_start, count in heartbeats:
+                score_delta, critical, device_type = report_deltas[report_id]
+                key = (_bucket_start(bucket_start, FLEET_ROLLUP_RESOLUTIONS["1m"]), device_type)
+                delta = deltas.setdefault(key, [0.0, 0])
+                delta[0] += score_delta * count
+                delta[1] += critical * count
+        for (bucket_start, device_type), (score_delta, critical_delta) in deltas.items():
+            _update_fleet_rollups(db, bucket_start, device_type, score_delta, critical_delta, count=0)
+
+        # Only devices whose scores changed get a new generation (?since= clients refetch them)
+        _touch_devices(db, sorted(changed))
+        db.commit()
+        return changed
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 12. typed report metrics (device_report_metrics) and SQL aggregates
+# ---------------------------------------------------------------------------
+
+def backfill_report_metrics(chunk_size: int = 500) -> int:
+    """
+    Create device_report_metrics rows for reports that have none (stored
+    before the table existed), parsing metrics_json in keyset-paged chunks.
+    Idempotent; reports whose metrics_json lacks a K1–K10 input are skipped.
+    Returns the number of rows created.
+    """
+    created = 0
+    after_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(DeviceReport.id, DeviceReport.device_id, DeviceReport.collected_at, DeviceReport.metrics_json)
+                .outerjoin(DeviceReportMetrics, DeviceReportMetrics.report_id == DeviceReport.id)
+                .filter(DeviceReportMetrics.report_id.is_(None), DeviceReport.id > after_id)
+                .order_by(asc(DeviceReport.id))
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                return created
+            after_id = rows[-1][0]
+            inserts = []
+            for report_id, device_id, collected_at, metrics_json in rows:
+                try:
+                    data = json.loads(metrics_json)
+                except (TypeError, ValueError):
+                    continue
+                typed = _metric_columns(data, collected_at)
+                if typed:
+                    inserts.append({"report_id": report_id, "device_id": device_id, **typed})
+            if inserts:
+                db.execute(insert(DeviceReportMetrics), inserts)
+                db.commit()
+                created += len(inserts)
+        finally:
+            db.close()
+
+
+# Both aggregates read device_report_metrics only through its indexes.
+# EXPLAIN QUERY PLAN (SQLite 3.40; explain_metric_aggregates() prints it):
+#
+#   trend:   SEARCH device_report_metrics USING INDEX
+#              ix_device_report_metrics_collected_ts (collected_ts>? AND collected_ts<?)
+#            USE TEMP B-TREE FOR GROUP BY
+#            USE TEMP B-TREE FOR count(DISTINCT)      (one per DISTINCT column)
+#
+#   current: MATERIALIZE latest
+#              SCAN device_report_metrics USING COVERING INDEX ix_device_report_metrics_device_id
+#            SCAN latest
+#            SEARCH m USING INTEGER PRIMARY KEY (rowid=?)
+#            SEARCH d USING INTEGER PRIMARY KEY (rowid=?)
+#
+# The trend scan is bounded by the requested range; the current summary
+# touches one index entry per report plus one row per device.
+METRIC_AGGREGATE_QUERIES: dict[str, str] = {
+    "trend": """
+        SELECT collected_ts - collected_ts % :width                                 AS bucket,
+               COUNT(*)                                                             AS reports,
+               COUNT(DISTINCT device_id)                                            AS devices,
+               COUNT(DISTINCT CASE WHEN firewall_enabled = 0 THEN device_id END)       AS firewall_disabled,
+               COUNT(DISTINCT CASE WHEN ssh_root_login_allowed = 1 THEN device_id END) AS ssh_root_login_allowed,
+               COUNT(DISTINCT CASE WHEN password_policy_ok = 0 THEN device_id END)     AS password_policy_failed,
+               AVG(update_count)                                                    AS avg_update_count,
+               AVG(disk_usage_percent)                                              AS avg_disk_usage,
+               MAX(disk_usage_percent)                                              AS max_disk_usage,
+               AVG(ram_usage_percent)                                               AS avg_ram_usage,
+               AVG(cpu_usage_percent)                                               AS avg_cpu_usage
+        FROM device_report_metrics
+        WHERE collected_ts >= :start AND collected_ts < :end
+        GROUP BY bucket
+        ORDER BY bucket DESC
+        LIMIT :limit
+    """,
+    "current": """
+        WITH latest AS (
+            SELECT MAX(report_id) AS report_id
+            FROM device_report_metrics
+            GROUP BY device_id
+        )
+        SELECT COUNT(*)                                    AS devices,
+               COALESCE(SUM(d.device_type = 'SERVER'), 0)  AS servers,
+               COALESCE(SUM(d.device_type = 'CLIENT'), 0)  AS clients,
+               COALESCE(SUM(m.firewall_enabled = 0), 0)    AS firewall_disabled,
+               COALESCE(SUM(m.ssh_root_login_allowed = 1), 0) AS ssh_root_login_allowed,
+               COALESCE(SUM(m.password_policy_ok = 0), 0)  AS password_policy_failed,
+               COALESCE(SUM(m.unnecessary_services_count > 0), 0) AS with_unnecessary_services,
+               COALESCE(SUM(m.update_count), 0)            AS pending_updates,
+               MAX(m.sudo_users_count)                     AS max_sudo_users,
+               AVG(m.disk_usage_percent)                   AS avg_disk_usage,
+               MAX(m.disk_usage_percent)                   AS max_disk_usage,
+               AVG(m.ram_usage_percent)                    AS avg_ram_usage,
+               AVG(m.cpu_usage_percent)                    AS avg_cpu_usage
+        FROM latest
+        JOIN device_report_metrics AS m ON m.report_id = latest.report_id
+        JOIN devices AS d ON d.id = m.device_id
+        WHERE d.is_active = 1
+    """,
+}
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def get_metric_trend(
+    limit: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "1h",
+) -> list[dict]:
+    """
+    K1–K10 input aggregates per time bucket, computed in SQL from
+    device_report_metrics. Returns the latest *limit* buckets inside
+    [start, end], ascending. Device counts are distinct devices that reported
+    the condition at least once in the bucket.
+    Raises ValueError for an unknown resolution.
+    """
+    seconds = FLEET_ROLLUP_RESOLUTIONS.get(resolution)
+    if seconds is None:
+        raise ValueError(f"Unknown resolution '{resolution}'.")
+    params = {
+        "width": seconds,
+        "start": int(_parse_ts(start).timestamp()) if start is not None else 0,
+        # Inclusive end: the whole second of *end* is in range
+        "end": int(_parse_ts(end).timestamp()) + 1 if end is not None else 2**62,
+        "limit": limit,
+    }
+    db = SessionLocal()
+    try:
+        rows = db.execute(text(METRIC_AGGREGATE_QUERIES["trend"]), params).mappings().all()
+        return [
+            {
+                "timestamp":              datetime.fromtimestamp(r["bucket"], tz=timezone.utc).isoformat(),
+                "reports":                r["reports"],
+                "devices":                r["devices"],
+                "firewall_disabled":      r["firewall_disabled"],
+                "ssh_root_login_allowed": r["ssh_root_login_allowed"],
+                "password_policy_failed": r["password_policy_failed"],
+                "avg_update_count":       _round(r["avg_update_count"]),
+                "avg_disk_usage":         _round(r["avg_disk_usage"]),
+                "max_disk_usage":         _round(r["max_disk_usage"]),
+                "avg_ram_usage":          _round(r["avg_ram_usage"]),
+                "avg_cpu_usage":          _round(r["avg_cpu_usage"]),
+            }
+            for r in reversed(rows)
+        ]
+    finally:
+        db.close()
+
+
+def get_metric_summary() -> dict:
+    """
+    K1–K10 input aggregates over the latest report of every active device,
+    computed in one SQL statement. Averages are None when no device has reported.
+    """
+    db = SessionLocal()
+    try:
+        row = dict(db.execute(text(METRIC_AGGREGATE_QUERIES["current"])).mappings().one())
+        for key in ("avg_disk_usage", "max_disk_usage", "avg_ram_usage", "avg_cpu_usage"):
+            row[key] = _round(row[key])
+        return row
+    finally:
+        db.close()
+
+
+def explain_metric_aggregates() -> dict[str, list[str]]:
+    """EXPLAIN QUERY PLAN detail lines for each METRIC_AGGREGATE_QUERIES entry."""
+    params = {"width": 3600, "start": 0, "end": 2**62, "limit": 1}
+    db = SessionLocal()
+    try:
+        return {
+            name: [row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql), params)]
+            for name, sql in METRIC_AGGREGATE_QUERIES.items()
+        }
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 13. per-device trend statistics (device_trends)
+# ---------------------------------------------------------------------------
+
+def _window_slope(window: list[list[float]]) -> Optional[float]:
+    """Least-squares slope of [[epoch s, score], ...] in score points per day."""
+    n = len(window)
+    if n < 2:
+        return None
+    mean_x = sum(p[0] for p in window) / n
+    mean_y = sum(p[1] for p in window) / n
+    sxx = sum((p[0] - mean_x) ** 2 for p in window)
+    if sxx == 0:
+        return None
+    sxy = sum((p[0] - mean_x) * (p[1] - mean_y) for p in window)
+    return sxy / sxx * 86400
+
+
+def _step_trend(
+    trend: Optional[DeviceTrend],
+    device_id: int,
+    collected_at: datetime,
+    score: float,
+    risk_level: str,
+) -> DeviceTrend:
+    """
+    Fold one report into *trend* (a new row for the first report). Constant
+    work per report: the regression only sees the last TREND_WINDOW points.
+    """
+    collected_at = _as_utc(collected_at)
+    point = [int(collected_at.timestamp()), score]
+    if trend is None:
+        return DeviceTrend(
+            device_id=device_id,
+            report_count=1,
+            first_score=score,
+            latest_score=score,
+            min_score=score,
+            max_score=score,
+            ewma_score=score,
+            window_json=json.dumps([point]),
+            slope_per_day=None,
+            risk_level=risk_level,
+            risk_level_since=collected_at,
+        )
+
+    window = json.loads(trend.window_json)
+    window.append(point)
+    del window[:-config.TREND_WINDOW]
+    alpha = 2.0 / (config.TREND_EWMA_SPAN + 1)
+
+    trend.report_count += 1
+    trend.latest_score = score
+    trend.min_score = min(trend.min_score, score)
+    trend.max_score = max(trend.max_score, score)
+    trend.ewma_score += alpha * (score - trend.ewma_score)
+    trend.window_json = json.dumps(window)
+    trend.slope_per_day = _window_slope(window)
+    if risk_level != trend.risk_level:
+        trend.risk_level = risk_level
+        trend.risk_level_since = collected_at
+    return trend
+
+
+def _trend_list_fields(trend: Optional[DeviceTrend]) -> dict:
+    """The trend keys of a /api/devices entry (all None before the first report)."""
+    if trend is None:
+        return {
+            "score_ewma": None, "score_slope_per_day": None,
+            "min_score": None, "max_score": None, "risk_level_since": None,
+        }
+    return {
+        "score_ewma":          _round(trend.ewma_score),
+        "score_slope_per_day": _round(trend.slope_per_day),
+        "min_score":           trend.min_score,
+        "max_score":           trend.max_score,
+        "risk_level_since":    _as_utc(trend.risk_level_since).isoformat(),
+    }
+
+
+def get_device_trend(hostname: str) -> dict:
+    """
+    Trend statistics of *hostname* from its device_trends row; report_count
+    is 0 and the statistics None before the first report.
+    Raises KeyError if device not found.
+    """
+    db = SessionLocal()
+    try:
+        device: Optional[Device] = (
+            db.query(Device).filter(Device.hostname == hostname).first()
+        )
+        if device is None:
+            raise KeyError(f"Device '{hostname}' not found.")
+        trend = db.get(DeviceTrend, device.id)
+        if trend is None:
+            return {"hostname": hostname, "report_count": 0}
+
+        since = _as_utc(trend.risk_level_since)
+        return {
+            "hostname":                  hostname,
+            "report_count":              trend.report_count,
+            "first_score":               trend.first_score,
+            "latest_score":              trend.latest_score,
+            "min_score":                 trend.min_score,
+            "max_score":                 trend.max_score,
+            "improvement_total":         round(trend.latest_score - trend.first_score, 2),
+            "ewma_score":                _round(trend.ewma_score),
+            "ewma_span":                 config.TREND_EWMA_SPAN,
+            "slope_per_day":             _round(trend.slope_per_day),
+            "window_size":               len(json.loads(trend.window_json)),
+            "risk_level":                trend.risk_level,
+            "risk_level_since":          since.isoformat(),
+            "seconds_since_risk_change": max(0, int((_utcnow() - since).total_seconds())),
+        }
+    finally:
+        db.close()
+
+
+def rebuild_device_trends(only_if_empty: bool = True) -> int:
+    """
+    Recompute device_trends by replaying device_reports in insertion order
+    (backfill for databases created before the table existed). With
+    *only_if_empty* (default) it is a no-op once any trend row exists.
+    Returns the number of reports replayed.
+    """
+    db = SessionLocal()
+    try:
+        if only_if_empty and db.query(DeviceTrend.device_id).first() is not None:
+            return 0
+
+        trends: dict[int, DeviceTrend] = {}
+        replayed = 0
+        rows = (
+            db.query(
+                DeviceReport.device_id,
+                DeviceReport.collected_at,
+                DeviceReport.total_score,
+                DeviceReport.risk_level,
+            )
+            .order_by(asc(DeviceReport.id))
+            .yield_per(1000)
+        )
+        for device_id, collected_at, score, risk_level in rows:
+            replayed += 1
+            trends[device_id] = _step_trend(trends.get(device_id), device_id, collected_at, score, risk_level)
+
+        db.query(DeviceTrend).delete(synchronize_session=False)
+        db.add_all(trends.values())
+        db.commit()
+        return replayed
+    finally:
+        db.close()
+
+
+def refresh_device_trends(device_ids: Iterable[int]) -> int:
+    """
+    After a rescore, recompute the score-derived fields of the device_trends
+    rows of *device_ids* from their retained reports: latest_score,
+    ewma_score, window_json / slope_per_day and risk_level (risk_level_since
+    moves only when the level changes). report_count, first_score and
+    min/max_score keep their values from ingest.
+
+    Each row is updated in place and only while its report_count is the one
+    read; a report folded in meanwhile makes the device be recomputed again.
+    Returns the number of rows updated.
+    """
+    alpha = 2.0 / (config.TREND_EWMA_SPAN + 1)
+    updated = 0
+    for device_id in device_ids:
+        for _ in range(3):
+            db = SessionLocal()
+            try:
+                trend = db.get(DeviceTrend, device_id)
+                if trend is None:
+                    break
+                ewma: Optional[float] = None
+                window: list[list[float]] = []
+                risk_level, risk_since = trend.risk_level, trend.risk_level_since
+                rows = (
+                    db.query(DeviceReport.collected_at, DeviceReport.total_score, DeviceReport.risk_level)
+                    .filter(DeviceReport.device_id == device_id)
+                    .order_by(asc(DeviceReport.id))
+                )
+                level_run: Optional[tuple[str, datetime]] = None
+                for collected_at, score, level in rows:
+                    ewma = score if ewma is None else ewma + alpha * (score - ewma)
+                    window.append([int(_as_utc(collected_at).timestamp()), score])
+                    del window[:-config.TREND_WINDOW]
+                    if level_run is None or level != level_run[0]:
+                        level_run = (level, _as_utc(collected_at))
+                if ewma is None or level_run is None:
+                    break
+                if level_run[0] != risk_level:
+                    risk_level, risk_since = level_run
+                result = db.execute(
+                    update(DeviceTrend)
+                    .where(DeviceTrend.device_id == device_id, DeviceTrend.report_count == trend.report_count)
+                    .values(
+                        latest_score=window[-1][1],
+                        ewma_score=ewma,
+                        window_json=json.dumps(window),
+                        slope_per_day=_window_slope(window),
+                        risk_level=risk_level,
+                        risk_level_since=risk_since,
+                    )
+                )
+                db.commit()
+                if result.rowcount:
+                    updated += 1
+                    break
+            finally:
+                db.close()
+    return updated
+
+
+# ---------------------------------------------------------------------------
+# 14. report export (GET /api/export/reports)
+# ---------------------------------------------------------------------------
+
+RISK_LEVELS = ("EXCELLENT", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+
+def iter_report_export(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hostnames: Optional[list[str]] = None,
+    risk_levels: Optional[list[str]] = None,
+    batch_size: Optional[int] = None,
+) -> Iterator[list[dict]]:
+    """
+    Stored reports matching the filters, in id (insertion) order, as batches
+    of at most *batch_size* (EXPORT_BATCH_SIZE) dicts. One streamed query
+    (yield_per): memory
+    stays at one batch whatever the row count. metrics_json / issues_json
+    are passed through unparsed. The session stays open until the generator
+    is exhausted or closed.
+    """
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(
+                DeviceReport.id,
+                Device.hostname,
+                Device.device_type,
+                DeviceReport.collected_at,
+                DeviceReport.total_score,
+                DeviceReport.risk_level,
+                DeviceReport.metrics_json,
+                DeviceReport.issues_json,
+            )
+            .join(Device, DeviceReport.device_id == Device.id)
+            .order_by(asc(DeviceReport.id))
+        )
+        # Stored timestamps are naive UTC; compare in the same form
+        if start is not None:
+            stmt = stmt.where(DeviceReport.collected_at >= _parse_ts(start).astimezone(timezone.utc).replace(tzinfo=None))
+        if end is not None:
+            stmt = stmt.where(DeviceReport.collected_at <= _parse_ts(end).astimezone(timezone.utc).replace(tzinfo=None))
+        if hostnames:
+            stmt = stmt.where(Device.hostname.in_(hostnames))
+        if risk_levels:
+            stmt = stmt.where(DeviceReport.risk_level.in_(risk_levels))
+
+        result = db.execute(stmt.execution_options(yield_per=batch_size or config.EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            yield [
+                {
+                    "id":           row.id,
+                    "hostname":     row.hostname,
+                    "device_type":  row.device_type,
+                    "collected_at": _as_utc(row.collected_at).isoformat(),
+                    "score":        row.total_score,
+                    "risk_level":   row.risk_level,
+                    "metrics_json": row.metrics_json,
+                    "issues_json":  row.issues_json,
+                }
+                for row in rows
+            ]
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# 15. cache warm start (server/warm_start.py)
+# ---------------------------------------------------------------------------
+
+def get_latest_reports() -> list[dict]:
+    """
+    The latest stored report of every active device, with the device's
+    last_seen_at, in one query. Driven from devices: each device's latest
+    report id (collected_at, then id, newest first) is one descending seek
+    into ix_device_reports_device_id_collected_at, so the cost grows with
+    the number of devices, not with their retained history.
+    """
+    latest_id = (
+        select(DeviceReport.id)
+        .where(DeviceReport.device_id == Device.id)
+        .order_by(desc(DeviceReport.collected_at), desc(DeviceReport.id))
+        .limit(1)
+        .correlate(Device)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            Device.hostname,
+            Device.last_seen_at,
+            DeviceReport.total_score,
+            DeviceReport.metrics_json,
+            DeviceReport.issues_json,
+        )
+        .join(DeviceReport, DeviceReport.id == latest_id)
+        .where(Device.is_active.is_(True))
+    )
+    db = SessionLocal()
+    try:
         return [
             {
-                "timestamp":     ts.isoformat(),
-                "fleet_avg":     _avg(b["fleet"]),
-                "server_avg":    _avg(b["server"]),
-                "client_avg":    _avg(b["client"]),
-                "critical_count": b["critical"],
+                "hostname":     row.hostname,
+                "last_seen_at": _as_utc(row.last_seen_at),
+                "total_score":  row.total_score,
+                "metrics_json": row.metrics_json,
+                "issues_json":  row.issues_json,
             }
-            for ts in sorted(buckets)
-            for b in [buckets[ts]]
+            for row in db.execute(stmt)
         ]
     finally:
         db.close()
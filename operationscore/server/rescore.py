@@ -0,0 +1,259 @@
+"""
+server/rescore.py — Recompute stored report scores after a rule change.
+
+device_reports keeps the total_score / risk_level / issue columns computed
+when each report arrived. After the rule spec changes they are stale; a
+RescoreJob recomputes them from metrics_json:
+
+  - Rows are read in keyset-paged chunks of RESCORE_CHUNK_SIZE (id > last
+    id), so the table is never held in memory. At most two chunks per
+    worker are in flight at a time.
+  - Chunks are scored in a process pool of RESCORE_WORKERS processes
+    (workers=0 scores inline), each worker using the active rule spec.
+    A chunk is scored column-wise by calculate_scores_batch(); issues and
+    the other score columns are only rebuilt for rows whose score changed,
+    and only those rows are written.
+  - Each scored chunk is written back in one transaction, together with the
+    score changes of the fleet_rollup buckets the rows belong to. At the end
+    the device_trends rows of the devices whose scores changed get their
+    score-derived fields recomputed in place (lifetime fields are kept).
+  - progress() reports processed / updated (written) / changed / failed rows,
+    throughput and an ETA while the job runs.
+
+Run it from the command line:
+
+    python -m server.rescore [--chunk-size N] [--workers N]
+
+or start it in the server via POST /api/admin/rescore and poll
+GET /api/admin/rescore (both need the SERVER account's HTTP Basic
+credentials).
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic import ValidationError
+
+from server import config
+from server import repository
+from server.models import DeviceMetrics
+from server.scoring import engine
+from server.scoring.batch import calculate_scores_batch, columns_from_metrics
+from server.scoring.spec import rule_spec
+
+logger = logging.getLogger(__name__)
+
+
+def _score_chunk(rows: list[tuple[int, str, float]]) -> tuple[list[dict], int, int]:
+    """
+    Score one chunk (runs in a pool worker; module-level so it pickles).
+    Returns (update rows of the reports whose score changed, their count,
+    rows that failed to parse).
+    """
+    parsed: list[tuple[int, DeviceMetrics, float]] = []
+    failed = 0
+    for report_id, metrics_json, old_score in rows:
+        try:
+            parsed.append((report_id, DeviceMetrics.model_validate_json(metrics_json), old_score))
+        except (ValidationError, ValueError, TypeError):
+            failed += 1
+
+    updates: list[dict] = []
+    if engine.RULES:
+        # Runtime-registered rule functions are not part of the batch path
+        for report_id, metrics, old_score in parsed:
+            report = engine.calculate_score(metrics)
+            if report.total_score != old_score:
+                updates.append({"id": report_id, **repository.serialize_report(metrics, report)})
+        return updates, len(updates), failed
+
+    rule_set = rule_spec.current()
+    batch = calculate_scores_batch(columns_from_metrics([m for _, m, _ in parsed], rule_set), rule_set)
+    for i, (report_id, metrics, old_score) in enumerate(parsed):
+        # numpy sums the penalties in another order than calculate_score()
+        if not math.isclose(batch.scores[i], old_score, rel_tol=0.0, abs_tol=1e-9):
+            updates.append({"id": report_id, **repository.serialize_report(metrics, batch.report(i))})
+    return updates, len(updates), failed
+
+
+class RescoreJob:
+    """One pass over device_reports. run() blocks; progress() is thread-safe to read."""
+
+    def __init__(self, chunk_size: Optional[int] = None, workers: Optional[int] = None) -> None:
+        self.chunk_size = chunk_size or config.RESCORE_CHUNK_SIZE
+        self.workers = config.RESCORE_WORKERS if workers is None else workers
+        self.state = "pending"          # pending | running | done | failed | cancelled
+        self.error: Optional[str] = None
+        self.total = 0
+        self.processed = 0
+        self.updated = 0
+        self.changed = 0
+        self.failed = 0
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started_mono = 0.0
+        self._elapsed: Optional[float] = None
+        self._cancel = threading.Event()
+        self._changed_devices: set[int] = set()
+
+    # ------------------------------------------------------------------
+    # Progress
+    # ------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self.state in ("pending", "running")
+
+    def cancel(self) -> None:
+        """Stop after the chunks already in flight are written."""
+        self._cancel.set()
+
+    def progress(self) -> dict:
+        if self._elapsed is not None:
+            elapsed = self._elapsed
+        elif self._started_mono:
+            elapsed = time.monotonic() - self._started_mono
+        else:
+            elapsed = 0.0
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.processed)
+        return {
+            "state": self.state,
+            "total": self.total,
+            "processed": self.processed,
+            "updated": self.updated,
+            "changed": self.changed,
+            "failed": self.failed,
+            "percent": (self.processed / self.total) * 100.0 if self.total else 100.0,
+            "rows_per_second": round(rate, 1),
+            "elapsed_seconds": round(elapsed, 3),
+            "eta_seconds": round(remaining / rate, 1) if self.running and rate > 0 else None,
+            "chunk_size": self.chunk_size,
+            "workers": self.workers,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+    def run(self) -> dict:
+        """Rescore every report. Returns the final progress()."""
+        self.state = "running"
+        self.started_at = datetime.now(timezone.utc)
+        self._started_mono = time.monotonic()
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        try:
+            self.total = repository.count_reports()
+            logger.info(
+                "rescore started total=%d chunk_size=%d workers=%d",
+                self.total, self.chunk_size, self.workers,
+            )
+            if pool is None:
+                self._run_inline()
+            else:
+                self._run_pool(pool)
+            if self._changed_devices:
+                repository.refresh_device_trends(sorted(self._changed_devices))
+            self.state = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as exc:
+            self.state = "failed"
+            self.error = str(exc)
+            logger.exception("rescore failed after %d rows", self.processed)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self.finished_at = datetime.now(timezone.utc)
+            self._elapsed = time.monotonic() - self._started_mono
+        result = self.progress()
+        logger.info(
+            "rescore %s processed=%d changed=%d failed=%d rate=%.1f rows/s",
+            self.state, self.processed, self.changed, self.failed, result["rows_per_second"],
+        )
+        return result
+
+    def _chunks(self):
+        after_id = 0
+        while not self._cancel.is_set():
+            rows = repository.fetch_report_metrics(after_id, self.chunk_size)
+            if not rows:
+                return
+            after_id = rows[-1][0]
+            yield rows
+
+    def _write(self, rows_read: int, result: tuple[list[dict], int, int]) -> None:
+        updates, changed, failed = result
+        self._changed_devices |= repository.update_report_scores(updates)
+        self.processed += rows_read
+        self.updated += len(updates)
+        self.changed += changed
+        self.failed += failed
+
+    def _run_inline(self) -> None:
+        for rows in self._chunks():
+            self._write(len(rows), _score_chunk(rows))
+
+    def _run_pool(self, pool: ProcessPoolExecutor) -> None:
+        chunks = self._chunks()
+        in_flight: dict[Future, int] = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < self.workers * 2:
+                rows = next(chunks, None)
+                if rows is None:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(_score_chunk, rows)] = len(rows)
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._write(in_flight.pop(future), future.result())
+
+
+# The job started through the admin endpoint (one at a time)
+current_job: Optional[RescoreJob] = None
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute stored report scores with the current rules.")
+    parser.add_argument("--chunk-size", type=int, default=config.RESCORE_CHUNK_SIZE,
+                        help=f"Reports per chunk (default {config.RESCORE_CHUNK_SIZE})")
+    parser.add_argument("--workers", type=int, default=config.RESCORE_WORKERS,
+                        help=f"Scoring processes, 0 = inline (default {config.RESCORE_WORKERS})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    from server.db import init_db
+    init_db()  # the server does this on startup; older databases may lack fleet_rollup
+    job = RescoreJob(chunk_size=max(1, args.chunk_size), workers=max(0, args.workers))
+    reporter_done = threading.Event()
+
+    def report_progress() -> None:
+        while not reporter_done.wait(2.0):
+            p = job.progress()
+            print(f"  {p['processed']}/{p['total']} ({p['percent']:.1f}%) "
+                  f"{p['rows_per_second']} rows/s eta={p['eta_seconds']}s", flush=True)
+
+    reporter = threading.Thread(target=report_progress, daemon=True)
+    reporter.start()
+    try:
+        result = job.run()
+    finally:
+        reporter_done.set()
+    print(f"rescore {result['state']}: processed={result['processed']} updated={result['updated']} "
+          f"changed={result['changed']} failed={result['failed']} "
+          f"in {result['elapsed_seconds']}s ({result['rows_per_second']} rows/s)")
+    return 0 if result["state"] == "done" else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
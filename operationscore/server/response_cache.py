@@ -0,0 +1,174 @@
+"""
+server/response_cache.py — Generation-versioned cache of serialized GET responses.
+
+The dashboard polls a few read endpoints (/latest_reports, /devices,
+/api/devices, /snapshot/latest) far more often than their data changes.
+Every write that can change them (a report, a registration, a deactivation,
+a snapshot rebuild/reset) calls bump(), which advances a process-wide
+ingest generation. cached_json() builds and serializes a response at most
+once per generation and key; later requests reuse the stored bytes:
+
+  - ETag is "<boot id>-<generation>", so a matching If-None-Match gets a
+    304 without building or serializing anything.
+  - Bodies of at least RESPONSE_GZIP_MIN_BYTES are gzip-compressed once and
+    served compressed to clients that send Accept-Encoding: gzip.
+
+serve() answers a request from any CachedBody with the same rules; the
+snapshot store uses it to serve its own pre-serialized snapshot, which
+also carries a Last-Modified date (If-Modified-Since → 304).
+
+subscribe() observes every bump (server/cluster.py forwards them so the
+other workers invalidate too).
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import secrets
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from server import config
+from server.telemetry import response_cache_requests
+
+_HIT = response_cache_requests.labels("hit")
+_MISS = response_cache_requests.labels("miss")
+_NOT_MODIFIED = response_cache_requests.labels("not_modified")
+
+# Distinguishes ETags across restarts (the generation restarts at 0)
+_BOOT_ID = secrets.token_hex(4)
+
+_generation = 0
+
+# key → CachedBody for the generation it was built in
+_entries: dict[str, "CachedBody"] = {}
+
+# Called with the new generation after every bump()
+_listeners: list[Callable[[int], None]] = []
+
+
+class CachedBody:
+    """
+    A serialized JSON body, its ETag (from *version*) and, optionally, its
+    Last-Modified time. The gzipped copy is built on first use.
+    """
+
+    def __init__(self, body: bytes, version: Any, last_modified: Optional[datetime] = None) -> None:
+        self.body = body
+        self.version = version
+        self.etag = f'"{_BOOT_ID}-{version}"'
+        # HTTP dates have one-second resolution
+        self.last_modified = (
+            last_modified.astimezone(timezone.utc).replace(microsecond=0) if last_modified else None
+        )
+        self._gzipped: Optional[bytes] = None
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+def bump() -> int:
+    """Invalidate every cached response. Call after any ingest-side write."""
+    global _generation
+    _generation += 1
+    for listener in list(_listeners):
+        listener(_generation)
+    return _generation
+
+
+def subscribe(listener: Callable[[int], None]) -> None:
+    _listeners.append(listener)
+
+
+def generation() -> int:
+    return _generation
+
+
+def clear() -> None:
+    _entries.clear()
+
+
+def size() -> int:
+    """Number of cached responses (any generation)."""
+    return len(_entries)
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if not header or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+
+def serialize(payload: Any) -> bytes:
+    """Compact UTF-8 JSON, as served by cached_json()."""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def serve(request: Request, entry: CachedBody) -> Response:
+    """
+    Respond with *entry*: 304 if the client's If-None-Match (or, without
+    one, If-Modified-Since) still matches, else the body, gzipped when large
+    enough and accepted.
+    """
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if entry.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(entry.last_modified, usegmt=True)
+    if_none_match = request.headers.get("if-none-match")
+    if _etag_matches(if_none_match, entry.etag) or (
+        if_none_match is None
+        and _not_modified_since(request.headers.get("if-modified-since"), entry.last_modified)
+    ):
+        _NOT_MODIFIED.inc()
+        return Response(status_code=304, headers=headers)
+
+    if (
+        len(entry.body) >= config.RESPONSE_GZIP_MIN_BYTES
+        and "gzip" in request.headers.get("accept-encoding", "")
+    ):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=entry.gzipped(), media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def cached_json(request: Request, key: str, build: Callable[[], Any]) -> Response:
+    """
+    Serve *build()* as JSON, reusing bytes cached for the current generation.
+    *key* must identify the endpoint and every parameter that affects the body.
+    """
+    entry = _entries.get(key)
+    if entry is None or entry.version != _generation:
+        _MISS.inc()
+        generation_at_build = _generation
+        entry = CachedBody(serialize(build()), generation_at_build)
+        _entries[key] = entry
+    else:
+        _HIT.inc()
+    return serve(request, entry)
@@ -0,0 +1,239 @@
+"""
+server/run_sessions.py — Run / scan-session bookkeeping with O(1) counters.
+
+A RunSession keeps its target devices plus running completed / score_sum
+counters, so progress and summary reads never walk the device map. A
+SessionStore indexes hostname → open sessions that still wait for that
+host, so attaching a report touches only the sessions it completes.
+
+Finished sessions stay in memory for RUN_SESSION_TTL_SECONDS; unfinished
+ones for at most RUN_SESSION_MAX_AGE_SECONDS. evict_expired() then moves
+them to the run_session_archive table, and get()/summaries() fall back to
+that table so evicted runs stay queryable.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from server import config
+from server import repository
+
+logger = logging.getLogger(__name__)
+
+# Per-device result: {"timestamp": datetime|str, "score": float, "issues": list}
+DeviceResult = dict[str, Any]
+
+
+class RunSession:
+    """One run: target devices (result or None while pending) and counters."""
+
+    def __init__(self, run_id: str, started_at: datetime, targets: Iterable[str]) -> None:
+        self.run_id = run_id
+        self.started_at = started_at
+        self.devices: dict[str, Optional[DeviceResult]] = dict.fromkeys(targets)
+        self.completed = 0
+        self.score_sum = 0.0
+        # Hostnames that reported while this run was current (targets or not)
+        self._reporters: set[str] = set()
+        self.reported_count = 0
+        self.finished_at: Optional[datetime] = None
+        self._finished_mono: Optional[float] = None
+        self._created_mono = time.monotonic()
+        self._check_finished()
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+    @property
+    def total(self) -> int:
+        return len(self.devices)
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.completed
+
+    @property
+    def average_score(self) -> Optional[float]:
+        return self.score_sum / self.completed if self.completed else None
+
+    @property
+    def completion_percent(self) -> float:
+        return (self.completed / self.total) * 100.0 if self.total else 0.0
+
+    def status(self, hostname: str) -> str:
+        return "pending" if self.devices.get(hostname) is None else "completed"
+
+    def statuses(self) -> dict[str, str]:
+        return {h: ("pending" if r is None else "completed") for h, r in self.devices.items()}
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def record(self, hostname: str, result: DeviceResult) -> bool:
+        """Attach a report. Returns True if *hostname* went from pending to completed."""
+        if hostname not in self._reporters:
+            self._reporters.add(hostname)
+            self.reported_count += 1
+        if hostname not in self.devices:
+            return False
+        previous = self.devices[hostname]
+        self.devices[hostname] = result
+        if previous is not None:
+            # Re-report: the latest report replaces the earlier one
+            self.score_sum += result["score"] - previous["score"]
+            return False
+        self.completed += 1
+        self.score_sum += result["score"]
+        self._check_finished()
+        return True
+
+    def _check_finished(self) -> None:
+        if self.finished_at is None and self.completed == self.total:
+            self.finished_at = datetime.now(timezone.utc)
+            self._finished_mono = time.monotonic()
+
+    def expired(self, now: float) -> bool:
+        if self._finished_mono is not None:
+            return now - self._finished_mono >= config.RUN_SESSION_TTL_SECONDS
+        return now - self._created_mono >= config.RUN_SESSION_MAX_AGE_SECONDS
+
+    # ------------------------------------------------------------------
+    # Archive round-trip
+    # ------------------------------------------------------------------
+    def to_archive(self, kind: str) -> dict:
+        devices = {
+            hostname: None if r is None else {
+                "timestamp": r["timestamp"],
+                "score": r["score"],
+                "issues": [i.model_dump() if hasattr(i, "model_dump") else i for i in r["issues"]],
+            }
+            for hostname, r in self.devices.items()
+        }
+        return {
+            "run_id":            self.run_id,
+            "kind":              kind,
+            "started_at":        self.started_at,
+            "finished_at":       self.finished_at,
+            "total_devices":     self.total,
+            "completed_devices": self.completed,
+            "score_sum":         self.score_sum,
+            "reported_count":    self.reported_count,
+            "devices_json":      json.dumps(devices, default=str, ensure_ascii=False),
+        }
+
+    @classmethod
+    def from_archive(cls, row: dict) -> "RunSession":
+        session = cls(row["run_id"], row["started_at"], ())
+        session.devices = json.loads(row["devices_json"])
+        session.completed = row["completed_devices"]
+        session.score_sum = row["score_sum"]
+        session.reported_count = row["reported_count"]
+        session.finished_at = row["finished_at"]
+        return session
+
+
+class SessionStore:
+    """In-memory sessions of one kind ("scan" or "run") with a pending-host index."""
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self._sessions: dict[str, RunSession] = {}
+        # hostname → run_ids in which that host is still pending
+        self._pending_by_host: dict[str, set[str]] = {}
+
+    def __contains__(self, run_id: str) -> bool:
+        return run_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def clear(self) -> None:
+        self._sessions.clear()
+        self._pending_by_host.clear()
+
+    def create(self, run_id: str, started_at: datetime, targets: Iterable[str]) -> RunSession:
+        session = RunSession(run_id, started_at, targets)
+        self._sessions[run_id] = session
+        for hostname in session.devices:
+            self._pending_by_host.setdefault(hostname, set()).add(run_id)
+        return session
+
+    def record(self, run_id: str, hostname: str, result: DeviceResult) -> bool:
+        """Attach a report to one session. False if the session is not in memory."""
+        session = self._sessions.get(run_id)
+        if session is None:
+            return False
+        if session.record(hostname, result):
+            self._unindex(hostname, run_id)
+        return True
+
+    def record_pending(self, hostname: str, result: DeviceResult) -> int:
+        """Complete *hostname* in every session still waiting for it. Returns the count."""
+        run_ids = self._pending_by_host.pop(hostname, ())
+        for run_id in run_ids:
+            session = self._sessions.get(run_id)
+            if session is not None:
+                session.record(hostname, result)
+        return len(run_ids)
+
+    def _unindex(self, hostname: str, run_id: str) -> None:
+        run_ids = self._pending_by_host.get(hostname)
+        if run_ids is not None:
+            run_ids.discard(run_id)
+            if not run_ids:
+                del self._pending_by_host[hostname]
+
+    async def get(self, run_id: str) -> Optional[RunSession]:
+        """Session from memory, else from the archive table; None if unknown."""
+        session = self._sessions.get(run_id)
+        if session is not None:
+            return session
+        row = await run_in_threadpool(repository.get_archived_run, self.kind, run_id)
+        return RunSession.from_archive(row) if row is not None else None
+
+    async def summaries(self) -> list[dict]:
+        """run_id / started_at / reported_count for every in-memory and archived session."""
+        items = {
+            run_id: {
+                "run_id": run_id,
+                "started_at": s.started_at,
+                "reported_count": s.reported_count,
+            }
+            for run_id, s in self._sessions.items()
+        }
+        for row in await run_in_threadpool(repository.list_archived_runs, self.kind):
+            items.setdefault(row["run_id"], row)
+        return list(items.values())
+
+    async def evict_expired(self) -> int:
+        """Archive and drop expired sessions. Returns the number evicted."""
+        now = time.monotonic()
+        expired = [s for s in self._sessions.values() if s.expired(now)]
+        if not expired:
+            return 0
+        try:
+            await run_in_threadpool(
+                repository.archive_run_sessions, [s.to_archive(self.kind) for s in expired]
+            )
+        except Exception:
+            logger.exception("run session archive failed kind=%s; keeping in memory", self.kind)
+            return 0
+        for session in expired:
+            self._sessions.pop(session.run_id, None)
+            for hostname, result in session.devices.items():
+                if result is None:
+                    self._unindex(hostname, session.run_id)
+        logger.info("archived %d %s sessions", len(expired), self.kind)
+        return len(expired)
+
+
+# Process-wide stores used by main.py (POST /tasks/broadcast creates both)
+scan_sessions = SessionStore("scan")
+run_sessions = SessionStore("run")
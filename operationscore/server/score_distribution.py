@@ -0,0 +1,284 @@
+"""
+server/score_distribution.py — Fleet score distribution as fixed-bin histograms.
+
+GET /api/fleet/distribution reports percentiles (p5 / p50 / p95) and a
+histogram of every device's latest score, per device type and fleet-wide.
+Instead of scanning device_reports_cache per request, one histogram per
+device type is kept up to date as latest scores change:
+
+  - update() moves a device's latest score from its old bin to its new one
+    (O(1)); remove() / clear() follow deactivations and snapshot resets.
+  - Histograms have BINS_PER_POINT bins per score point over 0–100; a
+    percentile (nearest rank) is the lower edge of the bin holding that
+    rank, so it is exact to 1 / BINS_PER_POINT and costs one pass over the
+    bins. Histograms merge by adding counts (the fleet-wide view is
+    SERVER + CLIENT).
+  - Device types are warmed from the devices table at startup, set on
+    registration and read through from the DB for a hostname not seen yet.
+  - save() writes the histograms and the latest score per hostname to
+    PERSIST_PATH (main.py does so every SCORE_DISTRIBUTION_PERSIST_SECONDS
+    while changed, and on shutdown); load() restores them at startup, so the
+    distribution is available again before the first report arrives.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from .snapshot_store import SNAPSHOT_DIR
+
+logger = logging.getLogger(__name__)
+
+PERSIST_PATH = SNAPSHOT_DIR / "score_distribution.json"
+
+BINS_PER_POINT = 2
+BIN_COUNT = 100 * BINS_PER_POINT + 1   # the last bin holds exactly 100
+DEVICE_TYPES = ("SERVER", "CLIENT")
+PERCENTILES = (5, 50, 95)
+
+
+class ScoreHistogram:
+    """Counts of scores (0–100) in bins of width 1 / BINS_PER_POINT."""
+
+    __slots__ = ("counts", "total", "score_sum")
+
+    def __init__(self, counts: Optional[list[int]] = None) -> None:
+        self.counts = list(counts) if counts is not None else [0] * BIN_COUNT
+        self.total = sum(self.counts)
+        self.score_sum = 0.0
+
+    @staticmethod
+    def bin_of(score: float) -> int:
+        return min(max(int(float(score) * BINS_PER_POINT), 0), BIN_COUNT - 1)
+
+    def add(self, score: float, n: int = 1) -> None:
+        """Count *score* n times (a negative n removes it)."""
+        self.counts[self.bin_of(score)] += n
+        self.total += n
+        self.score_sum += n * float(score)
+
+    def copy(self) -> "ScoreHistogram":
+        copied = ScoreHistogram(self.counts)
+        copied.score_sum = self.score_sum
+        return copied
+
+    def merge(self, other: "ScoreHistogram") -> "ScoreHistogram":
+        merged = ScoreHistogram([a + b for a, b in zip(self.counts, other.counts)])
+        merged.score_sum = self.score_sum + other.score_sum
+        return merged
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Nearest-rank *p*-th percentile, as the lower edge of its bin (None when empty)."""
+        if self.total <= 0:
+            return None
+        rank = max(1, math.ceil(p / 100.0 * self.total))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return i / BINS_PER_POINT
+        return 100.0
+
+    def mean(self) -> Optional[float]:
+        return self.score_sum / self.total if self.total > 0 else None
+
+    def buckets(self, width: int) -> list[dict]:
+        """Coarser histogram: *width*-point buckets over 0–100 (100 falls in the last)."""
+        result = []
+        for lower in range(0, 100, width):
+            first = lower * BINS_PER_POINT
+            last = (lower + width) * BINS_PER_POINT + (1 if lower + width == 100 else 0)
+            result.append({"lower": lower, "upper": lower + width, "count": sum(self.counts[first:last])})
+        return result
+
+
+class FleetDistribution:
+    """Latest score per hostname, folded into one ScoreHistogram per device type."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest: dict[str, tuple[str, float]] = {}     # hostname → (device type, score)
+        self._types: dict[str, str] = {}
+        self._histograms = {t: ScoreHistogram() for t in DEVICE_TYPES}
+        self.changes = 0     # bumped on every change; save() records the value it wrote
+        self._saved_changes = 0
+
+    # ------------------------------------------------------------------
+    # Device types
+    # ------------------------------------------------------------------
+    def warm_types(self, types: dict[str, str]) -> None:
+        with self._lock:
+            self._types.update(types)
+
+    def set_device_type(self, hostname: str, device_type: str) -> None:
+        """Record a (re-)registration; a device already counted moves to its new type."""
+        with self._lock:
+            self._types[hostname] = device_type
+            latest = self._latest.get(hostname)
+            if latest is not None and latest[0] != device_type:
+                self._move(hostname, device_type, latest[1])
+
+    def forget_type(self, hostname: Optional[str]) -> None:
+        """Re-read the type from the DB at the next update (registry add / invalidate)."""
+        with self._lock:
+            if hostname is None:
+                self._types.clear()
+            else:
+                self._types.pop(hostname, None)
+
+    def _device_type(self, hostname: str) -> str:
+        device_type = self._types.get(hostname)
+        if device_type is None:
+            from server import repository  # lazy, like device_registry
+            try:
+                device_type = repository.get_device_types([hostname]).get(hostname, "CLIENT")
+            except Exception:
+                logger.exception("device type lookup failed hostname=%s", hostname)
+                device_type = "CLIENT"
+            with self._lock:
+                self._types[hostname] = device_type
+        return device_type
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def update(self, hostname: str, score: float) -> None:
+        """Make *score* the latest score of *hostname*."""
+        device_type = self._device_type(hostname)
+        with self._lock:
+            self._move(hostname, device_type, float(score))
+
+    def _move(self, hostname: str, device_type: str, score: float) -> None:
+        previous = self._latest.get(hostname)
+        if previous == (device_type, score):
+            return
+        if previous is not None:
+            self._histograms[previous[0]].add(previous[1], -1)
+        self._histograms.setdefault(device_type, ScoreHistogram()).add(score)
+        self._latest[hostname] = (device_type, score)
+        self.changes += 1
+
+    def remove(self, hostname: str) -> None:
+        with self._lock:
+            previous = self._latest.pop(hostname, None)
+            if previous is not None:
+                self._histograms[previous[0]].add(previous[1], -1)
+                self.changes += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._latest.clear()
+            self._histograms = {t: ScoreHistogram() for t in DEVICE_TYPES}
+            self.changes += 1
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def summary(self, bucket_width: int = 10) -> dict:
+        """{"device_count", "bin_width", "fleet", "server", "client"} for the API."""
+        with self._lock:
+            histograms = {t: self._histograms[t].copy() for t in DEVICE_TYPES}
+            count = len(self._latest)
+        fleet = histograms["SERVER"].merge(histograms["CLIENT"])
+
+        def describe(histogram: ScoreHistogram) -> dict:
+            mean = histogram.mean()
+            return {
+                "count": histogram.total,
+                "mean": round(mean, 2) if mean is not None else None,
+                **{f"p{p}": histogram.percentile(p) for p in PERCENTILES},
+                "histogram": histogram.buckets(bucket_width),
+            }
+
+        return {
+            "device_count": count,
+            "bin_width": 1 / BINS_PER_POINT,
+            "fleet": describe(fleet),
+            "server": describe(histograms["SERVER"]),
+            "client": describe(histograms["CLIENT"]),
+        }
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def dirty(self) -> bool:
+        return self.changes != self._saved_changes
+
+    def save(self, path: Optional[Path] = None) -> bool:
+        """Atomically write the current state to *path* (PERSIST_PATH). False on failure."""
+        path = path or PERSIST_PATH
+        with self._lock:
+            changes = self.changes
+            body = json.dumps({
+                "bins_per_point": BINS_PER_POINT,
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+                "histograms": {t: h.counts for t, h in self._histograms.items()},
+                "score_sums": {t: h.score_sum for t, h in self._histograms.items()},
+                "devices": {hostname: list(latest) for hostname, latest in self._latest.items()},
+            }, separators=(",", ":"))
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(body, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception("score distribution save failed path=%s", path)
+            return False
+        self._saved_changes = changes
+        return True
+
+    def load(self, path: Optional[Path] = None, active: Optional[dict[str, str]] = None) -> int:
+        """
+        Restore the state written by save(). *active* (hostname → device
+        type, from the devices table) drops hostnames deactivated meanwhile
+        and moves devices whose type changed. Returns the devices loaded; a
+        missing or unreadable file leaves the distribution empty.
+        """
+        path = path or PERSIST_PATH
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            devices = {h: (str(t), float(s)) for h, (t, s) in data["devices"].items()}
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("score distribution file unreadable path=%s", path)
+            return 0
+
+        if active is not None:
+            current = {h: (active[h], s) for h, (_, s) in devices.items() if h in active}
+            stale = current != devices
+            devices = current
+        else:
+            stale = False
+        with self._lock:
+            if data.get("bins_per_point") == BINS_PER_POINT and not stale:
+                self._histograms = {t: ScoreHistogram(counts) for t, counts in data["histograms"].items()}
+                for t, score_sum in data.get("score_sums", {}).items():
+                    self._histograms[t].score_sum = score_sum
+                self._latest = devices
+            else:
+                # Different binning or changed devices: re-bin from the per-device scores
+                self._histograms = {t: ScoreHistogram() for t in DEVICE_TYPES}
+                self._latest = {}
+                for hostname, (device_type, score) in devices.items():
+                    self._move(hostname, device_type, score)
+            for t in DEVICE_TYPES:
+                self._histograms.setdefault(t, ScoreHistogram())
+            for hostname, (device_type, _) in self._latest.items():
+                self._types.setdefault(hostname, device_type)
+            self._saved_changes = self.changes
+            return len(self._latest)
+
+
+# Process-wide distribution fed by main.py's report path
+score_distribution = FleetDistribution()
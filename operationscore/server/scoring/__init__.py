@@ -2,6 +2,9 @@
 
 from .engine import (
     calculate_score,
+    calculate_score_cached,
+    calculate_score_value,
+    metrics_content_hash,
     get_rules,
     register_rule,
     unregister_rule,
@@ -20,6 +23,9 @@ from .rules import (
 
 __all__ = [
     "calculate_score",
+    "calculate_score_cached",
+    "calculate_score_value",
+    "metrics_content_hash",
     "get_rules",
     "register_rule",
     "unregister_rule",
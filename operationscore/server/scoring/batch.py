@@ -0,0 +1,189 @@
+"""
+Vectorized scoring of many devices at once.
+
+calculate_score() evaluates each rule per device and builds a ScoreIssue
+(with formatted message) for every hit. For fleet or history rescoring,
+calculate_scores_batch() takes columnar metrics (one numpy array per field)
+and evaluates the tier tables of the compiled rule spec (spec.py)
+column-wise into an (n_devices × n_rules) penalty matrix plus a matching
+hit matrix (a tier may carry a zero penalty and still report an issue).
+Scores come straight from the penalty matrix; ScoreIssue objects are only built when
+issues()/report() is asked for a row, by the same compiled rules, so
+messages are identical to the per-device path.
+
+Rules added at runtime through engine.register_rule() are plain functions
+and are not part of the batch path.
+"""
+
+from types import SimpleNamespace
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models import DeviceMetrics, ScoreIssue, ScoreReport
+from .spec import CompiledRule, CompiledRuleSet, rule_spec
+
+# DeviceMetrics annotation → column dtype (anything else is an object column)
+_DTYPES: Dict[Any, Any] = {int: np.int64, float: np.float64, bool: np.bool_}
+
+
+def _dtype(field: str) -> Any:
+    return _DTYPES.get(DeviceMetrics.model_fields[field].annotation, object)
+
+
+def required_columns(rule_set: Optional[CompiledRuleSet] = None) -> Dict[str, Any]:
+    """Metric field → column dtype for every field the rule set reads."""
+    rule_set = rule_set or rule_spec.current()
+    return {rule.field: _dtype(rule.field) for rule in rule_set}
+
+
+def _object_column(values: Sequence[Any]) -> np.ndarray:
+    # Element-wise fill: np.array() would turn equal-length lists into a 2-D array
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = list(value)
+    return column
+
+
+def _measure_column(rule: CompiledRule, column: np.ndarray) -> np.ndarray:
+    """Vector form of CompiledRule.measure()."""
+    if rule.fail_when is not None:
+        return (column.astype(bool) == rule.fail_when).astype(np.int64)
+    if rule.measure_kind == "count":
+        return np.fromiter((len(v) for v in column), dtype=np.int64, count=len(column))
+    return column
+
+
+def _rule_penalties(rule: CompiledRule, column: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (hit, penalty) per device for one rule: searchsorted over the rule's
+    thresholds. hit is True where a tier matched, whatever its penalty.
+    """
+    measure = _measure_column(rule, column)
+    index = np.searchsorted(np.asarray(rule.thresholds), measure, side="left") - 1
+    choices = []
+    for tier in rule.tiers:
+        if isinstance(tier.penalty, tuple):
+            base, per_unit, cap = tier.penalty
+            choices.append(np.minimum(cap, base + per_unit * measure))
+        else:
+            choices.append(np.full(len(measure), tier.penalty))
+    penalties = np.select([index == t for t in range(len(rule.tiers))], choices, default=0.0)
+    return index >= 0, penalties
+
+
+class BatchScores:
+    """
+    Result of calculate_scores_batch().
+
+    Attributes:
+        rule_ids: Matrix column order (the rule set's rule order).
+        penalties: float array (n, len(rule_ids)); 0.0 where a rule passed.
+        hits: bool array (n, len(rule_ids)); True where a rule fired.
+        total_penalty: Row sums clamped to 100.
+        scores: Final scores (0-100), same as ScoreReport.total_score.
+    """
+
+    def __init__(
+        self,
+        rule_set: CompiledRuleSet,
+        columns: Dict[str, np.ndarray],
+        penalties: np.ndarray,
+        hits: np.ndarray,
+    ) -> None:
+        self._rule_set = rule_set
+        self._columns = columns
+        self.rule_ids: Tuple[str, ...] = tuple(r.rule_id for r in rule_set)
+        self.penalties = penalties
+        self.hits = hits
+        self.total_penalty = np.minimum(penalties.sum(axis=1), 100.0)
+        self.scores = np.maximum(0.0, 100.0 - self.total_penalty)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def triggered(self, index: int) -> List[str]:
+        """Rule ids that fired for row *index*, in evaluation order."""
+        return [self.rule_ids[j] for j in np.flatnonzero(self.hits[index])]
+
+    def _row(self, index: int) -> SimpleNamespace:
+        values = {}
+        for name, column in self._columns.items():
+            value = column[index]
+            values[name] = value.item() if isinstance(value, np.generic) else value
+        return SimpleNamespace(**values)
+
+    def issues(self, index: int) -> List[ScoreIssue]:
+        """Build the ScoreIssue list for row *index* (only the rules that fired)."""
+        fired = np.flatnonzero(self.hits[index])
+        if not len(fired):
+            return []
+        row = self._row(index)
+        return [self._rule_set.rules[j](row) for j in fired]
+
+    def report(self, index: int) -> ScoreReport:
+        """Full ScoreReport for row *index*, equal to calculate_score() on that device."""
+        return ScoreReport(total_score=float(self.scores[index]), issues=self.issues(index))
+
+
+def columns_from_metrics(
+    metrics: Sequence[DeviceMetrics],
+    rule_set: Optional[CompiledRuleSet] = None,
+) -> Dict[str, np.ndarray]:
+    """Transpose DeviceMetrics objects into the columnar input of calculate_scores_batch()."""
+    columns: Dict[str, np.ndarray] = {}
+    for name, dtype in required_columns(rule_set).items():
+        if dtype is object:
+            column = _object_column([getattr(m, name) for m in metrics])
+        else:
+            column = np.fromiter((getattr(m, name) for m in metrics), dtype=dtype, count=len(metrics))
+        columns[name] = column
+    return columns
+
+
+def calculate_scores_batch(
+    columns: Mapping[str, Any],
+    rule_set: Optional[CompiledRuleSet] = None,
+) -> BatchScores:
+    """
+    Score many devices from columnar metrics.
+
+    Args:
+        columns: One array-like per field in required_columns(), all the
+            same length (see columns_from_metrics()). Extra keys are ignored.
+        rule_set: Compiled rules to apply; defaults to the active spec.
+
+    Returns:
+        BatchScores with the penalty matrix and per-device scores.
+
+    Raises:
+        ValueError: A column is missing or the columns differ in length.
+    """
+    rule_set = rule_set or rule_spec.current()
+    required = required_columns(rule_set)
+    missing = [name for name in required if name not in columns]
+    if missing:
+        raise ValueError(f"Missing metric columns: {', '.join(missing)}")
+
+    cols: Dict[str, np.ndarray] = {}
+    for name, dtype in required.items():
+        if dtype is object:
+            column = _object_column(columns[name])
+        else:
+            column = np.asarray(columns[name], dtype=dtype)
+        cols[name] = column
+
+    lengths = {len(column) for column in cols.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Metric columns differ in length: {sorted(lengths)}")
+    rows = lengths.pop() if lengths else 0
+
+    if len(rule_set):
+        evaluated = [_rule_penalties(rule, cols[rule.field]) for rule in rule_set]
+        hits = np.column_stack([hit for hit, _ in evaluated])
+        penalties = np.column_stack([penalty for _, penalty in evaluated])
+    else:
+        hits = np.zeros((rows, 0), dtype=bool)
+        penalties = np.zeros((rows, 0))
+    shape = (rows, len(rule_set))
+    return BatchScores(rule_set, cols, penalties.reshape(shape), hits.reshape(shape))
@@ -1,44 +1,65 @@
 """
 Modular rule-based operational health scoring engine.
 
-This module implements a flexible scoring system where each health rule
-is a function that evaluates device metrics and returns a ScoreIssue if
-a problem is detected, or None if the rule passes. Rules are combined
-into a comprehensive operational health score.
+The built-in rules K1-K10 are declared in rule_spec.json and compiled by
+spec.py into threshold tables (hot-reloaded when the file changes). Extra
+rules can still be plugged in as functions that take DeviceMetrics and
+return a ScoreIssue if a problem is detected, or None if the rule passes
+(register_rule). The per-rule modules in rules/ remain the reference
+implementation the compiled spec is tested against.
+
+get_rules() lists the compiled spec rules (callable like the functions in
+rules/) followed by the registered ones. Spec rules are removed by editing
+rule_spec.json; unregister_rule() raises for them instead of returning False.
+
+calculate_score_cached() memoizes reports in an LRU keyed by
+metrics_content_hash() (every scored field except last_seen_minutes) plus
+last_seen_minutes, so identical reports from a fleet are scored once.
 """
 
-from typing import Callable, Dict, Optional, List
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, List, Tuple, Union
+from .. import config
 from ..models import DeviceMetrics, ScoreIssue, ScoreReport
-
-# Import all rule functions from individual rule modules
-from .rules.k1_updates import rule_pending_updates
-from .rules.k2_firewall import rule_firewall_enabled
-from .rules.k3_ssh import rule_ssh_root_login_disabled
-from .rules.k4_sudo import rule_sudo_users_limit
-from .rules.k5_services import rule_unnecessary_services
-from .rules.k6_disk import rule_disk_usage
-from .rules.k7_password import rule_password_policy
-from .rules.k8_zombie import rule_zombie_detection
+from .rules import (
+    rule_disk_usage,
+    rule_firewall_enabled,
+    rule_password_policy,
+    rule_pending_updates,
+    rule_ssh_root_login_disabled,
+    rule_sudo_users_limit,
+    rule_unnecessary_services,
+    rule_zombie_detection,
+)
 from .rules.k9_ram import rule_ram_usage
 from .rules.k10_gpu import rule_cpu_usage
+from .spec import CompiledRule, rule_spec
 
 
 # Type alias for rule functions: takes DeviceMetrics, returns ScoreIssue or None
 RuleFunction = Callable[[DeviceMetrics], Optional[ScoreIssue]]
 
-# List of all registered rules in evaluation order
-RULES: List[RuleFunction] = [
-    rule_pending_updates,           # K1: Package updates
-    rule_firewall_enabled,          # K2: Firewall status
-    rule_ssh_root_login_disabled,   # K3: SSH root login
-    rule_sudo_users_limit,          # K4: Sudo user privileges
-    rule_unnecessary_services,      # K5: Unnecessary services
-    rule_disk_usage,                # K6: Disk capacity
-    rule_password_policy,           # K7: Password policy
-    rule_zombie_detection,          # K8: Zombie devices
-    rule_ram_usage,                 # K9: RAM utilization
-    rule_cpu_usage,                 # K10: CPU utilization
-]
+# Rules registered at runtime, evaluated after the compiled spec rules
+# (K1-K10 live in rule_spec.json; get_rules() lists both)
+RULES: List[RuleFunction] = []
+
+# Reference implementations of the built-in spec rules, which were entries
+# of RULES before the spec existed
+_REFERENCE_RULE_IDS: Dict[RuleFunction, str] = {
+    rule_pending_updates:         "K1",
+    rule_firewall_enabled:        "K2",
+    rule_ssh_root_login_disabled: "K3",
+    rule_sudo_users_limit:        "K4",
+    rule_unnecessary_services:    "K5",
+    rule_disk_usage:              "K6",
+    rule_password_policy:         "K7",
+    rule_zombie_detection:        "K8",
+    rule_ram_usage:               "K9",
+    rule_cpu_usage:               "K10",
+}
 
 
 def calculate_score(metrics: DeviceMetrics) -> ScoreReport:
@@ -50,7 +71,7 @@ def calculate_score(metrics: DeviceMetrics) -> ScoreReport:
     
     Algorithm:
     1. Start from base score of 100
-    2. Evaluate each rule function against metrics
+    2. Evaluate the compiled spec rules, then each registered rule function
     3. Collect all triggered rules (those returning ScoreIssue, not None)
     4. Sum penalties from all triggered rules
     5. Clamp total penalty to maximum of 100 (so score doesn't go below 0)
@@ -63,18 +84,16 @@ def calculate_score(metrics: DeviceMetrics) -> ScoreReport:
     Returns:
         ScoreReport containing the final score (0-100) and list of ScoreIssue objects.
     """
-    issues: List[ScoreIssue] = []
-    total_penalty = 0.0
+    issues: List[ScoreIssue] = [hit.to_issue() for hit in rule_spec.current().evaluate(metrics)]
     
-    # Evaluate each rule in the RULES list
+    # Evaluate each runtime-registered rule
     for rule_func in RULES:
         issue = rule_func(metrics)
         if issue is not None:
             issues.append(issue)
-            total_penalty += issue.penalty
     
     # Clamp total penalty to 100 (so score cannot go below 0)
-    total_penalty = min(total_penalty, 100.0)
+    total_penalty = min(sum(issue.penalty for issue in issues), 100.0)
     
     # Calculate final score: start from 100, subtract penalties
     final_score = max(0.0, 100.0 - total_penalty)
@@ -86,14 +105,124 @@ def calculate_score(metrics: DeviceMetrics) -> ScoreReport:
     )
 
 
+def calculate_score_value(metrics: DeviceMetrics) -> float:
+    """
+    Final score only, equal to calculate_score(metrics).total_score.
+
+    Compiled rules are evaluated without rendering any message; only
+    runtime-registered rule functions still build their ScoreIssue.
+    """
+    total_penalty = rule_spec.current().penalty(metrics)
+    for rule_func in RULES:
+        issue = rule_func(metrics)
+        if issue is not None:
+            total_penalty += issue.penalty
+    return max(0.0, 100.0 - min(total_penalty, 100.0))
+
+
+# Fields that never affect the score; last_seen_minutes does (K8) but is
+# overwritten by the server on every report, so it is kept out of the hash
+# and added to the memo key separately.
+_UNHASHED_FIELDS = frozenset({"hostname", "timestamp", "last_seen_minutes"})
+_CONTENT_FIELDS: Tuple[str, ...] = tuple(
+    name for name in DeviceMetrics.model_fields if name not in _UNHASHED_FIELDS
+)
+
+
+def metrics_content_hash(metrics: DeviceMetrics) -> str:
+    """
+    Digest of the scoring inputs that come from the agent (everything except
+    hostname, timestamp and last_seen_minutes). Equal hashes mean a report
+    repeats the previous one.
+    """
+    values = [getattr(metrics, name) for name in _CONTENT_FIELDS]
+    payload = json.dumps(values, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _ScoreMemo:
+    """LRU of ScoreReports for one compiled rule set (cleared when it changes)."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._rule_set: object = None
+        self._entries: "OrderedDict[Tuple[str, int], ScoreReport]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int], rule_set: object) -> Optional[ScoreReport]:
+        with self._lock:
+            if rule_set is not self._rule_set:
+                self._entries.clear()
+                self._rule_set = rule_set
+            report = self._entries.get(key)
+            if report is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return report
+
+    def put(self, key: Tuple[str, int], rule_set: object, report: ScoreReport) -> None:
+        with self._lock:
+            if rule_set is not self._rule_set:
+                return
+            self._entries[key] = report
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rule_set = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+_score_memo = _ScoreMemo(config.SCORE_CACHE_SIZE)
+
+
+def calculate_score_cached(metrics: DeviceMetrics, content_hash: Optional[str] = None) -> ScoreReport:
+    """
+    calculate_score() memoized by (content hash, last_seen_minutes).
+
+    The returned ScoreReport may be shared between calls; treat it as
+    read-only. Runtime-registered rules may read any field (hostname
+    included), so the memo is bypassed while any are registered.
+    """
+    if RULES:
+        return calculate_score(metrics)
+    rule_set = rule_spec.current()
+    key = (content_hash or metrics_content_hash(metrics), metrics.last_seen_minutes)
+    report = _score_memo.get(key, rule_set)
+    if report is None:
+        report = calculate_score(metrics)
+        _score_memo.put(key, rule_set, report)
+    return report
+
+
+def score_cache_stats() -> dict:
+    return _score_memo.stats()
+
+
+def clear_score_cache() -> None:
+    _score_memo.clear()
+
+
 def get_rules() -> List[RuleFunction]:
     """
-    Get the list of all registered rules.
+    Get every rule in evaluation order: the active spec rules, then the
+    runtime-registered ones.
     
     Returns:
-        List of rule functions.
+        List of rule callables (CompiledRule objects follow the rule
+        function contract).
     """
-    return RULES.copy()
+    return [*rule_spec.current().rules, *RULES]
 
 
 def register_rule(rule_func: RuleFunction) -> None:
@@ -106,7 +235,7 @@ def register_rule(rule_func: RuleFunction) -> None:
     RULES.append(rule_func)
 
 
-def unregister_rule(rule_func: RuleFunction) -> bool:
+def unregister_rule(rule_func: Union[RuleFunction, str]) -> bool:
     """
     Unregister a rule from the rules list.
     
@@ -115,7 +244,24 @@ def unregister_rule(rule_func: RuleFunction) -> bool:
         
     Returns:
         True if rule was removed, False if rule function was not found.
+
+    Raises:
+        ValueError: *rule_func* is a spec rule (its id, its CompiledRule or
+            its reference function in rules/); remove it from the rule spec.
     """
+    if isinstance(rule_func, str):
+        rule_id: Optional[str] = rule_func
+    elif isinstance(rule_func, CompiledRule):
+        rule_id = rule_func.rule_id
+    else:
+        rule_id = _REFERENCE_RULE_IDS.get(rule_func)
+    if rule_id is not None:
+        rule_set = rule_spec.current()
+        if rule_id in rule_set.by_id:
+            raise ValueError(
+                f"{rule_id} is defined in the rule spec ({rule_set.source}); remove it there"
+            )
+        return False
     try:
         RULES.remove(rule_func)
         return True
@@ -0,0 +1,391 @@
+"""
+Declarative rule spec (rule_spec.json) compiled into a fast evaluator.
+
+Each rule names a DeviceMetrics field and a list of penalty tiers:
+
+    {"id": "K6", "field": "disk_usage_percent",
+     "tiers": [{"above": 95, "penalty": 30, "message": "...{value}%..."},
+               {"above": 85, "penalty": 15, "message": "..."}]}
+
+  - A tier matches when the measured value is strictly greater than "above";
+    the highest matching threshold wins.
+  - "measure": "count" measures len(field) instead of the value.
+  - Boolean checks use "fail_when": true|false plus a rule-level "penalty".
+  - "penalty" is a number or {"base", "per_unit", "max"} (linear in the
+    measure, capped).
+  - "message" / "recommendation" may be set per rule or per tier (tier wins).
+    Messages are str.format templates over {value}, {count}, {items}
+    (comma-joined list) and {duration} (for "unit": "minutes").
+
+compile_rule_spec() turns a spec into CompiledRule objects holding sorted
+threshold tuples, so evaluation is one bisect per rule. Evaluation returns
+RuleHit objects; message templates are rendered only when a hit is turned
+into a ScoreIssue, so score-only callers never build strings.
+
+rule_spec (RuleSpecLoader) is the process-wide active rule set. current()
+re-stats the spec file at most every RULE_SPEC_RELOAD_SECONDS and recompiles
+when it changed, so edits apply without a restart. An invalid edit is
+logged and the previous rule set stays active.
+"""
+
+import json
+import logging
+import os
+import string
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .. import config
+from ..models import DeviceMetrics, ScoreIssue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(__file__), "rule_spec.json")
+
+# Placeholders a message / recommendation template may use
+TEMPLATE_FIELDS = frozenset({"value", "count", "items", "duration"})
+
+Penalty = Union[float, Tuple[float, float, float]]   # fixed, or (base, per_unit, max)
+
+
+class RuleSpecError(ValueError):
+    """The rule spec is malformed; the message names the offending rule."""
+
+
+# ---------------------------------------------------------------------------
+# Compiled form
+# ---------------------------------------------------------------------------
+
+class Tier:
+    """One penalty tier: applies when measure > above."""
+
+    __slots__ = ("above", "penalty", "message", "recommendation")
+
+    def __init__(self, above: float, penalty: Penalty, message: str, recommendation: str) -> None:
+        self.above = above
+        self.penalty = penalty
+        self.message = message
+        self.recommendation = recommendation
+
+    def penalty_for(self, measure: float) -> float:
+        if isinstance(self.penalty, tuple):
+            base, per_unit, cap = self.penalty
+            return min(cap, base + per_unit * measure)
+        return self.penalty
+
+
+class CompiledRule:
+    """A rule from the spec with its tiers pre-sorted by threshold."""
+
+    def __init__(
+        self,
+        rule_id: str,
+        name: str,
+        description: str,
+        field: str,
+        measure: str,
+        fail_when: Optional[bool],
+        unit: Optional[str],
+        tiers: Sequence[Tier],
+    ) -> None:
+        self.rule_id = rule_id
+        self.name = name
+        self.description = description
+        self.field = field
+        self.measure_kind = measure
+        self.fail_when = fail_when
+        self.unit = unit
+        # Ascending thresholds; bisect_left gives the number of thresholds < measure
+        self.tiers: Tuple[Tier, ...] = tuple(sorted(tiers, key=lambda t: t.above))
+        self.thresholds: Tuple[float, ...] = tuple(t.above for t in self.tiers)
+
+    def measure(self, metrics: Any) -> float:
+        value = getattr(metrics, self.field)
+        if self.fail_when is not None:
+            return 1 if bool(value) == self.fail_when else 0
+        if self.measure_kind == "count":
+            return len(value)
+        return value
+
+    def tier_index(self, measure: float) -> int:
+        """Index into self.tiers of the matching tier, or -1 if the rule passes."""
+        return bisect_left(self.thresholds, measure) - 1
+
+    def evaluate(self, metrics: Any) -> Optional["RuleHit"]:
+        measure = self.measure(metrics)
+        index = self.tier_index(measure)
+        if index < 0:
+            return None
+        return RuleHit(self, self.tiers[index], measure, metrics)
+
+    def __call__(self, metrics: DeviceMetrics) -> Optional[ScoreIssue]:
+        """Same contract as the functions in scoring/rules/."""
+        hit = self.evaluate(metrics)
+        return hit.to_issue() if hit is not None else None
+
+    def describe(self) -> dict:
+        tiers = []
+        for tier in reversed(self.tiers):
+            if isinstance(tier.penalty, tuple):
+                base, per_unit, cap = tier.penalty
+                penalty: Any = {"base": base, "per_unit": per_unit, "max": cap}
+            else:
+                penalty = tier.penalty
+            tiers.append({"above": tier.above, "penalty": penalty})
+        info = {
+            "rule_id": self.rule_id,
+            "name": self.name,
+            "description": self.description,
+            "field": self.field,
+            "measure": self.measure_kind,
+            "tiers": tiers,
+        }
+        if self.fail_when is not None:
+            info["fail_when"] = self.fail_when
+        return info
+
+
+class RuleHit:
+    """A rule that fired; the ScoreIssue text is rendered only on to_issue()."""
+
+    __slots__ = ("rule", "tier", "measure", "metrics", "penalty")
+
+    def __init__(self, rule: CompiledRule, tier: Tier, measure: float, metrics: Any) -> None:
+        self.rule = rule
+        self.tier = tier
+        self.measure = measure
+        self.metrics = metrics
+        self.penalty = float(tier.penalty_for(measure))
+
+    def _context(self) -> Dict[str, Any]:
+        value = getattr(self.metrics, self.rule.field)
+        context: Dict[str, Any] = {"value": value, "count": self.measure}
+        if isinstance(value, (list, tuple)):
+            context["items"] = ", ".join(value)
+        if self.rule.unit == "minutes":
+            context["duration"] = _format_minutes(value)
+        return context
+
+    def to_issue(self) -> ScoreIssue:
+        context = self._context()
+        return ScoreIssue(
+            rule_id=self.rule.rule_id,
+            penalty=self.penalty,
+            message=self.tier.message.format(**context),
+            recommendation=self.tier.recommendation.format(**context),
+        )
+
+
+def _format_minutes(minutes: int) -> str:
+    hours = minutes // 60
+    days = minutes // 1440
+    if minutes < 1440:
+        return f"{hours} hour{'s' if hours > 1 else ''}"
+    return f"{days} day{'s' if days > 1 else ''}"
+
+
+class CompiledRuleSet:
+    """Ordered compiled rules plus where they came from."""
+
+    def __init__(self, rules: Sequence[CompiledRule], version: Any, source: str) -> None:
+        self.rules: Tuple[CompiledRule, ...] = tuple(rules)
+        self.version = version
+        self.source = source
+        self.loaded_at = datetime.now(timezone.utc)
+        self.by_id: Dict[str, CompiledRule] = {r.rule_id: r for r in self.rules}
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(self, metrics: Any) -> List[RuleHit]:
+        """Hits in rule order; no message is rendered."""
+        hits = []
+        for rule in self.rules:
+            hit = rule.evaluate(metrics)
+            if hit is not None:
+                hits.append(hit)
+        return hits
+
+    def penalty(self, metrics: Any) -> float:
+        """Unclamped penalty sum without building any issue."""
+        total = 0.0
+        for rule in self.rules:
+            measure = rule.measure(metrics)
+            index = rule.tier_index(measure)
+            if index >= 0:
+                total += rule.tiers[index].penalty_for(measure)
+        return total
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loaded_at": self.loaded_at.isoformat(),
+            "total_rules": len(self.rules),
+            "rules": [r.describe() for r in self.rules],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+
+def _check_template(rule_id: str, template: Any, what: str) -> str:
+    if not isinstance(template, str) or not template:
+        raise RuleSpecError(f"{rule_id}: {what} must be a non-empty string")
+    try:
+        names = {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+    except ValueError as exc:
+        raise RuleSpecError(f"{rule_id}: bad {what} template: {exc}") from None
+    unknown = {n.split(".")[0].split("[")[0] for n in names} - TEMPLATE_FIELDS
+    if unknown:
+        raise RuleSpecError(f"{rule_id}: {what} uses unknown placeholder(s) {sorted(unknown)}")
+    return template
+
+
+def _compile_penalty(rule_id: str, raw: Any) -> Penalty:
+    if isinstance(raw, bool):
+        raise RuleSpecError(f"{rule_id}: penalty must be a number or an object")
+    if isinstance(raw, (int, float)):
+        if raw < 0:
+            raise RuleSpecError(f"{rule_id}: penalty must be >= 0")
+        return float(raw)
+    if isinstance(raw, Mapping):
+        try:
+            parts = tuple(float(raw[k]) for k in ("base", "per_unit", "max"))
+        except (KeyError, TypeError, ValueError):
+            raise RuleSpecError(f"{rule_id}: linear penalty needs numeric base, per_unit and max") from None
+        return parts
+    raise RuleSpecError(f"{rule_id}: penalty must be a number or an object")
+
+
+def _compile_rule(raw: Mapping[str, Any]) -> CompiledRule:
+    rule_id = raw.get("id")
+    if not isinstance(rule_id, str) or not rule_id:
+        raise RuleSpecError("every rule needs a string 'id'")
+    field = raw.get("field")
+    if field not in DeviceMetrics.model_fields:
+        raise RuleSpecError(f"{rule_id}: unknown metrics field {field!r}")
+    measure = raw.get("measure", "value")
+    if measure not in ("value", "count"):
+        raise RuleSpecError(f"{rule_id}: measure must be 'value' or 'count'")
+    fail_when = raw.get("fail_when")
+    if fail_when is not None and not isinstance(fail_when, bool):
+        raise RuleSpecError(f"{rule_id}: fail_when must be true or false")
+
+    if fail_when is not None:
+        if "tiers" in raw:
+            raise RuleSpecError(f"{rule_id}: use either fail_when or tiers, not both")
+        raw_tiers = [{"above": 0, "penalty": raw.get("penalty")}]
+    else:
+        raw_tiers = raw.get("tiers")
+        if not isinstance(raw_tiers, list) or not raw_tiers:
+            raise RuleSpecError(f"{rule_id}: tiers must be a non-empty list")
+
+    tiers = []
+    for raw_tier in raw_tiers:
+        above = raw_tier.get("above")
+        if isinstance(above, bool) or not isinstance(above, (int, float)):
+            raise RuleSpecError(f"{rule_id}: tier 'above' must be a number")
+        tiers.append(Tier(
+            above=above,
+            penalty=_compile_penalty(rule_id, raw_tier.get("penalty")),
+            message=_check_template(rule_id, raw_tier.get("message", raw.get("message")), "message"),
+            recommendation=_check_template(
+                rule_id, raw_tier.get("recommendation", raw.get("recommendation")), "recommendation",
+            ),
+        ))
+    if len({t.above for t in tiers}) != len(tiers):
+        raise RuleSpecError(f"{rule_id}: duplicate tier thresholds")
+
+    return CompiledRule(
+        rule_id=rule_id,
+        name=raw.get("name", rule_id),
+        description=raw.get("description", ""),
+        field=field,
+        measure=measure,
+        fail_when=fail_when,
+        unit=raw.get("unit"),
+        tiers=tiers,
+    )
+
+
+def compile_rule_spec(spec: Mapping[str, Any], source: str = "<memory>") -> CompiledRuleSet:
+    """Validate and compile a parsed spec. Raises RuleSpecError."""
+    if not isinstance(spec, Mapping) or not isinstance(spec.get("rules"), list):
+        raise RuleSpecError("spec must be an object with a 'rules' list")
+    rules = [_compile_rule(raw) for raw in spec["rules"]]
+    ids = [r.rule_id for r in rules]
+    if len(set(ids)) != len(ids):
+        raise RuleSpecError("duplicate rule ids")
+    return CompiledRuleSet(rules, spec.get("version"), source)
+
+
+def load_rule_spec(path: str) -> CompiledRuleSet:
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, json.JSONDecodeError) as exc:
+        raise RuleSpecError(f"cannot read {path}: {exc}") from None
+    return compile_rule_spec(spec, source=path)
+
+
+# ---------------------------------------------------------------------------
+# Hot reload
+# ---------------------------------------------------------------------------
+
+class RuleSpecLoader:
+    """Holds the active CompiledRuleSet and recompiles it when the file changes."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path
+        self._rule_set: Optional[CompiledRuleSet] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    @property
+    def path(self) -> str:
+        return self._path or config.RULE_SPEC_PATH or DEFAULT_SPEC_PATH
+
+    def reload(self) -> CompiledRuleSet:
+        """Recompile from disk now. Raises RuleSpecError and keeps the old set on failure."""
+        path = self.path
+        mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+        rule_set = load_rule_spec(path)
+        self._rule_set, self._mtime = rule_set, mtime
+        self._checked_at = time.monotonic()
+        logger.info("rule spec loaded path=%s rules=%d version=%s", path, len(rule_set), rule_set.version)
+        return rule_set
+
+    def current(self) -> CompiledRuleSet:
+        """Active rule set, reloaded first if the spec file changed since the last check."""
+        if self._rule_set is None:
+            return self.reload()
+        now = time.monotonic()
+        if now - self._checked_at >= config.RULE_SPEC_RELOAD_SECONDS:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = self._mtime
+            if mtime != self._mtime:
+                try:
+                    self.reload()
+                except RuleSpecError as exc:
+                    self._mtime = mtime     # don't retry the same broken file every check
+                    logger.error("rule spec reload failed, keeping previous rules: %s", exc)
+        return self._rule_set
+
+    def reset(self) -> None:
+        """Forget the compiled set (next current() loads from disk)."""
+        self._rule_set = None
+        self._mtime = None
+
+
+# Process-wide active rules used by engine.calculate_score and batch scoring
+rule_spec = RuleSpecLoader()
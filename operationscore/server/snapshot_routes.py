@@ -4,34 +4,35 @@ Snapshot API routes.
 Endpoints for reading, rebuilding, and resetting the snapshot.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
-from . import state
-from .snapshot_store import (
-    atomic_write_snapshot,
-    build_snapshot,
-    empty_snapshot,
-    read_or_create_snapshot,
-)
+from . import response_cache, state
+from .cluster import cluster
+from .score_distribution import score_distribution
+from .snapshot_store import build_snapshot, current_body, empty_snapshot, set_snapshot
 
 router = APIRouter()
 
 
 @router.get("/latest")
-async def get_snapshot_latest():
-    """Return the latest snapshot from disk, or create an empty one if missing."""
-    return read_or_create_snapshot()
+async def get_snapshot_latest(request: Request):
+    """
+    Return the in-memory snapshot as pre-serialized bytes (gzip when accepted;
+    ETag / If-None-Match and Last-Modified / If-Modified-Since → 304).
+    """
+    return response_cache.serve(request, current_body())
 
 
 @router.post("/rebuild")
 async def post_snapshot_rebuild():
-    """Rebuild snapshot from caches and write atomically."""
+    """Rebuild snapshot from caches; it is written to disk in the background."""
     snapshot = build_snapshot(
         state.device_metrics_cache,
         state.device_reports_cache,
         state.registered_devices,
     )
-    atomic_write_snapshot(snapshot)
+    set_snapshot(snapshot)
+    response_cache.bump()
     return {
         "ok": True,
         "generated_at": snapshot["generated_at"],
@@ -45,6 +46,8 @@ async def post_snapshot_reset():
     state.device_metrics_cache.clear()
     state.device_reports_cache.clear()
     state.registered_devices.clear()
-    snap = empty_snapshot()
-    atomic_write_snapshot(snap)
+    score_distribution.clear()
+    set_snapshot(empty_snapshot())
+    cluster.publish("snapshot_reset")
+    response_cache.bump()
     return {"ok": True}
@@ -1,19 +1,36 @@
 """
-Snapshot storage utilities: atomic write and snapshot builder.
+Snapshot storage utilities: snapshot builder, in-memory current snapshot
+and its on-disk copy.
 
-Manages the single JSON snapshot file and builds snapshot payloads from
-in-memory caches.
+The current snapshot lives in memory and is the source of truth:
+set_snapshot() serializes it once to compact JSON and keeps the bytes
+(with ETag / Last-Modified and a lazily gzipped copy) for GET
+/snapshot/latest, so reads never touch the filesystem. The same bytes are
+handed to a background writer thread that atomically replaces
+latest_snapshot.json; a newer snapshot supersedes one still waiting to be
+written. The file is only read back by load_snapshot() at startup.
 """
 
 import json
+import logging
 import os
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
-SNAPSHOT_DIR = Path(__file__).resolve().parent / "snapshot"
+from . import config
+from .response_cache import CachedBody, serialize
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = (
+    Path(config.SNAPSHOT_DIR) if config.SNAPSHOT_DIR else Path(__file__).resolve().parent / "snapshot"
+)
 LATEST_PATH = SNAPSHOT_DIR / "latest_snapshot.json"
-TMP_PATH = SNAPSHOT_DIR / "latest_snapshot.json.tmp"
+# Per process: workers sharing SNAPSHOT_DIR must not write the same temp file
+TMP_PATH = SNAPSHOT_DIR / f"latest_snapshot.json.{os.getpid()}.tmp"
 
 
 def risk_level(score: float) -> str:
@@ -155,30 +172,132 @@ def build_snapshot(
     }
 
 
-def atomic_write_snapshot(snapshot: dict) -> None:
-    """Write snapshot to TMP_PATH then atomically replace LATEST_PATH."""
+def _atomic_write(body: bytes) -> None:
+    """Write *body* to TMP_PATH then atomically replace LATEST_PATH."""
     SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
-    with open(TMP_PATH, "w", encoding="utf-8") as f:
-        json.dump(snapshot, f, indent=2, ensure_ascii=False)
+    with open(TMP_PATH, "wb") as f:
+        f.write(body)
     os.replace(TMP_PATH, LATEST_PATH)
 
 
-def read_or_create_snapshot() -> dict:
+class _SnapshotWriter:
     """
-    Read LATEST_PATH if it exists; otherwise create empty_snapshot(),
-    write it atomically, and return it.
+    Daemon thread persisting the newest submitted body to LATEST_PATH.
+    Bodies submitted while a write is in progress replace each other, so a
+    burst of reports costs a couple of writes rather than one per report.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._pending: Optional[bytes] = None
+        self._submitted = 0     # bodies submitted so far
+        self._written = 0       # submissions covered by a finished write
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+        self.failures = 0
+
+    def submit(self, body: bytes) -> None:
+        with self._cond:
+            self._pending = body
+            self._submitted += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything submitted so far is on disk. False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            while self._written < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                body, self._pending = self._pending, None
+                submitted = self._submitted
+            try:
+                _atomic_write(body)
+                self.writes += 1
+            except OSError:
+                self.failures += 1
+                logger.exception("Snapshot write failed")
+            with self._cond:
+                self._written = submitted
+                self._cond.notify_all()
+
+
+_writer = _SnapshotWriter()
+_lock = threading.Lock()
+_version = 0
+_current: Optional[dict] = None
+_current_body: Optional[CachedBody] = None
+
+
+def set_snapshot(
+    snapshot: dict,
+    persist: bool = True,
+    last_modified: Optional[datetime] = None,
+) -> CachedBody:
+    """
+    Make *snapshot* the current snapshot. It is serialized here, once; with
+    *persist* the bytes are queued for the background writer.
+    """
+    global _version, _current, _current_body
+    body = serialize(snapshot)
+    with _lock:
+        _version += 1
+        entry = CachedBody(body, f"s{_version}", last_modified or datetime.now(timezone.utc))
+        _current, _current_body = snapshot, entry
+    if persist:
+        _writer.submit(body)
+    return entry
+
+
+def load_snapshot() -> dict:
+    """
+    Make the snapshot stored in LATEST_PATH current (startup). A missing or
+    unreadable file is replaced by an empty snapshot.
     """
-    if not LATEST_PATH.exists():
-        snap = empty_snapshot()
-        atomic_write_snapshot(snap)
-        return snap
     try:
-        with open(LATEST_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json.loads(LATEST_PATH.read_bytes())
         if not isinstance(data, dict):
             raise ValueError("Invalid snapshot: not a dict")
+        mtime = datetime.fromtimestamp(LATEST_PATH.stat().st_mtime, timezone.utc)
+        set_snapshot(data, persist=False, last_modified=mtime)
         return data
     except (json.JSONDecodeError, OSError, ValueError):
         snap = empty_snapshot()
-        atomic_write_snapshot(snap)
+        set_snapshot(snap)
         return snap
+
+
+def current_snapshot() -> dict:
+    """The current snapshot (loaded from disk on first use)."""
+    if _current is None:
+        return load_snapshot()
+    return _current
+
+
+def current_body() -> CachedBody:
+    """The current snapshot as pre-serialized bytes for GET /snapshot/latest."""
+    if _current_body is None:
+        load_snapshot()
+    return _current_body
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """Wait for pending snapshot writes (shutdown, tests)."""
+    return _writer.flush(timeout)
+
+
+def writer_stats() -> dict:
+    return {"writes": _writer.writes, "failures": _writer.failures}
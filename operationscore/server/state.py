@@ -19,5 +19,4 @@ device_reports_cache: dict[str, Any] = {}
 # Format: {hostname: datetime}
 registered_devices: dict[str, datetime] = {}
 
-# Active WebSocket client connections (for future use)
-ws_clients: set[Any] = set()
+# WebSocket clients are owned by server/ws_broadcaster.py (ws_broadcaster)
@@ -0,0 +1,420 @@
+"""
+server/task_queue.py — Durable per-host agent task queue with leases.
+
+  - In memory: one deque per hostname, so enqueue/dequeue are O(1). All
+    in-memory mutations happen between awaits on the event loop, so no
+    global lock is needed; only the SQLite writes run in the thread pool.
+  - On disk: every task is a row in agent_tasks. A broadcast inserts all
+    of its rows in one transaction (repository.insert_tasks).
+  - Leases: dequeue() hands a task out for TASK_LEASE_SECONDS. The agent
+    acknowledges it via POST /tasks/{hostname}/{task_id}/ack; for run_scan
+    the resulting /report is the acknowledgement (ack_command). A lease that
+    expires is re-queued at the head of the host's queue the next time that
+    host polls, until TASK_MAX_ATTEMPTS deliveries, then marked "failed".
+  - Restart: load_from_db() rebuilds the deques from queued and leased rows.
+
+dequeue(hostname, wait=N) is also the long-poll primitive: an empty queue
+parks the caller on a per-request asyncio.Event until a task is enqueued for
+that host or N seconds pass.
+
+Shared mode (several workers, server/cluster.py): every worker mirrors the
+others' enqueues, takes, requeues and finishes via subscribe() /
+apply_remote(), so a long-poll on any worker wakes for any enqueue. The
+agent_tasks row arbitrates: a worker only hands out a task whose row it
+moved from "queued" to "leased", and acks or expiries of another worker's
+lease are conditional updates of that row. A failed write is not a lost
+race: the task stays at the head of the queue, or stays an expired lease,
+and the host's next poll tries again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, Optional
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from server import config
+from server import repository
+
+logger = logging.getLogger(__name__)
+
+# Task item keys: task_id, hostname, command, created_at, run_id, attempts,
+# lease_expires (monotonic clock, only while leased by this worker) or
+# lease_until (UTC datetime, leases held by another worker in shared mode)
+TaskItem = dict[str, Any]
+
+# Listener signature: (event, payload) where event is "enqueue" | "take" |
+# "requeue" | "finish" and payload is JSON-serializable
+TaskListener = Callable[[str, dict], None]
+
+_WIRE_KEYS = ("task_id", "hostname", "command", "created_at", "run_id", "attempts")
+
+
+def _to_wire(item: TaskItem) -> dict:
+    wire = {key: item.get(key) for key in _WIRE_KEYS}
+    if isinstance(wire["created_at"], datetime):
+        wire["created_at"] = wire["created_at"].isoformat()
+    return wire
+
+
+def _from_wire(wire: dict) -> TaskItem:
+    item = {key: wire.get(key) for key in _WIRE_KEYS}
+    if isinstance(item["created_at"], str):
+        item["created_at"] = datetime.fromisoformat(item["created_at"])
+    return item
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class TaskQueue:
+    """Per-host FIFO queues with lease/ack, persisted to agent_tasks."""
+
+    def __init__(self) -> None:
+        self._queues: dict[str, deque[TaskItem]] = {}
+        # hostname → {task_id: item} for tasks handed out and not yet acked
+        self._leases: dict[str, dict[str, TaskItem]] = {}
+        # hostname → one Event per parked long-poll request
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+        # Set by server/cluster.py when several workers share agent_tasks
+        self.shared = False
+        # hostname → {task_id: item} leased by other workers (shared mode)
+        self._remote_leases: dict[str, dict[str, TaskItem]] = {}
+        self._listeners: list[TaskListener] = []
+
+    # ------------------------------------------------------------------
+    # Persistence helpers
+    # ------------------------------------------------------------------
+    async def _persist(self, fn: Callable[..., Any], *args: Any, strict: bool = False) -> Any:
+        """
+        Run a repository write off the loop. Returns its result, or None if it
+        failed (logged); a single worker's in-memory queue stays authoritative.
+        With *strict* the error is re-raised instead, for shared-mode writes
+        whose result decides what happens to the task.
+        """
+        try:
+            return await run_in_threadpool(fn, *args)
+        except Exception:
+            logger.exception("task persistence failed op=%s", getattr(fn, "__name__", fn))
+            if strict:
+                raise
+            return None
+
+    def load_from_db(self) -> int:
+        """Rebuild the in-memory queues from agent_tasks. Returns tasks loaded."""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=config.TASK_RETENTION_HOURS)
+        purged = repository.purge_finished_tasks(cutoff)
+        if purged:
+            logger.info("task queue purged %d finished tasks", purged)
+        self.clear()
+        rows = repository.load_open_tasks(reset_leases=not self.shared)
+        for row in rows:
+            status, lease_until = row.pop("status"), row.pop("lease_expires_at")
+            if status == "leased":
+                # Another worker's lease; expired ones are requeued on the next poll
+                row["lease_until"] = _utc(lease_until or datetime.now(timezone.utc))
+                self._remote_leases.setdefault(row["hostname"], {})[row["task_id"]] = row
+            else:
+                self._queues.setdefault(row["hostname"], deque()).append(row)
+        return len(rows)
+
+    def clear(self) -> None:
+        """Forget every in-memory task (parked long-polls time out normally)."""
+        self._queues.clear()
+        self._leases.clear()
+        self._remote_leases.clear()
+
+    # ------------------------------------------------------------------
+    # Cross-worker replication (shared mode)
+    # ------------------------------------------------------------------
+    def subscribe(self, listener: TaskListener) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, payload: dict) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(event, payload)
+            except Exception:
+                logger.exception("task queue listener failed event=%s", event)
+
+    def apply_remote(self, event: str, payload: dict) -> None:
+        """Mirror a change another worker made to the shared queue."""
+        if event == "enqueue":
+            for item in map(_from_wire, payload["items"]):
+                self._queues.setdefault(item["hostname"], deque()).append(item)
+                self._wake(item["hostname"])
+            return
+        hostname = payload["hostname"]
+        if event == "take":
+            item = _from_wire(payload["item"])
+            item["lease_until"] = datetime.fromisoformat(payload["lease_until"])
+            self._forget(hostname, {item["task_id"]})
+            self._remote_leases.setdefault(hostname, {})[item["task_id"]] = item
+        elif event == "requeue":
+            items = [_from_wire(wire) for wire in payload["items"]]
+            self._forget(hostname, {item["task_id"] for item in items})
+            queue = self._queues.setdefault(hostname, deque())
+            for item in reversed(items):
+                queue.appendleft(item)
+            self._wake(hostname)
+        elif event == "finish":
+            self._forget(hostname, set(payload["task_ids"]))
+
+    def _forget(self, hostname: str, task_ids: set[str]) -> None:
+        """Drop *task_ids* from this host's queue and from local and remote leases."""
+        queue = self._queues.get(hostname)
+        if queue is not None:
+            kept = deque(item for item in queue if item["task_id"] not in task_ids)
+            if kept:
+                self._queues[hostname] = kept
+            else:
+                del self._queues[hostname]
+        for leases in (self._leases, self._remote_leases):
+            leased = leases.get(hostname)
+            if leased is None:
+                continue
+            for task_id in task_ids:
+                leased.pop(task_id, None)
+            if not leased:
+                del leases[hostname]
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    async def enqueue_many(
+        self,
+        hostnames: Iterable[str],
+        command: str,
+        run_id: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+    ) -> list[TaskItem]:
+        """Queue *command* once for each hostname (one DB transaction). Returns the items."""
+        created_at = created_at or datetime.now()
+        items = [
+            {
+                "task_id":    str(uuid4()),
+                "hostname":   hostname,
+                "command":    command,
+                "created_at": created_at,
+                "run_id":     run_id,
+                "attempts":   0,
+            }
+            for hostname in hostnames
+        ]
+        await self._persist(repository.insert_tasks, items)
+        for item in items:
+            self._queues.setdefault(item["hostname"], deque()).append(item)
+            self._wake(item["hostname"])
+        self._notify("enqueue", {"items": [_to_wire(item) for item in items]})
+        return items
+
+    async def enqueue(self, hostname: str, command: str) -> TaskItem:
+        return (await self.enqueue_many([hostname], command))[0]
+
+    def _wake(self, hostname: str) -> None:
+        for event in self._waiters.pop(hostname, ()):
+            event.set()
+
+    # ------------------------------------------------------------------
+    # Consumers
+    # ------------------------------------------------------------------
+    async def dequeue(self, hostname: str, wait: float = 0) -> Optional[TaskItem]:
+        """
+        Lease the oldest task for *hostname*. With wait > 0, block up to that
+        many seconds for one to be enqueued. Returns None if nothing arrived.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            item = await self._take(hostname)
+            if item is not None:
+                return item
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            # No await between the empty check in _take and this registration,
+            # so an enqueue cannot slip in unseen
+            event = asyncio.Event()
+            self._waiters.setdefault(hostname, set()).add(event)
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters = self._waiters.get(hostname)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        self._waiters.pop(hostname, None)
+
+    async def _take(self, hostname: str) -> Optional[TaskItem]:
+        await self._expire_leases(hostname)
+        while True:
+            queue = self._queues.get(hostname)
+            if not queue:
+                return None
+            item = queue.popleft()
+            if not queue:
+                del self._queues[hostname]
+            lease_until = datetime.now(timezone.utc) + timedelta(seconds=config.TASK_LEASE_SECONDS)
+            if self.shared:
+                # Another worker may have taken it first: the row decides
+                try:
+                    claimed = await self._persist(
+                        repository.lease_task, item["task_id"], lease_until, item["attempts"] + 1,
+                        strict=True,
+                    )
+                except Exception:
+                    # Row unchanged: keep the task for the next poll
+                    self._queues.setdefault(hostname, deque()).appendleft(item)
+                    return None
+                if not claimed:
+                    continue
+            item["attempts"] += 1
+            item["lease_expires"] = time.monotonic() + config.TASK_LEASE_SECONDS
+            self._leases.setdefault(hostname, {})[item["task_id"]] = item
+            if self.shared:
+                self._notify("take", {
+                    "hostname": hostname,
+                    "item": _to_wire(item),
+                    "lease_until": lease_until.isoformat(),
+                })
+            else:
+                await self._persist(repository.lease_task, item["task_id"], lease_until, item["attempts"])
+            return item
+
+    async def _expire_leases(self, hostname: str) -> None:
+        now = time.monotonic()
+        expired = [
+            item for item in self._leases.get(hostname, {}).values() if item["lease_expires"] <= now
+        ]
+        if self.shared:
+            # A lease whose worker died is expired by whichever worker the host polls next
+            wall_now = datetime.now(timezone.utc)
+            expired += [
+                item for item in self._remote_leases.get(hostname, {}).values()
+                if item["lease_until"] <= wall_now
+            ]
+        if not expired:
+            return
+        self._forget(hostname, {item["task_id"] for item in expired})
+        retry, failed = [], []
+        for item in expired:
+            item.pop("lease_expires", None)
+            item.pop("lease_until", None)
+            (retry if item["attempts"] < config.TASK_MAX_ATTEMPTS else failed).append(item)
+        if retry:
+            try:
+                requeued = await self._persist(
+                    repository.requeue_tasks, [i["task_id"] for i in retry], strict=self.shared
+                )
+            except Exception:
+                self._hold_expired(hostname, retry)
+                requeued, retry = [], []
+            if self.shared:
+                # Only leases still open in the DB (not acked or requeued elsewhere)
+                retry = [item for item in retry if item["task_id"] in set(requeued or ())]
+            queue = self._queues.setdefault(hostname, deque())
+            # Redeliver ahead of newer tasks, keeping the original order
+            for item in reversed(retry):
+                queue.appendleft(item)
+            if not queue:
+                del self._queues[hostname]
+            if retry:
+                logger.info("task leases expired hostname=%s requeued=%d", hostname, len(retry))
+                self._notify("requeue", {"hostname": hostname, "items": [_to_wire(i) for i in retry]})
+        if failed:
+            logger.warning("task attempts exhausted hostname=%s failed=%d", hostname, len(failed))
+            try:
+                closed = await self._persist(
+                    repository.finish_tasks, [i["task_id"] for i in failed], "failed", strict=self.shared
+                )
+            except Exception:
+                self._hold_expired(hostname, failed)
+                closed = None
+            if closed:
+                self._notify("finish", {"hostname": hostname, "task_ids": closed})
+
+    def _hold_expired(self, hostname: str, items: list[TaskItem]) -> None:
+        """
+        Keep *items*, whose rows are still leased after a failed write (shared
+        mode), as expired leases so the host's next poll expires them again.
+        """
+        wall_now = datetime.now(timezone.utc)
+        leases = self._remote_leases.setdefault(hostname, {})
+        for item in items:
+            item["lease_until"] = wall_now
+            leases[item["task_id"]] = item
+
+    # ------------------------------------------------------------------
+    # Acknowledgement
+    # ------------------------------------------------------------------
+    async def ack(self, hostname: str, task_id: str) -> bool:
+        """Complete a leased task. False if *task_id* is not leased to *hostname*."""
+        leased = self._leases.get(hostname)
+        if leased and task_id in leased:
+            self._forget(hostname, {task_id})
+            await self._persist(repository.finish_tasks, [task_id], "done")
+            self._notify("finish", {"hostname": hostname, "task_ids": [task_id]})
+            return True
+        if not self.shared:
+            return False
+        # Leased through another worker (possibly before its take event arrived)
+        closed = await self._persist(repository.finish_tasks, [task_id], "done", hostname)
+        if not closed:
+            return False
+        self._forget(hostname, set(closed))
+        self._notify("finish", {"hostname": hostname, "task_ids": closed})
+        return True
+
+    async def ack_command(self, hostname: str, command: str) -> int:
+        """Complete every task with *command* leased to *hostname*. Returns the count."""
+        done = [
+            task_id for task_id, item in self._leases.get(hostname, {}).items()
+            if item["command"] == command
+        ]
+        remote = [
+            task_id for task_id, item in self._remote_leases.get(hostname, {}).items()
+            if item["command"] == command
+        ]
+        if not done and not remote:
+            return 0
+        self._forget(hostname, set(done))
+        if done:
+            await self._persist(repository.finish_tasks, done, "done")
+        if remote:
+            closed = await self._persist(repository.finish_tasks, remote, "done", hostname) or []
+            self._forget(hostname, set(closed))
+            done += closed
+        if done:
+            self._notify("finish", {"hostname": hostname, "task_ids": done})
+        return len(done)
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+    def pending(self, hostname: str) -> int:
+        return len(self._queues.get(hostname, ()))
+
+    def leased(self, hostname: str) -> int:
+        return len(self._leases.get(hostname, ()))
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(q) for q in self._queues.values()),
+            "leased": sum(len(l) for l in self._leases.values()),
+            "leased_elsewhere": sum(len(l) for l in self._remote_leases.values()),
+            "hosts": len(self._queues),
+            "waiters": sum(len(w) for w in self._waiters.values()),
+        }
+
+
+# Process-wide queue used by main.py
+task_queue = TaskQueue()
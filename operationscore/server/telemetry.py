@@ -0,0 +1,325 @@
+"""
+server/telemetry.py — In-process metrics in Prometheus text exposition format.
+
+No client library or push gateway: GET /metrics renders the registry below.
+
+  - Counter / Histogram children are created once per label set and cached,
+    so a hot-path update is a dict lookup plus an increment under a lock.
+  - Histograms use fixed, preallocated bucket bounds; observe() is one
+    bisect into them (cumulative counts are only computed at render time).
+  - Callback metrics (gauges and counters) read state owned by other
+    modules — task queue depth, WebSocket stats, cache sizes — at scrape
+    time, so those modules need no instrumentation calls.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Mapping, Optional, Sequence, Union
+
+# Latency buckets in seconds (0.5 ms … 10 s)
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# A callback returns one value, or {label value (or tuple of them): value}
+CallbackValue = Union[float, Mapping[Any, float]]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple, Any] = {}
+
+    def _child(self, labelvalues: tuple) -> Any:
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def labels(self, *labelvalues: Any) -> Any:
+        return self._child(tuple(str(v) for v in labelvalues))
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._child(()).inc(amount)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot: above the largest bound
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._child(()).observe(value)
+
+    def time(self) -> Any:
+        return self._child(()).time()
+
+    def samples(self) -> list[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            label_text = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter whose value is read from *fn* at render time."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], CallbackValue],
+        kind: str = "gauge",
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self) -> list[str]:
+        value = self.fn()
+        if not isinstance(value, Mapping):
+            return [f"{self.name} {_format_value(value)}"]
+        lines = []
+        for key, item in value.items():
+            values = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_format_value(item)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together by render()."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                if isinstance(metric, CallbackMetric):
+                    existing.fn = metric.fn
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(
+        self, name: str, help: str, fn: Callable[[], CallbackValue], labelnames: Sequence[str] = ()
+    ) -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, fn, "gauge", labelnames))
+
+    def counter_callback(
+        self, name: str, help: str, fn: Callable[[], CallbackValue], labelnames: Sequence[str] = ()
+    ) -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, fn, "counter", labelnames))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format (version 0.0.4)."""
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing callback must not break the whole scrape
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by GET /metrics
+registry = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------------------------------------------------------------------
+# Hot-path metrics (updated by main.py and response_cache.py)
+# ---------------------------------------------------------------------------
+
+http_request_seconds = registry.histogram(
+    "operationscore_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status.",
+    ("method", "route", "status"),
+)
+report_stage_seconds = registry.histogram(
+    "operationscore_report_stage_duration_seconds",
+    "Time spent per report ingest stage (score, save_report, build_snapshot, write_snapshot, broadcast).",
+    ("stage",),
+)
+reports_total = registry.counter(
+    "operationscore_reports_total",
+    "Reports received by outcome (stored, store_failed, rejected).",
+    ("outcome",),
+)
+response_cache_requests = registry.counter(
+    "operationscore_response_cache_requests_total",
+    "Cached read responses by result (hit, miss, not_modified).",
+    ("result",),
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into http_request_seconds.
+    The route label is the matched path template ("/api/devices/{hostname}"),
+    or "<unmatched>" so unknown paths cannot grow the label set.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            http_request_seconds.labels(scope["method"], route, status).observe(
+                time.perf_counter() - started
+            )
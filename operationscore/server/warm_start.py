@@ -0,0 +1,116 @@
+"""
+server/warm_start.py — Refill the in-memory device caches from the database.
+
+device_metrics_cache, device_reports_cache and registered_devices
+(server/state.py) start empty after a restart, so /latest_reports, /devices,
+new runs and K8 (last_seen_minutes) would see no device until every agent has
+reported again. warm_caches() refills them at startup from the latest stored
+report of each active device, read in one query with an indexed lookup per
+device (repository.get_latest_reports):
+
+  - metrics and issues are parsed by pydantic straight from metrics_json /
+    issues_json (no intermediate dicts);
+  - registered_devices gets the device's last_seen_at, so K8 keeps counting
+    from the last report or heartbeat before the restart;
+  - the content hash is left empty; main._is_repeat() computes it at the
+    device's first report, so an unchanged report after the restart is still
+    stored as a heartbeat without hashing every device at startup;
+  - the score distribution gets the same latest scores.
+
+Hostnames already in the caches (a report replayed by another worker while
+starting) are left alone. Rows that no longer validate against DeviceMetrics
+are skipped and counted.
+
+After a rescore, main.py reads the same rows off the event loop
+(read_latest_reports) and applies them with overwrite=True: a cached report
+is replaced by its rescored row, but only if it is still the same report
+(equal metrics timestamp), so a report received meanwhile is kept.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime
+
+from pydantic import ValidationError
+
+from . import repository
+from .models import DeviceMetrics, ScoreReport
+from .score_distribution import score_distribution
+from .state import device_metrics_cache, device_reports_cache, registered_devices
+
+logger = logging.getLogger(__name__)
+
+# (hostname, metrics, report, last_seen_at) of one device's latest stored report
+LatestReport = tuple[str, DeviceMetrics, ScoreReport, datetime]
+
+
+def read_latest_reports() -> tuple[list[LatestReport], dict]:
+    """
+    Read and decode the latest report of every active device; touches no
+    cache, so it may run in a worker thread. Returns the decoded reports and
+    {"skipped", "query_seconds", "decode_seconds"}.
+    """
+    started = time.perf_counter()
+    rows = repository.get_latest_reports()
+    queried = time.perf_counter()
+
+    entries: list[LatestReport] = []
+    skipped = 0
+    for row in rows:
+        hostname = row["hostname"]
+        try:
+            metrics = DeviceMetrics.model_validate_json(row["metrics_json"])
+            report = ScoreReport.model_validate_json(
+                f'{{"total_score":{row["total_score"]!r},"issues":{row["issues_json"] or "[]"}}}'
+            )
+        except ValidationError:
+            logger.warning("warm start skipped hostname=%s: stored report does not validate", hostname)
+            skipped += 1
+            continue
+        entries.append((hostname, metrics, report, row["last_seen_at"]))
+
+    return entries, {
+        "skipped": skipped,
+        "query_seconds": queried - started,
+        "decode_seconds": time.perf_counter() - queried,
+    }
+
+
+def apply_latest_reports(entries: list[LatestReport], overwrite: bool = False) -> int:
+    """
+    Put *entries* into the caches and the score distribution (run it where
+    the caches are written: the event loop). Without *overwrite* cached
+    hostnames are skipped; with it, a cached report is replaced when it is
+    the same report (equal metrics timestamp). Returns the entries applied.
+    """
+    applied = 0
+    for hostname, metrics, report, last_seen_at in entries:
+        cached = device_reports_cache.get(hostname)
+        if cached is not None:
+            current = device_metrics_cache.get(hostname)
+            if not overwrite or current is None or current.timestamp != metrics.timestamp:
+                continue
+            # Same report, new score: keep the cached metrics, hash and times
+            cached["report"] = report
+        else:
+            device_metrics_cache[hostname] = metrics
+            device_reports_cache[hostname] = {
+                "report": report,
+                "scored_at": last_seen_at,
+                "content_hash": None,
+            }
+            registered_devices[hostname] = last_seen_at
+        score_distribution.update(hostname, report.total_score)
+        applied += 1
+    return applied
+
+
+def warm_caches() -> dict:
+    """
+    Load the latest report of every active device into the caches. Returns
+    {"devices", "skipped", "query_seconds", "decode_seconds"}.
+    """
+    entries, stats = read_latest_reports()
+    return {"devices": apply_latest_reports(entries), **stats}
@@ -0,0 +1,193 @@
+"""
+server/ws_broadcaster.py — Non-blocking WebSocket fan-out for /ws.
+
+publish() never awaits a socket: it drops the event into each client's
+bounded outbound queue and returns, so a slow dashboard cannot delay a
+/report response. One sender task per client drains its queue:
+
+  - Coalescing: a queued "snapshot_updated" event for a hostname is replaced
+    in place by a newer one for the same hostname (only the latest score of a
+    device matters to a dashboard that has fallen behind).
+  - Batching: up to WS_BATCH_MAX_EVENTS queued events go out as one frame,
+    {"type": "batch", "events": [...]}; a lone event is sent unwrapped.
+  - Back-pressure: a full queue drops its oldest event. A client that drops
+    WS_CLIENT_QUEUE_SIZE events without a successful send in between, or
+    whose send takes longer than WS_SEND_TIMEOUT_SECONDS, is disconnected.
+
+stats() exposes client count, frames/events sent, coalesced and dropped
+events, slow-client disconnects and send latency. subscribe() observes every
+published event (server/cluster.py relays them to the other workers).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from server import config
+
+logger = logging.getLogger(__name__)
+
+# Events of this type are coalesced per hostname
+COALESCED_EVENT_TYPE = "snapshot_updated"
+
+
+class _Client:
+    """Outbound state for one connected socket."""
+
+    def __init__(self, websocket: Any) -> None:
+        self.websocket = websocket
+        # coalescing key → event, in send order
+        self.pending: OrderedDict[Hashable, dict] = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.dropped_since_send = 0
+        self.sender: Optional[asyncio.Task] = None
+
+
+class WebSocketBroadcaster:
+    """Per-client bounded queues drained by per-client sender tasks."""
+
+    def __init__(self) -> None:
+        self._clients: dict[Any, _Client] = {}
+        self._seq = itertools.count()
+        self._listeners: list[Callable[[dict], None]] = []
+        self._stats = {
+            "frames_sent": 0,
+            "events_sent": 0,
+            "events_coalesced": 0,
+            "events_dropped": 0,
+            "slow_disconnects": 0,
+            "send_seconds_total": 0.0,
+            "send_seconds_max": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Connection lifecycle
+    # ------------------------------------------------------------------
+    async def connect(self, websocket: Any) -> None:
+        await websocket.accept()
+        client = _Client(websocket)
+        self._clients[websocket] = client
+        client.sender = asyncio.create_task(self._send_loop(client))
+
+    async def disconnect(self, websocket: Any) -> None:
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return
+        sender = client.sender
+        if sender is not None and sender is not asyncio.current_task():
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def close_all(self) -> None:
+        """Stop every sender task (app shutdown)."""
+        for websocket in list(self._clients):
+            await self.disconnect(websocket)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    # ------------------------------------------------------------------
+    # Publishing (never blocks)
+    # ------------------------------------------------------------------
+    def publish(self, event: dict) -> None:
+        """Queue *event* for every connected client."""
+        if event.get("type") == COALESCED_EVENT_TYPE and event.get("hostname"):
+            key: Hashable = (COALESCED_EVENT_TYPE, event["hostname"])
+        else:
+            key = next(self._seq)
+        for client in list(self._clients.values()):
+            self._offer(client, key, event)
+        for listener in self._listeners:
+            listener(event)
+
+    def subscribe(self, listener: Callable[[dict], None]) -> None:
+        self._listeners.append(listener)
+
+    def _offer(self, client: _Client, key: Hashable, event: dict) -> None:
+        if key in client.pending:
+            client.pending[key] = event          # keeps its queue position
+            self._stats["events_coalesced"] += 1
+            return
+        if len(client.pending) >= config.WS_CLIENT_QUEUE_SIZE:
+            client.pending.popitem(last=False)
+            client.dropped_since_send += 1
+            self._stats["events_dropped"] += 1
+            if client.dropped_since_send >= config.WS_CLIENT_QUEUE_SIZE:
+                self._drop_slow(client, "queue overflow")
+                return
+        client.pending[key] = event
+        client.wakeup.set()
+
+    def _drop_slow(self, client: _Client, reason: str) -> None:
+        if self._clients.pop(client.websocket, None) is None:
+            return
+        self._stats["slow_disconnects"] += 1
+        logger.warning("WS client disconnected (%s)", reason)
+        if client.sender is not None and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+        asyncio.ensure_future(self._close_quietly(client.websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: Any) -> None:
+        try:
+            await websocket.close(code=1013)     # "try again later"
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Sender
+    # ------------------------------------------------------------------
+    async def _send_loop(self, client: _Client) -> None:
+        while True:
+            await client.wakeup.wait()
+            client.wakeup.clear()
+            while client.pending:
+                batch = [
+                    client.pending.popitem(last=False)[1]
+                    for _ in range(min(len(client.pending), config.WS_BATCH_MAX_EVENTS))
+                ]
+                frame = batch[0] if len(batch) == 1 else {"type": "batch", "events": batch}
+                started = time.perf_counter()
+                try:
+                    await asyncio.wait_for(
+                        client.websocket.send_json(frame),
+                        timeout=config.WS_SEND_TIMEOUT_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    self._drop_slow(client, "send timeout")
+                    return
+                except Exception:
+                    # Peer went away; the /ws handler's finally will also disconnect
+                    self._clients.pop(client.websocket, None)
+                    return
+                elapsed = time.perf_counter() - started
+                client.dropped_since_send = 0
+                self._stats["frames_sent"] += 1
+                self._stats["events_sent"] += len(batch)
+                self._stats["send_seconds_total"] += elapsed
+                if elapsed > self._stats["send_seconds_max"]:
+                    self._stats["send_seconds_max"] = elapsed
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        frames = self._stats["frames_sent"]
+        return {
+            "clients": len(self._clients),
+            "queued_events": sum(len(c.pending) for c in self._clients.values()),
+            **self._stats,
+            "send_seconds_avg": self._stats["send_seconds_total"] / frames if frames else 0.0,
+        }
+
+
+# Process-wide broadcaster used by main.py
+ws_broadcaster = WebSocketBroadcaster()
@@ -11,6 +11,7 @@ Default seeded credentials (from auth_seed.py defaults / env):
   ops-server / server123!  -> role SERVER
 """
 
+import json
 import os
 import tempfile
 import pytest
@@ -24,6 +25,9 @@ from fastapi.testclient import TestClient
 # Shared helpers
 # ---------------------------------------------------------------------------
 
+# HTTP Basic credentials of the seeded SERVER account (admin routes)
+OPERATOR = ("ops-server", "server123!")
+
 METRICS_CLEAN = {
     "hostname": "PC-A",
     "timestamp": "2026-02-21T10:00:00+00:00",
@@ -112,6 +116,10 @@ def client(monkeypatch, tmp_path):
     finally:
         db.close()
 
+    # Score distribution state stays per test (its file is under tmp_path, see conftest.py)
+    from server.score_distribution import score_distribution
+    score_distribution.clear()
+
     # Import app AFTER monkeypatching so startup event uses patched DB
     from server.main import app
     with TestClient(app, raise_server_exceptions=True) as tc:
@@ -291,6 +299,53 @@ class TestReportGating:
         assert r.status_code == 200
         assert r.json()["total_score"] < 100.0
 
+    def test_deactivated_device_returns_403(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        assert _post_report(client, hostname="PC-A").status_code == 200
+        r = client.delete("/api/devices/PC-A", auth=OPERATOR)
+        assert r.status_code == 200
+        r = _post_report(client, hostname="PC-A")
+        assert r.status_code == 403
+        # Re-registering reactivates the device
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        assert _post_report(client, hostname="PC-A").status_code == 200
+
+    def test_deactivate_unknown_device_returns_404(self, client):
+        r = client.delete("/api/devices/NOPE", auth=OPERATOR)
+        assert r.status_code == 404
+
+    def test_deactivate_requires_server_account(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        r = client.delete("/api/devices/PC-A")
+        assert r.status_code == 401
+        assert r.headers["www-authenticate"] == "Basic"
+        assert client.delete("/api/devices/PC-A", auth=("ops-server", "wrong")).status_code == 401
+        assert client.delete("/api/devices/PC-A", auth=("ops-client", "client123!")).status_code == 403
+        assert _post_report(client, hostname="PC-A").status_code == 200
+
+
+class TestRunSessions:
+
+    def test_run_progress_and_summary(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_report(client, hostname="PC-A")   # joins the in-memory registry
+
+        run_id = client.post("/runs/start").json()["run_id"]
+        progress = client.get(f"/runs/{run_id}/progress").json()
+        assert (progress["completed"], progress["pending"]) == (0, 1)
+
+        _post_report(client, hostname="PC-A")
+        progress = client.get(f"/runs/{run_id}/progress").json()
+        assert progress["completion_percent"] == pytest.approx(100.0)
+        summary = client.get(f"/runs/{run_id}/summary").json()
+        assert summary["average_score"] == pytest.approx(100.0)
+        detail = client.get(f"/runs/{run_id}").json()
+        assert detail["devices"]["PC-A"]["status"] == "completed"
+        assert any(r["run_id"] == run_id for r in client.get("/runs").json()["runs"])
+
+    def test_unknown_run_returns_404(self, client):
+        assert client.get("/runs/nope/progress").status_code == 404
+
 
 # ---------------------------------------------------------------------------
 # P5.2.4 — DB persistence side effects
@@ -342,6 +397,226 @@ class TestReportPersistence:
         finally:
             db.close()
 
+    def test_saves_run_off_the_event_loop(self, client, monkeypatch):
+        import asyncio
+        import server.main as main
+
+        calls = []
+
+        def recording(func):
+            def wrapper(*args):
+                try:
+                    asyncio.get_running_loop()
+                    calls.append((func.__name__, "event loop"))
+                except RuntimeError:
+                    calls.append((func.__name__, "worker thread"))
+                return func(*args)
+            return wrapper
+
+        monkeypatch.setattr(main, "save_report", recording(main.save_report))
+        monkeypatch.setattr(main, "save_heartbeat", recording(main.save_heartbeat))
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_report(client, hostname="PC-A")
+        _post_report(client, hostname="PC-A")
+        assert {name for name, _ in calls} == {"save_report", "save_heartbeat"}
+        assert {where for _, where in calls} == {"worker thread"}
+
+
+class TestUnchangedReports:
+
+    @staticmethod
+    def _count(model):
+        import server.db as db_module
+        db = db_module.SessionLocal()
+        try:
+            return db.query(model).count()
+        finally:
+            db.close()
+
+    @pytest.fixture()
+    def published(self, monkeypatch):
+        """snapshot_updated events (device_changed events from registration are skipped)."""
+        from server.main import ws_broadcaster
+        events = []
+
+        def publish(event):
+            if event["type"] == "snapshot_updated":
+                events.append(event)
+
+        monkeypatch.setattr(ws_broadcaster, "publish", publish)
+        return events
+
+    def test_repeat_stored_as_heartbeat_without_event(self, client, published):
+        from server.db_models import DeviceHeartbeat, DeviceReport
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        for ts in ("2026-02-21T10:00:00+00:00", "2026-02-21T10:00:10+00:00", "2026-02-21T10:00:20+00:00"):
+            r = client.post("/report", json=dict(METRICS_CLEAN, timestamp=ts))
+            assert r.status_code == 200
+            assert r.json()["score"] == pytest.approx(100.0)
+        assert self._count(DeviceReport) == 1
+        assert self._count(DeviceHeartbeat) == 1
+        assert [e["hostname"] for e in published] == ["PC-A"]
+
+        # A changed report is stored in full and broadcast
+        r = client.post("/report", json=dict(METRICS_CLEAN, firewall_enabled=False))
+        assert r.json()["score"] < 100.0
+        assert self._count(DeviceReport) == 2
+        assert len(published) == 2
+
+    def test_heartbeats_disabled(self, client, published, monkeypatch):
+        import server.main as main
+        from server.db_models import DeviceReport
+
+        monkeypatch.setattr(main.config, "REPORT_HEARTBEATS", False)
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_report(client, "PC-A")
+        _post_report(client, "PC-A")
+        assert self._count(DeviceReport) == 2
+        assert len(published) == 2
+
+    def test_batch_repeats(self, client, published):
+        from server.db_models import DeviceReport
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        r = client.post("/reports/batch", json={"reports": [
+            dict(METRICS_CLEAN), dict(METRICS_CLEAN), dict(METRICS_CLEAN, firewall_enabled=False),
+        ]})
+        assert r.json()["accepted"] == 3
+        assert self._count(DeviceReport) == 2
+        assert [e["hostname"] for e in published] == ["PC-A"]
+        assert published[0]["score"] < 100.0
+
+
+class TestReportBatch:
+
+    @staticmethod
+    def _metrics(hostname: str, **overrides) -> dict:
+        payload = dict(METRICS_CLEAN)
+        payload.update(hostname=hostname, **overrides)
+        return payload
+
+    def test_per_item_results_in_request_order(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_register(client, "PC-B", "1.1.1.2", "ops-client", "client123!")
+        r = client.post("/reports/batch", json={"reports": [
+            self._metrics("PC-A"),
+            self._metrics("UNREG"),
+            self._metrics("PC-B", firewall_enabled=False),
+        ]})
+        assert r.status_code == 200
+        body = r.json()
+        assert (body["accepted"], body["rejected"]) == (2, 1)
+        assert [i["hostname"] for i in body["results"]] == ["PC-A", "UNREG", "PC-B"]
+        assert [i["ok"] for i in body["results"]] == [True, False, True]
+        assert body["results"][0]["score"] == pytest.approx(100.0)
+        assert body["results"][1]["error"] == "Device not registered"
+        assert body["results"][2]["score"] < 100.0
+        assert body["results"][2]["issues"]
+
+    def test_rows_persisted_and_latest_cached(self, client):
+        import server.db as db_module
+        from server.db_models import DeviceReport
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        r = client.post("/reports/batch", json={"reports": [
+            self._metrics("PC-A", firewall_enabled=False),
+            self._metrics("PC-A"),
+        ]})
+        assert r.json()["accepted"] == 2
+
+        db = db_module.SessionLocal()
+        try:
+            assert db.query(DeviceReport).count() == 2
+        finally:
+            db.close()
+        latest = client.get("/latest_reports").json()
+        device = next(d for d in latest["devices"] if d["hostname"] == "PC-A")
+        assert device["final_score"] == pytest.approx(100.0)
+
+    def test_invalid_item_rejects_whole_batch(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        bad = self._metrics("PC-A", disk_usage_percent="lots")
+        r = client.post("/reports/batch", json={"reports": [self._metrics("PC-A"), bad]})
+        assert r.status_code == 400
+
+    def test_empty_and_oversized_batches_rejected(self, client, monkeypatch):
+        import server.main as main
+        assert client.post("/reports/batch", json={"reports": []}).status_code == 400
+        monkeypatch.setattr(main.config, "REPORT_BATCH_MAX_ITEMS", 1)
+        r = client.post("/reports/batch", json={"reports": [self._metrics("A"), self._metrics("B")]})
+        assert r.status_code == 400
+
+
+class TestAdminRescore:
+
+    def test_requires_server_account(self, client, monkeypatch):
+        from server import rescore
+        monkeypatch.setattr(rescore, "current_job", None)
+        r = client.post("/api/admin/rescore", params={"workers": 0})
+        assert r.status_code == 401
+        assert r.headers["www-authenticate"] == "Basic"
+        r = client.post("/api/admin/rescore", params={"workers": 0}, auth=("ops-server", "wrong"))
+        assert r.status_code == 401
+        r = client.post("/api/admin/rescore", params={"workers": 0}, auth=("ops-client", "client123!"))
+        assert r.status_code == 403
+        assert client.get("/api/admin/rescore").status_code == 401
+        assert rescore.current_job is None
+
+    def test_rescore_job_runs_and_reports_progress(self, client, monkeypatch):
+        import time
+        from server import rescore
+        monkeypatch.setattr(rescore, "current_job", None)
+        assert client.get("/api/admin/rescore", auth=OPERATOR).status_code == 404
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_report(client, hostname="PC-A")
+        r = client.post("/api/admin/rescore", params={"workers": 0}, auth=OPERATOR)
+        assert r.status_code == 202
+
+        deadline = time.monotonic() + 10
+        progress = client.get("/api/admin/rescore", auth=OPERATOR).json()
+        while progress["state"] in ("pending", "running") and time.monotonic() < deadline:
+            time.sleep(0.05)
+            progress = client.get("/api/admin/rescore", auth=OPERATOR).json()
+        assert progress["state"] == "done"
+        assert (progress["total"], progress["processed"], progress["changed"]) == (1, 1, 0)
+
+    def test_rescored_scores_reach_the_caches(self, client, monkeypatch, tmp_path):
+        import time
+        import server.main as main
+        from server import rescore
+        from server.scoring.spec import DEFAULT_SPEC_PATH, rule_spec
+
+        monkeypatch.setattr(rescore, "current_job", None)
+        published = []
+        monkeypatch.setattr(main.cluster, "publish", lambda kind, payload=None: published.append(kind))
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        assert client.post("/report", json=dict(METRICS_CLEAN, firewall_enabled=False)).json()["score"] == 75.0
+
+        # K2 (firewall) penalty 25 → 40
+        spec = json.loads(open(DEFAULT_SPEC_PATH, encoding="utf-8").read())
+        spec["rules"][1]["penalty"] = 40
+        (tmp_path / "rules.json").write_text(json.dumps(spec), encoding="utf-8")
+        monkeypatch.setattr(main.config, "RULE_SPEC_PATH", str(tmp_path / "rules.json"))
+        rule_spec.reload()
+        try:
+            assert client.post("/api/admin/rescore", params={"workers": 0}, auth=OPERATOR).status_code == 202
+            deadline = time.monotonic() + 10
+            while "rescored" not in published and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            rule_spec.reset()
+
+        assert "rescored" in published
+        # The caches are process-wide: other tests' hosts may be present
+        latest = {d["hostname"]: d for d in client.get("/latest_reports").json()["devices"]}
+        assert latest["PC-A"]["final_score"] == 60.0
+        snapshot = {d["hostname"]: d for d in client.get("/snapshot/latest").json()["devices"]}
+        assert snapshot["PC-A"]["score"] == 60.0
+        assert client.get("/api/fleet/distribution").json()["client"]["p50"] == 60.0
+        assert client.get("/api/devices/PC-A/trend").json()["latest_score"] == 60.0
+
 
 # ---------------------------------------------------------------------------
 # P5.2.5 — GET /api/devices shape
@@ -393,6 +668,73 @@ class TestDevicesEndpoint:
         # latest_score may be None before any report submitted
         assert "latest_score" in device  # key present even if null
 
+    def test_etag_revalidation_until_registration(self, client):
+        first = client.get("/api/devices")
+        etag = first.headers["ETag"]
+        again = client.get("/api/devices", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        after = client.get("/api/devices", headers={"If-None-Match": etag})
+        assert after.status_code == 200
+        assert after.headers["ETag"] != etag
+        assert "PC-A" in [d["hostname"] for d in after.json()["devices"]]
+
+
+class TestDevicesDelta:
+
+    def test_changes_since_generation(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_register(client, "PC-B", "1.1.1.2", "ops-client", "client123!")
+        full = client.get("/api/devices").json()
+        assert full["full"] is True
+        generation = full["generation"]
+        assert generation >= 2
+
+        # Nothing changed yet
+        r = client.get(f"/api/devices?since={generation}").json()
+        assert r == {"device_count": 0, "devices": [], "generation": generation, "full": False, "removed": []}
+
+        _post_report(client, "PC-B")
+        r = client.get(f"/api/devices?since={generation}").json()
+        assert [d["hostname"] for d in r["devices"]] == ["PC-B"]
+        assert r["devices"][0]["latest_score"] is not None
+        assert r["generation"] > generation
+
+        client.delete("/api/devices/PC-A", auth=OPERATOR)
+        r2 = client.get(f"/api/devices?since={r['generation']}").json()
+        assert r2["devices"] == []
+        assert r2["removed"] == ["PC-A"]
+        # From the original generation both changes are reported
+        r3 = client.get(f"/api/devices?since={generation}").json()
+        assert [d["hostname"] for d in r3["devices"]] == ["PC-B"]
+        assert r3["removed"] == ["PC-A"]
+
+    def test_unknown_or_zero_generation_returns_full_list(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        for since in (0, 10_000):
+            r = client.get(f"/api/devices?since={since}").json()
+            assert r["full"] is True
+            assert [d["hostname"] for d in r["devices"]] == ["PC-A"]
+        assert client.get("/api/devices?since=-1").status_code == 400
+
+    def test_events_carry_generation(self, client, monkeypatch):
+        from server.main import ws_broadcaster
+        events = []
+        monkeypatch.setattr(ws_broadcaster, "publish", events.append)
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        client.post("/report", json=dict(METRICS_CLEAN, firewall_enabled=False))
+        client.delete("/api/devices/PC-A", auth=OPERATOR)
+
+        assert [e["type"] for e in events] == ["device_changed", "snapshot_updated", "device_changed"]
+        generations = [e["generation"] for e in events]
+        assert generations == sorted(generations) and len(set(generations)) == 3
+        assert events[2]["removed"] is True
+        # The last event's generation is the one /api/devices reports
+        assert client.get("/api/devices").json()["generation"] == generations[-1]
+
 
 # ---------------------------------------------------------------------------
 # P5.2.6 — GET /api/devices/{hostname}/history
@@ -455,6 +797,85 @@ class TestDeviceHistoryEndpoint:
         assert r.status_code == 400
         assert r.json()["detail"] == "Invalid limit"
 
+    def test_range_pages_follow_next_cursor(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        for minute in range(5):
+            payload = dict(METRICS_CLEAN)
+            payload["timestamp"] = f"2026-02-21T10:0{minute}:00+00:00"
+            payload["disk_usage_percent"] = 50 + minute   # distinct reports, no heartbeats
+            client.post("/report", json=payload)
+
+        url = "/api/devices/PC-A/history?from=2026-02-21T10:01:00Z&to=2026-02-21T10:04:00Z&limit=3"
+        first = client.get(url).json()
+        assert [p["timestamp"][11:16] for p in first["points"]] == ["10:01", "10:02", "10:03"]
+        assert first["next_cursor"]
+        second = client.get(url + "&cursor=" + first["next_cursor"]).json()
+        assert [p["timestamp"][11:16] for p in second["points"]] == ["10:04"]
+        assert second["next_cursor"] is None
+
+        # Latest-N mode is unchanged and never paginates
+        assert client.get("/api/devices/PC-A/history?limit=2").json()["next_cursor"] is None
+
+    def test_downsampled_range(self, client):
+        self._send_two_reports(client)
+        body = client.get("/api/devices/PC-A/history?points=3").json()
+        assert body["raw_count"] == 2
+        assert body["downsampled"] is False
+        assert len(body["points"]) == 2
+
+    def test_invalid_range_arguments_return_400(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        cases = {
+            "cursor=%%%": "Invalid cursor",
+            "from=2026-02-22T00:00:00Z&to=2026-02-21T00:00:00Z": "Invalid time range",
+            "points=2": "Invalid points",
+            "points=999999": "Invalid points",
+            "points=10&method=average": "Invalid method",
+            "points=10&cursor=abc": "cursor cannot be combined with points",
+        }
+        for query, detail in cases.items():
+            r = client.get(f"/api/devices/PC-A/history?{query}")
+            assert r.status_code == 400, query
+            assert r.json()["detail"] == detail
+
+
+# ---------------------------------------------------------------------------
+# GET /api/devices/{hostname}/trend
+# ---------------------------------------------------------------------------
+
+class TestDeviceTrendEndpoint:
+
+    def test_trend_after_reports(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        empty = client.get("/api/devices/PC-A/trend").json()
+        assert empty["report_count"] == 0
+        assert empty["ewma_score"] is None
+
+        for day, firewall in enumerate([True, False, False]):
+            payload = dict(METRICS_CLEAN)
+            payload["timestamp"] = f"2026-02-2{day + 1}T10:00:00+00:00"
+            payload["firewall_enabled"] = firewall
+            payload["disk_usage_percent"] = 50 + day   # distinct reports, no heartbeats
+            client.post("/report", json=payload)
+
+        body = client.get("/api/devices/PC-A/trend").json()
+        assert body["report_count"] == 3
+        assert body["min_score"] < body["max_score"] == body["first_score"]
+        assert body["latest_score"] == body["min_score"]
+        assert body["min_score"] < body["ewma_score"] < body["max_score"]
+        assert body["slope_per_day"] < 0
+        assert body["window_size"] == 3
+        assert body["risk_level_since"].startswith("2026-02-22T10:00:00")
+        assert body["seconds_since_risk_change"] > 0
+
+        device = client.get("/api/devices").json()["devices"][0]
+        assert device["score_ewma"] == body["ewma_score"]
+        assert device["score_slope_per_day"] == body["slope_per_day"]
+        assert device["risk_level_since"] == body["risk_level_since"]
+
+    def test_unknown_host_returns_404(self, client):
+        assert client.get("/api/devices/NOPE/trend").status_code == 404
+
 
 # ---------------------------------------------------------------------------
 # P5.2.7 — GET /api/fleet/history
@@ -512,11 +933,278 @@ class TestFleetHistoryEndpoint:
         assert r.status_code == 400
         assert r.json()["detail"] == "Invalid limit"
 
+    def test_day_of_minute_buckets_is_accepted(self, client):
+        self._seed_fleet(client)
+        r = client.get("/api/fleet/history?limit=1440&resolution=1m")
+        assert r.status_code == 200
+        assert len(r.json()["points"]) == 2
+
     def test_limit_0_returns_400(self, client):
         r = client.get("/api/fleet/history?limit=0")
         assert r.status_code == 400
         assert r.json()["detail"] == "Invalid limit"
 
+    def test_resolution_and_range(self, client):
+        self._seed_fleet(client)
+        r = client.get("/api/fleet/history?resolution=1h&from=2026-02-21T00:00:00Z&to=2026-02-22T00:00:00Z")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["resolution"] == "1h"
+        assert len(body["points"]) == 1
+        assert body["points"][0]["fleet_avg"] == pytest.approx(100.0)
+
+    def test_invalid_resolution_returns_400(self, client):
+        r = client.get("/api/fleet/history?resolution=7m")
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Invalid resolution"
+
+    def test_invalid_range_returns_400(self, client):
+        r = client.get("/api/fleet/history?from=not-a-date")
+        assert r.status_code == 400
+        r = client.get("/api/fleet/history?from=2026-02-22T00:00:00Z&to=2026-02-21T00:00:00Z")
+        assert r.status_code == 400
+
+
+class TestFleetDistributionEndpoint:
+
+    def test_latest_scores_per_device_type(self, client):
+        _post_register(client, "SRV-1", "1.1.1.9", "ops-server", "server123!")
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_register(client, "PC-B", "1.1.1.2", "ops-client", "client123!")
+        scores = {}
+        for hostname, firewall in [("SRV-1", True), ("PC-A", True), ("PC-B", True), ("PC-B", False)]:
+            payload = dict(METRICS_CLEAN, hostname=hostname, firewall_enabled=firewall)
+            scores[hostname] = client.post("/report", json=payload).json()["score"]
+
+        body = client.get("/api/fleet/distribution").json()
+        assert body["device_count"] == 3
+        assert body["server"]["count"] == 1
+        assert body["client"]["count"] == 2     # PC-B counted once, with its latest score
+        assert body["client"]["p5"] == pytest.approx(scores["PC-B"], abs=0.5)
+        assert body["client"]["p95"] == pytest.approx(scores["PC-A"], abs=0.5)
+        assert sum(b["count"] for b in body["fleet"]["histogram"]) == 3
+
+        client.delete("/api/devices/PC-B", auth=OPERATOR)
+        body = client.get("/api/fleet/distribution?bucket_width=25").json()
+        assert body["client"]["count"] == 1
+        assert [b["upper"] for b in body["fleet"]["histogram"]] == [25, 50, 75, 100]
+
+    def test_invalid_bucket_width_returns_400(self, client):
+        r = client.get("/api/fleet/distribution?bucket_width=7")
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Invalid bucket_width"
+
+
+class TestReportExportEndpoint:
+
+    def _seed(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_register(client, "PC-S", "2.2.2.2", "ops-server", "server123!")
+        for ts, disk in [("2026-02-21T10:00:00+00:00", 40), ("2026-02-21T11:00:00+00:00", 60)]:
+            for hostname in ("PC-A", "PC-S"):
+                payload = dict(METRICS_CLEAN, hostname=hostname, timestamp=ts, disk_usage_percent=disk)
+                assert client.post("/report", json=payload).status_code == 200
+
+    def test_ndjson_lines(self, client):
+        self._seed(client)
+        r = client.get("/api/export/reports")
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in r.text.splitlines()]
+        assert [row["hostname"] for row in rows] == ["PC-A", "PC-S", "PC-A", "PC-S"]
+        assert rows[0]["collected_at"] == "2026-02-21T10:00:00+00:00"
+        assert rows[0]["metrics"]["disk_usage_percent"] == 40
+        assert isinstance(rows[0]["issues"], list)
+        assert {"id", "device_type", "score", "risk_level"} <= rows[0].keys()
+
+    def test_filters(self, client):
+        self._seed(client)
+        r = client.get("/api/export/reports?hostname=PC-S&from=2026-02-21T10:30:00Z")
+        rows = [json.loads(line) for line in r.text.splitlines()]
+        assert [(row["hostname"], row["metrics"]["disk_usage_percent"]) for row in rows] == [("PC-S", 60)]
+        # Same instant as 10:30Z, written with a +03:00 offset (%2B = "+")
+        r = client.get("/api/export/reports?hostname=PC-S&from=2026-02-21T13:30:00%2B03:00")
+        assert [json.loads(line)["metrics"]["disk_usage_percent"] for line in r.text.splitlines()] == [60]
+
+        level = rows[0]["risk_level"]
+        r = client.get(f"/api/export/reports?risk_level={level.lower()}&hostname=PC-S&hostname=PC-A")
+        assert {json.loads(line)["risk_level"] for line in r.text.splitlines()} == {level}
+
+    def test_gzip(self, client):
+        import gzip
+        self._seed(client)
+        r = client.get("/api/export/reports?gzip=true")
+        assert r.status_code == 200
+        assert r.headers["content-type"] == "application/gzip"
+        assert "reports.ndjson.gz" in r.headers["content-disposition"]
+        lines = gzip.decompress(r.content).decode().splitlines()
+        assert len(lines) == 4
+
+    def test_invalid_parameters_return_400(self, client):
+        r = client.get("/api/export/reports?risk_level=SEVERE")
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Invalid risk_level"
+        r = client.get("/api/export/reports?from=2026-02-22T00:00:00Z&to=2026-02-21T00:00:00Z")
+        assert r.json()["detail"] == "Invalid time range"
+        assert client.get("/api/export/reports?to=soon").status_code == 400
+
+
+class TestWarmStart:
+
+    @staticmethod
+    def _restart_caches():
+        """Empty the in-memory state as after a restart, then warm it from the DB."""
+        from server.main import warm_caches
+        from server.score_distribution import score_distribution
+        from server.state import device_metrics_cache, device_reports_cache, registered_devices
+        for cache in (device_metrics_cache, device_reports_cache, registered_devices):
+            cache.clear()
+        score_distribution.clear()
+        return warm_caches()
+
+    def test_caches_rebuilt_from_latest_reports(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_register(client, "PC-B", "1.1.1.2", "ops-client", "client123!")
+        _post_register(client, "PC-S", "2.2.2.2", "ops-server", "server123!")
+        client.post("/report", json=dict(METRICS_CLEAN, hostname="PC-A"))
+        client.post("/report", json=dict(METRICS_CLEAN, hostname="PC-A", firewall_enabled=False,
+                                          timestamp="2026-02-21T10:05:00+00:00"))
+        client.post("/report", json=dict(METRICS_CLEAN, hostname="PC-B"))
+        client.post("/report", json=dict(METRICS_CLEAN, hostname="PC-S", disk_usage_percent=95))
+        client.delete("/api/devices/PC-B", auth=OPERATOR)
+        before = client.get("/latest_reports").json()["devices"]
+        before_seen = client.get("/devices").json()["devices"]
+
+        stats = self._restart_caches()
+        assert stats["devices"] == 2 and stats["skipped"] == 0
+
+        after = client.get("/latest_reports").json()["devices"]
+        key = lambda d: d["hostname"]
+        assert sorted(after, key=key) == sorted(before, key=key)
+        assert {d["hostname"]: d["final_score"] for d in after}["PC-A"] < 100.0   # the newer report
+        assert client.get("/devices").json()["devices"] == before_seen
+        assert client.get("/api/fleet/distribution").json()["device_count"] == 2
+
+    def test_empty_issues_column_is_loaded(self, client):
+        import server.db as db_module
+        from server.db_models import DeviceReport
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        client.post("/report", json=METRICS_CLEAN)
+        db = db_module.SessionLocal()
+        try:
+            db.query(DeviceReport).update({DeviceReport.issues_json: ""})
+            db.commit()
+        finally:
+            db.close()
+
+        assert self._restart_caches()["devices"] == 1
+        assert client.get("/latest_reports").json()["devices"][0]["issues"] == []
+
+    def test_unchanged_report_after_restart_is_heartbeat(self, client):
+        import server.db as db_module
+        from server.db_models import DeviceHeartbeat, DeviceReport
+
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        client.post("/report", json=METRICS_CLEAN)
+        self._restart_caches()
+        assert client.post("/report", json=dict(METRICS_CLEAN, timestamp="2026-02-21T10:01:00+00:00")).status_code == 200
+
+        db = db_module.SessionLocal()
+        try:
+            assert db.query(DeviceReport).count() == 1
+            assert db.query(DeviceHeartbeat).count() == 1
+        finally:
+            db.close()
+
+
+class TestFleetMetricsEndpoints:
+
+    def _seed(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_register(client, "PC-S", "2.2.2.2", "ops-server", "server123!")
+        for ts, firewall, disk in [
+            ("2026-02-21T10:00:00+00:00", True, 40),
+            ("2026-02-21T10:30:00+00:00", False, 60),
+        ]:
+            for hostname in ("PC-A", "PC-S"):
+                payload = dict(METRICS_CLEAN, hostname=hostname, timestamp=ts,
+                               firewall_enabled=firewall or hostname == "PC-S",
+                               disk_usage_percent=disk)
+                assert client.post("/report", json=payload).status_code == 200
+
+    def test_trend_buckets(self, client):
+        self._seed(client)
+        r = client.get("/api/fleet/metrics/trend?resolution=1h&from=2026-02-21T00:00:00Z&to=2026-02-22T00:00:00Z")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["resolution"] == "1h"
+        (point,) = body["points"]
+        assert point["timestamp"] == "2026-02-21T10:00:00+00:00"
+        assert point["reports"] == 4
+        assert point["devices"] == 2
+        assert point["firewall_disabled"] == 1
+        assert point["avg_disk_usage"] == pytest.approx(50.0)
+
+    def test_current_uses_latest_report(self, client):
+        self._seed(client)
+        r = client.get("/api/fleet/metrics/current")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["devices"] == 2
+        assert body["servers"] == 1 and body["clients"] == 1
+        assert body["firewall_disabled"] == 1
+        assert body["max_disk_usage"] == pytest.approx(60.0)
+
+    def test_current_empty_fleet(self, client):
+        body = client.get("/api/fleet/metrics/current").json()
+        assert body["devices"] == 0
+        assert body["avg_disk_usage"] is None
+
+    def test_invalid_parameters_return_400(self, client):
+        assert client.get("/api/fleet/metrics/trend?resolution=7m").status_code == 400
+        assert client.get("/api/fleet/metrics/trend?limit=0").status_code == 400
+        assert client.get("/api/fleet/metrics/trend?from=yesterday").status_code == 400
+
+
+class TestMetricsEndpoint:
+
+    def test_report_path_instrumented(self, client):
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        assert _post_report(client, "PC-A").status_code == 200
+        assert _post_report(client, "PC-UNKNOWN").status_code == 403
+        r = client.get("/metrics")
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = r.text
+        for stage in ("score", "save_report", "build_snapshot", "write_snapshot", "broadcast"):
+            assert f'operationscore_report_stage_duration_seconds_count{{stage="{stage}"}}' in text
+        assert 'operationscore_reports_total{outcome="stored"}' in text
+        assert 'operationscore_reports_total{outcome="rejected"}' in text
+        assert 'route="/report",status="200"' in text
+        assert 'operationscore_task_queue_tasks{state="queued"}' in text
+        assert "operationscore_ws_clients " in text
+        assert 'operationscore_cache_entries{cache="device_metrics"}' in text
+
+
+class TestDebugDb:
+
+    def test_profile_pragmas_and_top_statements(self, client):
+        import server.db as db_module
+        from server.db_profile import query_stats
+
+        query_stats.install(db_module.engine)
+        _post_register(client, "PC-A", "1.1.1.1", "ops-client", "client123!")
+        _post_report(client, "PC-A")
+        r = client.get("/debug/db?limit=5")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["profile"] in ("safe", "balanced", "fast")
+        assert "busy_timeout" in body["pragmas"]
+        assert body["calls"] > 0
+        assert 0 < len(body["top"]) <= 5
+        assert {"statement", "calls", "total_ms", "avg_ms", "max_ms"} <= set(body["top"][0])
+
 
 # ---------------------------------------------------------------------------
 # P5.2.8 — Limit validation (explicit grouping)
@@ -0,0 +1,90 @@
+"""
+tests/test_cluster.py
+
+server/cluster.py: two buses in one event loop stand in for two workers
+sharing a CLUSTER_DIR under tmp_path.
+"""
+
+import asyncio
+
+from server.cluster import ClusterBus
+
+
+async def _until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+def test_messages_reach_every_peer_without_echo(tmp_path):
+    async def scenario():
+        a, b = ClusterBus(), ClusterBus()
+        a.node_id, b.node_id = "a", "b"
+        received = {"a": [], "b": []}
+        a.on("ping", received["a"].append)
+
+        def b_handler(payload):
+            received["b"].append(payload)
+            b.publish("ping", "echo")   # replaying: not forwarded
+
+        b.on("ping", b_handler)
+        await a.start(str(tmp_path))
+        await b.start(str(tmp_path))        # connects to a; a connects back on hello
+        await _until(lambda: a.stats()["peers"] == 1 and b.stats()["peers"] == 1)
+
+        a.publish("ping", {"n": 1})
+        b.publish("ping", [2])
+        await _until(lambda: received["a"] and received["b"])
+        await asyncio.sleep(0.05)
+        await a.stop()
+        await b.stop()
+        return received, a.stats()
+
+    received, stats = asyncio.run(scenario())
+    assert received == {"a": [[2]], "b": [{"n": 1}]}
+    assert stats["messages_sent"] == 1
+    assert stats["enabled"] is False
+
+
+def test_publish_from_a_thread(tmp_path):
+    async def scenario():
+        a, b = ClusterBus(), ClusterBus()
+        received = []
+        b.on("x", received.append)
+        await a.start(str(tmp_path))
+        await b.start(str(tmp_path))
+        await _until(lambda: a.stats()["peers"] == 1)
+        await asyncio.to_thread(a.publish, "x", 7)
+        await _until(lambda: received)
+        await a.stop()
+        await b.stop()
+        return received
+
+    assert asyncio.run(scenario()) == [7]
+
+
+def test_stale_sockets_are_pruned_and_stop_cleans_up(tmp_path):
+    stale = tmp_path / "dead-worker.sock"
+    stale.write_bytes(b"")
+
+    async def scenario():
+        bus = ClusterBus()
+        await bus.start(str(tmp_path))
+        own = bus.path
+        assert own.exists()
+        stats = bus.stats()
+        await bus.stop()
+        return own, stats
+
+    own, stats = asyncio.run(scenario())
+    assert not stale.exists()
+    assert stats["peers_pruned"] == 1 and stats["peers"] == 0
+    assert not own.exists()
+
+
+def test_publish_is_a_noop_when_stopped():
+    bus = ClusterBus()
+    bus.publish("x", 1)
+    assert bus.stats()["messages_sent"] == 0
@@ -0,0 +1,98 @@
+"""
+tests/test_credentials.py
+
+Unit tests for server/credentials.py (off-loop bcrypt verification).
+The account lookup is patched out, so no database is involved; bcrypt runs
+in the real process pool.
+"""
+
+import asyncio
+
+import bcrypt
+import pytest
+
+import server.credentials as credentials
+
+_HASH = bcrypt.hashpw(b"client123!", bcrypt.gensalt(rounds=4)).decode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Empty cache, fake account table, pool torn down after each test."""
+    lookups = []
+
+    def _fake_account(username):
+        lookups.append(username)
+        return (_HASH, "CLIENT") if username == "ops-client" else None
+
+    credentials.clear_cache()
+    monkeypatch.setattr(credentials.repository, "get_register_account", _fake_account)
+    yield lookups
+    credentials.clear_cache()
+    credentials.shutdown()
+
+
+def test_valid_credentials_return_role(fresh_state):
+    ok, role = asyncio.run(credentials.verify_credentials("ops-client", "client123!", "10.0.0.1"))
+    assert (ok, role) == (True, "CLIENT")
+
+
+def test_wrong_password_and_unknown_user_rejected(fresh_state):
+    assert asyncio.run(credentials.verify_credentials("ops-client", "WRONG")) == (False, None)
+    assert asyncio.run(credentials.verify_credentials("nobody", "x")) == (False, None)
+
+
+def test_success_is_cached_and_failure_is_not(fresh_state):
+    lookups = fresh_state
+
+    async def scenario():
+        await credentials.verify_credentials("ops-client", "client123!", "10.0.0.1")
+        await credentials.verify_credentials("ops-client", "client123!", "10.0.0.2")
+        await credentials.verify_credentials("ops-client", "WRONG", "10.0.0.1")
+        await credentials.verify_credentials("ops-client", "WRONG", "10.0.0.1")
+
+    asyncio.run(scenario())
+    # one lookup for the cached success, two for the uncached failures
+    assert lookups == ["ops-client"] * 3
+
+
+def test_cache_key_never_contains_plaintext():
+    key = credentials._cache_key("ops-client", "client123!")
+    assert b"client123!" not in key
+    assert key != credentials._cache_key("ops-client", "client123?")
+    assert key != credentials._cache_key("ops-clien", "tclient123!")
+
+
+def test_expired_entry_is_reverified(fresh_state, monkeypatch):
+    lookups = fresh_state
+    monkeypatch.setattr(credentials.config, "REGISTER_CACHE_TTL_SECONDS", 0)
+
+    async def scenario():
+        await credentials.verify_credentials("ops-client", "client123!")
+        await credentials.verify_credentials("ops-client", "client123!")
+
+    asyncio.run(scenario())
+    assert len(lookups) == 2
+
+
+def test_per_ip_concurrency_limit(fresh_state, monkeypatch):
+    monkeypatch.setattr(credentials.config, "REGISTER_MAX_CONCURRENCY_PER_IP", 2)
+    in_flight = {"now": 0, "peak": 0}
+
+    async def slow_verify(username, password):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return False, None
+
+    monkeypatch.setattr(credentials, "_verify_uncached", slow_verify)
+
+    async def scenario():
+        await asyncio.gather(*[
+            credentials.verify_credentials(f"user-{i}", "pw", "10.9.9.9") for i in range(8)
+        ])
+
+    asyncio.run(scenario())
+    assert in_flight["peak"] == 2
+    assert credentials._ip_slots == {}
@@ -0,0 +1,77 @@
+"""
+tests/test_db_profile.py
+
+Storage profiles (PRAGMAs applied on connect) and per-statement query timing.
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from server.db_profile import (
+    DEFAULT_PROFILE,
+    PROFILES,
+    QueryStats,
+    apply_profile,
+    effective_pragmas,
+    normalize_statement,
+    resolve_profile,
+)
+
+
+@pytest.mark.parametrize("name", sorted(PROFILES))
+def test_profile_pragmas_applied_on_connect(tmp_path, name):
+    engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    assert apply_profile(engine, name) == name
+    pragmas = effective_pragmas(engine)
+    expected = PROFILES[name]
+    assert pragmas["journal_mode"].upper() == expected["journal_mode"]
+    assert pragmas["cache_size"] == expected["cache_size"]
+    assert pragmas["busy_timeout"] == expected["busy_timeout"]
+    assert pragmas["synchronous"] == {"OFF": 0, "NORMAL": 1, "FULL": 2}[expected["synchronous"]]
+    engine.dispose()
+
+
+def test_unknown_profile_falls_back_to_default():
+    assert resolve_profile("turbo") == DEFAULT_PROFILE
+    assert resolve_profile(" Fast ") == "fast"
+    assert resolve_profile("") == DEFAULT_PROFILE
+
+
+def test_normalize_statement_collapses_in_lists_and_whitespace():
+    assert normalize_statement("SELECT a\n  FROM t WHERE id IN (?, ?, ?)") == "SELECT a FROM t WHERE id IN (?, ...)"
+    assert normalize_statement("SELECT a FROM t WHERE id IN (?,?)") == normalize_statement("SELECT a FROM t WHERE id IN (?, ?, ?, ?)")
+
+
+def test_query_stats_top_statements():
+    engine = create_engine("sqlite://")
+    stats = QueryStats()
+    stats.install(engine)
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+        for _ in range(3):
+            conn.execute(text("SELECT id FROM t WHERE id IN (1, 2)"))
+            conn.execute(text("SELECT count(*) FROM t"))
+    top = {row["statement"]: row for row in stats.top()}
+    assert top["SELECT count(*) FROM t"]["calls"] == 3
+    assert top["CREATE TABLE t (id INTEGER PRIMARY KEY)"]["calls"] == 1
+    summary = stats.stats(limit=2)
+    assert summary["calls"] == 7
+    assert len(summary["top"]) == 2
+    totals = [row["total_ms"] for row in stats.top()]
+    assert totals == sorted(totals, reverse=True)
+
+    stats.reset()
+    assert stats.stats()["calls"] == 0
+
+
+def test_slow_queries_logged_and_statement_cap(caplog):
+    stats = QueryStats(max_statements=2)
+    stats.slow_ms = 50
+    stats.record("SELECT 1", 0.001)
+    stats.record("SELECT 2", 0.2)
+    stats.record("SELECT 3", 0.001)     # over the cap: counted, not tracked
+    summary = stats.stats()
+    assert summary["statements"] == 2
+    assert summary["untracked_calls"] == 1
+    assert [q["statement"] for q in summary["slow_queries"]] == ["SELECT 2"]
+    assert any("slow query" in r.message for r in caplog.records)
@@ -0,0 +1,164 @@
+"""
+tests/test_device_registry.py
+
+Unit tests for server/device_registry.py (in-process active hostname cache).
+repository lookups are patched, so no database is involved.
+"""
+
+import asyncio
+
+import pytest
+
+import server.repository as repository
+from server.device_registry import DeviceRegistry
+
+
+@pytest.fixture()
+def db_hosts(monkeypatch):
+    """Fake devices table: the set of active hostnames, plus a lookup counter."""
+    hosts = {"PC-A", "PC-B"}
+    calls = {"is_registered": 0, "list": 0}
+
+    def _is_registered(hostname):
+        calls["is_registered"] += 1
+        return hostname in hosts
+
+    def _list_active():
+        calls["list"] += 1
+        return sorted(hosts)
+
+    monkeypatch.setattr(repository, "is_registered", _is_registered)
+    monkeypatch.setattr(repository, "list_active_hostnames", _list_active)
+    return hosts, calls
+
+
+def test_warm_hits_do_not_query_db(db_hosts):
+    _, calls = db_hosts
+    reg = DeviceRegistry(refresh_seconds=300)
+    assert reg.warm_from_db() == 2
+    for _ in range(100):
+        assert "PC-A" in reg
+    assert calls["is_registered"] == 0
+
+
+def test_miss_reads_through_and_caches(db_hosts):
+    hosts, calls = db_hosts
+    reg = DeviceRegistry(refresh_seconds=300)
+    reg.warm_from_db()
+    hosts.add("PC-C")  # registered by another worker
+    assert reg.contains("PC-C") is True
+    assert reg.contains("PC-C") is True
+    assert calls["is_registered"] == 1
+    assert reg.contains("UNKNOWN") is False
+
+
+def test_discard_and_invalidate(db_hosts):
+    hosts, _ = db_hosts
+    reg = DeviceRegistry(refresh_seconds=300)
+    reg.warm_from_db()
+    hosts.discard("PC-A")
+    reg.discard("PC-A")
+    assert "PC-A" not in reg
+
+    # Deactivated elsewhere: stays cached until invalidated
+    hosts.discard("PC-B")
+    assert "PC-B" in reg
+    reg.invalidate("PC-B")
+    assert "PC-B" not in reg
+
+
+def test_periodic_refresh_drops_remote_deactivation(db_hosts):
+    hosts, calls = db_hosts
+    reg = DeviceRegistry(refresh_seconds=0)
+    reg.warm_from_db()
+    hosts.discard("PC-A")
+    assert "PC-A" not in reg
+    assert calls["list"] >= 2
+
+
+def test_misses_are_cached_until_ttl_or_add(db_hosts, monkeypatch):
+    hosts, calls = db_hosts
+    reg = DeviceRegistry(refresh_seconds=300, miss_ttl_seconds=60)
+    reg.warm_from_db()
+    for _ in range(10):
+        assert "ROGUE" not in reg
+    assert calls["is_registered"] == 1
+
+    # Registered here (or announced by another worker): no stale miss
+    hosts.add("ROGUE")
+    reg.add("ROGUE")
+    assert "ROGUE" in reg
+
+    reg = DeviceRegistry(refresh_seconds=300, miss_ttl_seconds=0)
+    reg.warm_from_db()
+    assert "PC-C" not in reg
+    hosts.add("PC-C")  # registered by another worker, TTL elapsed
+    assert "PC-C" in reg
+
+
+def test_contains_async_refreshes_in_background(db_hosts):
+    hosts, calls = db_hosts
+    reg = DeviceRegistry(refresh_seconds=0)
+    reg.warm_from_db()
+    hosts.discard("PC-A")
+
+    async def scenario():
+        # Answered from the current set while the reload runs in the thread pool
+        first = await reg.contains_async("PC-A")
+        await reg._refresh_task
+        return first, await reg.contains_async("PC-A"), await reg.contains_async("NEW")
+
+    assert asyncio.run(scenario()) == (True, False, False)
+    assert calls["list"] >= 2
+    assert calls["is_registered"] == 2
+
+
+def test_listeners_see_every_change(db_hosts):
+    reg = DeviceRegistry(refresh_seconds=300)
+    events = []
+    reg.subscribe(lambda event, hostname: events.append((event, hostname)))
+    reg.add("PC-X")
+    reg.discard("PC-X")
+    reg.invalidate()
+    assert events == [("add", "PC-X"), ("remove", "PC-X"), ("invalidate", None)]
+
+
+def test_refresh_does_not_readd_device_discarded_during_read(db_hosts, monkeypatch):
+    hosts, _ = db_hosts
+    reg = DeviceRegistry(refresh_seconds=0)
+    reg.warm_from_db()
+
+    def _list_active_then_deactivate():
+        # The read sees PC-A; the deactivation commits before the refresh lands
+        snapshot = sorted(hosts)
+        hosts.discard("PC-A")
+        reg.discard("PC-A")
+        reg.add("PC-NEW")
+        return snapshot
+
+    monkeypatch.setattr(repository, "list_active_hostnames", _list_active_then_deactivate)
+
+    async def scenario():
+        await reg.contains_async("PC-B")
+        await reg._refresh_task
+
+    asyncio.run(scenario())
+    assert "PC-A" not in reg._active
+    assert "PC-NEW" in reg._active
+    assert "PC-B" in reg._active
+
+
+def test_read_through_does_not_cache_device_discarded_during_read(db_hosts, monkeypatch):
+    hosts, _ = db_hosts
+    reg = DeviceRegistry(refresh_seconds=300)
+    reg.warm([])
+
+    def _is_registered_then_deactivate(hostname):
+        registered = hostname in hosts
+        hosts.discard(hostname)
+        reg.discard(hostname)
+        return registered
+
+    monkeypatch.setattr(repository, "is_registered", _is_registered_then_deactivate)
+    assert asyncio.run(reg.contains_async("PC-A")) is False
+    assert "PC-A" not in reg._active
@@ -0,0 +1,53 @@
+"""
+tests/test_downsample.py
+
+server/downsample.py: LTTB and min/max bucket reduction of a time series.
+"""
+
+import math
+
+import pytest
+
+from server import downsample
+
+
+def _series(n):
+    xs = [float(i) for i in range(n)]
+    ys = [math.sin(i / 5.0) * 50 + 50 for i in range(n)]
+    return xs, ys
+
+
+def test_lttb_keeps_endpoints_and_count():
+    xs, ys = _series(1000)
+    kept = downsample.lttb_indices(xs, ys, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert kept == sorted(set(kept))
+
+
+def test_lttb_keeps_a_spike():
+    xs = [float(i) for i in range(200)]
+    ys = [50.0] * 200
+    ys[123] = 100.0
+    assert 123 in downsample.lttb_indices(xs, ys, 10)
+
+
+def test_minmax_keeps_extremes_per_bucket():
+    xs, ys = _series(1000)
+    kept = downsample.minmax_indices(xs, ys, 20)
+    assert len(kept) <= 20
+    assert kept == sorted(kept)
+    assert ys.index(max(ys)) in kept
+    assert ys.index(min(ys)) in kept
+
+
+@pytest.mark.parametrize("method", downsample.METHODS)
+def test_short_series_unchanged(method):
+    xs, ys = _series(5)
+    assert downsample.downsample_indices(method, xs, ys, 10) == [0, 1, 2, 3, 4]
+    assert downsample.downsample_indices(method, [], [], 10) == []
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample.downsample_indices("median", [0.0], [1.0], 3)
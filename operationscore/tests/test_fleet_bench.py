@@ -0,0 +1,130 @@
+"""
+tests/test_fleet_bench.py
+
+Unit tests for the load-test harness in agent/fleet_bench.py (no server):
+latency statistics, open-loop pacing, /metrics parsing and report rendering.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+_AGENT_DIR = Path(__file__).parent.parent / "agent"
+sys.path.insert(0, str(_AGENT_DIR))
+
+import agent.fleet_bench as bench  # noqa: E402
+
+
+def _stats(latencies_ms, statuses=None):
+    stats = bench.LatencyStats("report", expected=(200,))
+    for i, ms in enumerate(latencies_ms):
+        stats.record(ms / 1000.0, (statuses or {}).get(i, 200))
+    return stats
+
+
+def _report(label, p99, rps=50.0, errors=0.0):
+    return {
+        "label": label,
+        "environment": {"git": "abc123", "python": "3.11", "cpus": 4},
+        "config": {
+            "agents": 10, "duration_seconds": 5.0, "report_rate": 50.0,
+            "poll_rate": 0.0, "run_interval_seconds": 0.0, "repeat": 0.0,
+        },
+        "registration": {"devices": 10, "seconds": 0.5},
+        "workloads": {
+            "report": {
+                "requests": 250, "dropped": 0, "achieved_rps": rps, "p50_ms": 5.0,
+                "p90_ms": 8.0, "p99_ms": p99, "max_ms": 40.0, "error_rate": errors,
+            },
+        },
+        "server_stages": {"score": {"count": 250, "mean_ms": 0.1}},
+    }
+
+
+class TestLatencyStats:
+
+    def test_percentiles_nearest_rank(self):
+        stats = _stats(range(1, 101))
+        assert stats.percentile(50) == pytest.approx(50.0)
+        assert stats.percentile(99) == pytest.approx(99.0)
+        assert stats.percentile(100) == pytest.approx(100.0)
+        assert bench.LatencyStats("empty").percentile(50) == 0.0
+
+    def test_errors_and_statuses(self):
+        stats = _stats([1, 2, 3, 4], statuses={1: 503, 3: "ClientConnectorError"})
+        summary = stats.summary(duration=2.0)
+        assert summary["requests"] == 4
+        assert summary["errors"] == 2
+        assert summary["error_rate"] == 0.5
+        assert summary["achieved_rps"] == 2.0
+        assert summary["statuses"] == {"200": 2, "503": 1, "ClientConnectorError": 1}
+
+    def test_histogram_buckets(self):
+        histogram = dict((str(b), c) for b, c in _stats([0.5, 1, 1.5, 30, 9000]).histogram())
+        assert histogram["1"] == 2          # upper bounds are inclusive
+        assert histogram["2"] == 1
+        assert histogram["50"] == 1
+        assert histogram["+Inf"] == 1
+        assert sum(histogram.values()) == 5
+
+
+class TestDrive:
+
+    def test_open_loop_rate(self):
+        stats = bench.LatencyStats("poll", expected=(204,))
+
+        async def request():
+            return 204
+
+        asyncio.run(bench.drive(rate=200.0, duration=0.25, request=request, stats=stats))
+        assert len(stats.samples) == 50
+        assert stats.errors == 0
+
+    def test_in_flight_cap_drops(self):
+        stats = bench.LatencyStats("report")
+
+        async def slow_request():
+            await asyncio.sleep(0.2)
+            return 200
+
+        asyncio.run(bench.drive(rate=100.0, duration=0.1, request=slow_request, stats=stats, max_in_flight=3))
+        assert len(stats.samples) == 3
+        assert stats.dropped == 7
+        # Latency is measured from the scheduled slot
+        assert min(stats.samples) >= 0.2
+
+
+def test_parse_stage_timings():
+    text = "\n".join([
+        "# TYPE operationscore_report_stage_duration_seconds histogram",
+        'operationscore_report_stage_duration_seconds_bucket{stage="score",le="0.001"} 4',
+        'operationscore_report_stage_duration_seconds_sum{stage="score"} 0.002',
+        'operationscore_report_stage_duration_seconds_count{stage="score"} 4',
+        'operationscore_report_stage_duration_seconds_sum{stage="save_report"} 0.1',
+        'operationscore_report_stage_duration_seconds_count{stage="save_report"} 10',
+        'operationscore_reports_total{outcome="stored"} 14',
+    ])
+    assert bench.parse_stage_timings(text) == {
+        "save_report": {"count": 10, "mean_ms": 10.0},
+        "score": {"count": 4, "mean_ms": 0.5},
+    }
+
+
+def test_render_markdown():
+    text = bench.render_markdown(_report("main", p99=20.0))
+    assert text.startswith("# Fleet benchmark: main")
+    assert "| report | 250 | 0 | 50.0 | 5.0 | 8.0 | 20.0 | 40.0 | 0 |" in text
+    assert "| score | 250 | 0.1 |" in text
+
+
+def test_compare_reports_flags_regressions():
+    text = bench.compare_reports(_report("main", p99=20.0), _report("branch", p99=30.0, rps=52.0))
+    assert text.startswith("# main → branch")
+    assert "| report | p99 ms | 20.0 | 30.0 | +50.0% ⚠ |" in text
+    # Higher throughput is not a regression
+    assert "| report | req/s | 50.0 | 52.0 | +4.0% |" in text
+    assert "| report | errors | 0 | 0 | — |" in text
@@ -170,6 +170,24 @@ class TestPollUnknownCommand:
         captured = capsys.readouterr()
         assert "mystery_op" in captured.err or "WARNING" in captured.err
 
+    def test_unknown_command_acked_when_server_leases(self):
+        task_resp = _fake_resp(200, {"command": "mystery_op", "task_id": "xyz"})
+        task_resp.headers = {"X-Task-Lease-Seconds": "600"}
+        get_effects = [task_resp]
+        sleep_effects = [KeyboardInterrupt("stop")]
+
+        args = _make_args()
+        collector = _make_collector(hostname="h")
+
+        with patch("requests.get", side_effect=get_effects), \
+             patch("requests.post") as mock_post, \
+             patch("time.sleep", side_effect=sleep_effects):
+            with pytest.raises(SystemExit):
+                mod._run_polling(args, collector, "http://x", "http://x/report")
+
+        mock_post.assert_called_once()
+        assert mock_post.call_args[0][0] == "http://x/tasks/h/xyz/ack"
+
 
 # ---------------------------------------------------------------------------
 # Test: KeyboardInterrupt during GET → exit 0
@@ -240,6 +258,47 @@ class TestPollNetworkError:
         mock_post.assert_not_called()
 
 
+# ---------------------------------------------------------------------------
+# Test: long-poll — no client-side sleep when the server held the request
+# ---------------------------------------------------------------------------
+
+class TestPollLongPoll:
+
+    def test_long_poll_server_skips_sleep(self):
+        args = _make_args(poll_interval=10)
+        args.long_poll_wait = 30
+        collector = _make_collector()
+
+        idle = _fake_resp(204, {})
+        idle.headers = {"X-Long-Poll": "1"}
+        get_effects = [idle, idle, KeyboardInterrupt("stop")]
+
+        with patch("requests.get", side_effect=get_effects) as mock_get, \
+             patch("time.sleep") as mock_sleep:
+            with pytest.raises(SystemExit):
+                mod._run_polling(args, collector, "http://x", "http://x")
+
+        mock_sleep.assert_not_called()
+        assert mock_get.call_args.kwargs["params"] == {"wait": 30}
+        assert mock_get.call_args.kwargs["timeout"] == args.timeout + 30
+
+    def test_legacy_server_still_sleeps(self):
+        args = _make_args(poll_interval=10)
+        args.long_poll_wait = 30
+        collector = _make_collector()
+
+        idle = _fake_resp(204, {})
+        idle.headers = {}
+        get_effects = [idle, KeyboardInterrupt("stop")]
+
+        with patch("requests.get", side_effect=get_effects), \
+             patch("time.sleep") as mock_sleep:
+            with pytest.raises(SystemExit):
+                mod._run_polling(args, collector, "http://x", "http://x")
+
+        mock_sleep.assert_called_once_with(10)
+
+
 # ---------------------------------------------------------------------------
 # Test: task URL is correctly formed from center + hostname
 # ---------------------------------------------------------------------------
@@ -8,10 +8,10 @@ Each test patches server.db.engine/SessionLocal so no production DB is touched.
 import json
 import os
 import pytest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 
 # ---------------------------------------------------------------------------
@@ -279,6 +279,99 @@ def test_get_device_history_ascending(isolated_db):
         get_device_history("no-such-host", limit=10)
 
 
+def _save_minutes(hostname, minutes, score=lambda m: 50.0 + m):
+    from server.repository import save_report
+    for m in minutes:
+        ts = f"2026-02-21T{10 + m // 60:02d}:{m % 60:02d}:00+00:00"
+        save_report(hostname, _FakeMetrics(hostname=hostname, timestamp=ts), _FakeReport(score=score(m)), "2.2.2.2")
+
+
+def test_get_device_history_page_keyset(isolated_db):
+    from server.repository import get_device_history_page, save_heartbeat, save_report
+
+    _register_device(hostname="page-host", ip="2.2.2.2")
+    _save_minutes("page-host", range(7))
+    # Two reports sharing a timestamp must both be returned exactly once
+    save_report("page-host", _FakeMetrics(hostname="page-host", timestamp="2026-02-21T10:06:00+00:00"),
+                _FakeReport(score=99.0), "2.2.2.2")
+
+    seen, cursor = [], None
+    while True:
+        points, cursor = get_device_history_page("page-host", limit=3, cursor=cursor)
+        seen.extend(points)
+        if cursor is None:
+            break
+    assert [p["score"] for p in seen] == [50.0, 51.0, 52.0, 53.0, 54.0, 55.0, 56.0, 99.0]
+
+    # Time range bounds are inclusive
+    start = datetime(2026, 2, 21, 10, 2, tzinfo=timezone.utc)
+    end = datetime(2026, 2, 21, 10, 4, tzinfo=timezone.utc)
+    points, cursor = get_device_history_page("page-host", limit=10, start=start, end=end)
+    assert [p["score"] for p in points] == [52.0, 53.0, 54.0]
+    assert cursor is None
+
+    # A heartbeat repeat of the latest report ends the last page
+    save_heartbeat("page-host", _FakeMetrics(hostname="page-host", timestamp="2026-02-21T10:09:00+00:00"),
+                   _FakeReport(score=99.0), "2.2.2.2")
+    points, cursor = get_device_history_page("page-host", limit=8, start=start)
+    assert [p["score"] for p in points] == [52.0, 53.0, 54.0, 55.0, 56.0, 99.0, 99.0]
+    assert points[-1]["timestamp"].startswith("2026-02-21T10:09:00")
+    points, cursor = get_device_history_page("page-host", limit=6, start=start)
+    assert cursor is not None
+    last_page, cursor = get_device_history_page("page-host", limit=6, start=start, cursor=cursor)
+    assert cursor is None
+    assert [p["score"] for p in last_page] == [99.0]
+    assert last_page[0]["timestamp"].startswith("2026-02-21T10:09:00")
+
+    with pytest.raises(ValueError):
+        get_device_history_page("page-host", limit=3, cursor="not-a-cursor")
+    with pytest.raises(KeyError):
+        get_device_history_page("no-such-host", limit=3)
+
+
+def test_get_device_history_page_uses_device_time_index(isolated_db):
+    from server.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        plan = db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, collected_at, total_score FROM device_reports "
+            "WHERE device_id = 1 AND collected_at >= '2026-02-21' "
+            "AND (collected_at > '2026-02-21' OR id > 5) ORDER BY collected_at, id LIMIT 4"
+        )).fetchall()
+    finally:
+        db.close()
+    detail = " ".join(row[-1] for row in plan)
+    assert "ix_device_reports_device_id_collected_at" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_get_device_history_downsampled(isolated_db):
+    from server.repository import get_device_history_downsampled
+
+    _register_device(hostname="ds-host", ip="2.2.2.2")
+    # Flat line with one dip at minute 40
+    _save_minutes("ds-host", range(100), score=lambda m: 10.0 if m == 40 else 80.0)
+
+    points, raw_count = get_device_history_downsampled("ds-host", 10)
+    assert raw_count == 100
+    assert len(points) == 10
+    assert points[0]["timestamp"].startswith("2026-02-21T10:00:00")
+    assert points[-1]["timestamp"].startswith("2026-02-21T11:39:00")
+    assert 10.0 in [p["score"] for p in points]
+
+    points, raw_count = get_device_history_downsampled("ds-host", 10, method="minmax")
+    assert len(points) <= 10
+    assert 10.0 in [p["score"] for p in points]
+
+    # Fewer points than requested come back unchanged
+    points, raw_count = get_device_history_downsampled("ds-host", 500)
+    assert len(points) == raw_count == 100
+
+    with pytest.raises(ValueError):
+        get_device_history_downsampled("ds-host", 10, method="average")
+
+
 # ---------------------------------------------------------------------------
 # Test 7: get_fleet_history buckets by minute with required keys
 # ---------------------------------------------------------------------------
@@ -315,3 +408,495 @@ def test_get_fleet_history_required_keys_and_buckets(isolated_db):
     # Timestamps must be ascending
     ts_list = [b["timestamp"] for b in history]
     assert ts_list == sorted(ts_list)
+
+
+# ---------------------------------------------------------------------------
+# Test 8: fleet_rollup is maintained on ingest at every resolution
+# ---------------------------------------------------------------------------
+
+def test_fleet_rollup_resolutions_and_range(isolated_db):
+    from server.repository import save_report, get_fleet_history
+
+    _register_device(hostname="roll-a", ip="4.4.4.1", device_type="SERVER")
+    _register_device(hostname="roll-b", ip="4.4.4.2", device_type="CLIENT")
+
+    save_report("roll-a", _FakeMetrics(hostname="roll-a", timestamp="2026-02-21T10:01:00+00:00"), _FakeReport(score=80.0), "4.4.4.1")
+    save_report("roll-b", _FakeMetrics(hostname="roll-b", timestamp="2026-02-21T10:14:00+00:00"), _FakeReport(score=30.0), "4.4.4.2")
+    save_report("roll-a", _FakeMetrics(hostname="roll-a", timestamp="2026-02-21T11:20:00+00:00"), _FakeReport(score=90.0), "4.4.4.1")
+
+    assert len(get_fleet_history(limit=50, resolution="1m")) == 3
+
+    quarter = get_fleet_history(limit=50, resolution="15m")
+    assert len(quarter) == 2
+    assert quarter[0]["fleet_avg"] == pytest.approx(55.0)
+    assert quarter[0]["server_avg"] == pytest.approx(80.0)
+    assert quarter[0]["client_avg"] == pytest.approx(30.0)
+    assert quarter[0]["critical_count"] == 1
+    assert quarter[1]["client_avg"] is None
+
+    hourly = get_fleet_history(limit=50, resolution="1h")
+    assert [p["fleet_avg"] for p in hourly] == [pytest.approx(55.0), pytest.approx(90.0)]
+
+    # Time range + limit keep the latest buckets inside the range
+    start = datetime(2026, 2, 21, 10, 10, tzinfo=timezone.utc)
+    end = datetime(2026, 2, 21, 12, 0, tzinfo=timezone.utc)
+    ranged = get_fleet_history(limit=50, start=start, end=end, resolution="1m")
+    assert len(ranged) == 2
+    assert len(get_fleet_history(limit=1, resolution="1m")) == 1
+
+    with pytest.raises(ValueError):
+        get_fleet_history(limit=10, resolution="5m")
+
+
+# ---------------------------------------------------------------------------
+# Test 9: rebuild_fleet_rollups backfills from existing device_reports
+# ---------------------------------------------------------------------------
+
+def test_rebuild_fleet_rollups_matches_ingest(isolated_db):
+    from server.repository import save_report, get_fleet_history, rebuild_fleet_rollups
+
+    _register_device(hostname="bf-a", ip="5.5.5.1", device_type="SERVER")
+    _register_device(hostname="bf-b", ip="5.5.5.2", device_type="CLIENT")
+    for ts, host, score in [
+        ("2026-02-21T10:00:10+00:00", "bf-a", 70.0),
+        ("2026-02-21T10:00:40+00:00", "bf-b", 35.0),
+        ("2026-02-21T10:05:00+00:00", "bf-a", 95.0),
+    ]:
+        save_report(host, _FakeMetrics(hostname=host, timestamp=ts), _FakeReport(score=score), "5.5.5.1")
+
+    expected = {res: get_fleet_history(limit=50, resolution=res) for res in ("1m", "15m", "1h")}
+
+    # Non-empty table: no-op by default
+    assert rebuild_fleet_rollups() == 0
+    assert rebuild_fleet_rollups(only_if_empty=False) == 3
+    for res, points in expected.items():
+        assert get_fleet_history(limit=50, resolution=res) == points
+
+
+def test_prune_fleet_rollups_keeps_hourly_buckets(isolated_db, monkeypatch):
+    from server import config
+    from server.db_models import DeviceReport
+    from server.repository import (
+        get_fleet_history, prune_fleet_rollups, save_report, update_report_scores,
+    )
+
+    monkeypatch.setattr(config, "FLEET_ROLLUP_1M_RETENTION_DAYS", 7)
+    monkeypatch.setattr(config, "FLEET_ROLLUP_15M_RETENTION_DAYS", 30)
+    _register_device(hostname="pr-a", ip="6.6.6.1", device_type="SERVER")
+    for ts in ("2026-01-01T10:00:00+00:00", "2026-02-10T10:00:00+00:00", "2026-02-20T10:00:00+00:00"):
+        save_report("pr-a", _FakeMetrics(hostname="pr-a", timestamp=ts), _FakeReport(score=50.0), "6.6.6.1")
+
+    now = datetime(2026, 2, 21, 12, 0, tzinfo=timezone.utc)
+    # 1m: January and 10 Feb are past 7 days; 15m: only January is past 30 days
+    assert prune_fleet_rollups(now=now) == 3
+    assert len(get_fleet_history(limit=50, resolution="1m")) == 1
+    assert len(get_fleet_history(limit=50, resolution="15m")) == 2
+    assert len(get_fleet_history(limit=50, resolution="1h")) == 3
+    assert prune_fleet_rollups(now=now) == 0
+
+    # Rescoring a report whose 1m bucket is gone does not recreate it
+    db = isolated_db()
+    try:
+        oldest = db.query(DeviceReport.id).order_by(DeviceReport.collected_at).first().id
+    finally:
+        db.close()
+    update_report_scores([{"id": oldest, "total_score": 70.0}])
+    assert len(get_fleet_history(limit=50, resolution="1m")) == 1
+    assert get_fleet_history(limit=50, resolution="1h")[0]["fleet_avg"] == pytest.approx(70.0)
+
+
+# ---------------------------------------------------------------------------
+# Test 10: device_report_metrics — typed columns, backfill, SQL aggregates
+# ---------------------------------------------------------------------------
+
+_FULL_METRICS = dict(
+    update_count=12, firewall_enabled=False, ssh_root_login_allowed=True,
+    sudo_users_count=2, unnecessary_services=["telnet", "cups"], disk_usage_percent=80,
+    password_policy_ok=True, last_seen_minutes=5, ram_usage_percent=42.5, cpu_usage_percent=10.0,
+)
+
+
+def test_save_report_writes_typed_metrics(isolated_db):
+    from server.db_models import DeviceReport, DeviceReportMetrics
+    from server.repository import save_report
+
+    _register_device(hostname="tm-a")
+    save_report("tm-a", _FakeMetrics(hostname="tm-a", **_FULL_METRICS), _FakeReport(), "1.2.3.4")
+    # Metrics without K1–K10 inputs keep only metrics_json
+    save_report("tm-a", _FakeMetrics(hostname="tm-a"), _FakeReport(), "1.2.3.4")
+
+    db = isolated_db()
+    try:
+        assert db.query(DeviceReport).count() == 2
+        (row,) = db.query(DeviceReportMetrics).all()
+        assert row.update_count == 12
+        assert row.firewall_enabled is False
+        assert row.unnecessary_services_count == 2
+        assert row.ram_usage_percent == pytest.approx(42.5)
+        assert row.collected_ts == int(datetime(2026, 2, 21, 10, tzinfo=timezone.utc).timestamp())
+    finally:
+        db.close()
+
+
+def test_retention_prunes_typed_metrics(isolated_db, monkeypatch):
+    import server.repository as repo_module
+    from server.db_models import DeviceReportMetrics
+
+    monkeypatch.setattr(repo_module, "MAX_REPORTS_PER_DEVICE", 2)
+    _register_device(hostname="tm-r")
+    for minute in range(4):
+        ts = f"2026-02-21T10:0{minute}:00+00:00"
+        repo_module.save_report("tm-r", _FakeMetrics(hostname="tm-r", timestamp=ts, **_FULL_METRICS),
+                                _FakeReport(), "1.2.3.4")
+    db = isolated_db()
+    try:
+        assert db.query(DeviceReportMetrics).count() == 2
+    finally:
+        db.close()
+
+
+def test_backfill_report_metrics_from_metrics_json(isolated_db):
+    from server.db_models import DeviceReportMetrics
+    from server.repository import backfill_report_metrics, save_report
+
+    _register_device(hostname="tm-b")
+    for minute in range(3):
+        ts = f"2026-02-21T10:0{minute}:00+00:00"
+        save_report("tm-b", _FakeMetrics(hostname="tm-b", timestamp=ts, **_FULL_METRICS), _FakeReport(), "1.2.3.4")
+    save_report("tm-b", _FakeMetrics(hostname="tm-b"), _FakeReport(), "1.2.3.4")
+
+    db = isolated_db()
+    try:
+        expected = [
+            (r.report_id, r.collected_ts, r.disk_usage_percent)
+            for r in db.query(DeviceReportMetrics).order_by(DeviceReportMetrics.report_id)
+        ]
+        db.query(DeviceReportMetrics).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    assert backfill_report_metrics(chunk_size=2) == 3
+    assert backfill_report_metrics() == 0
+    db = isolated_db()
+    try:
+        assert [
+            (r.report_id, r.collected_ts, r.disk_usage_percent)
+            for r in db.query(DeviceReportMetrics).order_by(DeviceReportMetrics.report_id)
+        ] == expected
+    finally:
+        db.close()
+
+
+def test_metric_trend_and_summary(isolated_db):
+    from server.repository import deactivate_device, get_metric_summary, get_metric_trend, save_report
+
+    _register_device(hostname="tm-s", device_type="SERVER")
+    _register_device(hostname="tm-c", device_type="CLIENT")
+    for ts, host, firewall, disk in [
+        ("2026-02-21T10:00:00+00:00", "tm-s", False, 90),
+        ("2026-02-21T10:20:00+00:00", "tm-s", False, 70),
+        ("2026-02-21T10:40:00+00:00", "tm-c", True, 30),
+        ("2026-02-21T11:10:00+00:00", "tm-c", False, 50),
+    ]:
+        metrics = dict(_FULL_METRICS, firewall_enabled=firewall, disk_usage_percent=disk)
+        save_report(host, _FakeMetrics(hostname=host, timestamp=ts, **metrics), _FakeReport(), "1.2.3.4")
+
+    hourly = get_metric_trend(limit=10, resolution="1h")
+    assert [p["timestamp"] for p in hourly] == ["2026-02-21T10:00:00+00:00", "2026-02-21T11:00:00+00:00"]
+    assert hourly[0]["reports"] == 3
+    assert hourly[0]["devices"] == 2
+    assert hourly[0]["firewall_disabled"] == 1          # tm-s counted once
+    assert hourly[0]["avg_disk_usage"] == pytest.approx(63.33)
+    assert hourly[0]["max_disk_usage"] == pytest.approx(90.0)
+
+    # Inclusive range and latest-bucket limit
+    start = datetime(2026, 2, 21, 10, 20, tzinfo=timezone.utc)
+    end = datetime(2026, 2, 21, 10, 40, tzinfo=timezone.utc)
+    assert [p["reports"] for p in get_metric_trend(limit=10, start=start, end=end, resolution="15m")] == [1, 1]
+    assert len(get_metric_trend(limit=1, resolution="1m")) == 1
+    with pytest.raises(ValueError):
+        get_metric_trend(limit=10, resolution="5m")
+
+    summary = get_metric_summary()
+    assert summary["devices"] == 2
+    assert summary["firewall_disabled"] == 2
+    assert summary["avg_disk_usage"] == pytest.approx(60.0)
+    assert summary["pending_updates"] == 24
+
+    deactivate_device("tm-c")
+    summary = get_metric_summary()
+    assert (summary["devices"], summary["servers"], summary["clients"]) == (1, 1, 0)
+
+
+def test_metric_aggregate_query_plans_use_indexes(isolated_db):
+    from server.repository import explain_metric_aggregates
+
+    plans = explain_metric_aggregates()
+    trend = " | ".join(plans["trend"])
+    assert "USING INDEX ix_device_report_metrics_collected_ts" in trend
+    current = " | ".join(plans["current"])
+    assert "USING COVERING INDEX ix_device_report_metrics_device_id" in current
+    # No full-table scan of device_report_metrics or devices
+    for line in plans["trend"] + plans["current"]:
+        if line.startswith("SCAN device_report_metrics") or line.startswith("SCAN d "):
+            assert "INDEX" in line, line
+
+
+# ---------------------------------------------------------------------------
+# Test 11: heartbeats for unchanged reports
+# ---------------------------------------------------------------------------
+
+def test_save_heartbeat_repeats_latest_report(isolated_db):
+    from server.db_models import DeviceHeartbeat, DeviceReport
+    from server.repository import get_device_history, get_fleet_history, save_heartbeat, save_report
+
+    _register_device(hostname="hb-a")
+    metrics = lambda ts: _FakeMetrics(hostname="hb-a", timestamp=ts)  # noqa: E731
+
+    # Nothing stored yet: caller must save in full
+    assert save_heartbeat("hb-a", metrics("2026-02-21T10:00:00+00:00"), _FakeReport(score=80.0), "1.2.3.4") is False
+    save_report("hb-a", metrics("2026-02-21T10:00:00+00:00"), _FakeReport(score=80.0), "1.2.3.4")
+    # Different score than the stored report: not a repeat
+    assert save_heartbeat("hb-a", metrics("2026-02-21T10:01:00+00:00"), _FakeReport(score=70.0), "1.2.3.4") is False
+    for minute in (1, 2, 3):
+        ts = f"2026-02-21T10:0{minute}:00+00:00"
+        assert save_heartbeat("hb-a", metrics(ts), _FakeReport(score=80.0), "1.2.3.4") is True
+
+    db = isolated_db()
+    try:
+        assert db.query(DeviceReport).count() == 1
+        heartbeat = db.query(DeviceHeartbeat).one()
+        assert heartbeat.heartbeat_count == 3
+    finally:
+        db.close()
+
+    # Heartbeats still count in the fleet averages
+    (bucket,) = get_fleet_history(limit=10, resolution="1h")
+    assert bucket["fleet_avg"] == pytest.approx(80.0)
+    minutes = get_fleet_history(limit=10, resolution="1m")
+    assert len(minutes) == 4
+
+    # History ends at the last heartbeat
+    points = get_device_history("hb-a", limit=10)
+    assert [p["score"] for p in points] == [80.0, 80.0]
+    assert points[-1]["timestamp"].startswith("2026-02-21T10:03:00")
+
+    # A newer full report supersedes the heartbeat in history and restarts the count
+    save_report("hb-a", metrics("2026-02-21T10:04:00+00:00"), _FakeReport(score=60.0), "1.2.3.4")
+    assert [p["score"] for p in get_device_history("hb-a", limit=10)] == [80.0, 60.0]
+    assert save_heartbeat("hb-a", metrics("2026-02-21T10:05:00+00:00"), _FakeReport(score=60.0), "1.2.3.4")
+    db = isolated_db()
+    try:
+        assert db.query(DeviceHeartbeat).one().heartbeat_count == 1
+    finally:
+        db.close()
+
+
+def test_save_reports_heartbeat_flags(isolated_db):
+    from server.db_models import DeviceHeartbeat, DeviceReport
+    from server.repository import save_reports
+
+    _register_device(hostname="hb-b")
+    items = [
+        ("hb-b", _FakeMetrics(hostname="hb-b", timestamp=f"2026-02-21T10:0{m}:00+00:00"), _FakeReport(score=90.0))
+        for m in range(3)
+    ]
+    # The first flagged item has nothing to repeat and is stored in full
+    assert save_reports(items, "1.2.3.4", heartbeats=[True, True, True]) == []
+    db = isolated_db()
+    try:
+        assert db.query(DeviceReport).count() == 1
+        assert db.query(DeviceHeartbeat).one().heartbeat_count == 2
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# Test 12: device_trends streaming statistics
+# ---------------------------------------------------------------------------
+
+def test_device_trend_updates_per_report(isolated_db, monkeypatch):
+    from server import config
+    from server.repository import get_device_trend, get_devices_list, save_heartbeat, save_report, save_reports
+
+    monkeypatch.setattr(config, "TREND_WINDOW", 3)
+    monkeypatch.setattr(config, "TREND_EWMA_SPAN", 3)     # alpha = 0.5
+    _register_device(hostname="trend-a")
+    assert get_device_trend("trend-a") == {"hostname": "trend-a", "report_count": 0}
+
+    def report(day, score):
+        return _FakeMetrics(hostname="trend-a", timestamp=f"2026-02-2{day}T10:00:00+00:00"), _FakeReport(score=score)
+
+    save_report("trend-a", *report(1, 80.0), "1.2.3.4")
+    # Two reports for the device in one batch share one trend row
+    save_reports([("trend-a", *report(2, 70.0)), ("trend-a", *report(3, 60.0))], "1.2.3.4")
+    trend = get_device_trend("trend-a")
+    assert trend["ewma_score"] == pytest.approx(67.5)      # 80 → 75 → 67.5
+    assert trend["slope_per_day"] == pytest.approx(-10.0)
+    assert trend["risk_level"] == "MEDIUM"
+    assert trend["risk_level_since"].startswith("2026-02-22T10:00:00")
+
+    # The window slides: days 2–4 only (70, 60, 90)
+    save_report("trend-a", *report(4, 90.0), "1.2.3.4")
+    trend = get_device_trend("trend-a")
+    assert trend["report_count"] == 4
+    assert trend["window_size"] == 3
+    assert trend["slope_per_day"] == pytest.approx(10.0)
+    assert (trend["min_score"], trend["max_score"]) == (60.0, 90.0)
+    assert trend["improvement_total"] == pytest.approx(10.0)
+    assert trend["risk_level"] == "EXCELLENT"
+
+    # Heartbeats repeat a stored report and leave the statistics alone
+    assert save_heartbeat("trend-a", *report(5, 90.0), "1.2.3.4")
+    assert get_device_trend("trend-a")["report_count"] == 4
+
+    device = get_devices_list()[0]
+    assert device["improvement_total"] == pytest.approx(10.0)
+    assert device["score_ewma"] == trend["ewma_score"]
+    assert device["score_slope_per_day"] == pytest.approx(10.0)
+    with pytest.raises(KeyError):
+        get_device_trend("nope")
+
+
+def test_rebuild_device_trends_matches_ingest(isolated_db):
+    from server.repository import get_device_trend, rebuild_device_trends, save_report
+
+    _register_device(hostname="trend-b")
+    for day, score in enumerate([50.0, 65.0, 45.0, 85.0], start=1):
+        save_report("trend-b", _FakeMetrics(hostname="trend-b", timestamp=f"2026-02-1{day}T08:00:00+00:00"),
+                    _FakeReport(score=score), "1.2.3.4")
+    ingested = get_device_trend("trend-b")
+
+    assert rebuild_device_trends() == 0
+    assert rebuild_device_trends(only_if_empty=False) == 4
+    rebuilt = get_device_trend("trend-b")
+    ingested.pop("seconds_since_risk_change")
+    rebuilt.pop("seconds_since_risk_change")
+    assert rebuilt == ingested
+
+
+# ---------------------------------------------------------------------------
+# Test 13: device change generations (delta sync)
+# ---------------------------------------------------------------------------
+
+def test_device_changes_since(isolated_db):
+    from server.repository import (
+        current_device_generation, deactivate_device, device_generations,
+        get_device_changes, save_heartbeat, save_report, update_report_scores,
+    )
+
+    assert current_device_generation() == 0
+    _register_device(hostname="gen-a")
+    _register_device(hostname="gen-b", device_type="CLIENT")
+    start = current_device_generation()
+    assert start == 2
+    assert device_generations(["gen-a", "gen-b", "nope"]) == {"gen-a": 1, "gen-b": 2}
+
+    metrics = _FakeMetrics(hostname="gen-a", timestamp="2026-02-21T10:00:00+00:00")
+    save_report("gen-a", metrics, _FakeReport(score=70.0), "1.2.3.4")
+    changes = get_device_changes(start)
+    assert changes["full"] is False
+    assert [d["hostname"] for d in changes["devices"]] == ["gen-a"]
+    assert changes["devices"][0]["latest_score"] == 70.0
+    assert changes["generation"] == 3
+
+    # Heartbeats move last_seen_at, so they count as a change too
+    assert save_heartbeat("gen-a", metrics, _FakeReport(score=70.0), "1.2.3.4")
+    assert get_device_changes(3)["generation"] == 4
+
+    # Rescoring touches the devices whose reports changed
+    db = isolated_db()
+    try:
+        from server.db_models import DeviceReport
+        report_id = db.query(DeviceReport.id).scalar()
+    finally:
+        db.close()
+    update_report_scores([{"id": report_id, "total_score": 65.0}])
+    assert [d["latest_score"] for d in get_device_changes(4)["devices"]] == [65.0]
+
+    assert deactivate_device("gen-b")
+    changes = get_device_changes(start)
+    assert [d["hostname"] for d in changes["devices"]] == ["gen-a"]
+    assert changes["removed"] == ["gen-b"]
+
+    # Re-registration clears the removal
+    _register_device(hostname="gen-b", device_type="CLIENT")
+    changes = get_device_changes(start)
+    assert [d["hostname"] for d in changes["devices"]] == ["gen-a", "gen-b"]
+    assert changes["removed"] == []
+
+    full = get_device_changes(0)
+    assert full["full"] is True and full["generation"] == current_device_generation()
+
+
+def test_iter_report_export_filters_and_batches(isolated_db):
+    from server.repository import iter_report_export
+
+    _register_device(hostname="exp-a")
+    _register_device(hostname="exp-b", device_type="CLIENT")
+    _save_minutes("exp-a", range(5), score=lambda m: 30.0 + 15 * m)   # 30 .. 90
+    _save_minutes("exp-b", range(3))
+
+    batches = list(iter_report_export(batch_size=3))
+    assert [len(b) for b in batches] == [3, 3, 2]
+    rows = [row for batch in batches for row in batch]
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    first = rows[0]
+    assert first["hostname"] == "exp-a" and first["device_type"] == "SERVER"
+    assert first["collected_at"] == "2026-02-21T10:00:00+00:00"
+    assert first["score"] == 30.0 and first["risk_level"] == "CRITICAL"
+    assert json.loads(first["metrics_json"])["hostname"] == "exp-a"
+
+    def export(**kw):
+        return [(r["hostname"], r["score"]) for batch in iter_report_export(**kw) for r in batch]
+
+    assert export(hostnames=["exp-b"]) == [("exp-b", 50.0), ("exp-b", 51.0), ("exp-b", 52.0)]
+    assert export(hostnames=["exp-a"], risk_levels=["LOW", "EXCELLENT"]) == [("exp-a", 75.0), ("exp-a", 90.0)]
+    start = datetime(2026, 2, 21, 10, 2, tzinfo=timezone.utc)
+    end = datetime(2026, 2, 21, 10, 3, tzinfo=timezone.utc)
+    assert export(start=start, end=end) == [("exp-a", 60.0), ("exp-a", 75.0), ("exp-b", 52.0)]
+    # The same instants with a +03:00 offset select the same rows
+    plus3 = timezone(timedelta(hours=3))
+    assert export(start=start.astimezone(plus3), end=end.astimezone(plus3)) == export(start=start, end=end)
+    assert export(hostnames=["nope"]) == []
+
+
+def test_get_latest_reports_one_row_per_active_device(isolated_db):
+    from server.repository import deactivate_device, get_latest_reports, save_report
+
+    _register_device(hostname="warm-a")
+    _register_device(hostname="warm-b", device_type="CLIENT")
+    _register_device(hostname="warm-gone")
+    _register_device(hostname="warm-idle")      # never reported
+    _save_minutes("warm-a", [0, 5], score=lambda m: 60.0 + m)
+    # Sent late: older collected_at, so not the latest despite the higher id
+    save_report("warm-a", _FakeMetrics(hostname="warm-a", timestamp="2026-02-21T10:01:00+00:00"),
+                _FakeReport(score=10.0), "2.2.2.2")
+    _save_minutes("warm-b", [3])
+    _save_minutes("warm-gone", [1])
+    assert deactivate_device("warm-gone")
+
+    rows = {row["hostname"]: row for row in get_latest_reports()}
+    assert set(rows) == {"warm-a", "warm-b"}
+    assert rows["warm-a"]["total_score"] == 65.0
+    assert json.loads(rows["warm-a"]["metrics_json"])["timestamp"].startswith("2026-02-21")
+    assert rows["warm-b"]["last_seen_at"].tzinfo is not None
+    assert json.loads(rows["warm-b"]["issues_json"]) == []
+
+
+def test_get_latest_reports_seeks_device_time_index(isolated_db):
+    from server.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        plan = db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT d.hostname FROM devices d JOIN device_reports r ON r.id = ("
+            "SELECT id FROM device_reports WHERE device_id = d.id "
+            "ORDER BY collected_at DESC, id DESC LIMIT 1) WHERE d.is_active IS 1"
+        )).fetchall()
+    finally:
+        db.close()
+    detail = " ".join(row[-1] for row in plan)
+    assert "COVERING INDEX ix_device_reports_device_id_collected_at (device_id=?)" in detail
+    assert "TEMP B-TREE" not in detail
@@ -0,0 +1,279 @@
+"""
+tests/test_rescore.py
+
+server/rescore.py: stored report scores are recomputed in chunks with the
+active rule spec and written back together with their fleet_rollup score
+changes. Runs against a per-test in-memory SQLite DB.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import server.main as main
+from server import repository
+from server.models import DeviceMetrics
+from server.rescore import RescoreJob
+from server.scoring.engine import calculate_score
+from server.scoring.spec import DEFAULT_SPEC_PATH, rule_spec
+
+BASE_TS = datetime(2026, 2, 22, 0, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(monkeypatch):
+    test_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+    from server.db import Base
+    import server.db_models  # noqa: F401 — registers models
+    Base.metadata.create_all(bind=test_engine)
+    TestSession = sessionmaker(bind=test_engine, autoflush=False, autocommit=False, future=True)
+
+    import server.db as db_module
+    monkeypatch.setattr(db_module, "engine", test_engine)
+    monkeypatch.setattr(db_module, "SessionLocal", TestSession)
+    monkeypatch.setattr(repository, "SessionLocal", TestSession)
+    yield TestSession
+    Base.metadata.drop_all(bind=test_engine)
+    test_engine.dispose()
+
+
+@pytest.fixture()
+def stricter_firewall_rule(tmp_path, monkeypatch):
+    """Call to make the active spec raise the K2 (firewall) penalty from 25 to 40."""
+    def apply() -> None:
+        with open(DEFAULT_SPEC_PATH, encoding="utf-8") as f:
+            spec = json.load(f)
+        spec["rules"][1]["penalty"] = 40
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(spec), encoding="utf-8")
+        monkeypatch.setattr(main.config, "RULE_SPEC_PATH", str(path))
+        rule_spec.reload()
+
+    yield apply
+    rule_spec.reset()
+
+
+def _metrics(i: int, **overrides) -> DeviceMetrics:
+    values = dict(
+        hostname="PC-A",
+        timestamp=BASE_TS + timedelta(minutes=i),
+        update_count=0,
+        firewall_enabled=i % 2 == 0,
+        ssh_root_login_allowed=False,
+        sudo_users_count=1,
+        unnecessary_services=[],
+        disk_usage_percent=50,
+        password_policy_ok=True,
+        last_seen_minutes=0,
+        ram_usage_percent=10.0,
+        cpu_usage_percent=10.0,
+    )
+    values.update(overrides)
+    return DeviceMetrics(**values)
+
+
+def _seed_reports(count: int) -> None:
+    repository.upsert_device("PC-A", "10.0.0.1", "CLIENT")
+    for i in range(count):
+        metrics = _metrics(i)
+        repository.save_report("PC-A", metrics, calculate_score(metrics), "10.0.0.1")
+
+
+def _scores(TestSession) -> list[float]:
+    from server.db_models import DeviceReport
+    db = TestSession()
+    try:
+        return [r.total_score for r in db.query(DeviceReport).order_by(DeviceReport.id)]
+    finally:
+        db.close()
+
+
+def test_rescore_applies_changed_rules_in_chunks(isolated_db, stricter_firewall_rule):
+    _seed_reports(7)
+    assert _scores(isolated_db) == [100.0, 75.0] * 3 + [100.0]
+    stricter_firewall_rule()
+
+    result = RescoreJob(chunk_size=3, workers=0).run()
+
+    assert result["state"] == "done"
+    # Only the three K2 rows changed and are written
+    assert (result["total"], result["processed"], result["updated"]) == (7, 7, 3)
+    assert result["changed"] == 3
+    assert result["percent"] == pytest.approx(100.0)
+    assert _scores(isolated_db) == [100.0, 60.0] * 3 + [100.0]
+
+    history = repository.get_device_history("PC-A", 10)
+    assert sorted(p["score"] for p in history)[:3] == [60.0, 60.0, 60.0]
+    fleet = repository.get_fleet_history(100, resolution="1h")
+    assert fleet[0]["fleet_avg"] == round((4 * 100.0 + 3 * 60.0) / 7, 2)
+
+
+def test_chunks_are_scored_in_batch(isolated_db, stricter_firewall_rule, monkeypatch):
+    from server.scoring import engine
+    _seed_reports(6)
+    stricter_firewall_rule()
+    serialized = []
+    serialize_report = repository.serialize_report
+
+    def counting(metrics, report):
+        serialized.append(metrics.timestamp)
+        return serialize_report(metrics, report)
+
+    def per_row(metrics):
+        raise AssertionError("rescore must not score row by row")
+
+    monkeypatch.setattr(repository, "serialize_report", counting)
+    monkeypatch.setattr(engine, "calculate_score", per_row)
+    result = RescoreJob(chunk_size=4, workers=0).run()
+
+    assert (result["state"], result["changed"]) == ("done", 3)
+    # Issues are built for the changed rows only
+    assert len(serialized) == 3
+    assert _scores(isolated_db) == [100.0, 60.0] * 3
+
+
+def test_rollups_of_pruned_reports_and_heartbeats_survive(isolated_db, stricter_firewall_rule):
+    from server.db_models import DeviceReport
+    _seed_reports(4)      # minutes 0..3: 100, 75, 100, 75
+    # A heartbeat repeating the minute-3 report adds to the minute-4 bucket;
+    # the rescore moves that bucket along with the report's own
+    metrics = _metrics(3, timestamp=BASE_TS + timedelta(minutes=4))
+    assert repository.save_heartbeat("PC-A", metrics, calculate_score(metrics), "10.0.0.1")
+    db = isolated_db()
+    try:
+        # Retention pruned the minute-1 report; its bucket stays in fleet_rollup
+        db.query(DeviceReport).filter(DeviceReport.collected_at == BASE_TS + timedelta(minutes=1)).delete()
+        db.commit()
+    finally:
+        db.close()
+    stricter_firewall_rule()
+
+    assert RescoreJob(chunk_size=10, workers=0).run()["changed"] == 1
+
+    minutes = repository.get_fleet_history(100, resolution="1m")
+    assert [(p["client_avg"], p["critical_count"]) for p in minutes] == [
+        (100.0, 0), (75.0, 0), (100.0, 0), (60.0, 0), (60.0, 0),
+    ]
+    (hour,) = repository.get_fleet_history(100, resolution="1h")
+    assert hour["client_avg"] == round((100.0 + 75.0 + 100.0 + 60.0 + 60.0) / 5, 2)
+
+
+def test_rescore_after_heartbeats_in_expired_minute_buckets(isolated_db, stricter_firewall_rule, monkeypatch):
+    _seed_reports(2)      # minutes 0..1: 100, 75
+    for minute in (20, 21, 21):
+        metrics = _metrics(1, timestamp=BASE_TS + timedelta(minutes=minute))
+        assert repository.save_heartbeat("PC-A", metrics, calculate_score(metrics), "10.0.0.1")
+    # 1m buckets expire; the heartbeat counts move to the 15m bucket at minute 15
+    monkeypatch.setattr(main.config, "FLEET_ROLLUP_1M_RETENTION_DAYS", 1)
+    assert repository.prune_fleet_rollups(now=BASE_TS + timedelta(days=2)) == 4
+    stricter_firewall_rule()
+
+    assert RescoreJob(chunk_size=10, workers=0).run()["changed"] == 1
+
+    assert repository.get_fleet_history(100, resolution="1m") == []
+    quarters = repository.get_fleet_history(100, resolution="15m")
+    assert [p["client_avg"] for p in quarters] == [round((100.0 + 60.0) / 2, 2), 60.0]
+    (hour,) = repository.get_fleet_history(100, resolution="1h")
+    assert hour["client_avg"] == round((100.0 + 60.0 * 4) / 5, 2)
+
+
+def test_trend_lifetime_fields_kept(isolated_db, stricter_firewall_rule):
+    from server.db_models import DeviceReport
+    _seed_reports(4)      # 100, 75, 100, 75
+    db = isolated_db()
+    try:
+        db.query(DeviceReport).filter(DeviceReport.collected_at == BASE_TS).delete()   # pruned
+        db.commit()
+    finally:
+        db.close()
+    before = repository.get_device_trend("PC-A")
+    stricter_firewall_rule()
+
+    RescoreJob(chunk_size=10, workers=0).run()
+
+    after = repository.get_device_trend("PC-A")
+    for key in ("report_count", "first_score", "min_score", "max_score"):
+        assert after[key] == before[key], key
+    assert after["latest_score"] == 60.0
+    assert after["improvement_total"] == -40.0
+    alpha = 2 / (main.config.TREND_EWMA_SPAN + 1)
+    ewma = 60.0 + alpha * (100.0 - 60.0)
+    ewma += alpha * (60.0 - ewma)
+    assert after["ewma_score"] == round(ewma, 2)
+    assert after["window_size"] == 3
+    assert after["risk_level"] == "MEDIUM"
+    assert after["risk_level_since"] == (BASE_TS + timedelta(minutes=3)).isoformat()
+
+
+def test_only_devices_with_changed_scores_get_a_new_generation(isolated_db):
+    from server.db_models import DeviceReport
+    _seed_reports(2)      # PC-A: 100, 75
+    repository.upsert_device("PC-B", "10.0.0.2", "CLIENT")
+    metrics = _metrics(0, hostname="PC-B")
+    repository.save_report("PC-B", metrics, calculate_score(metrics), "10.0.0.2")
+    db = isolated_db()
+    try:
+        reports = {r.id: r.device_id for r in db.query(DeviceReport)}
+    finally:
+        db.close()
+    a_id, _, b_id = sorted(reports)
+    generation = repository.current_device_generation()
+
+    changed = repository.update_report_scores([
+        {"id": a_id, "total_score": 90.0, "risk_level": "LOW"},
+        {"id": b_id, "total_score": 100.0, "risk_level": "LOW"},     # unchanged
+    ])
+
+    assert changed == {reports[a_id]}
+    delta = repository.get_device_changes(generation)
+    assert [d["hostname"] for d in delta["devices"]] == ["PC-A"]
+    assert repository.update_report_scores([{"id": b_id, "total_score": 100.0}]) == set()
+    assert repository.current_device_generation() == delta["generation"]
+
+
+def test_unparseable_rows_are_counted_and_left_alone(isolated_db):
+    from server.db_models import DeviceReport
+    _seed_reports(2)
+    db = isolated_db()
+    try:
+        first = db.query(DeviceReport).order_by(DeviceReport.id).first()
+        first.metrics_json = '{"hostname": "PC-A"}'
+        first.total_score = 1.0
+        db.commit()
+    finally:
+        db.close()
+
+    result = RescoreJob(chunk_size=10, workers=0).run()
+    assert (result["processed"], result["updated"], result["failed"]) == (2, 0, 1)
+    assert _scores(isolated_db)[0] == 1.0
+
+
+def test_process_pool_restores_tampered_scores(isolated_db):
+    from server.db_models import DeviceReport
+    _seed_reports(5)
+    expected = _scores(isolated_db)
+    db = isolated_db()
+    try:
+        db.query(DeviceReport).update({DeviceReport.total_score: 0.0})
+        db.commit()
+    finally:
+        db.close()
+
+    result = RescoreJob(chunk_size=2, workers=2).run()
+    assert result["state"] == "done"
+    assert result["changed"] == 5
+    assert _scores(isolated_db) == expected
+
+
+def test_empty_table(isolated_db):
+    result = RescoreJob(workers=0).run()
+    assert (result["state"], result["total"], result["processed"]) == ("done", 0, 0)
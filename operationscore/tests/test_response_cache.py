@@ -0,0 +1,88 @@
+"""
+tests/test_response_cache.py
+
+server/response_cache.py: one build per ingest generation, ETag / 304
+revalidation and gzip for large bodies. Uses a minimal FastAPI app so no
+database is involved.
+"""
+
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from server import config, response_cache
+
+
+@pytest.fixture()
+def app_state(monkeypatch):
+    monkeypatch.setattr(config, "RESPONSE_GZIP_MIN_BYTES", 1024)
+    response_cache.clear()
+    state = {"builds": 0, "items": ["a"]}
+
+    def build():
+        state["builds"] += 1
+        return {"items": list(state["items"])}
+
+    app = FastAPI()
+
+    @app.get("/items")
+    async def items(request: Request):
+        return response_cache.cached_json(request, "items", build)
+
+    yield TestClient(app), state
+    response_cache.clear()
+
+
+def test_body_built_once_per_generation(app_state):
+    client, state = app_state
+    first = client.get("/items")
+    second = client.get("/items")
+    assert first.json() == second.json() == {"items": ["a"]}
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert state["builds"] == 1
+
+
+def test_if_none_match_returns_304(app_state):
+    client, state = app_state
+    etag = client.get("/items").headers["ETag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        r = client.get("/items", headers={"If-None-Match": header})
+        assert r.status_code == 304
+        assert r.headers["ETag"] == etag
+    assert client.get("/items", headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert state["builds"] == 1
+
+
+def test_bump_invalidates(app_state):
+    client, state = app_state
+    etag = client.get("/items").headers["ETag"]
+    state["items"].append("b")
+    response_cache.bump()
+    r = client.get("/items", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json() == {"items": ["a", "b"]}
+    assert r.headers["ETag"] != etag
+    assert state["builds"] == 2
+
+
+def test_large_bodies_gzipped_for_accepting_clients(app_state):
+    client, state = app_state
+    state["items"] = ["x" * 64] * 64
+    plain = client.get("/items", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    zipped = client.get("/items", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.headers["Vary"] == "Accept-Encoding"
+    assert zipped.json() == plain.json()        # TestClient transparently decodes
+    assert int(zipped.headers["Content-Length"]) < len(plain.content)
+    assert gzip.decompress(response_cache._entries["items"].gzipped()) == plain.content
+
+
+def test_small_bodies_not_gzipped(app_state):
+    client, _ = app_state
+    r = client.get("/items", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers
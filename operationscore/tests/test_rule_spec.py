@@ -0,0 +1,196 @@
+"""
+tests/test_rule_spec.py
+
+server/scoring/spec.py: the bundled rule_spec.json compiles to rules that
+match the hand-written modules in scoring/rules/ exactly (penalty, message,
+recommendation), invalid specs are rejected, and RuleSpecLoader picks up
+edits without a restart.
+"""
+
+import asyncio
+import json
+import os
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+import server.main as main
+from server.models import DeviceMetrics
+from server.scoring.engine import calculate_score, calculate_score_value
+from server.scoring.rules import (
+    rule_disk_usage,
+    rule_firewall_enabled,
+    rule_password_policy,
+    rule_pending_updates,
+    rule_ssh_root_login_disabled,
+    rule_sudo_users_limit,
+    rule_unnecessary_services,
+    rule_zombie_detection,
+)
+from server.scoring.rules.k10_gpu import rule_cpu_usage
+from server.scoring.rules.k9_ram import rule_ram_usage
+from server.scoring.spec import (
+    DEFAULT_SPEC_PATH,
+    RuleSpecError,
+    RuleSpecLoader,
+    compile_rule_spec,
+    load_rule_spec,
+)
+
+FIXED_TS = datetime(2026, 2, 22, 0, 0, 0, tzinfo=timezone.utc)
+
+REFERENCE_RULES = {
+    "K1": rule_pending_updates,
+    "K2": rule_firewall_enabled,
+    "K3": rule_ssh_root_login_disabled,
+    "K4": rule_sudo_users_limit,
+    "K5": rule_unnecessary_services,
+    "K6": rule_disk_usage,
+    "K7": rule_password_policy,
+    "K8": rule_zombie_detection,
+    "K9": rule_ram_usage,
+    "K10": rule_cpu_usage,
+}
+
+BOUNDARIES = dict(
+    update_count=[0, 10, 11, 30, 31, 500],
+    firewall_enabled=[True, False],
+    ssh_root_login_allowed=[True, False],
+    sudo_users_count=[0, 3, 4, 20],
+    unnecessary_services=[[], ["telnet"], ["telnet", "ftp"], list("abcdef")],
+    disk_usage_percent=[0, 85, 86, 95, 96, 100],
+    password_policy_ok=[True, False],
+    last_seen_minutes=[0, 60, 61, 119, 120, 1439, 1440, 2880],
+    ram_usage_percent=[0.0, 70.0, 70.05, 85.0, 85.5, 95.0, 95.01, 100.0],
+    cpu_usage_percent=[0.0, 70.0, 70.4, 85.0, 85.2, 95.0, 99.9, 100.0],
+)
+
+
+def make_metrics(**overrides) -> DeviceMetrics:
+    defaults = dict(
+        hostname="test-host",
+        timestamp=FIXED_TS,
+        update_count=0,
+        firewall_enabled=True,
+        ssh_root_login_allowed=False,
+        sudo_users_count=1,
+        unnecessary_services=[],
+        disk_usage_percent=50,
+        password_policy_ok=True,
+        last_seen_minutes=0,
+        ram_usage_percent=0.0,
+        cpu_usage_percent=0.0,
+    )
+    defaults.update(overrides)
+    return DeviceMetrics(**defaults)
+
+
+def _sample_metrics():
+    rng = random.Random(99)
+    samples = [make_metrics(**{f: v}) for f, values in BOUNDARIES.items() for v in values]
+    samples += [
+        make_metrics(**{f: rng.choice(values) for f, values in BOUNDARIES.items()})
+        for _ in range(200)
+    ]
+    return samples
+
+
+@pytest.fixture()
+def spec_dict():
+    with open(DEFAULT_SPEC_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------------------------------------------------------
+# Parity with scoring/rules/
+# ---------------------------------------------------------------------------
+
+def test_bundled_spec_covers_reference_rules_in_order():
+    rule_set = load_rule_spec(DEFAULT_SPEC_PATH)
+    assert [r.rule_id for r in rule_set] == list(REFERENCE_RULES)
+
+
+def test_each_compiled_rule_matches_reference_module():
+    rule_set = load_rule_spec(DEFAULT_SPEC_PATH)
+    for metrics in _sample_metrics():
+        for rule in rule_set:
+            assert rule(metrics) == REFERENCE_RULES[rule.rule_id](metrics), (rule.rule_id, metrics)
+
+
+def test_score_value_matches_full_report():
+    for metrics in _sample_metrics():
+        assert calculate_score_value(metrics) == calculate_score(metrics).total_score
+
+
+def test_hits_defer_message_rendering():
+    rule_set = load_rule_spec(DEFAULT_SPEC_PATH)
+    hits = rule_set.evaluate(make_metrics(disk_usage_percent=96, firewall_enabled=False))
+    assert [(h.rule.rule_id, h.penalty) for h in hits] == [("K2", 25.0), ("K6", 30.0)]
+    assert "96% used" in hits[1].to_issue().message
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("mutate, match", [
+    (lambda s: s["rules"][0].update(field="no_such_field"), "unknown metrics field"),
+    (lambda s: s["rules"][0]["tiers"][0].update(message="{nope}"), "unknown placeholder"),
+    (lambda s: s["rules"][1].update(id="K1"), "duplicate rule ids"),
+    (lambda s: s["rules"][0]["tiers"][0].update(penalty="high"), "penalty"),
+    (lambda s: s["rules"][0].update(tiers=[]), "tiers"),
+    (lambda s: s.pop("rules"), "rules"),
+])
+def test_invalid_specs_rejected(spec_dict, mutate, match):
+    mutate(spec_dict)
+    with pytest.raises(RuleSpecError, match=match):
+        compile_rule_spec(spec_dict)
+
+
+# ---------------------------------------------------------------------------
+# Hot reload
+# ---------------------------------------------------------------------------
+
+def _write(path, spec, mtime):
+    path.write_text(json.dumps(spec), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_loader_picks_up_edits_and_keeps_last_good(tmp_path, spec_dict, monkeypatch):
+    monkeypatch.setattr(main.config, "RULE_SPEC_RELOAD_SECONDS", 0)
+    path = tmp_path / "rules.json"
+    _write(path, spec_dict, 1_000_000)
+    loader = RuleSpecLoader(str(path))
+    metrics = make_metrics(firewall_enabled=False)
+    assert loader.current().penalty(metrics) == 25.0
+
+    spec_dict["rules"][1]["penalty"] = 40
+    _write(path, spec_dict, 1_000_100)
+    assert loader.current().penalty(metrics) == 40.0
+
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, (1_000_200, 1_000_200))
+    assert loader.current().penalty(metrics) == 40.0
+    with pytest.raises(RuleSpecError):
+        loader.reload()
+
+
+def test_rules_endpoint_lists_compiled_set():
+    body = asyncio.run(main.list_rules())
+    assert body["total_rules"] == len(REFERENCE_RULES)
+    k6 = next(r for r in body["rules"] if r["rule_id"] == "K6")
+    assert k6["field"] == "disk_usage_percent"
+    assert k6["tiers"] == [{"above": 95, "penalty": 30.0}, {"above": 85, "penalty": 15.0}]
+
+
+def test_reload_endpoint_rejects_invalid_spec(tmp_path, monkeypatch):
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"rules": [{"id": "X", "field": "nope"}]}', encoding="utf-8")
+    monkeypatch.setattr(main.config, "RULE_SPEC_PATH", str(bad))
+    with pytest.raises(main.HTTPException) as exc:
+        asyncio.run(main.reload_rules())
+    assert exc.value.status_code == 400
+
+    monkeypatch.setattr(main.config, "RULE_SPEC_PATH", "")
+    assert asyncio.run(main.reload_rules())["total_rules"] == len(REFERENCE_RULES)
@@ -0,0 +1,119 @@
+"""
+tests/test_run_sessions.py
+
+Unit tests for server/run_sessions.py: maintained counters, the
+hostname → pending-session index, and eviction to run_session_archive.
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from server.run_sessions import SessionStore
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(monkeypatch):
+    test_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+    from server.db import Base
+    import server.db_models  # noqa: F401 — registers models
+    Base.metadata.create_all(bind=test_engine)
+    TestSession = sessionmaker(bind=test_engine, autoflush=False, autocommit=False, future=True)
+
+    import server.db as db_module
+    import server.repository as repo_module
+    monkeypatch.setattr(db_module, "engine", test_engine)
+    monkeypatch.setattr(db_module, "SessionLocal", TestSession)
+    monkeypatch.setattr(repo_module, "SessionLocal", TestSession)
+    yield TestSession
+    Base.metadata.drop_all(bind=test_engine)
+    test_engine.dispose()
+
+
+def _result(score: float) -> dict:
+    return {"timestamp": datetime(2026, 1, 1, 12, 0), "score": score, "issues": []}
+
+
+def test_counters_track_reports():
+    store = SessionStore("run")
+    session = store.create("r1", datetime(2026, 1, 1), ["a", "b", "c"])
+    assert (session.total, session.completed, session.pending) == (3, 0, 3)
+    assert session.average_score is None
+
+    store.record("r1", "a", _result(80.0))
+    store.record("r1", "b", _result(60.0))
+    store.record("r1", "a", _result(90.0))       # re-report replaces the earlier score
+    store.record("r1", "outsider", _result(10.0))  # counted as a reporter, not a target
+
+    assert (session.completed, session.pending) == (2, 1)
+    assert session.average_score == pytest.approx(75.0)
+    assert session.completion_percent == pytest.approx(200 / 3)
+    assert session.reported_count == 3
+    assert session.statuses() == {"a": "completed", "b": "completed", "c": "pending"}
+    assert session.finished_at is None
+
+
+def test_pending_index_completes_every_open_scan():
+    store = SessionStore("scan")
+    s1 = store.create("s1", datetime(2026, 1, 1), ["a", "b"])
+    s2 = store.create("s2", datetime(2026, 1, 1), ["a"])
+
+    assert store.record_pending("a", _result(50.0)) == 2
+    assert store.record_pending("a", _result(70.0)) == 0   # nothing left waiting for "a"
+    assert s1.status("a") == s2.status("a") == "completed"
+    assert s2.finished_at is not None
+    assert s1.pending == 1
+
+
+def test_eviction_archives_and_get_falls_back(monkeypatch):
+    import server.config as config
+    monkeypatch.setattr(config, "RUN_SESSION_TTL_SECONDS", 0)
+    store = SessionStore("run")
+    store.create("r1", datetime(2026, 1, 1), ["a"])
+    store.create("r2", datetime(2026, 1, 2), ["a", "b"])   # unfinished: kept
+    store.record("r1", "a", _result(88.0))
+
+    assert asyncio.run(store.evict_expired()) == 1
+    assert "r1" not in store and "r2" in store
+
+    archived = asyncio.run(store.get("r1"))
+    assert archived.completed == 1
+    assert archived.average_score == pytest.approx(88.0)
+    assert archived.devices["a"]["score"] == 88.0
+    assert asyncio.run(store.get("missing")) is None
+
+    listed = {item["run_id"]: item["reported_count"] for item in asyncio.run(store.summaries())}
+    assert listed == {"r1": 1, "r2": 0}
+
+
+def test_periodic_eviction_without_new_runs(monkeypatch):
+    import server.config as config
+    import server.main as main
+    monkeypatch.setattr(config, "RUN_SESSION_TTL_SECONDS", 0)
+    monkeypatch.setattr(config, "RUN_SESSION_EVICT_SECONDS", 0)
+    runs, scans = SessionStore("run"), SessionStore("scan")
+    monkeypatch.setattr(main, "run_sessions", runs)
+    monkeypatch.setattr(main, "scan_sessions", scans)
+    runs.create("r1", datetime(2026, 1, 1), [])      # no targets: finished at once
+    scans.create("s1", datetime(2026, 1, 1), [])
+
+    async def scenario():
+        task = asyncio.create_task(main._evict_run_sessions())
+        for _ in range(100):
+            if not len(runs) and not len(scans):
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert "r1" not in runs and "s1" not in scans
+    assert asyncio.run(runs.get("r1")).run_id == "r1"
@@ -0,0 +1,123 @@
+"""
+tests/test_score_distribution.py
+
+server/score_distribution.py: fixed-bin histograms of the latest score per
+device, moved in O(1) as scores change, and their save/load round trip.
+Device types are given up front so no DB is needed.
+"""
+
+import json
+
+import pytest
+
+from server.score_distribution import FleetDistribution, ScoreHistogram
+
+
+@pytest.fixture()
+def dist():
+    d = FleetDistribution()
+    d.warm_types({f"srv-{i}": "SERVER" for i in range(10)} | {f"pc-{i}": "CLIENT" for i in range(100)})
+    return d
+
+
+class TestScoreHistogram:
+
+    def test_percentiles_nearest_rank(self):
+        h = ScoreHistogram()
+        for score in range(1, 101):
+            h.add(float(score))
+        assert h.percentile(5) == 5.0
+        assert h.percentile(50) == 50.0
+        assert h.percentile(95) == 95.0
+        assert h.mean() == pytest.approx(50.5)
+        assert ScoreHistogram().percentile(50) is None
+
+    def test_bin_resolution_and_bounds(self):
+        h = ScoreHistogram()
+        for score in (72.3, 72.4, 100.0, -3.0):
+            h.add(score)
+        assert h.percentile(50) == 72.0          # 72.3 and 72.4 share the [72, 72.5) bin
+        assert h.percentile(95) == 100.0
+        assert h.percentile(1) == 0.0             # clamped into the first bin
+
+    def test_buckets_and_merge(self):
+        a, b = ScoreHistogram(), ScoreHistogram()
+        for score in (5.0, 15.0, 99.5):
+            a.add(score)
+        b.add(100.0)
+        merged = a.merge(b)
+        buckets = merged.buckets(10)
+        assert len(buckets) == 10
+        assert [x["count"] for x in buckets] == [1, 1, 0, 0, 0, 0, 0, 0, 0, 2]
+        assert merged.total == 4 and a.total == 3
+        assert buckets[-1] == {"lower": 90, "upper": 100, "count": 2}
+
+
+class TestFleetDistribution:
+
+    def test_update_moves_latest_score(self, dist):
+        dist.update("pc-1", 40.0)
+        dist.update("pc-2", 80.0)
+        dist.update("srv-1", 90.0)
+        dist.update("pc-1", 60.0)      # replaces 40, not added to it
+
+        summary = dist.summary()
+        assert summary["device_count"] == 3
+        assert summary["client"]["count"] == 2
+        assert summary["client"]["p5"] == 60.0
+        assert summary["client"]["p95"] == 80.0
+        assert summary["server"]["p50"] == 90.0
+        assert summary["fleet"]["count"] == 3
+        assert summary["fleet"]["mean"] == pytest.approx(76.67)
+
+        dist.remove("pc-2")
+        assert dist.summary()["client"]["p95"] == 60.0
+        dist.clear()
+        assert dist.summary()["fleet"]["p50"] is None
+
+    def test_type_change_moves_device(self, dist):
+        dist.update("pc-1", 70.0)
+        dist.set_device_type("pc-1", "SERVER")
+        summary = dist.summary()
+        assert (summary["server"]["count"], summary["client"]["count"]) == (1, 0)
+
+    def test_matches_full_scan(self, dist):
+        import random
+        rng = random.Random(7)
+        latest = {}
+        for _ in range(2000):
+            host = f"pc-{rng.randrange(100)}"
+            latest[host] = round(rng.uniform(0, 100), 1)
+            dist.update(host, latest[host])
+        scores = sorted(latest.values())
+        for p in (5, 50, 95):
+            exact = scores[max(1, -(-p * len(scores) // 100)) - 1]
+            assert dist.summary()["client"][f"p{p}"] == pytest.approx(exact, abs=0.5)
+
+    def test_save_and_load(self, dist, tmp_path):
+        path = tmp_path / "dist.json"
+        dist.update("pc-1", 55.0)
+        dist.update("srv-1", 95.0)
+        assert dist.dirty()
+        assert dist.save(path)
+        assert not dist.dirty()
+        assert json.loads(path.read_text())["devices"]["pc-1"] == ["CLIENT", 55.0]
+
+        restored = FleetDistribution()
+        assert restored.load(path) == 2
+        assert restored.summary() == dist.summary()
+        restored.update("pc-1", 65.0)     # the restored score is replaced, not kept
+        assert restored.summary()["client"]["count"] == 1
+
+        # Devices deactivated since the save are dropped, re-registered ones move
+        pruned = FleetDistribution()
+        assert pruned.load(path, active={"srv-1": "CLIENT"}) == 1
+        summary = pruned.summary()
+        assert (summary["server"]["count"], summary["client"]["count"]) == (0, 1)
+
+    def test_missing_or_corrupt_file(self, tmp_path):
+        d = FleetDistribution()
+        assert d.load(tmp_path / "missing.json") == 0
+        (tmp_path / "bad.json").write_text("{nope")
+        assert d.load(tmp_path / "bad.json") == 0
+        assert len(d) == 0
@@ -0,0 +1,103 @@
+"""
+tests/test_score_memo.py
+
+metrics_content_hash() and the LRU-memoized calculate_score_cached().
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from server.models import DeviceMetrics, ScoreIssue
+from server.scoring import engine
+from server.scoring.engine import (
+    calculate_score,
+    calculate_score_cached,
+    clear_score_cache,
+    metrics_content_hash,
+    register_rule,
+    score_cache_stats,
+    unregister_rule,
+)
+
+
+def make_metrics(**overrides) -> DeviceMetrics:
+    data = dict(
+        hostname="memo-host",
+        timestamp=datetime(2026, 2, 21, 10, 0, tzinfo=timezone.utc),
+        update_count=12,
+        firewall_enabled=False,
+        ssh_root_login_allowed=False,
+        sudo_users_count=1,
+        unnecessary_services=["telnet"],
+        disk_usage_percent=50,
+        password_policy_ok=True,
+        last_seen_minutes=0,
+    )
+    data.update(overrides)
+    return DeviceMetrics(**data)
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo():
+    clear_score_cache()
+    yield
+    clear_score_cache()
+
+
+def test_hash_ignores_identity_time_and_last_seen():
+    base = metrics_content_hash(make_metrics())
+    assert metrics_content_hash(make_metrics(hostname="other-host")) == base
+    assert metrics_content_hash(make_metrics(timestamp=datetime(2027, 1, 1, tzinfo=timezone.utc))) == base
+    assert metrics_content_hash(make_metrics(last_seen_minutes=90)) == base
+    assert metrics_content_hash(make_metrics(update_count=13)) != base
+    assert metrics_content_hash(make_metrics(unnecessary_services=["cups"])) != base
+    assert metrics_content_hash(make_metrics(ram_usage_percent=71.0)) != base
+
+
+def test_cached_report_equals_calculate_score_and_is_reused():
+    first = calculate_score_cached(make_metrics())
+    assert first == calculate_score(make_metrics())
+    # Another host with the same inputs shares the memoized report
+    assert calculate_score_cached(make_metrics(hostname="other-host")) is first
+    assert score_cache_stats()["hits"] >= 1
+
+    # K8 depends on last_seen_minutes: a different value is scored separately
+    stale = calculate_score_cached(make_metrics(last_seen_minutes=120))
+    assert stale is not first
+    assert "K8" in {issue.rule_id for issue in stale.issues}
+
+
+def test_memo_dropped_when_rule_set_changes(monkeypatch):
+    from server.scoring.spec import DEFAULT_SPEC_PATH, load_rule_spec
+
+    first = calculate_score_cached(make_metrics())
+    other_rule_set = load_rule_spec(DEFAULT_SPEC_PATH)
+    monkeypatch.setattr(engine.rule_spec, "current", lambda: other_rule_set)
+    again = calculate_score_cached(make_metrics())
+    assert again is not first
+    assert again == first
+
+
+def test_memo_bypassed_with_runtime_rules():
+    def hostname_rule(metrics):
+        if metrics.hostname == "flagged":
+            return ScoreIssue(rule_id="X1", penalty=10.0, message="flagged", recommendation="none")
+        return None
+
+    calculate_score_cached(make_metrics())
+    register_rule(hostname_rule)
+    try:
+        plain = calculate_score_cached(make_metrics())
+        flagged = calculate_score_cached(make_metrics(hostname="flagged"))
+        assert flagged.total_score == plain.total_score - 10.0
+    finally:
+        unregister_rule(hostname_rule)
+
+
+def test_lru_evicts_oldest(monkeypatch):
+    monkeypatch.setattr(engine._score_memo, "size", 2)
+    calculate_score_cached(make_metrics(update_count=1))
+    calculate_score_cached(make_metrics(update_count=2))
+    calculate_score_cached(make_metrics(update_count=3))
+    assert score_cache_stats()["entries"] == 2
@@ -23,7 +23,7 @@ Penalty table (from production rules):
 import pytest
 from datetime import datetime, timezone
 from server.models import DeviceMetrics, ScoreIssue, ScoreReport
-from server.scoring.engine import calculate_score, RULES, register_rule, unregister_rule
+from server.scoring.engine import calculate_score, get_rules, RULES, register_rule, unregister_rule
 
 
 # ============================================================
@@ -554,6 +554,30 @@ class TestRuleRegistry:
         def ghost_rule(metrics):
             return None
         assert unregister_rule(ghost_rule) is False
+        assert unregister_rule("K99") is False
+
+    def test_get_rules_lists_spec_rules_first(self):
+        def custom_rule(metrics):
+            return None
+
+        register_rule(custom_rule)
+        try:
+            rules = get_rules()
+        finally:
+            unregister_rule(custom_rule)
+        assert [r.rule_id for r in rules[:-1]] == [f"K{i}" for i in range(1, 11)]
+        assert rules[-1] is custom_rule
+        # Each spec rule follows the rule function contract
+        issue = rules[1](make_metrics(firewall_enabled=False))
+        assert issue.rule_id == "K2"
+
+    def test_unregister_spec_rule_raises(self):
+        from server.scoring.rules import rule_firewall_enabled
+
+        for rule in ("K3", get_rules()[0], rule_firewall_enabled):
+            with pytest.raises(ValueError, match="rule spec"):
+                unregister_rule(rule)
+        assert len(get_rules()) == 10
 
 
 if __name__ == "__main__":
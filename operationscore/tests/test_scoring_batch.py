@@ -0,0 +1,174 @@
+"""
+tests/test_scoring_batch.py
+
+server/scoring/batch.py must agree with the per-device rule modules:
+same penalty per rule, same final score and, when issues are materialized,
+the same ScoreIssue objects as calculate_score().
+"""
+
+import random
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from server.models import DeviceMetrics
+from server.scoring.batch import calculate_scores_batch, columns_from_metrics
+from server.scoring.engine import calculate_score
+from server.scoring.spec import compile_rule_spec, rule_spec
+from server.scoring.rules.k10_gpu import rule_cpu_usage
+from server.scoring.rules.k9_ram import rule_ram_usage
+from server.scoring.rules import (
+    rule_disk_usage,
+    rule_firewall_enabled,
+    rule_password_policy,
+    rule_pending_updates,
+    rule_ssh_root_login_disabled,
+    rule_sudo_users_limit,
+    rule_unnecessary_services,
+    rule_zombie_detection,
+)
+
+FIXED_TS = datetime(2026, 2, 22, 0, 0, 0, tzinfo=timezone.utc)
+
+# Reference implementation per matrix column
+REFERENCE_RULES = {
+    "K1": rule_pending_updates,
+    "K2": rule_firewall_enabled,
+    "K3": rule_ssh_root_login_disabled,
+    "K4": rule_sudo_users_limit,
+    "K5": rule_unnecessary_services,
+    "K6": rule_disk_usage,
+    "K7": rule_password_policy,
+    "K8": rule_zombie_detection,
+    "K9": rule_ram_usage,
+    "K10": rule_cpu_usage,
+}
+
+# Values on and around every rule threshold
+BOUNDARIES = dict(
+    update_count=[0, 10, 11, 30, 31, 500],
+    firewall_enabled=[True, False],
+    ssh_root_login_allowed=[True, False],
+    sudo_users_count=[0, 3, 4, 20],
+    unnecessary_services=[[], ["telnet"], ["telnet", "ftp"], ["a", "b", "c", "d", "e", "f"]],
+    disk_usage_percent=[0, 85, 86, 95, 96, 100],
+    password_policy_ok=[True, False],
+    last_seen_minutes=[0, 60, 61, 120, 1439, 1440, 2880],
+    ram_usage_percent=[0.0, 70.0, 70.05, 85.0, 85.5, 95.0, 95.01, 100.0],
+    cpu_usage_percent=[0.0, 70.0, 70.4, 85.0, 85.2, 95.0, 99.9, 100.0],
+)
+
+
+def make_metrics(**overrides) -> DeviceMetrics:
+    defaults = dict(
+        hostname="test-host",
+        timestamp=FIXED_TS,
+        update_count=0,
+        firewall_enabled=True,
+        ssh_root_login_allowed=False,
+        sudo_users_count=1,
+        unnecessary_services=[],
+        disk_usage_percent=50,
+        password_policy_ok=True,
+        last_seen_minutes=0,
+        ram_usage_percent=0.0,
+        cpu_usage_percent=0.0,
+    )
+    defaults.update(overrides)
+    return DeviceMetrics(**defaults)
+
+
+@pytest.fixture(scope="module")
+def fleet():
+    rng = random.Random(1234)
+    devices = [make_metrics()]
+    # Every boundary value of every field at least once, others clean
+    for field, values in BOUNDARIES.items():
+        devices.extend(make_metrics(**{field: v}) for v in values)
+    # Random combinations
+    for i in range(300):
+        devices.append(make_metrics(
+            hostname=f"host-{i}",
+            **{field: rng.choice(values) for field, values in BOUNDARIES.items()},
+        ))
+    return devices
+
+
+def test_penalties_match_each_rule_module(fleet):
+    batch = calculate_scores_batch(columns_from_metrics(fleet))
+    assert batch.rule_ids == tuple(REFERENCE_RULES)
+    assert batch.penalties.shape == (len(fleet), len(REFERENCE_RULES))
+    for i, metrics in enumerate(fleet):
+        for j, rule_id in enumerate(batch.rule_ids):
+            issue = REFERENCE_RULES[rule_id](metrics)
+            expected = issue.penalty if issue is not None else 0.0
+            assert batch.penalties[i, j] == expected, (rule_id, metrics)
+
+
+def test_scores_and_reports_match_calculate_score(fleet):
+    batch = calculate_scores_batch(columns_from_metrics(fleet))
+    for i, metrics in enumerate(fleet):
+        expected = calculate_score(metrics)
+        assert batch.scores[i] == pytest.approx(expected.total_score)
+        assert batch.triggered(i) == [issue.rule_id for issue in expected.issues]
+        assert batch.report(i) == expected
+
+
+def test_zero_penalty_hits_are_reported(fleet, monkeypatch):
+    # A rule may fire with no penalty (informational); it is still an issue
+    rule_set = compile_rule_spec({"rules": [
+        {"id": "I1", "field": "update_count", "message": "{value} updates", "recommendation": "r",
+         "tiers": [{"above": 30, "penalty": 5}, {"above": 10, "penalty": 0}]},
+        {"id": "I2", "field": "firewall_enabled", "fail_when": False, "penalty": 0,
+         "message": "firewall off", "recommendation": "r"},
+    ]})
+    monkeypatch.setattr(rule_spec, "current", lambda: rule_set)
+    batch = calculate_scores_batch(columns_from_metrics(fleet, rule_set), rule_set)
+    fired = 0
+    for i, metrics in enumerate(fleet):
+        expected = calculate_score(metrics)
+        assert batch.scores[i] == pytest.approx(expected.total_score)
+        assert batch.triggered(i) == [issue.rule_id for issue in expected.issues]
+        assert batch.issues(i) == expected.issues
+        fired += any(issue.penalty == 0 for issue in expected.issues)
+    assert fired
+
+
+def test_accepts_plain_sequences():
+    columns = {
+        "update_count": [0, 40],
+        "firewall_enabled": [True, False],
+        "ssh_root_login_allowed": [False, True],
+        "sudo_users_count": [1, 5],
+        "unnecessary_services": [[], ["cups", "avahi"]],
+        "disk_usage_percent": [10, 99],
+        "password_policy_ok": [True, False],
+        "last_seen_minutes": [0, 90],
+        "ram_usage_percent": [10.0, 99.0],
+        "cpu_usage_percent": [10.0, 99.0],
+        "hostname": ["ignored", "extra"],
+    }
+    batch = calculate_scores_batch(columns)
+    assert len(batch) == 2
+    np.testing.assert_array_equal(batch.scores, [100.0, 0.0])
+    assert batch.issues(0) == []
+    assert len(batch.issues(1)) == len(REFERENCE_RULES)
+
+
+def test_missing_or_ragged_columns_rejected():
+    columns = columns_from_metrics([make_metrics(), make_metrics()])
+    del columns["cpu_usage_percent"]
+    with pytest.raises(ValueError, match="cpu_usage_percent"):
+        calculate_scores_batch(columns)
+
+    columns = columns_from_metrics([make_metrics(), make_metrics()])
+    columns["update_count"] = columns["update_count"][:1]
+    with pytest.raises(ValueError, match="length"):
+        calculate_scores_batch(columns)
+
+
+def test_empty_batch():
+    batch = calculate_scores_batch(columns_from_metrics([]))
+    assert len(batch) == 0
+    assert batch.penalties.shape == (0, len(REFERENCE_RULES))
@@ -0,0 +1,132 @@
+"""
+tests/test_snapshot_store.py
+
+server/snapshot_store.py: the in-memory snapshot is served as pre-serialized
+bytes and written to disk by the background writer (compact JSON, newest
+body wins). The snapshot file is redirected to tmp_path.
+"""
+
+import gzip
+import json
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server import config, snapshot_store
+from server.snapshot_routes import router
+
+
+@pytest.fixture()
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(snapshot_store, "LATEST_PATH", tmp_path / "latest_snapshot.json")
+    monkeypatch.setattr(snapshot_store, "TMP_PATH", tmp_path / "latest_snapshot.json.tmp")
+    monkeypatch.setattr(snapshot_store, "_current", None)
+    monkeypatch.setattr(snapshot_store, "_current_body", None)
+    yield snapshot_store
+    assert snapshot_store.flush()
+
+
+def _snapshot(count):
+    devices = [
+        {"hostname": f"pc-{i}", "score": 80.0, "risk_level": "LOW", "issues": []}
+        for i in range(count)
+    ]
+    return {"generated_at": "2026-02-21T10:00:00+00:00", "device_count": count, "devices": devices}
+
+
+def test_set_snapshot_serves_memory_and_writes_compact_file(store):
+    snap = _snapshot(2)
+    entry = store.set_snapshot(snap)
+    assert store.current_snapshot() is snap
+    assert store.current_body() is entry
+    assert json.loads(entry.body) == snap
+    assert b"\n" not in entry.body and b": " not in entry.body
+
+    assert store.flush()
+    assert store.LATEST_PATH.read_bytes() == entry.body
+    assert not store.TMP_PATH.exists()
+
+
+def test_newest_snapshot_wins(store):
+    for count in range(20):
+        store.set_snapshot(_snapshot(count))
+    assert store.flush()
+    assert json.loads(store.LATEST_PATH.read_text(encoding="utf-8"))["device_count"] == 19
+
+
+def test_load_snapshot_from_disk(store):
+    store.LATEST_PATH.write_text(json.dumps(_snapshot(3), indent=2), encoding="utf-8")
+    assert store.load_snapshot()["device_count"] == 3
+    assert store.current_body().last_modified is not None
+    # Loading does not rewrite the file
+    assert b"\n" in store.LATEST_PATH.read_bytes()
+
+
+def test_missing_or_corrupt_file_gives_empty_snapshot(store):
+    assert store.current_snapshot()["device_count"] == 0
+    store.LATEST_PATH.write_text("{not json", encoding="utf-8")
+    assert store.load_snapshot()["devices"] == []
+    assert store.flush()
+    assert json.loads(store.LATEST_PATH.read_bytes())["device_count"] == 0
+
+
+class TestLatestRoute:
+
+    @pytest.fixture()
+    def client(self, store, monkeypatch):
+        monkeypatch.setattr(config, "RESPONSE_GZIP_MIN_BYTES", 1024)
+        app = FastAPI()
+        app.include_router(router, prefix="/snapshot")
+        return TestClient(app)
+
+    def test_served_without_reading_the_file(self, client, store, monkeypatch):
+        store.set_snapshot(_snapshot(1))
+        assert store.flush()
+        monkeypatch.setattr(store, "LATEST_PATH", store.SNAPSHOT_DIR / "missing" / "x.json")
+
+        r = client.get("/snapshot/latest")
+        assert r.status_code == 200
+        assert r.json()["device_count"] == 1
+        assert r.headers["etag"]
+        assert r.headers["last-modified"].endswith("GMT")
+
+    def test_conditional_requests(self, client, store):
+        store.set_snapshot(_snapshot(1))
+        first = client.get("/snapshot/latest")
+
+        r = client.get("/snapshot/latest", headers={"If-None-Match": first.headers["etag"]})
+        assert r.status_code == 304
+        r = client.get("/snapshot/latest", headers={"If-Modified-Since": first.headers["last-modified"]})
+        assert r.status_code == 304
+        earlier = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+        assert client.get("/snapshot/latest", headers={"If-Modified-Since": earlier}).status_code == 200
+
+        # A new snapshot changes the ETag
+        store.set_snapshot(_snapshot(2))
+        r = client.get("/snapshot/latest", headers={"If-None-Match": first.headers["etag"]})
+        assert r.status_code == 200
+        assert r.json()["device_count"] == 2
+
+    def test_gzip_compressed_once(self, client, store):
+        entry = store.set_snapshot(_snapshot(50))
+        r = client.get("/snapshot/latest", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.json()["device_count"] == 50
+        assert gzip.decompress(entry.gzipped()) == entry.body
+        assert entry.gzipped() is entry.gzipped()
+
+    def test_rebuild_and_reset(self, client, store, monkeypatch):
+        from server import state
+
+        monkeypatch.setattr(state, "device_reports_cache", {"pc-1": {"report": {"total_score": 55.0}}})
+        monkeypatch.setattr(state, "device_metrics_cache", {})
+        monkeypatch.setattr(state, "registered_devices", {})
+        assert client.post("/snapshot/rebuild").json()["device_count"] == 1
+        assert client.get("/snapshot/latest").json()["devices"][0]["risk_level"] == "HIGH"
+
+        assert client.post("/snapshot/reset").json() == {"ok": True}
+        assert client.get("/snapshot/latest").json()["device_count"] == 0
@@ -0,0 +1,331 @@
+"""
+tests/test_task_queue.py
+
+Agent task delivery: GET /tasks/{hostname}?wait=N long-poll semantics and
+the durable lease/ack queue in server/task_queue.py. Endpoint coroutines are
+driven directly on an event loop against a per-test in-memory SQLite DB.
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import server.main as main
+from server.task_queue import TaskQueue, task_queue
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(monkeypatch):
+    """Fresh in-memory DB for repository writes; empty process-wide queue."""
+    test_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+    from server.db import Base
+    import server.db_models  # noqa: F401 — registers models
+    Base.metadata.create_all(bind=test_engine)
+    TestSession = sessionmaker(bind=test_engine, autoflush=False, autocommit=False, future=True)
+
+    import server.db as db_module
+    import server.repository as repo_module
+    monkeypatch.setattr(db_module, "engine", test_engine)
+    monkeypatch.setattr(db_module, "SessionLocal", TestSession)
+    monkeypatch.setattr(repo_module, "SessionLocal", TestSession)
+
+    task_queue.clear()
+    yield TestSession
+    task_queue.clear()
+    Base.metadata.drop_all(bind=test_engine)
+    test_engine.dispose()
+
+
+def _statuses(TestSession) -> dict:
+    from server.db_models import AgentTask
+    db = TestSession()
+    try:
+        return {t.task_id: (t.status, t.attempts) for t in db.query(AgentTask).all()}
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# Long-poll
+# ---------------------------------------------------------------------------
+
+def test_no_wait_returns_204_immediately():
+    response = Response()
+    result = asyncio.run(main.get_task("lp-host", response, wait=0))
+    assert result is None
+    assert response.status_code == 204
+    assert response.headers["X-Long-Poll"] == "1"
+
+
+def test_pending_task_returned_without_waiting():
+    async def scenario():
+        await main.create_task("lp-host", {"command": "run_scan"})
+        return await main.get_task("lp-host", Response(), wait=30)
+
+    start = time.monotonic()
+    task = asyncio.run(scenario())
+    assert task.command == "run_scan"
+    assert time.monotonic() - start < 1
+
+
+def test_waiter_released_when_task_enqueued():
+    async def scenario():
+        poll = asyncio.create_task(main.get_task("lp-host", Response(), wait=30))
+        await asyncio.sleep(0.05)
+        assert poll.done() is False
+        await main.create_task("lp-host", {"command": "run_scan"})
+        return await asyncio.wait_for(poll, timeout=2)
+
+    task = asyncio.run(scenario())
+    assert task.command == "run_scan"
+    assert task_queue._waiters == {}
+
+
+def test_wait_times_out_with_204(monkeypatch):
+    monkeypatch.setattr(main.config, "TASK_LONG_POLL_MAX_SECONDS", 0.1)
+    response = Response()
+    start = time.monotonic()
+    result = asyncio.run(main.get_task("lp-host", response, wait=30))
+    assert result is None
+    assert response.status_code == 204
+    assert time.monotonic() - start < 2
+    assert task_queue._waiters == {}
+
+
+# ---------------------------------------------------------------------------
+# Durability, leases and acks
+# ---------------------------------------------------------------------------
+
+def test_broadcast_is_fifo_per_host_and_persisted(isolated_db):
+    async def scenario():
+        await task_queue.enqueue_many(["h1", "h2"], "run_scan")
+        await task_queue.enqueue("h1", "collect_logs")
+        first = await task_queue.dequeue("h1")
+        second = await task_queue.dequeue("h1")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first["command"], second["command"]) == ("run_scan", "collect_logs")
+    assert task_queue.pending("h2") == 1
+    statuses = _statuses(isolated_db)
+    assert len(statuses) == 3
+    assert statuses[first["task_id"]] == ("leased", 1)
+
+
+def test_ack_completes_and_rejects_unknown(isolated_db):
+    async def scenario():
+        item = await task_queue.enqueue("h1", "collect_logs")
+        await task_queue.dequeue("h1")
+        return item, await task_queue.ack("h1", item["task_id"]), await task_queue.ack("h1", "nope")
+
+    item, ok, unknown = asyncio.run(scenario())
+    assert (ok, unknown) == (True, False)
+    assert _statuses(isolated_db)[item["task_id"]] == ("done", 1)
+
+
+def test_expired_lease_is_redelivered_then_failed(isolated_db, monkeypatch):
+    monkeypatch.setattr(main.config, "TASK_LEASE_SECONDS", 0)
+    monkeypatch.setattr(main.config, "TASK_MAX_ATTEMPTS", 2)
+
+    async def scenario():
+        item = await task_queue.enqueue("h1", "run_scan")
+        a = await task_queue.dequeue("h1")
+        b = await task_queue.dequeue("h1")   # lease expired → redelivered
+        c = await task_queue.dequeue("h1")   # attempts exhausted
+        return item, a, b, c
+
+    item, a, b, c = asyncio.run(scenario())
+    assert a["task_id"] == b["task_id"] == item["task_id"]
+    assert c is None
+    assert _statuses(isolated_db)[item["task_id"]] == ("failed", 2)
+
+
+def test_report_acks_leased_run_scan(isolated_db):
+    async def scenario():
+        item = await task_queue.enqueue("h1", "run_scan")
+        await task_queue.dequeue("h1")
+        return item, await task_queue.ack_command("h1", "run_scan")
+
+    item, acked = asyncio.run(scenario())
+    assert acked == 1
+    assert task_queue.leased("h1") == 0
+    assert _statuses(isolated_db)[item["task_id"]][0] == "done"
+
+
+def test_restart_restores_queued_and_leased(isolated_db):
+    async def scenario():
+        await task_queue.enqueue_many(["h1", "h1", "h2"], "run_scan")
+        return await task_queue.dequeue("h1")
+
+    leased = asyncio.run(scenario())
+
+    restarted = TaskQueue()
+    assert restarted.load_from_db() == 3
+    assert restarted.pending("h1") == 2
+    item = asyncio.run(restarted.dequeue("h1"))
+    assert item["task_id"] == leased["task_id"]
+    assert item["attempts"] == 2
+
+
+# ---------------------------------------------------------------------------
+# Shared mode: two queues stand in for two workers (server/cluster.py)
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def workers():
+    import json
+
+    a, b = TaskQueue(), TaskQueue()
+    for source, target in ((a, b), (b, a)):
+        source.shared = True
+        # JSON round trip, as over the bus
+        source.subscribe(
+            lambda event, payload, target=target: target.apply_remote(event, json.loads(json.dumps(payload)))
+        )
+    return a, b
+
+
+def test_shared_task_is_delivered_once(isolated_db, workers):
+    a, b = workers
+
+    async def scenario():
+        item = await a.enqueue("h1", "collect_logs")
+        assert b.pending("h1") == 1
+        # Both workers poll at once: the agent_tasks row picks one winner
+        results = await asyncio.gather(a.dequeue("h1"), b.dequeue("h1"))
+        return item, results
+
+    item, results = asyncio.run(scenario())
+    delivered = [r for r in results if r is not None]
+    assert [r["task_id"] for r in delivered] == [item["task_id"]]
+    assert a.pending("h1") == b.pending("h1") == 0
+    assert _statuses(isolated_db)[item["task_id"]] == ("leased", 1)
+
+
+def test_shared_long_poll_wakes_on_other_worker_enqueue(isolated_db, workers):
+    a, b = workers
+
+    async def scenario():
+        waiter = asyncio.create_task(b.dequeue("h1", wait=5))
+        await asyncio.sleep(0.05)
+        await a.enqueue("h1", "run_scan")
+        return await waiter
+
+    start = time.monotonic()
+    task = asyncio.run(scenario())
+    assert task["command"] == "run_scan"
+    assert time.monotonic() - start < 2
+    assert a.stats()["leased_elsewhere"] == 1
+
+
+def test_shared_ack_on_another_worker(isolated_db, workers):
+    a, b = workers
+
+    async def scenario():
+        first = await a.enqueue("h1", "collect_logs")
+        scan = await a.enqueue("h1", "run_scan")
+        await a.dequeue("h1")
+        await a.dequeue("h1")
+        acked = await b.ack("h1", first["task_id"])
+        wrong_host = await b.ack("h2", scan["task_id"])
+        # A report handled by b completes the run_scan leased through a
+        reported = await b.ack_command("h1", "run_scan")
+        return first, scan, acked, wrong_host, reported
+
+    first, scan, acked, wrong_host, reported = asyncio.run(scenario())
+    assert (acked, wrong_host, reported) == (True, False, 1)
+    assert a.leased("h1") == 0
+    assert a.stats()["leased_elsewhere"] == b.stats()["leased_elsewhere"] == 0
+    statuses = _statuses(isolated_db)
+    assert statuses[first["task_id"]][0] == statuses[scan["task_id"]][0] == "done"
+
+
+def test_shared_lease_of_dead_worker_is_requeued(isolated_db, workers, monkeypatch):
+    monkeypatch.setattr(main.config, "TASK_LEASE_SECONDS", 0)
+    a, b = workers
+
+    async def scenario():
+        item = await a.enqueue("h1", "run_scan")
+        await a.dequeue("h1")
+        a._listeners.clear()            # worker a is gone
+        return item, await b.dequeue("h1")
+
+    item, redelivered = asyncio.run(scenario())
+    assert redelivered["task_id"] == item["task_id"]
+    assert redelivered["attempts"] == 2
+    assert _statuses(isolated_db)[item["task_id"]] == ("leased", 2)
+
+
+def test_shared_failed_lease_write_keeps_the_task(isolated_db, workers, monkeypatch):
+    import server.repository as repo_module
+
+    a, _ = workers
+    lease_task = repo_module.lease_task
+
+    def broken(*args):
+        raise RuntimeError("database is locked")
+
+    async def scenario():
+        item = await a.enqueue("h1", "run_scan")
+        monkeypatch.setattr(repo_module, "lease_task", broken)
+        missed = await a.dequeue("h1")
+        pending = a.pending("h1")
+        monkeypatch.setattr(repo_module, "lease_task", lease_task)
+        return item, missed, pending, await a.dequeue("h1")
+
+    item, missed, pending, delivered = asyncio.run(scenario())
+    assert (missed, pending) == (None, 1)
+    assert delivered["task_id"] == item["task_id"]
+    assert _statuses(isolated_db)[item["task_id"]] == ("leased", 1)
+
+
+def test_shared_failed_requeue_is_retried(isolated_db, workers, monkeypatch):
+    import server.repository as repo_module
+
+    monkeypatch.setattr(main.config, "TASK_LEASE_SECONDS", 0)
+    a, b = workers
+    requeue_tasks = repo_module.requeue_tasks
+
+    def broken(task_ids):
+        raise RuntimeError("database is locked")
+
+    async def scenario():
+        item = await a.enqueue("h1", "run_scan")
+        await a.dequeue("h1")
+        a._listeners.clear()            # worker a is gone
+        monkeypatch.setattr(repo_module, "requeue_tasks", broken)
+        missed = await b.dequeue("h1")
+        held = b.stats()["leased_elsewhere"]
+        monkeypatch.setattr(repo_module, "requeue_tasks", requeue_tasks)
+        return item, missed, held, await b.dequeue("h1")
+
+    item, missed, held, redelivered = asyncio.run(scenario())
+    assert (missed, held) == (None, 1)
+    assert redelivered["task_id"] == item["task_id"]
+    assert _statuses(isolated_db)[item["task_id"]] == ("leased", 2)
+
+
+def test_shared_restart_keeps_other_workers_leases(isolated_db, workers):
+    a, _ = workers
+
+    async def scenario():
+        await a.enqueue_many(["h1", "h1"], "run_scan")
+        return await a.dequeue("h1")
+
+    leased = asyncio.run(scenario())
+    restarted = TaskQueue()
+    restarted.shared = True
+    assert restarted.load_from_db() == 2
+    assert restarted.pending("h1") == 1
+    assert restarted.stats()["leased_elsewhere"] == 1
+    assert _statuses(isolated_db)[leased["task_id"]][0] == "leased"
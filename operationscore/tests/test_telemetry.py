@@ -0,0 +1,76 @@
+"""
+tests/test_telemetry.py
+
+In-process metrics registry and its Prometheus text rendering.
+"""
+
+import pytest
+
+from server.telemetry import MetricsRegistry
+
+
+def _samples(text):
+    return {
+        line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line and not line.startswith("#")
+    }
+
+
+def test_counter_with_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("ops_things_total", "Things.", ("kind",))
+    counter.labels("a").inc()
+    counter.labels("a").inc(2)
+    counter.labels("b").inc()
+    text = registry.render()
+    assert "# TYPE ops_things_total counter" in text
+    samples = _samples(text)
+    assert samples['ops_things_total{kind="a"}'] == 3
+    assert samples['ops_things_total{kind="b"}'] == 1
+
+    with pytest.raises(ValueError):
+        counter.labels("a", "extra")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    hist = registry.histogram("ops_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value)
+    samples = _samples(registry.render())
+    assert samples['ops_latency_seconds_bucket{le="0.1"}'] == 2      # le is inclusive
+    assert samples['ops_latency_seconds_bucket{le="1"}'] == 3
+    assert samples['ops_latency_seconds_bucket{le="+Inf"}'] == 4
+    assert samples["ops_latency_seconds_count"] == 4
+    assert samples["ops_latency_seconds_sum"] == pytest.approx(3.65)
+
+
+def test_histogram_timer_and_label_escaping():
+    registry = MetricsRegistry()
+    hist = registry.histogram("ops_stage_seconds", "Stage.", ("stage",))
+    with hist.labels('we"ird').time():
+        pass
+    samples = _samples(registry.render())
+    assert samples['ops_stage_seconds_count{stage="we\\"ird"}'] == 1
+
+
+def test_callbacks_and_failing_callback_skipped():
+    registry = MetricsRegistry()
+    registry.gauge_callback("ops_depth", "Depth.", lambda: {"queued": 3, "leased": 1}, ("state",))
+    registry.counter_callback("ops_sent_total", "Sent.", lambda: 7)
+    registry.gauge_callback("ops_broken", "Broken.", lambda: 1 / 0)
+    text = registry.render()
+    samples = _samples(text)
+    assert samples['ops_depth{state="queued"}'] == 3
+    assert samples["ops_sent_total"] == 7
+    assert "# TYPE ops_sent_total counter" in text
+    assert "ops_broken" not in text
+
+
+def test_reregistering_returns_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("ops_x_total", "X.", ("a",))
+    assert registry.counter("ops_x_total", "X.", ("a",)) is first
+    with pytest.raises(ValueError):
+        registry.histogram("ops_x_total", "X.")
@@ -0,0 +1,139 @@
+"""
+tests/test_ws_broadcaster.py
+
+Unit tests for server/ws_broadcaster.py using in-process fake sockets,
+plus one end-to-end /ws check through the TestClient.
+"""
+
+import asyncio
+
+import pytest
+
+import server.config as config
+from server.ws_broadcaster import WebSocketBroadcaster
+
+
+class FakeSocket:
+    """Records frames; send_json blocks until `gate` is set."""
+
+    def __init__(self, gate=None):
+        self.frames = []
+        self.closed_with = None
+        self.gate = gate
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, frame):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.frames.append(frame)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def _update(hostname, score):
+    return {"type": "snapshot_updated", "hostname": hostname, "score": score}
+
+
+def _events(frames):
+    out = []
+    for frame in frames:
+        out.extend(frame["events"] if frame.get("type") == "batch" else [frame])
+    return out
+
+
+def test_publish_coalesces_and_batches():
+    async def scenario():
+        b = WebSocketBroadcaster()
+        gate = asyncio.Event()
+        sock = FakeSocket(gate)
+        await b.connect(sock)
+        b.publish({"type": "other", "n": 0})
+        await asyncio.sleep(0)              # sender takes "other" and blocks on the gate
+        b.publish(_update("a", 10))
+        b.publish(_update("b", 20))
+        b.publish(_update("a", 30))         # replaces the queued update for "a"
+        gate.set()
+        await asyncio.sleep(0.05)
+        await b.close_all()
+        return b, sock
+
+    b, sock = asyncio.run(scenario())
+    assert sock.frames[0] == {"type": "other", "n": 0}
+    assert sock.frames[1]["type"] == "batch"
+    assert sock.frames[1]["events"] == [_update("a", 30), _update("b", 20)]
+    stats = b.stats()
+    assert stats["events_coalesced"] == 1
+    assert stats["events_sent"] == 3
+    assert stats["frames_sent"] == 2
+
+
+def test_slow_client_does_not_block_publish_and_is_dropped(monkeypatch):
+    monkeypatch.setattr(config, "WS_CLIENT_QUEUE_SIZE", 3)
+
+    async def scenario():
+        b = WebSocketBroadcaster()
+        slow = FakeSocket(asyncio.Event())  # never released
+        fast = FakeSocket()
+        await b.connect(slow)
+        await b.connect(fast)
+        for n in range(10):
+            b.publish({"type": "other", "n": n})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        clients = len(b)
+        await b.close_all()
+        return b, slow, fast, clients
+
+    b, slow, fast, clients = asyncio.run(scenario())
+    assert [e["n"] for e in _events(fast.frames)] == list(range(10))
+    assert slow.closed_with == 1013
+    assert clients == 1
+    assert b.stats()["slow_disconnects"] == 1
+    assert b.stats()["events_dropped"] >= 3
+
+
+def test_ws_endpoint_receives_report_event(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    test_engine = create_engine(
+        f"sqlite:///{tmp_path / 'ws.db'}",
+        connect_args={"check_same_thread": False},
+        future=True,
+    )
+    TestSession = sessionmaker(bind=test_engine, autoflush=False, autocommit=False, future=True)
+    import server.db as db_module
+    import server.repository as repo_module
+    monkeypatch.setattr(db_module, "engine", test_engine)
+    monkeypatch.setattr(db_module, "SessionLocal", TestSession)
+    monkeypatch.setattr(repo_module, "SessionLocal", TestSession)
+
+    from server.main import app
+    with TestClient(app) as tc:
+        tc.post("/api/register", json={
+            "hostname": "ws-host", "ip": "10.0.0.5",
+            "username": "ops-client", "password": "client123!",
+        })
+        with tc.websocket_connect("/ws") as ws:
+            r = tc.post("/report", json={
+                "hostname": "ws-host",
+                "timestamp": "2026-01-01T00:00:00Z",
+                "update_count": 0,
+                "firewall_enabled": True,
+                "ssh_root_login_allowed": False,
+                "sudo_users_count": 1,
+                "unnecessary_services": [],
+                "disk_usage_percent": 10,
+                "password_policy_ok": True,
+                "last_seen_minutes": 0,
+            })
+            assert r.status_code == 200
+            event = ws.receive_json()
+            assert event["type"] == "snapshot_updated"
+            assert event["hostname"] == "ws-host"
+        assert tc.get("/debug/ws").json()["events_sent"] >= 1
+    test_engine.dispose()